@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Script chuyển session cũ sang file archive + bảo trì file DB chính (core/archiver.py)
+App tự chạy định kỳ (DB_CONFIG["maintenance_interval"]); script dùng cho cron hoặc lần đầu
+với database đã có nhiều năm dữ liệu
+
+Usage:
+    python archive_sessions.py                            # Session đã thanh toán quá 180 ngày
+    python archive_sessions.py --days 90 --batch 10000
+    python archive_sessions.py --enable-incremental-vacuum    # 1 lần, khi app đã tắt (VACUUM toàn bộ file)
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import archiver
+from core.db_migrations import run_migrations
+
+# Đường dẫn database
+DB_PATH = os.path.join(os.path.dirname(__file__), "parking_system.db")
+
+
+def archive(db_path=DB_PATH, archive_path=None, days=180, batch_size=5000, enable_vacuum=False):
+    archive_path = archive_path or archiver.default_archive_path(db_path)
+    print(f"🔄 Archive session đã thanh toán quá {days} ngày: {db_path} -> {archive_path}")
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    try:
+        # Attach trước khi migrate: migration v7 giữ daily_rollup của session đã archive
+        archiver.attach_archive(conn, archive_path)
+        run_migrations(conn)
+        archiver.ensure_archive_schema(conn)
+        conn.commit()
+
+        cutoff_ts = int(time.time()) - days * 86400
+        total = 0
+        t0 = time.perf_counter()
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            moved = archiver.archive_batch(conn, cutoff_ts, batch_size)
+            conn.commit()
+            total += moved
+            if moved:
+                print(f"   ... {total:,} session")
+            if moved < batch_size:
+                break
+        print(f"✅ Đã chuyển {total:,} session sau {time.perf_counter() - t0:.1f}s")
+
+        if enable_vacuum:
+            print("🔧 Chuyển file chính sang auto_vacuum=INCREMENTAL (VACUUM)...")
+            archiver.enable_incremental_vacuum(conn)
+        result = archiver.maintain(conn)
+        conn.commit()
+        print(f"✅ ANALYZE + incremental vacuum: {result}")
+        return total
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Lỗi archive: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chuyển session cũ sang file archive")
+    parser.add_argument("--db", default=DB_PATH, help="Đường dẫn file database")
+    parser.add_argument("--archive", help="File archive (mặc định: <db>_archive.db)")
+    parser.add_argument("--days", type=int, default=180, help="Session ra bãi quá N ngày")
+    parser.add_argument("--batch", type=int, default=5000, help="Số session mỗi transaction")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Chuyển file chính sang auto_vacuum=INCREMENTAL (chạy khi app đã tắt)")
+    args = parser.parse_args()
+    archive(args.db, args.archive, args.days, args.batch, args.enable_incremental_vacuum)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Script tạo snapshot database bằng online backup API (core/snapshot_service.py)
+Chạy được khi app đang mở - thay cho việc copy tay parking_system.db
+App chỉ tự tạo snapshot định kỳ khi bật DB_CONFIG["snapshot_interval"] (mặc định tắt);
+script dùng cho cron / trước khi nâng cấp
+
+Usage:
+    python backup_db.py                          # Snapshot vào snapshots/<YYYYmmdd_HHMMSS>/
+    python backup_db.py --dir D:/backup --retention 7
+    python backup_db.py --list
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import DB_CONFIG
+from core import archiver
+from core.snapshot_service import SnapshotService
+
+# Đường dẫn database
+DB_PATH = os.path.join(os.path.dirname(__file__), "parking_system.db")
+
+
+def make_service(db_path=DB_PATH, snapshot_dir=None, retention=None, archive_path=None):
+    archive_path = archive_path or DB_CONFIG.get("archive_path") or archiver.default_archive_path(db_path)
+    return SnapshotService(
+        db_path,
+        snapshot_dir=snapshot_dir or DB_CONFIG.get("snapshot_dir"),
+        retention=retention or int(DB_CONFIG.get("snapshot_retention", 12)),
+        pages_per_step=int(DB_CONFIG.get("snapshot_pages_per_step", 256)),
+        step_sleep=float(DB_CONFIG.get("snapshot_step_sleep", 0.01)),
+        attachments={archiver.ARCHIVE_ALIAS: archive_path},
+        timeout=float(DB_CONFIG.get("busy_timeout", 120)),
+    )
+
+
+def backup(db_path=DB_PATH, snapshot_dir=None, retention=None):
+    service = make_service(db_path, snapshot_dir, retention)
+    print(f"🔄 Snapshot {db_path} -> {service.snapshot_dir}")
+    snapshot = service.take_snapshot()
+    stats = service.get_stats()
+    print(f"✅ {snapshot['path']} ({stats['last_duration_ms']:.0f} ms, "
+          f"restart {stats['restarts']}, copy 1 bước {stats['fallback_single_step']})")
+    return snapshot['path']
+
+
+def list_snapshots(db_path=DB_PATH, snapshot_dir=None):
+    service = make_service(db_path, snapshot_dir)
+    snapshots = service.list_snapshots()
+    if not snapshots:
+        print(f"Chưa có snapshot trong {service.snapshot_dir}")
+    for snapshot in snapshots:
+        files = sorted(os.listdir(snapshot['path']))
+        size = sum(os.path.getsize(os.path.join(snapshot['path'], f)) for f in files)
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot['created']))
+        print(f"  {created}  {size / 1048576:8.1f} MB  {', '.join(files)}")
+    return snapshots
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot database (chạy được khi app đang mở)")
+    parser.add_argument("--db", default=DB_PATH, help="Đường dẫn file database")
+    parser.add_argument("--dir", help="Thư mục snapshot (mặc định: snapshots/ cạnh file DB)")
+    parser.add_argument("--retention", type=int, help="Số snapshot mới nhất được giữ lại")
+    parser.add_argument("--list", action="store_true", help="Chỉ liệt kê snapshot hiện có")
+    args = parser.parse_args()
+    if args.list:
+        list_snapshots(args.db, args.dir)
+    else:
+        backup(args.db, args.dir, args.retention)
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Benchmark DBManager: đo thời gian mọi đường đọc/ghi chính trên database giả lập cỡ lớn
+(cổng vào/ra, dashboard, lịch sử, doanh thu, tìm kiếm) - kết quả ghi JSON để so sánh giữa các lần chạy
+
+- Database sinh bởi generate_dataset.py (hoặc --db <file> có sẵn, được copy ra file tạm vì
+  benchmark có ghi: xe vào / xe ra)
+- Mỗi case chạy `repeat` lần: min / p50 / p95 / max / mean (ms), ops/s
+- --compare baseline.json: in chênh lệch p50 từng case, đánh dấu REGRESSION khi chậm hơn --threshold %
+  và hơn --min-delta ms (bỏ qua dao động của các case dưới 1ms); exit code 1 nếu có regression
+
+Usage:
+    python benchmark_db.py --sessions 1000000 --out bench_baseline.json
+    python benchmark_db.py --db bench.db --out bench_new.json --compare bench_baseline.json
+    python benchmark_db.py --sessions 200000 --wal --only history
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+app_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, app_dir)
+
+import config
+from generate_dataset import build_database
+from core.enums import SessionStatus
+
+
+def _percentile(sorted_values, p):
+    index = min(int(round(p * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _summary(samples_ms):
+    values = sorted(samples_ms)
+    mean = statistics.fmean(values)
+    return {
+        'n': len(values),
+        'min_ms': round(values[0], 4),
+        'p50_ms': round(_percentile(values, 0.50), 4),
+        'p95_ms': round(_percentile(values, 0.95), 4),
+        'max_ms': round(values[-1], 4),
+        'mean_ms': round(mean, 4),
+        'ops_per_s': round(1000 / mean, 1) if mean > 0 else None,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app_dir, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+class Benchmark:
+    """Các case benchmark trên 1 DBManager trỏ tới database giả lập"""
+
+    def __init__(self, db, repeat=50, quiet=True):
+        self.db = db
+        self.repeat = repeat
+        self.quiet = quiet
+        self.results = {}
+        self.values = self._sample_values()
+
+    def _sample_values(self):
+        with self.db.connect() as conn:
+            open_rows = conn.execute(
+                f"SELECT plate_in, card_id FROM parking_sessions WHERE status={SessionStatus.PARKING.value} "
+                "ORDER BY id LIMIT 20"
+            ).fetchall()
+            monthly = conn.execute(
+                "SELECT card_id, owner_name, plate_number FROM monthly_tickets ORDER BY id LIMIT 20"
+            ).fetchall()
+            latest = conn.execute("SELECT MAX(time_in) FROM parking_sessions").fetchone()[0]
+            frequent_plate = conn.execute(
+                "SELECT plate_in FROM parking_sessions WHERE id > (SELECT MAX(id) - 5000 FROM parking_sessions) "
+                "GROUP BY plate_in ORDER BY COUNT(*) DESC LIMIT 1"
+            ).fetchone()[0]
+        today = datetime.date.fromisoformat(latest[:10])
+        return {
+            'open_plates': [r[0] for r in open_rows],
+            'open_cards': [r[1] for r in open_rows],
+            'monthly_cards': [r[0] for r in monthly],
+            'owner_part': monthly[0][1].split()[-1] if monthly else "Nam",
+            'plate_part': frequent_plate[-6:],
+            'today': today.isoformat(),
+            'month_ago': (today - datetime.timedelta(days=30)).isoformat(),
+            'year_ago': (today - datetime.timedelta(days=365)).isoformat(),
+        }
+
+    # ------------------------------------------------------------------
+    # Chạy case
+    # ------------------------------------------------------------------
+    def run(self, name, func, repeat=None, setup=None):
+        """Đo func(i) `repeat` lần (setup(i) chạy trước mỗi lần, không tính giờ)"""
+        repeat = repeat or self.repeat
+        samples = []
+        sink = io.StringIO()
+        for i in range(repeat):
+            if setup is not None:
+                setup(i)
+            # Log [DB-ENTRY]... vẫn được format như khi chạy thật, chỉ không in ra terminal
+            with contextlib.redirect_stdout(sink) if self.quiet else contextlib.nullcontext():
+                t0 = time.perf_counter()
+                func(i)
+                samples.append((time.perf_counter() - t0) * 1000)
+            sink.seek(0)
+            sink.truncate()
+        self.results[name] = _summary(samples)
+        r = self.results[name]
+        print(f"{name:<42} p50 {r['p50_ms']:>9.3f}ms  p95 {r['p95_ms']:>9.3f}ms  max {r['max_ms']:>9.3f}ms")
+
+    def run_all(self, only=None):
+        db, v = self.db, self.values
+        groups = {
+            'gate': self.gate_cases,
+            'dashboard': self.dashboard_cases,
+            'history': self.history_cases,
+            'revenue': self.revenue_cases,
+            'search': self.search_cases,
+            'write': self.write_cases,
+        }
+        for group, cases in groups.items():
+            if only and group not in only:
+                continue
+            cases(db, v)
+        return self.results
+
+    def gate_cases(self, db, v):
+        plates, cards = v['open_plates'] or ["00Z9 000.00"], v['open_cards'] or ["00000000"]
+        self.run("gate.session_by_plate", lambda i: db.get_parking_session(plate=plates[i % len(plates)]))
+        self.run("gate.session_by_card", lambda i: db.get_parking_session(card_id=cards[i % len(cards)]))
+        self.run("gate.session_miss", lambda i: db.get_parking_session(plate="00Z9 000.00"))
+        monthly = v['monthly_cards'] or ["00000000"]
+        self.run("gate.monthly_ticket_info", lambda i: db.get_monthly_ticket_info(monthly[i % len(monthly)]))
+        self.run("gate.monthly_ticket_info_uncached", lambda i: db.get_monthly_ticket_info(monthly[i % len(monthly)]),
+                 setup=lambda i: db.read_cache.invalidate('monthly_tickets'))
+        self.run("gate.get_setting", lambda i: db.get_setting('price_xe_máy_block1', '5000'))
+        self.run("gate.available_guest_slots", lambda i: db.get_available_slots_for_guests("Xe máy"))
+
+    def dashboard_cases(self, db, v):
+        self.run("dashboard.statistics", lambda i: db.get_parking_statistics())
+        self.run("dashboard.statistics_resync", lambda i: db.get_parking_statistics(),
+                 setup=lambda i: db.stats_counter.invalidate())
+        self.run("dashboard.all_slots", lambda i: db.get_all_parking_slots())
+        self.run("dashboard.last_entry", lambda i: db.get_last_entry_session())
+        self.run("dashboard.last_exit", lambda i: db.get_last_exit_session())
+        self.run("dashboard.monthly_stats", lambda i: db.get_monthly_ticket_stats())
+
+    def history_cases(self, db, v):
+        self.run("history.first_page", lambda i: db.get_parking_history_page(page_size=10))
+        cursor = {'before': None}
+
+        def next_page(i):
+            rows, cursor['before'] = db.get_parking_history_page(page_size=10, before_id=cursor['before'])
+        self.run("history.walk_pages", next_page, repeat=max(self.repeat, 200))
+        self.run("history.count", lambda i: db.count_parking_history())
+        self.run("history.last_30_days", lambda i: db.get_parking_history_page(
+            date_from=v['month_ago'], date_to=v['today'], page_size=10))
+        self.run("history.count_last_30_days", lambda i: db.count_parking_history(
+            date_from=v['month_ago'], date_to=v['today']))
+        self.run("history.plate_filter", lambda i: db.get_parking_history_page(plate=v['plate_part'], page_size=10))
+        self.run("history.latest_1000", lambda i: db.get_parking_history(), repeat=max(self.repeat // 5, 5))
+
+    def revenue_cases(self, db, v):
+        self.run("revenue.days_30", lambda i: db.get_revenue_by_date_range(v['month_ago'], v['today']))
+        self.run("revenue.days_365", lambda i: db.get_revenue_by_date_range(v['year_ago'], v['today']))
+        self.run("revenue.months_365", lambda i: db.get_revenue_by_date_range(v['year_ago'], v['today'], 'month'))
+
+    def search_cases(self, db, v):
+        self.run("search.sessions_by_plate", lambda i: db.search_sessions_by_plate(v['plate_part']))
+        self.run("search.sessions_by_plate_miss", lambda i: db.search_sessions_by_plate("ZZZ999"))
+        self.run("search.monthly_owner", lambda i: db.search_monthly_tickets(v['owner_part']))
+        self.run("search.monthly_all", lambda i: db.get_all_monthly_tickets())
+
+    def write_cases(self, db, v):
+        n = max(self.repeat, 20)
+        created = []
+
+        def entry(i):
+            slot, ok = db.allocate_and_record_entry(f"BENCH{i:06d}", f"99-B9 {i:03d}.{i % 100:02d}", "Xe máy", "GUEST")
+            if ok:
+                created.append(f"BENCH{i:06d}")
+        self.run("write.entry", entry, repeat=n)
+
+        sessions = []
+        for card in created:
+            row = db.get_parking_session(card_id=card)
+            if row:
+                sessions.append((row[0], row[2]))
+        if sessions:
+            self.run("write.exit", lambda i: db.record_exit(sessions[i][0], sessions[i][1], 5000, "CASH"),
+                     repeat=len(sessions))
+        self.run("write.save_setting", lambda i: db.save_setting('bench_key', str(i)))
+
+
+def compare(current, baseline, threshold=20.0, min_delta_ms=0.1):
+    """In chênh lệch p50 so với baseline; trả về danh sách case chậm hơn threshold % (và hơn min_delta_ms)"""
+    regressions = []
+    print("\n" + "=" * 90)
+    print(f"{'Case':<42} {'Baseline':>12} {'Hiện tại':>12} {'Chênh lệch':>12}")
+    print("=" * 90)
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base:
+            print(f"{name:<42} {'-':>12} {result['p50_ms']:>10.3f}ms {'(mới)':>12}")
+            continue
+        change = (result['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100 if base['p50_ms'] else 0.0
+        flag = ""
+        if change > threshold and result['p50_ms'] - base['p50_ms'] > min_delta_ms:
+            flag = "  ⚠️ REGRESSION"
+            regressions.append(name)
+        print(f"{name:<42} {base['p50_ms']:>10.3f}ms {result['p50_ms']:>10.3f}ms {change:>+11.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DBManager trên database giả lập")
+    parser.add_argument("--db", help="Database có sẵn (sinh bởi generate_dataset.py) - được copy ra file tạm")
+    parser.add_argument("--sessions", type=int, default=1_000_000, help="Số sessions khi tự sinh database")
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--only", nargs="*", help="Chỉ chạy nhóm: gate dashboard history revenue search write")
+    parser.add_argument("--wal", action="store_true", help="Chạy với journal_mode=WAL (writer thread)")
+    parser.add_argument("--out", help="File JSON kết quả")
+    parser.add_argument("--compare", help="File JSON baseline để so sánh")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Ngưỡng regression (%% p50)")
+    parser.add_argument("--min-delta", type=float, default=0.1, help="Chênh lệch p50 tối thiểu (ms) để tính regression")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_db_")
+    path = os.path.join(work_dir, "bench.db")
+    if args.db:
+        shutil.copyfile(args.db, path)
+        dataset = {'source': os.path.abspath(args.db)}
+    else:
+        dataset = build_database(path, sessions=args.sessions, days=args.days, seed=args.seed)
+
+    # DBManager đọc config.DB_PATH lúc import -> trỏ sang file tạm trước khi import
+    config.DB_PATH = path
+    config.DB_CONFIG["journal_mode"] = "WAL" if args.wal else "DELETE"
+    from core import db_manager
+    db_manager.DB_PATH = path
+    db = db_manager.DBManager()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.get_setting('parking_name')  # Chạy migration còn thiếu trước khi đo
+
+        print(f"\n📊 Benchmark {path} (repeat={args.repeat}, journal={config.DB_CONFIG['journal_mode']})")
+        results = Benchmark(db, repeat=args.repeat).run_all(only=args.only)
+    finally:
+        db.close_pool()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'dataset': dataset,
+            'repeat': args.repeat,
+            'db_config': {k: v for k, v in config.DB_CONFIG.items() if v is None or isinstance(v, (int, float, str, bool))},
+        },
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Đã ghi kết quả: {args.out}")
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} case chậm hơn {args.threshold}%: {', '.join(regressions)}")
+            exit_code = 1
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Benchmark tách dòng text ESP32: vòng lặp cũ (str += / split) so với core/framing.py LineFramer
+- steady: mỗi lần recv là 1 dòng ngắn (CARD / HEARTBEAT như node gửi bình thường)
+- burst: nhiều dòng PARKING_DATA dồn trong các đoạn recv đầy (node kết nối lại, gửi bù),
+  recv 1KB như server và recv lớn (vòng cũ copy lại phần còn lại sau mỗi dòng -> O(N²) / đoạn)
+- socket: burst qua socketpair thật, recv() + vòng lặp cũ so với LineFramer.recv_into()
+
+Usage:
+    python benchmark_framing.py
+    python benchmark_framing.py --lines 200000 --repeat 5
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+app_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, app_dir)
+
+from core.framing import LineFramer
+
+CHUNK = 1024
+
+
+# ===== CÁCH TÁCH DÒNG =====
+def split_str(chunks, chunk_size):
+    """Vòng lặp gốc của NetworkServer: decode mọi byte rồi split từng dòng"""
+    buffer = ""
+    count = 0
+    for data in chunks:
+        buffer += data.decode('utf-8', errors='ignore')
+        while '\n' in buffer:
+            line, buffer = buffer.split('\n', 1)
+            if line.strip():
+                count += 1
+    return count
+
+
+def split_bytearray(chunks, chunk_size):
+    """bytearray + find + del[:end] (mỗi dòng dời phần còn lại)"""
+    buffer = bytearray()
+    count = 0
+    for data in chunks:
+        buffer += data
+        while True:
+            end = buffer.find(b'\n')
+            if end < 0:
+                break
+            line = buffer[:end].decode('utf-8', errors='ignore')
+            del buffer[:end + 1]
+            if line.strip():
+                count += 1
+    return count
+
+
+def split_framer(chunks, chunk_size):
+    framer = LineFramer(recv_size=chunk_size)
+    count = 0
+    for data in chunks:
+        framer.feed(data)
+        for line in framer.lines():
+            if line.strip():
+                count += 1
+    return count
+
+
+METHODS = [
+    ("str += / split (cũ)", split_str),
+    ("bytearray find / del", split_bytearray),
+    ("LineFramer", split_framer),
+]
+
+
+# ===== DỮ LIỆU =====
+def steady_chunks(n_lines):
+    """1 dòng / recv"""
+    return [f"CARD:{i:08X}:{i % 4 + 1}\n".encode() if i % 2 else f"HEARTBEAT:{i % 8}:-{i % 90}\n".encode()
+            for i in range(n_lines)]
+
+
+def burst_stream(n_lines):
+    status = "1010001101" * 10
+    line = f"PARKING_DATA:1:{status}:{status.count('1')}:{status.count('0')}\n".encode()
+    return line * n_lines
+
+
+def burst_chunks(n_lines, chunk_size=CHUNK):
+    stream = burst_stream(n_lines)
+    return [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+
+def best_of(repeat, func, *args):
+    """(ms nhỏ nhất, kết quả)"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best, result
+
+
+# ===== QUA SOCKET =====
+def _socket_run(stream, reader):
+    left, right = socket.socketpair()
+    sender = threading.Thread(target=lambda: (left.sendall(stream), left.close()), daemon=True)
+    try:
+        t0 = time.perf_counter()
+        sender.start()
+        count = reader(right)
+        elapsed = (time.perf_counter() - t0) * 1000
+    finally:
+        sender.join()
+        right.close()
+    return elapsed, count
+
+
+def recv_str(sock):
+    buffer = ""
+    count = 0
+    while True:
+        data = sock.recv(CHUNK)
+        if not data:
+            return count
+        buffer += data.decode('utf-8', errors='ignore')
+        while '\n' in buffer:
+            line, buffer = buffer.split('\n', 1)
+            if line.strip():
+                count += 1
+
+
+def recv_framer(sock):
+    framer = LineFramer(recv_size=CHUNK)
+    count = 0
+    while framer.recv_into(sock):
+        for line in framer.lines():
+            if line.strip():
+                count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tách dòng giao thức text ESP32")
+    parser.add_argument("--lines", type=int, default=100_000, help="Số dòng mỗi kịch bản")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--big-chunk", type=int, default=64 * 1024, help="Cỡ recv của kịch bản burst lớn")
+    args = parser.parse_args()
+
+    scenarios = [
+        ("steady (1 dòng / recv)", steady_chunks(args.lines), CHUNK),
+        ("burst (PARKING_DATA, recv 1KB)", burst_chunks(args.lines), CHUNK),
+        (f"burst (recv {args.big_chunk // 1024}KB)", burst_chunks(args.lines, args.big_chunk), args.big_chunk),
+    ]
+
+    print("=" * 80)
+    print(f"TÁCH DÒNG TRONG BỘ NHỚ ({args.lines:,} dòng, best of {args.repeat})")
+    print("=" * 80)
+    print(f"{'Kịch bản':<32} {'Cách':<22} {'Thời gian':>12} {'dòng/s':>12}")
+    for scenario, chunks, chunk_size in scenarios:
+        base = None
+        for name, func in METHODS:
+            elapsed, count = best_of(args.repeat, func, chunks, chunk_size)
+            assert count == args.lines, f"{name}: {count} != {args.lines}"
+            base = base or elapsed
+            print(f"{scenario:<32} {name:<22} {elapsed:>10.1f}ms {count / elapsed * 1000:>12,.0f}"
+                  f"   ({base / elapsed:.1f}x)")
+        print("-" * 80)
+
+    stream = burst_stream(args.lines)
+    print(f"\nQUA SOCKETPAIR ({len(stream) / 1024 / 1024:.1f} MB burst, recv {CHUNK} byte)")
+    print(f"{'Cách':<32} {'Thời gian':>12} {'MB/s':>10}")
+    for name, reader in (("recv() + str split (cũ)", recv_str), ("LineFramer.recv_into()", recv_framer)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            elapsed, count = _socket_run(stream, reader)
+            assert count == args.lines, f"{name}: {count} != {args.lines}"
+            best = min(best, elapsed)
+        print(f"{name:<32} {best:>10.1f}ms {len(stream) / 1024 / 1024 / best * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark index: so sánh query plan + thời gian truy vấn TRƯỚC/SAU migration index
+Tạo database tạm với N phiên gửi xe (mặc định 1 triệu), chạy các truy vấn ở cổng vào/ra,
+dashboard và doanh thu rồi in EXPLAIN QUERY PLAN
+
+Usage:
+    python benchmark_indexes.py                 # 1.000.000 sessions
+    python benchmark_indexes.py --sessions 200000 --keep bench.db
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+app_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, app_dir)
+
+from core.db_migrations import run_migrations
+from generate_dataset import build_database as build_database_base
+INDEX_VERSION = 2  # Migration tạo index trên cột text (v3 chuyển sang cột epoch)
+
+
+def build_database(path, n_sessions, seed=42):
+    """Tạo DB với schema gốc (chưa có index) và n_sessions phiên gửi xe (generate_dataset.py)"""
+    build_database_base(path, sessions=n_sessions, seed=seed, migrate=False, verbose=False)
+
+
+def sample_values(conn):
+    # Xe vào sớm nhất trong số xe đang gửi (không phải dòng mới nhất của bảng)
+    plate, card = conn.execute(
+        "SELECT plate_in, card_id FROM parking_sessions WHERE status='PARKING' ORDER BY id LIMIT 1"
+    ).fetchone()
+    # Doanh thu tháng trước của dữ liệu (dataset trải tới hôm nay)
+    last = conn.execute("SELECT MAX(time_in) FROM parking_sessions").fetchone()[0]
+    date_to = conn.execute("SELECT date(?, 'start of month', '-1 day')", (last,)).fetchone()[0]
+    return {"plate": plate, "card": card, "date_from": date_to[:8] + "01", "date_to": date_to}
+
+
+# (tên, SQL, hàm tạo tham số)
+QUERIES = [
+    ("exit: session theo biển số",
+     "SELECT * FROM parking_sessions WHERE plate_in=? AND status='PARKING' ORDER BY id DESC LIMIT 1",
+     lambda v: (v["plate"],)),
+    ("exit: biển số không có trong bãi",
+     "SELECT * FROM parking_sessions WHERE plate_in=? AND status='PARKING' ORDER BY id DESC LIMIT 1",
+     lambda v: ("00Z9 000.00",)),
+    ("exit: session theo thẻ",
+     "SELECT * FROM parking_sessions WHERE card_id=? AND status='PARKING' ORDER BY id DESC LIMIT 1",
+     lambda v: (v["card"],)),
+    ("entry: kiểm tra trùng thẻ",
+     "SELECT id, time_in FROM parking_sessions WHERE card_id=? AND status='PARKING' "
+     "AND datetime(time_in) > datetime('now', '-10 seconds') ORDER BY id DESC LIMIT 1",
+     lambda v: (v["card"],)),
+    ("entry: tìm ô trống",
+     "SELECT slot_id FROM parking_slots WHERE vehicle_type=? AND is_reserved=0 AND status=0 LIMIT 1",
+     lambda v: ("Xe máy",)),
+    ("dashboard: xe máy đang gửi",
+     "SELECT COUNT(*) FROM parking_sessions WHERE status='PARKING' AND vehicle_type='Xe máy'",
+     lambda v: ()),
+    ("dashboard: phiên vào gần nhất",
+     "SELECT id, plate_in, time_in, vehicle_type, slot_id FROM parking_sessions ORDER BY time_in DESC LIMIT 1",
+     lambda v: ()),
+    ("dashboard: phiên ra gần nhất",
+     "SELECT id, plate_in, time_out, price, payment_method, slot_id, vehicle_type FROM parking_sessions "
+     "WHERE status='PAID' ORDER BY time_out DESC LIMIT 1",
+     lambda v: ()),
+    ("thống kê: doanh thu 1 tháng",
+     "SELECT DATE(time_out), COUNT(*), SUM(price) FROM parking_sessions "
+     "WHERE status IN ('PAID', 'COMPLETED') AND time_out >= ? AND time_out < date(?, '+1 day') "
+     "GROUP BY DATE(time_out)",
+     lambda v: (v["date_from"], v["date_to"])),
+]
+
+
+def run_queries(conn, values, repeat):
+    results = []
+    for name, sql, params in QUERIES:
+        args = params(values)
+        plan = " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, args))
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, args).fetchall()
+        elapsed_ms = (time.perf_counter() - t0) * 1000 / repeat
+        results.append((name, plan, elapsed_ms))
+    return results
+
+
+def print_results(title, results):
+    print("\n" + "=" * 100)
+    print(title)
+    print("=" * 100)
+    for name, plan, elapsed_ms in results:
+        print(f"{name:<32} {elapsed_ms:>10.3f} ms   {plan}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark index parking_sessions")
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", help="Giữ lại file DB tại đường dẫn này")
+    args = parser.parse_args()
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(), "bench_indexes.db")
+    if os.path.exists(path):
+        os.remove(path)
+
+    print(f"🔧 Tạo database {path} với {args.sessions:,} sessions...")
+    t0 = time.perf_counter()
+    build_database(path, args.sessions)
+    print(f"   Xong sau {time.perf_counter() - t0:.1f}s")
+
+    conn = sqlite3.connect(path)
+    run_migrations(conn, target_version=1, verbose=False)
+    values = sample_values(conn)
+    before = run_queries(conn, values, args.repeat)
+    print_results("TRƯỚC migration index (schema v1)", before)
+
+    t0 = time.perf_counter()
+    run_migrations(conn, target_version=INDEX_VERSION)
+    print(f"\n🔧 Tạo index xong sau {time.perf_counter() - t0:.1f}s")
+    after = run_queries(conn, values, args.repeat)
+    print_results("SAU migration index", after)
+
+    print("\n" + "=" * 100)
+    print(f"{'Truy vấn':<32} {'Trước':>12} {'Sau':>12} {'Nhanh hơn':>10}")
+    for (name, _, t_before), (_, _, t_after) in zip(before, after):
+        speedup = t_before / t_after if t_after > 0 else float("inf")
+        print(f"{name:<32} {t_before:>10.3f}ms {t_after:>10.3f}ms {speedup:>9.1f}x")
+    conn.close()
+
+    if not args.keep:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ Script kiểm tra chi tiết trạng thái database
 import sqlite3
 from datetime import datetime
 
+from core.enums import SessionStatus, TicketType, VehicleType
+
 def check_database_status():
     conn = sqlite3.connect('parking_system.db')
     cursor = conn.cursor()
@@ -30,6 +32,7 @@ def check_database_status():
         print("-" * 80)
         for row in sessions:
             sid, plate, vtype, ticket, status, tin, tout = row
+            vtype, ticket, status = VehicleType.label_of(vtype), TicketType.label_of(ticket), SessionStatus.label_of(status)
             print(f"{sid:<5} {plate:<12} {vtype:<10} {ticket:<8} {status:<10} {tin or 'N/A':<20} {tout or 'N/A':<20}")
     else:
         print("❌ Không có session nào")
@@ -48,7 +51,7 @@ def check_database_status():
     stats = cursor.fetchall()
     if stats:
         for status, vtype, count in stats:
-            print(f"{status:<15} | {vtype:<10} | {count} xe")
+            print(f"{SessionStatus.label_of(status):<15} | {VehicleType.label_of(vtype):<10} | {count} xe")
     else:
         print("❌ Không có dữ liệu")
     
@@ -56,10 +59,10 @@ def check_database_status():
     print("\n3. SESSIONS HÔM NAY")
     print("-" * 80)
     
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT COUNT(*) as total,
-               SUM(CASE WHEN status='PARKING' THEN 1 ELSE 0 END) as parking,
-               SUM(CASE WHEN status='PAID' THEN 1 ELSE 0 END) as paid
+               SUM(CASE WHEN status={SessionStatus.PARKING.value} THEN 1 ELSE 0 END) as parking,
+               SUM(CASE WHEN status={SessionStatus.PAID.value} THEN 1 ELSE 0 END) as paid
         FROM parking_sessions
         WHERE date(time_in) = date('now')
     """)
@@ -88,7 +91,7 @@ def check_database_status():
         for slot, vtype, reserved, status in slots:
             reserved_str = "Vé tháng" if reserved == 1 else "Vãng lai"
             status_str = "ĐẦY" if status == 1 else "TRỐNG"
-            print(f"{slot:<6} {vtype:<10} {reserved_str:<12} {status_str:<10}")
+            print(f"{slot:<6} {VehicleType.label_of(vtype):<10} {reserved_str:<12} {status_str:<10}")
     
     # 5. Thống kê slots
     print("\n5. THỐNG KÊ SLOTS")
@@ -104,14 +107,14 @@ def check_database_status():
     """)
     
     for vtype, total, empty, occupied in cursor.fetchall():
-        print(f"{vtype:<10}: {empty}/{total} trống, {occupied}/{total} đầy")
+        print(f"{VehicleType.label_of(vtype):<10}: {empty}/{total} trống, {occupied}/{total} đầy")
     
     # 6. Kiểm tra tính nhất quán
     print("\n6. KIỂM TRA TÍNH NHẤT QUÁN")
     print("-" * 80)
     
     # Sessions PARKING vs Slots occupied
-    cursor.execute("SELECT COUNT(*) FROM parking_sessions WHERE status='PARKING'")
+    cursor.execute(f"SELECT COUNT(*) FROM parking_sessions WHERE status={SessionStatus.PARKING.value}")
     sessions_parking = cursor.fetchone()[0]
     
     cursor.execute("SELECT COUNT(*) FROM parking_slots WHERE status=1")
@@ -133,7 +136,7 @@ def check_database_status():
         occupied_slots = cursor.fetchall()
         print(f"\nSlots bị đánh dấu đầy ({len(occupied_slots)}):")
         for slot, vtype in occupied_slots:
-            print(f"  ❌ {slot} ({vtype}): Slot đang đầy nhưng không track được session")
+            print(f"  ❌ {slot} ({VehicleType.label_of(vtype)}): Slot đang đầy nhưng không track được session")
     else:
         print("✅ Dữ liệu nhất quán")
     
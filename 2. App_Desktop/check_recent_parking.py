@@ -1,6 +1,8 @@
 import sqlite3
 from datetime import datetime
 
+from core.enums import SessionStatus
+
 db_path = './parking_system.db'
 try:
     conn = sqlite3.connect(db_path)
@@ -15,9 +17,9 @@ try:
     print()
     
     # Get recent entries
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT * FROM parking_sessions 
-        WHERE status = 'PARKING' 
+        WHERE status = {SessionStatus.PARKING.value} 
         ORDER BY time_in DESC 
         LIMIT 3
     """)
@@ -3,6 +3,8 @@ Script dọn dẹp database: xóa sessions trùng lặp và sessions cũ
 """
 import sqlite3
 
+from core.enums import SessionStatus, VehicleType
+
 def cleanup_database():
     conn = sqlite3.connect('parking_system.db')
     cursor = conn.cursor()
@@ -13,19 +15,19 @@ def cleanup_database():
     
     # 1. Xem trước khi xóa
     print("\n1. TRƯỚC KHI XÓA:")
-    cursor.execute("SELECT COUNT(*) FROM parking_sessions WHERE status='PARKING'")
+    cursor.execute(f"SELECT COUNT(*) FROM parking_sessions WHERE status={SessionStatus.PARKING.value}")
     count_before = cursor.fetchone()[0]
     print(f"Sessions đang PARKING: {count_before}")
     
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT id, plate_in, vehicle_type, time_in 
         FROM parking_sessions 
-        WHERE status='PARKING'
+        WHERE status={SessionStatus.PARKING.value}
         ORDER BY time_in DESC
     """)
     for row in cursor.fetchall():
         sid, plate, vtype, time_in = row
-        print(f"  ID={sid}: {plate} ({vtype}) - {time_in}")
+        print(f"  ID={sid}: {plate} ({VehicleType.label_of(vtype)}) - {time_in}")
     
     # 2. Xóa tất cả sessions cũ (giữ lại history nếu cần)
     print("\n2. XÓA SESSIONS:")
@@ -36,10 +38,18 @@ def cleanup_database():
     print(f"✅ Đã xóa {deleted} sessions")
     
     # Option 2: Chỉ xóa sessions PARKING (giữ lại PAID cho history)
-    # cursor.execute("DELETE FROM parking_sessions WHERE status='PARKING'")
+    # cursor.execute(f"DELETE FROM parking_sessions WHERE status={SessionStatus.PARKING.value}")
     # deleted = cursor.rowcount
     # print(f"✅ Đã xóa {deleted} sessions với status=PARKING")
     
+    # Bảng tổng hợp doanh thu (daily_rollup) phải khớp với sessions còn lại
+    try:
+        from core import daily_rollup
+        daily_rollup.rebuild(cursor)
+        print("✅ Đã tính lại daily_rollup")
+    except sqlite3.OperationalError as e:
+        print(f"ℹ️  Bỏ qua daily_rollup: {e}")
+    
     # 3. Reset tất cả slots về trống
     cursor.execute("UPDATE parking_slots SET status=0")
     updated = cursor.rowcount
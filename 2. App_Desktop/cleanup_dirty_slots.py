@@ -6,6 +6,7 @@ Utility để cleanup và fix database parking_slots
 
 import sqlite3
 from core.db_manager import DBManager
+from core.enums import SessionStatus, VehicleType
 
 def cleanup_dirty_slots():
     """Tìm và fix tất cả slots bẩn (status=1 nhưng không có session PARKING)"""
@@ -16,13 +17,13 @@ def cleanup_dirty_slots():
     print("\n🔧 [CLEANUP] Tìm slots bẩn...\n")
     
     # Tìm slots bẩn
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT ps.slot_id, ps.vehicle_type
         FROM parking_slots ps
         WHERE ps.status=1
         AND NOT EXISTS (
             SELECT 1 FROM parking_sessions psess 
-            WHERE psess.status='PARKING' 
+            WHERE psess.status={SessionStatus.PARKING.value} 
             AND psess.slot_id = ps.slot_id
         )
     """)
@@ -37,7 +38,7 @@ def cleanup_dirty_slots():
     print(f"❌ Tìm thấy {len(dirty_slots)} slot bẩn:\n")
     
     for slot_id, vehicle_type in dirty_slots:
-        print(f"  🔴 {slot_id} ({vehicle_type})")
+        print(f"  🔴 {slot_id} ({VehicleType.label_of(vehicle_type)})")
         cursor.execute("UPDATE parking_slots SET status=0 WHERE slot_id=?", (slot_id,))
     
     conn.commit()
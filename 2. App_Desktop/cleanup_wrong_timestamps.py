@@ -1,11 +1,13 @@
 import sqlite3
 
+from core.enums import SessionStatus
+
 db_path = './parking_system.db'
 conn = sqlite3.connect(db_path)
 cursor = conn.cursor()
 
 # Delete the problematic PARKING session that has wrong time_in
-cursor.execute("DELETE FROM parking_sessions WHERE status = 'PARKING'")
+cursor.execute(f"DELETE FROM parking_sessions WHERE status = {SessionStatus.PARKING.value}")
 conn.commit()
 
 print(f"✅ Deleted all PARKING sessions with wrong time_in")
@@ -6,6 +6,7 @@ Giữ backwards compatibility với các file cũ
 # Import từ setup.py
 from setup import (
     DATABASE_PATH,
+    DB_CONFIG,
     CAMERA_ENTRY_ID,
     CAMERA_EXIT_ID,
     ENABLE_AI_DETECTION,
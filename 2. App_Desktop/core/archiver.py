@@ -0,0 +1,143 @@
+"""
+Session Archiver - tách parking_sessions thành hot / cold
+parking_sessions (file DB chính) chỉ giữ xe đang gửi + session gần đây; session đã thanh toán
+(PAID/COMPLETED) ra bãi quá `archive_after_days` ngày được chuyển sang file archive riêng
+
+- File archive được ATTACH với tên `archive` trên mọi connection của pool (core/db_pool.py)
+  -> lịch sử / báo cáo đọc thêm archive.parking_sessions, truy vấn ở cổng vào/ra chỉ chạm bảng hot
+- archive_batch(): chuyển tối đa batch_size session trong 1 transaction (INSERT OR REPLACE vào
+  archive rồi DELETE ở main) - DBManager gọi lặp nhiều transaction ngắn để không giữ write lock lâu
+- daily_rollup nằm ở file chính và đã chứa cả session đã archive; rebuild() đọc cả 2 file
+- maintain(): ANALYZE (giới hạn số dòng lấy mẫu) + incremental vacuum cho file chính
+"""
+
+import json
+import os
+import re
+
+from core.daily_rollup import REVENUE_STATUSES
+from core.db_migrations import convert_enum_columns
+
+
+ARCHIVE_ALIAS = 'archive'
+SESSIONS = 'parking_sessions'
+
+
+def default_archive_path(db_path):
+    """parking_system.db -> parking_system_archive.db (cùng thư mục)"""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def is_attached(conn, alias=ARCHIVE_ALIAS):
+    return any(row[1] == alias for row in conn.execute("PRAGMA database_list"))
+
+
+def attach_archive(conn, archive_path, alias=ARCHIVE_ALIAS):
+    """ATTACH file archive (tạo file nếu chưa có) nếu connection chưa attach"""
+    if not is_attached(conn, alias):
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (archive_path,))
+
+
+def has_archive_table(conn, alias=ARCHIVE_ALIAS):
+    """Connection đã attach archive và archive đã có bảng parking_sessions"""
+    if not is_attached(conn, alias):
+        return False
+    row = conn.execute(
+        f"SELECT 1 FROM {alias}.sqlite_master WHERE type='table' AND name=?", (SESSIONS,)
+    ).fetchone()
+    return row is not None
+
+
+def _columns(conn, schema):
+    return conn.execute(f"PRAGMA {schema}.table_info({SESSIONS})").fetchall()
+
+
+def ensure_archive_schema(conn, alias=ARCHIVE_ALIAS):
+    """Tạo archive.parking_sessions theo schema hiện tại của main (thêm cột còn thiếu nếu đã có)
+
+    Gọi sau run_migrations() để archive có đủ cột mới (time_in_ts, duration_sec...) và
+    vehicle_type / ticket_type / status đã đổi sang mã số như main (migration v7).
+    """
+    if not has_archive_table(conn, alias):
+        sql = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type='table' AND name=?", (SESSIONS,)
+        ).fetchone()[0]
+        # Cùng cột, cùng id với bảng hot; archive không tự sinh id nên bỏ AUTOINCREMENT
+        sql = re.sub(r'^\s*CREATE TABLE\s+"?parking_sessions"?', f"CREATE TABLE {alias}.{SESSIONS}", sql,
+                     count=1, flags=re.IGNORECASE)
+        sql = re.sub(r'\s+AUTOINCREMENT', '', sql, flags=re.IGNORECASE)
+        conn.execute(sql)
+    else:
+        if convert_enum_columns(conn, SESSIONS, schema=alias):
+            print(f"[DB-ARCHIVE] ✅ {alias}.{SESSIONS}: đổi vehicle_type / ticket_type / status sang mã số")
+        existing = {row[1] for row in _columns(conn, alias)}
+        for _, name, col_type, _, default, _ in _columns(conn, 'main'):
+            if name not in existing:
+                ddl = f"ALTER TABLE {alias}.{SESSIONS} ADD COLUMN {name} {col_type}"
+                if default is not None:
+                    ddl += f" DEFAULT {default}"
+                conn.execute(ddl)
+
+    # Index cho lịch sử / báo cáo trên archive (lọc theo giờ vào, biển số, thẻ)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_archive_time_in_ts ON {SESSIONS}(time_in_ts)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_archive_time_out_ts ON {SESSIONS}(time_out_ts)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_archive_plate ON {SESSIONS}(plate_in)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_archive_card ON {SESSIONS}(card_id)")
+
+
+def archive_batch(conn, cutoff_ts, batch_size=5000, alias=ARCHIVE_ALIAS):
+    """Chuyển tối đa batch_size session đã thanh toán, ra bãi trước cutoff_ts, sang archive
+
+    Không commit - caller chạy trong transaction (DBManager._run_write).
+
+    Returns:
+        int: Số session đã chuyển (0 = hết)
+    """
+    ids = [row[0] for row in conn.execute(f"""
+        SELECT id FROM main.{SESSIONS}
+        WHERE status IN {REVENUE_STATUSES} AND time_out_ts < ?
+        LIMIT ?
+    """, (cutoff_ts, batch_size))]
+    if not ids:
+        return 0
+
+    columns = ", ".join(row[1] for row in _columns(conn, 'main'))
+    id_list = json.dumps(ids)
+    # INSERT OR REPLACE: chạy lại sau sự cố (WAL không commit nguyên tử giữa 2 file) vẫn đúng
+    conn.execute(f"""
+        INSERT OR REPLACE INTO {alias}.{SESSIONS} ({columns})
+        SELECT {columns} FROM main.{SESSIONS} WHERE id IN (SELECT value FROM json_each(?))
+    """, (id_list,))
+    conn.execute(f"DELETE FROM main.{SESSIONS} WHERE id IN (SELECT value FROM json_each(?))", (id_list,))
+    return len(ids)
+
+
+def maintain(conn, vacuum_pages=2000, analysis_limit=1000):
+    """ANALYZE + incremental vacuum cho file chính (sau khi archive)
+
+    Incremental vacuum chỉ chạy khi file đã ở chế độ auto_vacuum=INCREMENTAL
+    (chuyển 1 lần bằng: python archive_sessions.py --enable-incremental-vacuum)
+
+    Returns:
+        dict: {'analyzed': True, 'freelist_before': n, 'freelist_after': n, 'incremental_vacuum': bool}
+    """
+    conn.execute(f"PRAGMA analysis_limit={int(analysis_limit)}")
+    conn.execute("ANALYZE main")
+    freelist_before = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+    incremental = conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] == 2
+    if incremental and freelist_before:
+        conn.execute(f"PRAGMA main.incremental_vacuum({int(vacuum_pages)})").fetchall()
+    freelist_after = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+    return {
+        'analyzed': True,
+        'freelist_before': freelist_before,
+        'freelist_after': freelist_after,
+        'incremental_vacuum': incremental,
+    }
+
+
+def enable_incremental_vacuum(conn):
+    """Chuyển file chính sang auto_vacuum=INCREMENTAL (VACUUM toàn bộ file - chạy khi app đã tắt)"""
+    conn.execute("PRAGMA main.auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM main")
@@ -0,0 +1,88 @@
+"""
+Async DB facade cho MainWindow
+Chạy các lệnh DBManager trên worker pool thay vì trên Qt GUI thread
+
+- submit(func, *args, callback=..., errback=...): chạy func trên worker, trả về Future;
+  callback(result) / errback(exc) được gọi lại trên GUI thread (queued signal)
+- call("record_exit", ...): như submit nhưng gọi method của DBManager theo tên
+- Khi DB bị khóa (busy_timeout 120s) chỉ worker phải chờ, UI và 2 camera preview vẫn chạy
+
+DBManager đã an toàn đa luồng (connection đọc thread-local, lệnh ghi qua write lock /
+writer thread), nên worker dùng chung 1 instance DBManager với GUI thread.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, Qt, Signal
+
+
+class AsyncDBManager(QObject):
+    """Chạy lệnh DB trên ThreadPoolExecutor, trả kết quả về thread của QObject (GUI thread)"""
+
+    _completed = Signal(object)  # (future, callback, errback)
+
+    def __init__(self, db, max_workers=4, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-async")
+        # Luôn queued: callback chạy ở vòng lặp sự kiện kế tiếp của GUI thread,
+        # kể cả khi future đã xong ngay lúc submit
+        self._completed.connect(self._dispatch, Qt.QueuedConnection)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'in_flight': 0}
+
+    def submit(self, func, *args, callback=None, errback=None, **kwargs):
+        """Chạy func(*args, **kwargs) trên worker thread
+
+        Args:
+            callback: callback(result) - gọi trên GUI thread khi xong
+            errback: errback(exc) - gọi trên GUI thread khi func ném exception
+                     (không có errback thì chỉ in lỗi)
+
+        Returns:
+            concurrent.futures.Future
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("AsyncDBManager đã dừng")
+            self._stats['submitted'] += 1
+            self._stats['in_flight'] += 1
+        future = self._executor.submit(func, *args, **kwargs)
+        future.add_done_callback(lambda f: self._completed.emit((f, callback, errback)))
+        return future
+
+    def call(self, method, *args, callback=None, errback=None, **kwargs):
+        """Gọi self.db.<method>(*args, **kwargs) trên worker thread"""
+        return self.submit(getattr(self.db, method), *args, callback=callback, errback=errback, **kwargs)
+
+    def _dispatch(self, item):
+        future, callback, errback = item
+        with self._lock:
+            self._stats['in_flight'] -= 1
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            with self._lock:
+                self._stats['failed'] += 1
+            if errback is not None:
+                errback(exc)
+            else:
+                print(f"[DB-ASYNC] ❌ Lỗi: {exc}")
+            return
+        with self._lock:
+            self._stats['completed'] += 1
+        if callback is not None:
+            callback(future.result())
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def shutdown(self, wait=True):
+        """Dừng worker pool (gọi khi tắt ứng dụng, TRƯỚC db.close_pool())"""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,202 @@
+"""
+TCP Server cho ESP32 chạy trên 1 event loop asyncio (selector) thay cho 1 thread / client
+Chọn bằng SERVER_CONFIG["engine"] = "asyncio" (mặc định "threaded" - core/network_server.py)
+
+- Cùng giao thức, cùng signal Qt, cùng API (open_barrier, send_lcd_message, send_command...):
+  kế thừa NetworkServer, chỉ thay phần accept / đọc / gửi
+- 1 thread nền chạy event loop cho mọi kết nối: hàng trăm node ESP32 không tốn hàng trăm thread
+- backlog: hàng đợi accept của socket lắng nghe (listen(5) cũ làm rớt kết nối khi nhiều node
+  cùng khởi động lại); max_clients: vượt giới hạn -> đóng kết nối mới ngay
+- Node chết không giữ chỗ mãi: TCP keepalive + read có timeout (idle_timeout cho node cảm biến)
+- Signal emit từ thread event loop, MainWindow nối bằng Qt.QueuedConnection như engine cũ
+- send_command() gọi từ GUI thread: lệnh được chuyển sang event loop (call_soon_threadsafe)
+  rồi vào asyncio.Queue của client; mỗi client có 1 task gửi (write + drain có timeout)
+"""
+
+import asyncio
+import threading
+
+from core import protocol_codec
+from core.network_server import ClientOutbox, NetworkServer
+
+
+class AsyncNetworkServer(NetworkServer):
+    """NetworkServer dùng asyncio streams: 1 event loop thread cho tất cả ESP32"""
+
+    def __init__(self, host='0.0.0.0', port=8888, scan_dedup_window=5.0, scan_dedup_max_entries=1024,
+                 backlog=128, max_clients=100, **send_options):
+        super().__init__(host, port, scan_dedup_window=scan_dedup_window,
+                         scan_dedup_max_entries=scan_dedup_max_entries, **send_options)
+        self.backlog = backlog
+        self.max_clients = max_clients
+        self.loop = None
+        self._loop_thread_id = None
+        self._stopping = None   # asyncio.Event, tạo trong event loop
+        self._ready = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {'accepted': 0, 'rejected': 0, 'bytes_in': 0}
+
+    def start(self):
+        """Khởi động event loop thread, chờ tới khi socket đã listen"""
+        if self.running:
+            print("[NET] Server đã chạy rồi!")
+            return
+
+        self.running = True
+        self._ready.clear()
+        self.server_thread = threading.Thread(target=self._run_loop, name="net-asyncio", daemon=True)
+        self.server_thread.start()
+        self._ready.wait(timeout=5.0)
+        print(f"[NET] TCP Server (asyncio) đang lắng nghe tại {self.host}:{self.port}")
+
+    def stop(self):
+        """Dừng server: đóng socket lắng nghe + mọi client, chờ event loop kết thúc"""
+        self.running = False
+        loop, stopping = self.loop, self._stopping
+        if loop is not None and stopping is not None:
+            try:
+                loop.call_soon_threadsafe(stopping.set)
+            except RuntimeError:
+                pass  # Loop đã đóng
+        if self.server_thread is not None and self.server_thread is not threading.current_thread():
+            self.server_thread.join(timeout=5.0)
+        print("[NET] Server đã dừng")
+
+    def _run_loop(self):
+        """Thread nền: SelectorEventLoop riêng (Windows mặc định là Proactor)"""
+        loop = asyncio.SelectorEventLoop()
+        asyncio.set_event_loop(loop)
+        self.loop = loop
+        self._loop_thread_id = threading.get_ident()
+        try:
+            loop.run_until_complete(self._serve())
+        except Exception as e:
+            print(f"[NET] ❌ Lỗi server: {e}")
+        finally:
+            self.running = False
+            self._ready.set()
+            try:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                self.loop = None
+                loop.close()
+
+    async def _serve(self):
+        self._stopping = asyncio.Event()
+        server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port,
+            backlog=self.backlog, reuse_address=True,
+        )
+        print(f"[NET] ✅ Server sẵn sàng nhận kết nối từ ESP32")
+        print(f"[NET] 📍 Binding: {self.host}:{self.port} (backlog={self.backlog}, max_clients={self.max_clients})")
+        self._ready.set()
+        try:
+            await self._stopping.wait()
+        finally:
+            server.close()
+            with self.clients_lock:
+                writers = list(self.clients)
+            for writer in writers:
+                writer.close()
+            await server.wait_closed()
+            # Chờ các handler chạy nốt finally (esp_disconnected)
+            handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            if handlers:
+                await asyncio.wait(handlers, timeout=2.0)
+
+    async def _handle_connection(self, reader, writer):
+        """Đọc messages từ một ESP32 client (coroutine trên event loop)"""
+        address = writer.get_extra_info('peername') or ('?', 0)
+        outbox = ClientOutbox(asyncio.Queue(maxsize=self.send_queue_size))
+        with self.clients_lock:
+            accepted = self.running and len(self.clients) < self.max_clients
+            if accepted:
+                info = self._register_client(writer, address, outbox)
+        with self._stats_lock:
+            self._stats['accepted' if accepted else 'rejected'] += 1
+        if not accepted:
+            print(f"[NET] ⛔ Từ chối {address}: đã đủ {self.max_clients} client")
+            writer.close()
+            return
+
+        print(f"[NET] 🔗 ESP32 đã kết nối từ {address}")
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            self._enable_keepalive(sock)
+        self.esp_connected.emit(str(address[0]))
+        sender = asyncio.get_running_loop().create_task(self._drain_outbox(writer, address, outbox))
+        try:
+            while self.running:
+                try:
+                    data = await asyncio.wait_for(reader.read(info['rx'].recv_size), timeout=self._recv_poll)
+                except asyncio.TimeoutError:
+                    if self._idle_expired(info):
+                        break
+                    continue
+                if not data:
+                    break
+                with self._stats_lock:
+                    self._stats['bytes_in'] += len(data)
+                self._feed(writer, info, data)
+
+        except protocol_codec.ProtocolError as e:
+            print(f"[NET] ⚠️ Frame lỗi từ {address}: {e}, đóng kết nối")
+        except (ConnectionError, OSError) as e:
+            if self.running:
+                print(f"[NET] Lỗi nhận dữ liệu từ {address}: {e}")
+        finally:
+            with self.clients_lock:
+                client_info = self._unregister_client(writer)
+            if client_info is not None:
+                print(f"[NET] ❌ ESP32 ngắt kết nối: {address} (Type: {client_info['type']})")
+            sender.cancel()
+            writer.close()
+            self.esp_disconnected.emit()
+
+    async def _drain_outbox(self, writer, address, outbox):
+        """Task gửi của 1 client: write + drain, drain quá send_timeout giây -> đóng kết nối"""
+        try:
+            while True:
+                data = await outbox.queue.get()
+                writer.write(data)
+                await asyncio.wait_for(writer.drain(), timeout=self.send_timeout)
+                outbox.sent += 1
+        except asyncio.TimeoutError:
+            print(f"[NET] ❌ Gửi đến {address} quá {self.send_timeout}s, đóng kết nối")
+            self._close_slow_client(writer)
+        except (ConnectionError, OSError) as e:
+            with self.clients_lock:
+                connected = writer in self.clients
+            if connected and self.running:
+                print(f"[NET] ❌ Lỗi gửi đến {address}: {e}")
+
+    def _close_slow_client(self, writer):
+        with self.clients_lock:
+            self.send_stats['closed_slow'] += 1
+        writer.transport.abort()  # Bỏ dữ liệu chưa gửi, _handle_connection dọn dẹp
+
+    def _send_to_client(self, writer, command):
+        """Xếp lệnh vào hàng đợi gửi: trực tiếp nếu đang ở event loop, ngược lại chuyển sang loop"""
+        data = self._encode_command(writer, command)
+        if threading.get_ident() == self._loop_thread_id:
+            return self._enqueue(writer, data)
+        loop = self.loop
+        with self.clients_lock:
+            connected = writer in self.clients
+        if loop is None or not connected:
+            return False
+        try:
+            loop.call_soon_threadsafe(self._enqueue, writer, data)
+            return True
+        except RuntimeError as e:
+            print(f"[NET] ❌ Lỗi gửi đến client: {e}")
+            return False
+
+    def get_stats(self):
+        """Số kết nối đã nhận / bị từ chối, số byte nhận, số client hiện tại + hàng đợi gửi"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self.clients_lock:
+            stats['clients'] = len(self.clients)
+        stats['send'] = self.get_send_stats()
+        return stats
@@ -0,0 +1,112 @@
+"""
+Read-through cache cho các truy vấn đọc nóng của DBManager
+(get_setting, get_monthly_ticket_info, get_user_permissions / has_permission)
+
+- LRU giới hạn `max_entries`, mỗi entry hết hạn sau `ttl` giây
+  (TTL chặn dữ liệu cũ khi DB bị sửa từ bên ngoài: script, process khác)
+- Generation theo bảng: lệnh ghi ĐÃ COMMIT gọi invalidate('settings', ...) ->
+  tăng generation, mọi entry của bảng đó coi như hết hạn
+- get_or_load() ghi nhận generation TRƯỚC khi đọc DB; nếu trong lúc đọc có lệnh ghi
+  invalidate bảng đó thì kết quả vừa đọc không được lưu (tránh cache dữ liệu cũ)
+- Đếm hit/miss theo bảng để theo dõi (DBManager.get_pool_stats()['read_cache'])
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReadCache:
+    """LRU + TTL, invalidate theo bảng bằng generation counter"""
+
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # {(table, key): (value, generation, expires_at)}
+        self._generations = {}         # {table: generation}
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'discarded': 0}
+        self._table_stats = {}         # {table: [hits, misses]}
+
+    def _count(self, table, hit):
+        stats = self._table_stats.setdefault(table, [0, 0])
+        if hit:
+            self._stats['hits'] += 1
+            stats[0] += 1
+        else:
+            self._stats['misses'] += 1
+            stats[1] += 1
+
+    def get_or_load(self, table, key, loader):
+        """Trả về giá trị đã cache, hoặc gọi loader() (đọc DB) rồi cache kết quả
+
+        Exception của loader được ném lại và KHÔNG được cache.
+        """
+        cache_key = (table, key)
+        with self._lock:
+            generation = self._generations.get(table, 0)
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                value, entry_generation, expires_at = entry
+                if entry_generation == generation and time.monotonic() < expires_at:
+                    self._entries.move_to_end(cache_key)
+                    self._count(table, True)
+                    return value
+                del self._entries[cache_key]
+            self._count(table, False)
+
+        value = loader()
+
+        with self._lock:
+            if self._generations.get(table, 0) != generation:
+                self._stats['discarded'] += 1
+                return value
+            self._entries[cache_key] = (value, generation, time.monotonic() + self.ttl)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+        return value
+
+    def invalidate(self, *tables):
+        """Gọi SAU khi commit lệnh ghi vào các bảng này"""
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self._stats['invalidations'] += 1
+
+    def clear(self):
+        """Xóa toàn bộ cache (vd: sau khi restore / import DB)"""
+        with self._lock:
+            for table in list(self._generations) + [t for t, _ in self._entries]:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self._entries.clear()
+            self._stats['invalidations'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+            stats['tables'] = {
+                table: {'hits': hits, 'misses': misses,
+                        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0}
+                for table, (hits, misses) in self._table_stats.items()
+            }
+        return stats
+
+
+# ===== CACHE DÙNG CHUNG THEO DB PATH =====
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_read_cache(db_path, max_entries=1024, ttl=30.0):
+    """Lấy (hoặc tạo) cache dùng chung cho db_path"""
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = ReadCache(max_entries=max_entries, ttl=ttl)
+            _caches[db_path] = cache
+        return cache
@@ -0,0 +1,94 @@
+"""
+Daily Rollup - bảng tổng hợp doanh thu / lượt xe theo ngày
+1 dòng cho mỗi (ngày ra, loại xe, loại vé, hình thức thanh toán): số lượt, doanh thu, tổng thời gian đỗ
+
+- record_exit cộng session vừa đóng vào rollup trong CÙNG transaction
+- rebuild(): tính lại từ parking_sessions (dữ liệu cũ, sau khi script ngoài sửa/xóa session),
+  gồm cả archive.parking_sessions nếu connection đã ATTACH file archive (core/archiver.py)
+- Thống kê 1 năm chỉ đọc ~365 x vài dòng thay vì quét toàn bộ parking_sessions
+"""
+
+from core import enums
+from core.vn_time import vn_date_sql, vn_epoch_sql
+
+
+# Trạng thái session được tính là đã thanh toán (giống get_revenue_by_date_range cũ) - literal SQL
+REVENUE_STATUSES = enums.SessionStatus.sql_in(*enums.REVENUE_STATUSES)
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS daily_rollup (
+        day TEXT NOT NULL,                  -- Ngày xe ra, giờ VN 'YYYY-MM-DD'
+        vehicle_type INTEGER NOT NULL,      -- core/enums.py VehicleType, 0 nếu NULL
+        ticket_type INTEGER NOT NULL,       -- core/enums.py TicketType, 0 nếu NULL
+        payment_method TEXT NOT NULL,       -- '' nếu NULL
+        exits INTEGER NOT NULL DEFAULT 0,
+        revenue INTEGER NOT NULL DEFAULT 0,
+        dwell_sec INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, vehicle_type, ticket_type, payment_method)
+    ) WITHOUT ROWID
+"""
+
+_KEY_COLUMNS = f"""
+    {vn_date_sql('time_out_ts')},
+    COALESCE(vehicle_type, 0), COALESCE(ticket_type, 0), COALESCE(payment_method, '')
+"""
+
+_ADD_SESSION_SQL = f"""
+    INSERT INTO daily_rollup (day, vehicle_type, ticket_type, payment_method, exits, revenue, dwell_sec)
+    SELECT {_KEY_COLUMNS}, :sign, :sign * COALESCE(price, 0), :sign * COALESCE(duration_sec, 0)
+    FROM parking_sessions
+    WHERE id = :id AND status IN {REVENUE_STATUSES} AND time_out_ts IS NOT NULL
+    ON CONFLICT (day, vehicle_type, ticket_type, payment_method) DO UPDATE SET
+        exits = exits + excluded.exits,
+        revenue = revenue + excluded.revenue,
+        dwell_sec = dwell_sec + excluded.dwell_sec
+"""
+
+
+def add_session(cursor, session_id, sign=1):
+    """Cộng (sign=1) hoặc trừ (sign=-1) 1 session đã thanh toán vào rollup
+
+    Gọi trong transaction của lệnh ghi session: trừ trước khi sửa 1 session đã đóng,
+    cộng sau khi đóng session.
+    """
+    cursor.execute(_ADD_SESSION_SQL, {'id': session_id, 'sign': sign})
+
+
+def _session_source(cursor):
+    """parking_sessions, hoặc UNION ALL với archive.parking_sessions nếu đã attach"""
+    attached = cursor.execute(
+        "SELECT 1 FROM pragma_database_list WHERE name='archive'"
+    ).fetchone()
+    if attached and cursor.execute(
+            "SELECT 1 FROM archive.sqlite_master WHERE type='table' AND name='parking_sessions'").fetchone():
+        columns = "time_out_ts, vehicle_type, ticket_type, payment_method, price, duration_sec, status"
+        return (f"(SELECT {columns} FROM main.parking_sessions"
+                f" UNION ALL SELECT {columns} FROM archive.parking_sessions)")
+    return "parking_sessions"
+
+
+def rebuild(cursor, date_from=None, date_to=None):
+    """Tính lại rollup từ parking_sessions (toàn bộ hoặc khoảng ngày [date_from, date_to])
+
+    Returns:
+        int: Số dòng rollup được ghi
+    """
+    day_filter, session_filter, params = "", "", []
+    if date_from:
+        day_filter += " AND day >= ?"
+        session_filter += f" AND time_out_ts >= {vn_epoch_sql('?')}"
+        params.append(date_from)
+    if date_to:
+        day_filter += " AND day <= ?"
+        session_filter += " AND time_out_ts < " + vn_epoch_sql("date(?, '+1 day')")
+        params.append(date_to)
+
+    cursor.execute(f"DELETE FROM daily_rollup WHERE 1=1 {day_filter}", params)
+    cursor.execute(f"""
+        INSERT INTO daily_rollup (day, vehicle_type, ticket_type, payment_method, exits, revenue, dwell_sec)
+        SELECT {_KEY_COLUMNS}, COUNT(*), COALESCE(SUM(price), 0), COALESCE(SUM(duration_sec), 0)
+        FROM {_session_source(cursor)}
+        WHERE status IN {REVENUE_STATUSES} AND time_out_ts IS NOT NULL {session_filter}
+        GROUP BY 1, 2, 3, 4
+    """, params)
+    return cursor.rowcount
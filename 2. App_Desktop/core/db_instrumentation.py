@@ -0,0 +1,405 @@
+"""
+Instrumentation cho DBManager: latency theo method / câu SQL, slow query log kèm query plan
+
+- instrument_methods(DBManager): bọc mọi method public -> histogram latency theo method
+- InstrumentedConnection / InstrumentedCursor (factory của sqlite3.connect, xem core/db_pool.py):
+  đo thời gian execute + fetch, số dòng trả về của từng câu SQL
+- Câu SQL chậm hơn `slow_query_ms`: ghi vào slow log (deque giới hạn) kèm EXPLAIN QUERY PLAN,
+  method đang gọi và in "[DB-SLOW]"
+- Chờ write lock (pool.writer) và số lần retry khi "database is locked" cũng được ghi lại
+- snapshot() trả dict (p50/p95/p99 theo bucket), dump() ghi JSON ra file
+
+Xem báo cáo từ file dump:
+    python -m core.db_instrumentation reports/db_stats_20250101_120000.json
+"""
+
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+# Biên trên các bucket latency (ms) - bucket cuối là +inf
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+MAX_STATEMENTS = 500  # Số câu SQL khác nhau tối đa được theo dõi riêng, còn lại gộp vào "<other>"
+
+
+class LatencyHistogram:
+    """Histogram latency theo bucket cố định (không thread-safe - gọi dưới lock của registry)"""
+
+    __slots__ = ('counts', 'count', 'total_ms', 'max_ms', 'rows')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+
+    def add(self, elapsed_ms, rows=0):
+        index = 0
+        while index < len(BUCKETS_MS) and elapsed_ms > BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.rows += rows
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+
+    def percentile(self, p):
+        """Biên trên của bucket chứa phân vị p (ước lượng, không vượt max)"""
+        if not self.count:
+            return 0.0
+        target = p * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(BUCKETS_MS[index], round(self.max_ms, 3)) if index < len(BUCKETS_MS) else round(self.max_ms, 3)
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max_ms, 3),
+            'total_ms': round(self.total_ms, 3),
+            'rows': self.rows,
+            'buckets': {(f"<={b}" if i < len(BUCKETS_MS) else ">10000"): n
+                        for i, (b, n) in enumerate(zip(BUCKETS_MS + (None,), self.counts)) if n},
+        }
+
+
+class QueryInstrumentation:
+    """Registry metrics dùng chung cho 1 DB (method, câu SQL, lock wait, retry, slow log)"""
+
+    def __init__(self, slow_query_ms=100.0, slow_log_size=200, enabled=True):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._methods = {}
+        self._statements = {}
+        self._sql_keys = {}  # {sql gốc: sql đã chuẩn hóa}
+        self._lock_wait = LatencyHistogram()
+        self._retries = 0
+        self._errors = 0
+        self._slow = deque(maxlen=slow_log_size)
+        self._started_at = time.time()
+
+    # ------------------------------------------------------------------
+    # Ghi nhận
+    # ------------------------------------------------------------------
+    def current_method(self):
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1][0] if stack else None
+
+    def record_method(self, name, elapsed_ms, rows=0, failed=False):
+        with self._lock:
+            hist = self._methods.get(name)
+            if hist is None:
+                hist = self._methods[name] = LatencyHistogram()
+            hist.add(elapsed_ms, rows)
+            if failed:
+                self._errors += 1
+
+    def record_statement(self, sql, elapsed_ms, rows):
+        # Chuẩn hóa SQL tốn regex -> nhớ theo chuỗi gốc (SQL của DBManager là hằng / f-string ít biến thể)
+        key = self._sql_keys.get(sql)
+        if key is None:
+            key = normalize_sql(sql)
+            if len(self._sql_keys) < MAX_STATEMENTS * 4:
+                self._sql_keys[sql] = key
+        stack = getattr(self._local, 'stack', None)
+        if stack:
+            stack[-1][1] += rows
+        with self._lock:
+            hist = self._statements.get(key)
+            if hist is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    key = '<other>'
+                    hist = self._statements.get(key)
+                if hist is None:
+                    hist = self._statements[key] = LatencyHistogram()
+            hist.add(elapsed_ms, rows)
+
+    def record_slow(self, sql, params, elapsed_ms, rows, plan):
+        entry = {
+            'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'method': self.current_method(),
+            'thread': threading.current_thread().name,
+            'elapsed_ms': round(elapsed_ms, 3),
+            'rows': rows,
+            'sql': normalize_sql(sql),
+            'params': _short_params(params),
+            'plan': plan,
+        }
+        with self._lock:
+            self._slow.append(entry)
+        print(f"[DB-SLOW] {elapsed_ms:.1f}ms ({entry['method']}) {entry['sql'][:120]} | {' | '.join(plan or [])}")
+
+    def record_lock_wait(self, seconds):
+        with self._lock:
+            self._lock_wait.add(seconds * 1000)
+
+    def record_retry(self):
+        with self._lock:
+            self._retries += 1
+
+    # ------------------------------------------------------------------
+    # Đọc
+    # ------------------------------------------------------------------
+    def snapshot(self, top=50):
+        """Dict metrics: method / câu SQL (sắp theo tổng thời gian), lock wait, retry, slow log"""
+        with self._lock:
+            methods = {name: hist.to_dict() for name, hist in self._methods.items()}
+            statements = [dict(hist.to_dict(), sql=sql) for sql, hist in self._statements.items()]
+            lock_wait = self._lock_wait.to_dict()
+            slow = list(self._slow)
+            retries, errors = self._retries, self._errors
+        statements.sort(key=lambda s: s['total_ms'], reverse=True)
+        return {
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._started_at)),
+            'slow_query_ms': self.slow_query_ms,
+            'methods': dict(sorted(methods.items(), key=lambda kv: kv[1]['total_ms'], reverse=True)),
+            'statements': statements[:top],
+            'write_lock_wait': lock_wait,
+            'retries': retries,
+            'method_errors': errors,
+            'slow_queries': slow,
+        }
+
+    def dump(self, path):
+        """Ghi snapshot ra file JSON, trả về đường dẫn"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(top=MAX_STATEMENTS), f, ensure_ascii=False, indent=2)
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+            self._statements.clear()
+            self._lock_wait = LatencyHistogram()
+            self._slow.clear()
+            self._sql_keys.clear()
+            self._retries = self._errors = 0
+            self._started_at = time.time()
+
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    return _WHITESPACE.sub(' ', sql).strip()[:300]
+
+
+def _short_params(params):
+    if params is None:
+        return None
+    try:
+        items = params.items() if isinstance(params, dict) else enumerate(params)
+        return {str(k): (v[:50] if isinstance(v, str) else v) for k, v in items}
+    except TypeError:
+        return str(params)[:100]
+
+
+# ===== METHOD =====
+def instrument_methods(cls, get_instrumentation, exclude=()):
+    """Bọc các method public của cls để đo latency (get_instrumentation(self) -> registry hoặc None)"""
+    for name, func in list(vars(cls).items()):
+        if name.startswith('_') or name in exclude or not callable(func) or isinstance(func, (staticmethod, classmethod, type)):
+            continue
+        setattr(cls, name, _wrap_method(name, func, get_instrumentation))
+    return cls
+
+
+def _wrap_method(name, func, get_instrumentation):
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        inst = get_instrumentation(self)
+        if inst is None or not inst.enabled:
+            return func(self, *args, **kwargs)
+        stack = getattr(inst._local, 'stack', None)
+        if stack is None:
+            stack = inst._local.stack = []
+        frame = [name, 0]  # [method, số dòng SQL trả về trong method]
+        stack.append(frame)
+        failed = False
+        start = time.perf_counter()
+        try:
+            return func(self, *args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            stack.pop()
+            inst.record_method(name, (time.perf_counter() - start) * 1000, frame[1], failed)
+    return wrapper
+
+
+# ===== SQL =====
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor đo execute + fetch; 1 mẫu / câu SQL, chốt khi fetch hết, execute câu mới, close hoặc GC"""
+
+    instrumentation = None  # Gán bởi InstrumentedConnection.cursor()
+
+    def _finish(self):
+        pending = getattr(self, '_pending', None)
+        if pending is None:
+            return
+        self._pending = None
+        sql, params, elapsed, rows = pending
+        inst = self.instrumentation
+        elapsed_ms = elapsed * 1000
+        inst.record_statement(sql, elapsed_ms, rows)
+        if elapsed_ms >= inst.slow_query_ms:
+            inst.record_slow(sql, params, elapsed_ms, rows, self._explain(sql, params))
+
+    def _explain(self, sql, params):
+        words = sql.split(None, 1)
+        if not words or words[0].upper() not in ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT'):
+            return None
+        try:
+            plan_cursor = sqlite3.Cursor(self.connection)
+            rows = plan_cursor.execute("EXPLAIN QUERY PLAN " + sql, params if params is not None else ()).fetchall()
+            return [row[3] for row in rows]
+        except sqlite3.Error as e:
+            return [f"(không lấy được plan: {e})"]
+
+    def _timed(self, func, sql, params, *args):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            result = func(self, sql, *args)
+        finally:
+            self._pending = [sql, params, time.perf_counter() - start, 0]
+        return result
+
+    def execute(self, sql, parameters=()):
+        if self.instrumentation is None or not self.instrumentation.enabled:
+            return super().execute(sql, parameters)
+        return self._timed(sqlite3.Cursor.execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self.instrumentation is None or not self.instrumentation.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        return self._timed(sqlite3.Cursor.executemany, sql, None, seq_of_parameters)
+
+    def _timed_fetch(self, func, *args):
+        pending = getattr(self, '_pending', None)
+        if pending is None:
+            return func(self, *args)
+        start = time.perf_counter()
+        result = func(self, *args)
+        pending[2] += time.perf_counter() - start
+        return result
+
+    def fetchone(self):
+        row = self._timed_fetch(sqlite3.Cursor.fetchone)
+        if getattr(self, '_pending', None) is not None:
+            if row is None:
+                self._finish()
+            else:
+                self._pending[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed_fetch(sqlite3.Cursor.fetchmany, size if size is not None else self.arraysize)
+        if getattr(self, '_pending', None) is not None:
+            self._pending[3] += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(sqlite3.Cursor.fetchall)
+        if getattr(self, '_pending', None) is not None:
+            self._pending[3] += len(rows)
+            self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection tạo InstrumentedCursor (conn.execute() cũng đi qua cursor())"""
+
+    instrumentation = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        cursor = super().cursor(factory)
+        if isinstance(cursor, InstrumentedCursor):
+            cursor.instrumentation = self.instrumentation
+        return cursor
+
+
+def connection_factory(instrumentation):
+    """Factory cho sqlite3.connect(..., factory=...) gắn sẵn registry"""
+    return type('InstrumentedConnection', (InstrumentedConnection,), {'instrumentation': instrumentation})
+
+
+# ===== REGISTRY DÙNG CHUNG THEO DB PATH =====
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_instrumentation(db_path, **kwargs):
+    """Lấy (hoặc tạo) registry dùng chung cho db_path"""
+    with _registries_lock:
+        inst = _registries.get(db_path)
+        if inst is None:
+            inst = QueryInstrumentation(**kwargs)
+            _registries[db_path] = inst
+        return inst
+
+
+# ===== BÁO CÁO TỪ FILE DUMP =====
+def format_report(snapshot, top=15):
+    lines = [f"DB stats từ {snapshot['since']} (slow >= {snapshot['slow_query_ms']}ms)", ""]
+    header = f"{'count':>8} {'avg':>9} {'p95':>9} {'p99':>9} {'max':>10} {'rows':>9}  "
+    lines.append("METHOD (theo tổng thời gian)")
+    lines.append(header + "method")
+    for name, h in list(snapshot['methods'].items())[:top]:
+        lines.append(f"{h['count']:>8} {h['avg_ms']:>8.2f}ms {h['p95_ms']:>8}ms {h['p99_ms']:>8}ms "
+                     f"{h['max_ms']:>9.1f}ms {h['rows']:>9}  {name}")
+    lines += ["", "SQL (theo tổng thời gian)", header + "sql"]
+    for h in snapshot['statements'][:top]:
+        lines.append(f"{h['count']:>8} {h['avg_ms']:>8.2f}ms {h['p95_ms']:>8}ms {h['p99_ms']:>8}ms "
+                     f"{h['max_ms']:>9.1f}ms {h['rows']:>9}  {h['sql'][:100]}")
+    wait = snapshot['write_lock_wait']
+    lines += ["", f"Chờ write lock: {wait['count']} lần, avg {wait['avg_ms']}ms, p99 {wait['p99_ms']}ms, "
+                  f"max {wait['max_ms']}ms | retry: {snapshot['retries']} | method lỗi: {snapshot['method_errors']}"]
+    if snapshot['slow_queries']:
+        lines += ["", f"SLOW QUERIES ({len(snapshot['slow_queries'])})"]
+        for q in snapshot['slow_queries'][-top:]:
+            lines.append(f"  {q['at']} {q['elapsed_ms']:>8.1f}ms {q['method']}: {q['sql'][:100]}")
+            for step in q['plan'] or []:
+                lines.append(f"      {step}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python -m core.db_instrumentation <db_stats.json>")
+        sys.exit(1)
+    with open(sys.argv[1], encoding='utf-8') as f:
+        print(format_report(json.load(f)))
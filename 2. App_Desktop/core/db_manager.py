@@ -1,29 +1,35 @@
+import os
 import sqlite3
 import hashlib
 import threading
 import time
 from contextlib import contextmanager
-from config import DB_PATH
+from datetime import datetime, timedelta
+from config import DB_PATH, DB_CONFIG
+from core.db_pool import get_pool
+from core.db_writer import get_writer, stop_writer
+from core.db_migrations import run_migrations, LATEST_VERSION
+from core.stats_counter import get_stats_counter
+from core.slot_allocator import get_slot_allocator
+from core.session_registry import get_session_registry
+from core.cache import get_read_cache
+from core.snapshot_service import get_snapshot_service
+from core import db_instrumentation
+from core import daily_rollup
+from core import archiver
+from core import exporter
+from core import monthly_bulk
+from core.enums import VehicleType, TicketType, SessionStatus, TicketStatus, CODED_COLUMNS
+from core.vn_time import vn_epoch_sql, vietnam_today, VN_OFFSET_SEC
 
 # ===== GLOBAL WRITE LOCK =====
 # SQLite cho phép một lần ghi duy nhất. Khóa này đảm bảo tất cả INSERT/UPDATE/DELETE 
 # được thực hiện tuần tự, tránh "database is locked" errors.
+# Connection ghi của pool (core/db_pool.py) cũng dùng chính khóa này.
 _db_write_lock = threading.RLock()
 
-@contextmanager
-def _connection_context(conn):
-    """Wrapper để đảm bảo connection được đóng sau context manager
-    
-    SQLite's native context manager chỉ commit/rollback, KHÔNG close connection!
-    Context manager này đảm bảo connection LUÔN được đóng.
-    """
-    try:
-        yield conn
-    finally:
-        conn.close()
-
-def _execute_with_retry(func, max_retries=5, initial_wait=0.05):
-    """Helper: Thực thi function với retry khi database locked"""
+def _execute_with_retry(func, max_retries=5, initial_wait=0.05, on_retry=None):
+    """Helper: Thực thi function với retry khi database locked (on_retry() được gọi mỗi lần retry)"""
     for attempt in range(max_retries):
         try:
             return func()
@@ -32,22 +38,100 @@ def _execute_with_retry(func, max_retries=5, initial_wait=0.05):
                 if attempt < max_retries - 1:
                     wait = initial_wait * (2 ** attempt)  # Exponential backoff: 0.05 -> 0.1 -> 0.2 -> 0.4 -> 0.8
                     print(f"[DB-RETRY] Database locked, retry {attempt + 1}/{max_retries} after {wait:.2f}s...")
+                    if on_retry is not None:
+                        on_retry()
                     time.sleep(wait)
                     continue
             print(f"[DB-ERROR] Database operation failed: {e}")
             raise
     return None
 
+class DuplicateEntryError(Exception):
+    """Thẻ đã có session PARKING đang mở (vi phạm unique index idx_sessions_open_card)"""
+
 class DBManager:
     # Class variable - shared across all instances
     _pragma_initialized = False
     _pragma_lock = threading.Lock()
+    _schema_checked = False
+    _fts_tables = None  # Bảng FTS5 trigram đã có (migration v5), None = chưa kiểm tra
+    _archive_ready = False  # archive.parking_sessions đã được tạo (core/archiver.py)
+    _session_select = None  # Cột parking_sessions cho get_parking_session (tạo 1 lần / process)
     
     def __init__(self):
         self.db_path = DB_PATH
+        # File archive cho session cũ (hot/cold) - ATTACH trên mọi connection của pool
+        self.archive_after_days = int(DB_CONFIG.get("archive_after_days", 0) or 0)
+        self.archive_path = None
+        if self.archive_after_days > 0:
+            self.archive_path = DB_CONFIG.get("archive_path") or archiver.default_archive_path(self.db_path)
+        # Đo latency theo method / câu SQL + slow query log (core/db_instrumentation.py)
+        self.instrumentation = None
+        if DB_CONFIG.get("instrumentation", True):
+            self.instrumentation = db_instrumentation.get_instrumentation(
+                self.db_path,
+                slow_query_ms=float(DB_CONFIG.get("slow_query_ms", 100)),
+                slow_log_size=int(DB_CONFIG.get("slow_query_log_size", 200)),
+            )
+        # Pool dùng chung cho mọi DBManager trỏ tới cùng file DB
+        self.pool = get_pool(
+            self.db_path,
+            max_readers=DB_CONFIG.get("pool_size", 8),
+            timeout=float(DB_CONFIG.get("busy_timeout", 120)),
+            health_check_interval=float(DB_CONFIG.get("health_check_interval", 30)),
+            write_lock=_db_write_lock,
+            attachments={archiver.ARCHIVE_ALIAS: self.archive_path} if self.archive_path else None,
+            factory=db_instrumentation.connection_factory(self.instrumentation) if self.instrumentation else None,
+            on_lock_wait=self.instrumentation.record_lock_wait if self.instrumentation else None,
+        )
+        # WAL (opt-in): mọi lệnh ghi đi qua 1 writer thread duy nhất (core/db_writer.py)
+        self.wal_enabled = str(DB_CONFIG.get("journal_mode", "DELETE")).upper() == "WAL"
+        self.writer = None
+        if self.wal_enabled:
+            self._ensure_pragma()
+            self.writer = get_writer(self.pool, max_batch=DB_CONFIG.get("writer_batch_size", 32))
+        # Snapshot thống kê dashboard, cập nhật delta sau mỗi lệnh ghi (core/stats_counter.py)
+        self.stats_counter = get_stats_counter(
+            self.db_path,
+            resync_interval=float(DB_CONFIG.get("stats_resync_interval", 60)),
+        )
+        # Free list ô đỗ trong bộ nhớ (core/slot_allocator.py)
+        self.slot_allocator = get_slot_allocator(
+            self.db_path,
+            resync_interval=float(DB_CONFIG.get("stats_resync_interval", 60)),
+        )
+        # Session đang gửi theo biển số / thẻ cho tra cứu ở cổng ra (core/session_registry.py)
+        self.session_registry = get_session_registry(
+            self.db_path,
+            resync_interval=float(DB_CONFIG.get("session_registry_resync", 60)),
+        )
+        # Cache đọc: settings, vé tháng, quyền - invalidate sau lệnh ghi (core/cache.py)
+        self.read_cache = get_read_cache(
+            self.db_path,
+            max_entries=int(DB_CONFIG.get("cache_max_entries", 1024)),
+            ttl=float(DB_CONFIG.get("cache_ttl", 30)),
+        )
+        # Snapshot point-in-time bằng online backup API: backup + báo cáo nặng (core/snapshot_service.py)
+        # Thread định kỳ chỉ chạy khi MainWindow gọi self.snapshots.start()
+        self.snapshot_max_age = float(DB_CONFIG.get("snapshot_max_age", 3600))
+        self.snapshots = get_snapshot_service(
+            self.db_path,
+            snapshot_dir=DB_CONFIG.get("snapshot_dir"),
+            interval=float(DB_CONFIG.get("snapshot_interval", 0)),
+            retention=int(DB_CONFIG.get("snapshot_retention", 12)),
+            pages_per_step=int(DB_CONFIG.get("snapshot_pages_per_step", 256)),
+            step_sleep=float(DB_CONFIG.get("snapshot_step_sleep", 0.01)),
+            attachments={archiver.ARCHIVE_ALIAS: self.archive_path} if self.archive_path else None,
+            timeout=float(DB_CONFIG.get("busy_timeout", 120)),
+            factory=db_instrumentation.connection_factory(self.instrumentation) if self.instrumentation else None,
+        )
 
     def _init_pragma_once(self, conn):
-        """Set PRAGMA one-time on first connection (thread-safe)"""
+        """Set PRAGMA cấp database one-time on first connection (thread-safe)
+        
+        PRAGMA theo connection (busy_timeout, synchronous, cache_size, temp_store)
+        được pool set khi tạo connection - xem core/db_pool.py
+        """
         if DBManager._pragma_initialized:
             return
         
@@ -58,12 +142,9 @@ class DBManager:
                 return
             try:
                 cursor = conn.cursor()
-                # Use DELETE mode instead of WAL to reduce locking issues
-                cursor.execute("PRAGMA busy_timeout=120000")
-                cursor.execute("PRAGMA journal_mode=DELETE")
-                cursor.execute("PRAGMA synchronous=NORMAL")
-                cursor.execute("PRAGMA cache_size=10000")
-                cursor.execute("PRAGMA temp_store=MEMORY")
+                # Mặc định DELETE mode; WAL chỉ bật khi DB_CONFIG["journal_mode"] = "WAL"
+                journal_mode = "WAL" if self.wal_enabled else "DELETE"
+                cursor.execute(f"PRAGMA journal_mode={journal_mode}")
                 conn.commit()
                 DBManager._pragma_initialized = True
                 print("[DB] PRAGMA initialized successfully")
@@ -77,32 +158,167 @@ class DBManager:
             except Exception as e:
                 print(f"[DB-WARN] Could not set PRAGMA: {e}")
 
-    def connect(self):
-        """Create connection to SQLite with context manager support
+    def connect(self, write=False):
+        """Mượn connection từ pool (context manager)
         
-        IMPORTANT: SQLite's native context manager does NOT close connection!
-        This method returns a wrapper context manager that ensures connection is closed.
+        - write=False: connection đọc riêng của thread hiện tại, được tái sử dụng giữa các lần gọi
+        - write=True: connection ghi dùng chung, giữ _db_write_lock trong suốt context
+        
+        Connection KHÔNG bị đóng khi ra khỏi context; phần chưa commit sẽ bị rollback
+        (giống hành vi đóng connection trước đây).
         
         Usage:
             with self.connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute(...)
-            # Connection automatically closed here
+            
+            with self.connect(write=True) as conn:
+                conn.execute("UPDATE ...")
+                conn.commit()
         """
-        # Use longer timeout and retry logic
-        max_retries = 5
-        for attempt in range(max_retries):
-            try:
-                conn = sqlite3.connect(self.db_path, timeout=120.0, check_same_thread=False)
+        self._ensure_pragma()
+        return self.pool.writer() if write else self.pool.reader()
+
+    def _ensure_pragma(self):
+        if not DBManager._pragma_initialized:
+            with self.pool.writer() as conn:
                 self._init_pragma_once(conn)
-                return _connection_context(conn)
-            except sqlite3.OperationalError as e:
-                if 'database is locked' in str(e).lower() and attempt < max_retries - 1:
-                    wait_time = 0.1 * (2 ** attempt)  # 0.1, 0.2, 0.4, 0.8, 1.6
-                    print(f"[DB-CONNECT] Database locked, retrying in {wait_time:.1f}s...")
-                    time.sleep(wait_time)
-                else:
-                    raise
+        if not DBManager._schema_checked:
+            self._ensure_schema()
+
+    def _ensure_schema(self):
+        """Chạy schema migrations còn thiếu (1 lần / process) - xem core/db_migrations.py"""
+        with DBManager._pragma_lock:
+            if DBManager._schema_checked:
+                return
+            try:
+                with self.pool.writer() as conn:
+                    run_migrations(conn)
+                    if archiver.is_attached(conn):
+                        archiver.ensure_archive_schema(conn)
+                        conn.commit()
+                        DBManager._archive_ready = True
+            except Exception as e:
+                print(f"[DB-WARN] Could not run migrations: {e}")
+            DBManager._schema_checked = True
+
+    def _run_write(self, func):
+        """Thực thi 1 job ghi func(conn) và commit
+        
+        - WAL mode: đưa job vào hàng đợi của writer thread (group commit), chờ kết quả
+        - DELETE mode: chạy trên writer connection dưới _db_write_lock, retry khi locked
+        
+        func KHÔNG được tự gọi conn.commit(). Exception của func được ném lại cho caller.
+        """
+        if self.writer is not None:
+            return self.writer.submit(func).result()
+
+        def do_write():
+            with self.connect(write=True) as conn:
+                result = func(conn)
+                conn.commit()
+                return result
+        return _execute_with_retry(
+            do_write, on_retry=self.instrumentation.record_retry if self.instrumentation else None
+        )
+
+    # --- TÌM KIẾM CHUỖI CON (FTS5 trigram) ---
+    FTS_MIN_QUERY = 3  # Trigram cần >= 3 ký tự, ngắn hơn thì dùng LIKE
+
+    def _has_fts(self, table):
+        """Bảng FTS5 trigram có trong DB không (kiểm tra 1 lần / process)"""
+        if DBManager._fts_tables is None:
+            try:
+                with self.connect() as conn:
+                    rows = conn.execute(
+                        "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE '%fts'"
+                    ).fetchall()
+                DBManager._fts_tables = {row[0] for row in rows}
+            except Exception as e:
+                print(f"[DB-WARN] Could not check FTS tables: {e}")
+                return False
+        return table in DBManager._fts_tables
+
+    def _fts_match(self, table, query):
+        """(sql, param) lọc rowid khớp chuỗi con `query`, hoặc None nếu phải dùng LIKE
+        
+        Truy vấn được bọc thành 1 phrase "..." -> ký tự đặc biệt của FTS5 (-, ., *) khớp nguyên văn
+        """
+        if len(query) < self.FTS_MIN_QUERY or not self._has_fts(table):
+            return None
+        return f"SELECT rowid FROM {table} WHERE {table} MATCH ?", '"' + query.replace('"', '""') + '"'
+
+    def get_pool_stats(self):
+        """Metrics của connection pool (hit/miss, overflow, health check)"""
+        stats = self.pool.get_stats()
+        if self.writer is not None:
+            stats['writer_queue'] = self.writer.get_stats()
+        stats['stats_counter'] = self.stats_counter.get_stats()
+        stats['slot_allocator'] = self.slot_allocator.get_stats()
+        stats['session_registry'] = self.session_registry.get_stats()
+        stats['read_cache'] = self.read_cache.get_stats()
+        stats['snapshots'] = self.snapshots.get_stats()
+        return stats
+
+    def get_query_stats(self, top=50):
+        """Latency theo method / câu SQL, chờ write lock, retry, slow query log (None nếu tắt)"""
+        if self.instrumentation is None:
+            return None
+        return self.instrumentation.snapshot(top=top)
+
+    def dump_query_stats(self, path=None):
+        """Ghi get_query_stats() ra file JSON (mặc định reports/db_stats_<thời gian>.json), trả về đường dẫn"""
+        if self.instrumentation is None:
+            return None
+        if path is None:
+            path = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "reports",
+                                time.strftime("db_stats_%Y%m%d_%H%M%S.json"))
+        self.instrumentation.dump(path)
+        print(f"[DB-STATS] Đã ghi thống kê truy vấn: {path}")
+        return path
+
+    def reset_query_stats(self):
+        if self.instrumentation is not None:
+            self.instrumentation.reset()
+
+    @contextmanager
+    def connect_report(self, min_created=None):
+        """Connection đọc cho báo cáo nặng: snapshot mới nhất nếu còn hạn, ngược lại pool reader
+
+        - Snapshot cũ hơn DB_CONFIG["snapshot_max_age"] giây hoặc tạo trước `min_created` (epoch)
+          thì đọc file đang chạy như connect()
+        - Snapshot có schema cũ hơn file đang chạy (tạo trước migration) cũng bị bỏ qua
+        - Connection snapshot là read-only, được đóng khi ra khỏi context
+        """
+        conn = self.snapshots.connect_latest(max_age=self.snapshot_max_age, min_created=min_created)
+        if conn is not None and conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] != LATEST_VERSION:
+            conn.close()
+            conn = None
+        self.snapshots.record_read(conn is not None)
+        if conn is None:
+            with self.connect() as conn:
+                yield conn
+            return
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def take_snapshot(self):
+        """Tạo snapshot ngay (WRITE file mới, KHÔNG giữ write lock), trả về đường dẫn hoặc None nếu lỗi"""
+        self._ensure_pragma()
+        try:
+            snapshot = self.snapshots.take_snapshot()
+            return snapshot['path'] if snapshot else None
+        except Exception as e:
+            print(f"[DB-ERROR] take_snapshot: {e}")
+            return None
+
+    def close_pool(self):
+        """Dừng writer thread (nếu có) và đóng toàn bộ connection của pool (gọi khi tắt ứng dụng)"""
+        self.snapshots.stop()
+        stop_writer(self.db_path)
+        self.pool.close_all()
 
     def hash_password(self, password):
         return hashlib.md5(password.encode()).hexdigest()
@@ -127,54 +343,79 @@ class DBManager:
 
     # --- 2. QUẢN LÝ CÀI ĐẶT (SETTINGS) ---
     def get_setting(self, key_name, default=None):
-        """Lấy cài đặt (READ - auto-close connection)"""
-        try:
+        """Lấy cài đặt (READ - read cache / pooled connection)"""
+        def load():
             with self.connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT key_value FROM settings WHERE key_name=?", (key_name,))
-                row = cursor.fetchone()
-            return row[0] if row else default
+                row = conn.execute("SELECT key_value FROM settings WHERE key_name=?", (key_name,)).fetchone()
+            return row[0] if row else None
+        
+        try:
+            value = self.read_cache.get_or_load('settings', key_name, load)
+            return value if value is not None else default
         except Exception as e:
             print(f"[DB-ERROR] get_setting: {e}")
             return default
 
     def save_setting(self, key_name, key_value):
-        """Lưu cài đặt (WRITE - single statement, SQLite handles atomicity)"""
+        """Lưu cài đặt (WRITE - single statement)"""
+        def do_save(conn):
+            conn.execute("INSERT OR REPLACE INTO settings (key_name, key_value) VALUES (?, ?)", 
+                         (key_name, str(key_value)))
+        
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("INSERT OR REPLACE INTO settings (key_name, key_value) VALUES (?, ?)", 
-                               (key_name, str(key_value)))
-                conn.commit()
+            self._run_write(do_save)
+            self.read_cache.invalidate('settings')
         except Exception as e:
             print(f"[DB-ERROR] save_setting: {e}")
 
     # --- 3. QUẢN LÝ VÉ THÁNG ---
+    # vehicle_type / status lưu mã số (core/enums.py) - đọc ra label cho UI
+    _MONTHLY_COLUMNS = f"""
+        SELECT plate_number, owner_name, card_id, {VehicleType.sql_label('vehicle_type')}, reg_date, exp_date,
+               assigned_slot, avatar_path, {TicketStatus.sql_label('status')}, exp_date
+        FROM monthly_tickets
+    """
+
     def get_all_monthly_tickets(self, search_query=""):
-        """Lấy danh sách vé tháng (READ - auto-close)"""
+        """Lấy danh sách vé tháng (READ - pooled connection)"""
+        if search_query and search_query.strip():
+            return self.search_monthly_tickets(search_query)
+        try:
+            with self.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"{self._MONTHLY_COLUMNS} ORDER BY id DESC")
+                rows = cursor.fetchall()
+            return rows
+        except Exception as e:
+            print(f"[DB-ERROR] get_all_monthly_tickets: {e}")
+            return []
+
+    def search_monthly_tickets(self, query):
+        """Tìm vé tháng theo chuỗi con của biển số / chủ xe / mã thẻ (READ - pooled connection)
+        
+        Dùng index monthly_tickets_fts (trigram) thay cho 3 điều kiện LIKE '%...%' quét toàn bảng
+        """
+        query = (query or "").strip()
         try:
+            fts = self._fts_match('monthly_tickets_fts', query)
             with self.connect() as conn:
                 cursor = conn.cursor()
-                if search_query:
-                    cursor.execute("""
-                        SELECT plate_number, owner_name, card_id, vehicle_type, reg_date, exp_date, assigned_slot, avatar_path, status, exp_date
-                        FROM monthly_tickets 
+                if fts:
+                    cursor.execute(f"{self._MONTHLY_COLUMNS} WHERE id IN ({fts[0]}) ORDER BY id DESC", (fts[1],))
+                else:
+                    like = f"%{query}%"
+                    cursor.execute(f"""{self._MONTHLY_COLUMNS}
                         WHERE plate_number LIKE ? OR owner_name LIKE ? OR card_id LIKE ?
                         ORDER BY id DESC
-                    """, (f"%{search_query}%", f"%{search_query}%", f"%{search_query}%"))
-                else:
-                    cursor.execute("""
-                        SELECT plate_number, owner_name, card_id, vehicle_type, reg_date, exp_date, assigned_slot, avatar_path, status, exp_date
-                        FROM monthly_tickets ORDER BY id DESC
-                    """)
+                    """, (like, like, like))
                 rows = cursor.fetchall()
             return rows
         except Exception as e:
-            print(f"[DB-ERROR] get_all_monthly_tickets: {e}")
+            print(f"[DB-ERROR] search_monthly_tickets: {e}")
             return []
 
     def get_monthly_ticket_stats(self):
-        """Lấy thống kê số vé tháng đã đăng ký theo loại xe (READ - auto-close)"""
+        """Lấy thống kê số vé tháng đã đăng ký theo loại xe (READ - pooled connection)"""
         try:
             with self.connect() as conn:
                 cursor = conn.cursor()
@@ -182,29 +423,29 @@ class DBManager:
                 # Đếm số vé tháng xe máy đã đăng ký
                 cursor.execute("""
                     SELECT COUNT(*) FROM monthly_tickets 
-                    WHERE vehicle_type='Xe máy' AND status != 'DELETED'
-                """)
+                    WHERE vehicle_type=? AND status != ?
+                """, (VehicleType.MOTOR, TicketStatus.DELETED))
                 motor_registered = cursor.fetchone()[0]
                 
                 # Đếm số vé tháng ô tô đã đăng ký
                 cursor.execute("""
                     SELECT COUNT(*) FROM monthly_tickets 
-                    WHERE vehicle_type='Ô tô' AND status != 'DELETED'
-                """)
+                    WHERE vehicle_type=? AND status != ?
+                """, (VehicleType.CAR, TicketStatus.DELETED))
                 car_registered = cursor.fetchone()[0]
                 
                 # Tổng số slot dành cho vé tháng xe máy (is_reserved=1)
                 cursor.execute("""
                     SELECT COUNT(*) FROM parking_slots 
-                    WHERE vehicle_type='Xe máy' AND is_reserved=1
-                """)
+                    WHERE vehicle_type=? AND is_reserved=1
+                """, (VehicleType.MOTOR,))
                 motor_total_slots = cursor.fetchone()[0]
                 
                 # Tổng số slot dành cho vé tháng ô tô (is_reserved=1)
                 cursor.execute("""
                     SELECT COUNT(*) FROM parking_slots 
-                    WHERE vehicle_type='Ô tô' AND is_reserved=1
-                """)
+                    WHERE vehicle_type=? AND is_reserved=1
+                """, (VehicleType.CAR,))
                 car_total_slots = cursor.fetchone()[0]
             
             return {
@@ -223,118 +464,136 @@ class DBManager:
             }
 
     def add_monthly_ticket(self, plate, owner, card, v_type, reg, exp, slot, avatar=""):
-        """Thêm vé tháng (WRITE - thread-safe, auto-close)"""
-        with _db_write_lock:
-            try:
+        """Thêm vé tháng (WRITE - 1 transaction: insert vé + reserve slot)"""
+        try:
+            vehicle_type = VehicleType.coerce(v_type)
+        except ValueError:
+            return False, f"Lỗi: loại xe '{v_type}' không hợp lệ!"
+        
+        def do_insert(conn):
+            cursor = conn.cursor()
+            print(f"[DB-MONTHLY] Inserting: plate={plate}, owner={owner}, card={card}, type={v_type}, slot={slot}")
+            cursor.execute("""
+                INSERT INTO monthly_tickets 
+                (plate_number, owner_name, card_id, vehicle_type, reg_date, exp_date, assigned_slot, avatar_path, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (plate, owner, card, vehicle_type, reg, exp, slot, avatar, TicketStatus.ACTIVE))
+            
+            # Nếu có chỉ định slot, đánh dấu là reserved cho khách tháng
+            if slot:
+                print(f"[DB-MONTHLY] Marking slot {slot} as reserved")
+                cursor.execute("UPDATE parking_slots SET is_reserved=1 WHERE slot_id=?", (slot,))
+        
+        try:
+            self._run_write(do_insert)
+            self.read_cache.invalidate('monthly_tickets')
+            if slot:
+                self.stats_counter.invalidate()
+                self.slot_allocator.invalidate()
+            print(f"[DB-MONTHLY] ✅ Transaction committed successfully")
+            return True, "Thêm thành công!"
+        except sqlite3.IntegrityError as e:
+            print(f"[DB-MONTHLY] ❌ IntegrityError: {e}")
+            return False, "Lỗi: Mã thẻ hoặc Biển số có thể đã tồn tại!"
+        except Exception as e:
+            print(f"[DB-MONTHLY] ❌ Unexpected error: {e}")
+            import traceback
+            traceback.print_exc()
+            return False, f"Lỗi: {e}"
+
+    def import_monthly_tickets(self, rows, skip_invalid=False, dry_run=False):
+        """Nhập vé tháng hàng loạt (WRITE - 1 transaction: kiểm tra + executemany vé + reserve ô)
+        
+        Args:
+            rows: [(số dòng, {cột: giá trị})] - xem core/monthly_bulk.read_csv()
+            skip_invalid: True = vẫn ghi các dòng hợp lệ khi có dòng lỗi (mặc định: không ghi gì)
+            dry_run: Chỉ kiểm tra (READ), không ghi
+        
+        Returns:
+            dict: báo cáo {'total', 'imported', 'reserved_slots', 'errors', 'warnings', 'dry_run'}
+        """
+        try:
+            if dry_run:
                 with self.connect() as conn:
-                    cursor = conn.cursor()
-                    print(f"[DB-MONTHLY] Inserting: plate={plate}, owner={owner}, card={card}, type={v_type}, slot={slot}")
-                    cursor.execute("""
-                        INSERT INTO monthly_tickets 
-                        (plate_number, owner_name, card_id, vehicle_type, reg_date, exp_date, assigned_slot, avatar_path, status)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'ACTIVE')
-                    """, (plate, owner, card, v_type, reg, exp, slot, avatar))
-                    
-                    # Nếu có chỉ định slot, đánh dấu là reserved cho khách tháng
-                    if slot:
-                        print(f"[DB-MONTHLY] Marking slot {slot} as reserved")
-                        cursor.execute("UPDATE parking_slots SET is_reserved=1 WHERE slot_id=?", (slot,))
-                        
-                    print(f"[DB-MONTHLY] Committing transaction...")
-                    conn.commit()
-                    print(f"[DB-MONTHLY] ✅ Transaction committed successfully")
-                return True, "Thêm thành công!"
-            except sqlite3.IntegrityError as e:
-                print(f"[DB-MONTHLY] ❌ IntegrityError: {e}")
-                return False, "Lỗi: Mã thẻ hoặc Biển số có thể đã tồn tại!"
-            except Exception as e:
-                print(f"[DB-MONTHLY] ❌ Unexpected error: {e}")
-                import traceback
-                traceback.print_exc()
-                return False, f"Lỗi: {e}"
+                    return monthly_bulk.import_tickets(conn, rows, dry_run=True)
+            report = self._run_write(lambda conn: monthly_bulk.import_tickets(conn, rows, skip_invalid))
+            if report['imported']:
+                self.read_cache.invalidate('monthly_tickets')
+                self.stats_counter.invalidate()
+                self.slot_allocator.invalidate()
+            print(f"[DB-MONTHLY] ✅ Import {report['imported']}/{report['total']} vé tháng, "
+                  f"{len(report['errors'])} lỗi, reserve {report['reserved_slots']} ô")
+            return report
+        except Exception as e:
+            print(f"[DB-ERROR] import_monthly_tickets: {e}")
+            return {'total': len(rows), 'imported': 0, 'reserved_slots': 0,
+                    'errors': [(0, '', f"Lỗi: {e}")], 'warnings': [], 'dry_run': dry_run}
+
+    def export_monthly_tickets(self, path, fmt=None, chunk_size=2000):
+        """Xuất toàn bộ vé tháng ra CSV / XLSX theo từng chunk (READ), trả về số dòng"""
+        writer = exporter.open_writer(path, fmt)
+        count = 0
+        try:
+            writer.write_rows([[title for _, title in monthly_bulk.COLUMNS]])
+            with self.connect() as conn:
+                for chunk in monthly_bulk.iter_export_rows(conn, chunk_size):
+                    writer.write_rows(chunk)
+                    count += len(chunk)
+        finally:
+            writer.close()
+        print(f"[DB-MONTHLY] ✅ Đã xuất {count} vé tháng -> {path}")
+        return count
 
     # --- 4. TÌM KIẾM Ô ĐỖ TRỐNG (Cho tính năng Dẫn Hướng) ---
     def find_available_slot(self, vehicle_type, is_monthly=False):
         """
-        Tìm 1 ô trống phù hợp (READ - auto-close).
+        Tìm 1 ô trống phù hợp (READ - in-memory slot allocator, không giữ chỗ).
         - is_monthly=True: Tìm ô đã RESERVED (is_reserved=1) dành riêng cho khách tháng.
         - is_monthly=False: Tìm ô VÃNG LAI (is_reserved=0) trống (status=0).
+        
+        Để cho xe vào, dùng allocate_and_record_entry() - cấp ô và ghi DB trong 1 transaction.
         """
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                
-                # Debug: Kiểm tra tổng số slot
-                cursor.execute("""
-                    SELECT COUNT(*) FROM parking_slots 
-                    WHERE vehicle_type=?
-                """, (vehicle_type,))
-                total_slots = cursor.fetchone()[0]
-                
-                if is_monthly:
-                    # 🔴 VÉ THÁNG: Tìm ô RESERVED (is_reserved=1) và trống (status=0)
-                    cursor.execute("""
-                        SELECT COUNT(*) FROM parking_slots 
-                        WHERE vehicle_type=? AND is_reserved=1 AND status=0
-                    """, (vehicle_type,))
-                    available_count = cursor.fetchone()[0]
-                    
-                    cursor.execute("""
-                        SELECT slot_id FROM parking_slots 
-                        WHERE vehicle_type=? AND is_reserved=1 AND status=0 
-                        LIMIT 1
-                    """, (vehicle_type,))
-                    
-                    row = cursor.fetchone()
-                    if row:
-                        print(f"[DB] ✅ VÉ THÁNG: Tìm thấy slot RESERVED {row[0]} cho {vehicle_type} (Tổng: {total_slots}, Trống: {available_count})")
-                        return row[0]
-                    else:
-                        print(f"[DB] ❌ VÉ THÁNG: KHÔNG tìm thấy slot RESERVED cho {vehicle_type} (Tổng: {total_slots}, Trống: {available_count})")
-                        return None
-                else:
-                    # 🟢 KHÁCH VÃNG LAI: Tìm ô NOT RESERVED (is_reserved=0) và trống (status=0)
-                    cursor.execute("""
-                        SELECT COUNT(*) FROM parking_slots 
-                        WHERE vehicle_type=? AND is_reserved=0 AND status=0
-                    """, (vehicle_type,))
-                    available_count = cursor.fetchone()[0]
-                    
-                    cursor.execute("""
-                        SELECT slot_id FROM parking_slots 
-                        WHERE vehicle_type=? AND is_reserved=0 AND status=0 
-                        LIMIT 1
-                    """, (vehicle_type,))
-                    
-                    row = cursor.fetchone()
-                    if row:
-                        print(f"[DB] ✅ VÃNG LAI: Tìm thấy slot trống {row[0]} cho {vehicle_type} (Tổng: {total_slots}, Trống: {available_count})")
-                        return row[0]
-                    else:
-                        print(f"[DB] ❌ VÃNG LAI: KHÔNG tìm thấy slot cho {vehicle_type} (Tổng: {total_slots}, Trống: {available_count})")
-                        return None
-                        
+            self._refresh_slot_allocator()
+            vtype = VehicleType.coerce(vehicle_type)
+            slot_id = self.slot_allocator.peek(vtype, is_monthly)
+            available_count, class_total = self.slot_allocator.counts(vtype, is_monthly)
+            label = "VÉ THÁNG" if is_monthly else "VÃNG LAI"
+            if slot_id:
+                print(f"[DB] ✅ {label}: Tìm thấy slot trống {slot_id} cho {vehicle_type} (Tổng: {class_total}, Trống: {available_count})")
+            else:
+                print(f"[DB] ❌ {label}: KHÔNG tìm thấy slot cho {vehicle_type} (Tổng: {class_total}, Trống: {available_count})")
+            return slot_id
         except Exception as e:
             print(f"[DB-ERROR] find_available_slot: {e}")
             return None
 
+    def _refresh_slot_allocator(self):
+        """Nạp lại free list nếu chưa load / quá resync_interval / bị invalidate"""
+        if self.slot_allocator.needs_reload():
+            with self.connect() as conn:
+                self.slot_allocator.load(conn)
+
     def update_slot_status(self, slot_id, status):
         """Cập nhật trạng thái cảm biến (WRITE - single statement)"""
+        def do_update(conn):
+            conn.execute("UPDATE parking_slots SET status=? WHERE slot_id=?", (status, slot_id))
+        
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("UPDATE parking_slots SET status=? WHERE slot_id=?", (status, slot_id))
-                conn.commit()
+            epoch = self.stats_counter.begin()
+            self._run_write(do_update)
+            self.stats_counter.apply(epoch, slots={slot_id: status})
+            self.slot_allocator.set_status(slot_id, status)
         except Exception as e:
             print(f"[DB-ERROR] update_slot_status: {e}")
 
     def get_all_parking_slots(self):
-        """Lấy tất cả các slot để hiển thị sơ đồ bãi đỗ (READ - auto-close)"""
+        """Lấy tất cả các slot để hiển thị sơ đồ bãi đỗ (READ - pooled connection)"""
         try:
             with self.connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT slot_id, vehicle_type, is_reserved, status 
+                cursor.execute(f"""
+                    SELECT slot_id, {VehicleType.sql_label('vehicle_type')}, is_reserved, status 
                     FROM parking_slots 
                     ORDER BY slot_id
                 """)
@@ -345,7 +604,7 @@ class DBManager:
             return []
 
     def get_member_avatar(self, card_id):
-        """Lấy đường dẫn ảnh đại diện của thành viên theo card_id (READ - auto-close)"""
+        """Lấy đường dẫn ảnh đại diện của thành viên theo card_id (READ - pooled connection)"""
         try:
             with self.connect() as conn:
                 cursor = conn.cursor()
@@ -363,67 +622,82 @@ class DBManager:
     
     def delete_monthly_ticket(self, card_id):
         """Xóa vé tháng (WRITE - cập nhật slot và monthly_tickets)"""
-        with _db_write_lock:
-            try:
-                with self.connect() as conn:
-                    cursor = conn.cursor()
-                    
-                    # 1. Lấy assigned_slot từ vé tháng sắp xoá
-                    cursor.execute("SELECT assigned_slot FROM monthly_tickets WHERE card_id=?", (card_id,))
-                    result = cursor.fetchone()
-                    
-                    if not result:
-                        return False, "Không tìm thấy vé tháng!"
-                    
-                    assigned_slot = result[0]
-                    
-                    # 2. Xoá vé tháng
-                    cursor.execute("DELETE FROM monthly_tickets WHERE card_id=?", (card_id,))
-                    
-                    # 3. Reset slot về không reserved (nếu có assigned_slot)
-                    if assigned_slot:
-                        cursor.execute("UPDATE parking_slots SET is_reserved=0 WHERE slot_id=?", (assigned_slot,))
-                    
-                    conn.commit()
-                    print(f"[DB] ✅ Đã xóa vé tháng {card_id} và reset slot {assigned_slot}")
-                return True, "Đã xóa vé tháng thành công!"
-            except Exception as e:
-                print(f"[DB-ERROR] delete_monthly_ticket: {e}")
-                return False, f"Lỗi: {str(e)}"
+        def do_delete(conn):
+            cursor = conn.cursor()
+            
+            # 1. Lấy assigned_slot từ vé tháng sắp xoá
+            cursor.execute("SELECT assigned_slot FROM monthly_tickets WHERE card_id=?", (card_id,))
+            result = cursor.fetchone()
+            
+            if not result:
+                return False, "Không tìm thấy vé tháng!"
+            
+            assigned_slot = result[0]
+            
+            # 2. Xoá vé tháng
+            cursor.execute("DELETE FROM monthly_tickets WHERE card_id=?", (card_id,))
+            
+            # 3. Reset slot về không reserved (nếu có assigned_slot)
+            if assigned_slot:
+                cursor.execute("UPDATE parking_slots SET is_reserved=0 WHERE slot_id=?", (assigned_slot,))
+            
+            print(f"[DB] ✅ Đã xóa vé tháng {card_id} và reset slot {assigned_slot}")
+            return True, "Đã xóa vé tháng thành công!"
+        
+        try:
+            result = self._run_write(do_delete)
+            self.read_cache.invalidate('monthly_tickets')
+            self.stats_counter.invalidate()
+            self.slot_allocator.invalidate()
+            return result
+        except Exception as e:
+            print(f"[DB-ERROR] delete_monthly_ticket: {e}")
+            return False, f"Lỗi: {str(e)}"
     
     def extend_monthly_ticket(self, card_id, new_exp_date):
         """Gia hạn vé tháng (WRITE - single UPDATE statement)"""
+        def do_extend(conn):
+            conn.execute("""
+                UPDATE monthly_tickets 
+                SET exp_date=?, status=? 
+                WHERE card_id=?
+            """, (new_exp_date, TicketStatus.ACTIVE, card_id))
+        
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    UPDATE monthly_tickets 
-                    SET exp_date=?, status='ACTIVE' 
-                    WHERE card_id=?
-                """, (new_exp_date, card_id))
-                conn.commit()
+            self._run_write(do_extend)
+            self.read_cache.invalidate('monthly_tickets')
             return True, "Đã gia hạn vé tháng thành công!"
         except Exception as e:
             print(f"[DB-ERROR] extend_monthly_ticket: {e}")
             return False, f"Lỗi: {str(e)}"
     
     def get_monthly_ticket_info(self, card_id):
-        """Lấy thông tin vé tháng từ card_id (READ - auto-close)"""
-        try:
+        """Lấy thông tin vé tháng từ card_id (READ - read cache / pooled connection)
+        
+        Cache cả kết quả None (thẻ vãng lai) - key gồm ngày hiện tại vì điều kiện hết hạn đổi theo ngày
+        """
+        def load():
             with self.connect() as conn:
                 cursor = conn.cursor()
-                # ✅ Sử dụng date(..., '+7 hours') để match với Vietnam timezone
+                # ✅ So với ngày giờ Việt Nam (tham số ?) để match với Vietnam timezone
                 cursor.execute("""
                     SELECT plate_number, vehicle_type, assigned_slot, owner_name
                     FROM monthly_tickets 
-                    WHERE card_id=? AND status != 'DELETED' AND date('now', '+7 hours') <= exp_date
-                """, (card_id,))
+                    WHERE card_id=? AND status != ? AND ? <= exp_date
+                """, (card_id, TicketStatus.DELETED, today))
                 row = cursor.fetchone()
             
+            if row:
+                return (row[0], row[1], row[2], row[3])
+            return None
+        
+        try:
+            today = vietnam_today()
+            row = self.read_cache.get_or_load('monthly_tickets', (card_id, today), load)
             if row:
                 return {
                     'plate_number': row[0],
-                    'vehicle_type': row[1],
+                    'vehicle_type': VehicleType.label_of(row[1]),
                     'assigned_slot': row[2],
                     'owner_name': row[3]
                 }
@@ -433,7 +707,7 @@ class DBManager:
             return None
     
     def get_ticket_detail(self, card_id):
-        """Lấy thông tin chi tiết vé tháng (READ - auto-close)"""
+        """Lấy thông tin chi tiết vé tháng (READ - pooled connection)"""
         try:
             with self.connect() as conn:
                 cursor = conn.cursor()
@@ -448,7 +722,7 @@ class DBManager:
                 return {
                     'plate_number': row[0],
                     'owner_name': row[1],
-                    'vehicle_type': row[2],
+                    'vehicle_type': VehicleType.label_of(row[2]),
                     'exp_date': row[3]
                 }
             return None
@@ -456,253 +730,344 @@ class DBManager:
             print(f"[DB-ERROR] get_ticket_detail: {e}")
             return None
 
+    @staticmethod
+    def _insert_entry_session(cursor, card_id, plate_number, vehicle_type, slot_id, ticket_type, image_in_path):
+        """Thêm vào parking_sessions với slot_id và image_in_path (vehicle_type / ticket_type là mã số)
+        
+        Lưu ý: datetime('now', '+7 hours') để lưu theo Vietnam time (UTC+7),
+        time_in_ts là epoch của cùng thời điểm ('now' không đổi trong 1 câu lệnh)
+        
+        KIỂM TRA TRÙNG LẶP: unique index idx_sessions_open_card (migration v6) từ chối session
+        PARKING thứ 2 của cùng thẻ -> DuplicateEntryError, caller để _run_write rollback cả job
+        (thay cho SELECT kiểm tra trước khi ghi; quét lặp liên tục đã bị lọc ở NetworkServer)
+        """
+        try:
+            cursor.execute("""
+                INSERT INTO parking_sessions 
+                (card_id, plate_in, time_in, time_in_ts, status, ticket_type, vehicle_type, price, payment_method, slot_id, image_in_path)
+                VALUES (?, ?, datetime('now', '+7 hours'), CAST(strftime('%s', 'now') AS INTEGER), ?, ?, ?, 0, NULL, ?, ?)
+            """, (card_id, plate_number, SessionStatus.PARKING, ticket_type, vehicle_type, slot_id, image_in_path))
+        except sqlite3.IntegrityError as e:
+            if 'card_id' in str(e):
+                raise DuplicateEntryError(card_id) from e
+            raise
+        return cursor.lastrowid
+
     def record_entry(self, card_id, plate_number, vehicle_type, slot_id, ticket_type, image_in_path=None):
-        """Ghi nhận xe vào bãi (WRITE - thread-safe, with retry, auto-close)"""
-        def do_insert():
-            with _db_write_lock:
-                with self.connect() as conn:
-                    cursor = conn.cursor()
-                    
-                    # KIỂM TRA TRÙNG LẶP: Nếu thẻ này đã có session PARKING trong vòng 10 giây, bỏ qua
-                    cursor.execute("""
-                        SELECT id, time_in FROM parking_sessions
-                        WHERE card_id=? AND status='PARKING'
-                        AND datetime(time_in) > datetime('now', '-10 seconds')
-                        ORDER BY id DESC LIMIT 1
-                    """, (card_id,))
-                    
-                    existing = cursor.fetchone()
-                    if existing:
-                        session_id, time_in = existing
-                        print(f"[DB-WARN] ⚠️ Thẻ {card_id} đã có session #{session_id} lúc {time_in}, BỎ QUA!")
-                        return False
-                    
-                    print(f"[DB-ENTRY] ✅ Ghi nhận: {plate_number} ({vehicle_type}) @ {slot_id}")
-                    
-                    # Thêm vào parking_sessions với slot_id và image_in_path
-                    # Lưu ý: datetime('now', '+7 hours') để lưu theo Vietnam time (UTC+7)
-                    cursor.execute("""
-                        INSERT INTO parking_sessions 
-                        (card_id, plate_in, time_in, status, ticket_type, vehicle_type, price, payment_method, slot_id, image_in_path)
-                        VALUES (?, ?, datetime('now', '+7 hours'), 'PARKING', ?, ?, 0, NULL, ?, ?)
-                    """, (card_id, plate_number, ticket_type, vehicle_type, slot_id, image_in_path))
-                    
-                    session_id = cursor.lastrowid
-                    
-                    # Cập nhật trạng thái slot
-                    cursor.execute("UPDATE parking_slots SET status=1 WHERE slot_id=?", (slot_id,))
-                    print(f"[DB-ENTRY] Session #{session_id} created, Slot {slot_id} marked occupied")
-                    
-                    conn.commit()
-                    return True
+        """Ghi nhận xe vào bãi với ô đã chọn sẵn (WRITE - 1 transaction: session + slot)"""
+        codes = {}
+        
+        def do_insert(conn):
+            cursor = conn.cursor()
+            session_id = self._insert_entry_session(cursor, card_id, plate_number, codes['vehicle_type'],
+                                                    slot_id, codes['ticket_type'], image_in_path)
+            codes['session'] = self._fetch_session(conn, session_id)
+            print(f"[DB-ENTRY] ✅ Ghi nhận: {plate_number} ({vehicle_type}) @ {slot_id}")
+            
+            # Cập nhật trạng thái slot
+            cursor.execute("UPDATE parking_slots SET status=1 WHERE slot_id=?", (slot_id,))
+            print(f"[DB-ENTRY] Session #{session_id} created, Slot {slot_id} marked occupied")
+            return True
         
         try:
-            return _execute_with_retry(do_insert)
+            codes.update(vehicle_type=VehicleType.coerce(vehicle_type), ticket_type=TicketType.coerce(ticket_type))
+            epoch = self.stats_counter.begin()
+            registry_epoch = self.session_registry.begin()
+            created = self._run_write(do_insert)
+            if created:
+                self.stats_counter.apply(epoch, entered=codes['vehicle_type'], slots={slot_id: 1})
+                self.slot_allocator.set_status(slot_id, 1)
+                self.session_registry.add(registry_epoch, codes['session'])
+            return created
+        except DuplicateEntryError:
+            print(f"[DB-WARN] ⚠️ Thẻ {card_id} đã có session đang gửi, BỎ QUA!")
+            return False
         except Exception as e:
             print(f"[DB-ERROR] record_entry: {e}")
             return False
 
+    def allocate_and_record_entry(self, card_id, plate_number, vehicle_type, ticket_type,
+                                  image_in_path=None, preferred_slot=None):
+        """Cấp ô trống + ghi nhận xe vào (WRITE - 1 transaction: chiếm slot + session)
+        
+        - preferred_slot: ô riêng của vé tháng, dùng nếu còn trống; ngược lại cấp ô VÃNG LAI
+        - Ô được giữ trong allocator trước khi ghi nên các làn vào song song không trùng ô;
+          UPDATE ... WHERE status=0 xác nhận lại với DB trong cùng transaction
+        
+        Returns:
+            tuple: (slot_id, created) - slot_id=None nghĩa là hết chỗ,
+                   created=False nghĩa là trùng thẻ hoặc lỗi ghi DB
+        """
+        try:
+            vtype = VehicleType.coerce(vehicle_type)
+            ttype = TicketType.coerce(ticket_type)
+            self._refresh_slot_allocator()
+        except Exception as e:
+            print(f"[DB-ERROR] allocate_and_record_entry: {e}")
+            return None, False
+        
+        allocator = self.slot_allocator
+        if preferred_slot and allocator.claim(preferred_slot):
+            chosen = {'slot': preferred_slot}
+        else:
+            chosen = {'slot': allocator.reserve(vtype, is_monthly=False)}
+        if chosen['slot'] is None:
+            print(f"[DB] ❌ Hết chỗ cho {vehicle_type}")
+            return None, False
+        
+        def do_insert(conn):
+            cursor = conn.cursor()
+            
+            # Chiếm slot có điều kiện: nếu DB báo đã có xe thì lấy ô khác
+            while True:
+                cursor.execute("UPDATE parking_slots SET status=1 WHERE slot_id=? AND status=0",
+                               (chosen['slot'],))
+                if cursor.rowcount == 1:
+                    break
+                print(f"[DB-ENTRY] ⚠️ Slot {chosen['slot']} đã có xe trong DB, chọn ô khác")
+                allocator.conflict(chosen['slot'])
+                chosen['conflict'] = True
+                chosen['slot'] = allocator.reserve(vtype, is_monthly=False)
+                if chosen['slot'] is None:
+                    return False
+            
+            slot_id = chosen['slot']
+            session_id = self._insert_entry_session(cursor, card_id, plate_number, vtype,
+                                                    slot_id, ttype, image_in_path)
+            chosen['session'] = self._fetch_session(conn, session_id)
+            print(f"[DB-ENTRY] ✅ Ghi nhận: {plate_number} ({vehicle_type}) @ {slot_id}")
+            print(f"[DB-ENTRY] Session #{session_id} created, Slot {slot_id} marked occupied")
+            return True
+        
+        created = False
+        try:
+            epoch = self.stats_counter.begin()
+            registry_epoch = self.session_registry.begin()
+            created = self._run_write(do_insert)
+        except DuplicateEntryError:
+            print(f"[DB-WARN] ⚠️ Thẻ {card_id} đã có session đang gửi, BỎ QUA!")
+        except Exception as e:
+            print(f"[DB-ERROR] allocate_and_record_entry: {e}")
+        
+        slot_id = chosen['slot']
+        if slot_id is None:
+            return None, False
+        if created:
+            allocator.commit(slot_id)
+            self.stats_counter.apply(epoch, entered=vtype, slots={slot_id: 1})
+            self.session_registry.add(registry_epoch, chosen['session'])
+            if chosen.get('conflict'):
+                # DB lệch với snapshot (cảm biến / script ngoài) -> đếm lại
+                self.stats_counter.invalidate()
+        else:
+            allocator.release(slot_id)
+        return slot_id, created
+
+    @staticmethod
+    def _session_columns(conn):
+        """Các cột parking_sessions theo thứ tự bảng (như SELECT *), cột mã số đọc ra label"""
+        if DBManager._session_select is None:
+            coded = CODED_COLUMNS['parking_sessions']
+            names = [row[1] for row in conn.execute("PRAGMA main.table_info(parking_sessions)")]
+            DBManager._session_select = ", ".join(
+                f"{coded[name].sql_label(name)} AS {name}" if name in coded else name for name in names
+            )
+        return DBManager._session_select
+
+    def _fetch_session(self, conn, session_id):
+        """1 dòng parking_sessions theo id (sqlite3.Row, cùng cột với get_parking_session)"""
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        return cursor.execute(f"SELECT {self._session_columns(conn)} FROM parking_sessions WHERE id=?",
+                              (session_id,)).fetchone()
+
+    def _refresh_session_registry(self):
+        """Load lại registry session đang gửi nếu đã cũ (quá resync_interval / invalidate)"""
+        if self.session_registry.needs_reload():
+            with self.connect() as conn:
+                self.session_registry.load(
+                    conn,
+                    f"SELECT {self._session_columns(conn)} FROM parking_sessions "
+                    f"WHERE status={SessionStatus.PARKING.value}",
+                )
+
+    def load_session_registry(self):
+        """Nạp registry session đang gửi lúc khởi động (MainWindow gọi trên worker)"""
+        try:
+            self._refresh_session_registry()
+            return len(self.session_registry)
+        except Exception as e:
+            print(f"[DB-ERROR] load_session_registry: {e}")
+            return 0
+
     def get_parking_session(self, plate=None, card_id=None, status='PARKING'):
-        """Lấy phiên đỗ xe hiện tại của xe (READ - auto-close)"""
+        """Lấy phiên đỗ xe hiện tại của xe (READ - pooled connection)
+        
+        Trả về sqlite3.Row: vẫn truy cập theo index như tuple (session[0], session[4]...)
+        và theo tên cột (session['time_in_ts']). vehicle_type / ticket_type / status là label.
+        
+        status=PARKING (cổng ra) đọc từ registry trong bộ nhớ (core/session_registry.py),
+        biển số so sánh sau khi chuẩn hóa ('51A-999.99' = '51A99999'). Registry không có
+        thì vẫn tra DB: DB có mà registry không -> registry lệch, load lại lần sau
+        """
         try:
+            status = SessionStatus.coerce(status)
+            if status == SessionStatus.PARKING and (plate or card_id):
+                self._refresh_session_registry()
+                found, row = self.session_registry.find(plate=plate, card_id=card_id)
+                if row is not None:
+                    return row
+            else:
+                found = False
             with self.connect() as conn:
                 cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                columns = self._session_columns(conn)
+                
+                # status=PARKING viết literal để SQLite dùng được partial index
+                # idx_sessions_open_plate / idx_sessions_open_card (xem core/db_migrations.py)
+                if status == SessionStatus.PARKING:
+                    status_clause, params = f"status={SessionStatus.PARKING.value}", ()
+                else:
+                    status_clause, params = "status=?", (status,)
                 
                 if plate:
-                    cursor.execute("""
-                        SELECT * FROM parking_sessions 
-                        WHERE plate_in=? AND status=?
+                    cursor.execute(f"""
+                        SELECT {columns} FROM parking_sessions 
+                        WHERE plate_in=? AND {status_clause}
                         ORDER BY id DESC LIMIT 1
-                    """, (plate, status))
+                    """, (plate,) + params)
                 elif card_id:
-                    cursor.execute("""
-                        SELECT * FROM parking_sessions 
-                        WHERE card_id=? AND status=?
+                    cursor.execute(f"""
+                        SELECT {columns} FROM parking_sessions 
+                        WHERE card_id=? AND {status_clause}
                         ORDER BY id DESC LIMIT 1
-                    """, (card_id, status))
+                    """, (card_id,) + params)
                 else:
                     return None
                     
                 row = cursor.fetchone()
+            if found and row is not None:
+                print(f"[SESSIONS] ⚠️ Session #{row['id']} có trong DB nhưng thiếu trong registry")
+                self.session_registry.invalidate()
             return row
         except Exception as e:
             print(f"[DB-ERROR] get_parking_session: {e}")
             return None
 
     def record_exit(self, session_id, plate_number, fee, payment_method, image_out_path=None):
-        """Ghi nhận xe ra (WRITE - thread-safe, with retry, auto-close)"""
-        def do_update():
-            with _db_write_lock:
-                with self.connect() as conn:
-                    cursor = conn.cursor()
-                    
-                    # Lấy thông tin session để có slot_id và vehicle_type
-                    cursor.execute("""
-                        SELECT slot_id, vehicle_type FROM parking_sessions 
-                        WHERE id=?
-                    """, (session_id,))
-                    result = cursor.fetchone()
-                    
-                    if not result:
-                        return False
-                    
-                    slot_id, vehicle_type = result
-                    
-                    # Cập nhật session với image_out_path
-                    # Lưu ý: datetime('now', '+7 hours') để lưu theo Vietnam time (UTC+7)
-                    cursor.execute("""
-                        UPDATE parking_sessions 
-                        SET time_out=datetime('now', '+7 hours'), status='PAID', price=?, payment_method=?, image_out_path=?
-                        WHERE id=?
-                    """, (fee, payment_method, image_out_path, session_id))
-                    
-                    # Giải phóng slot
-                    if slot_id:
-                        # Nếu có slot_id, dùng nó trực tiếp
-                        cursor.execute("UPDATE parking_slots SET status=0 WHERE slot_id=?", (slot_id,))
-                        print(f"[DB-EXIT] Session #{session_id} closed, slot {slot_id} freed")
-                    else:
-                        # Nếu slot_id NULL (migration data), tìm slot đang occupied cho vehicle_type này
-                        cursor.execute("""
-                            SELECT slot_id FROM parking_slots 
-                            WHERE vehicle_type=? AND status=1 
-                            LIMIT 1
-                        """, (vehicle_type,))
-                        found_slot = cursor.fetchone()
-                        if found_slot:
-                            slot_to_free = found_slot[0]
-                            cursor.execute("UPDATE parking_slots SET status=0 WHERE slot_id=?", (slot_to_free,))
-                            print(f"[DB-EXIT] Session #{session_id} closed (legacy), slot {slot_to_free} freed")
-                        else:
-                            print(f"[DB-EXIT] Session #{session_id} closed (legacy), but couldn't find occupied slot to free")
-                    
-                    conn.commit()
-                    return True
+        """Ghi nhận xe ra (WRITE - 1 transaction: session + giải phóng slot)
+        
+        Chỉ đóng session còn PARKING: session đã đóng (quét lại thẻ ở cổng ra, bấm xác nhận 2 lần)
+        -> False, không ghi đè time_out / price và không giải phóng slot mà xe khác có thể đang dùng
+        """
+        closed = {}  # Thông tin cho stats_counter sau khi commit
+        
+        def do_update(conn):
+            cursor = conn.cursor()
+            
+            # Lấy thông tin session để có slot_id và vehicle_type
+            cursor.execute("""
+                SELECT slot_id, vehicle_type, status FROM parking_sessions 
+                WHERE id=?
+            """, (session_id,))
+            result = cursor.fetchone()
+            
+            if not result:
+                return False
+            
+            slot_id, vehicle_type, old_status = result
+            closed.update(vehicle_type=vehicle_type, slot=slot_id)
+            if old_status != SessionStatus.PARKING:
+                closed['already_closed'] = True
+                print(f"[DB-EXIT] ⚠️ Session #{session_id} đã đóng từ trước "
+                      f"({SessionStatus.label_of(old_status)}), bỏ qua")
+                return False
+            
+            # Cập nhật session với image_out_path
+            # Lưu ý: datetime('now', '+7 hours') để lưu theo Vietnam time (UTC+7)
+            # time_out_ts / duration_sec (epoch) tính luôn lúc xe ra - session cũ thiếu time_in_ts
+            # thì lấy từ text time_in
+            cursor.execute(f"""
+                UPDATE parking_sessions 
+                SET time_out=datetime('now', '+7 hours'),
+                    time_out_ts=CAST(strftime('%s', 'now') AS INTEGER),
+                    duration_sec=CAST(strftime('%s', 'now') AS INTEGER) - COALESCE(time_in_ts, {vn_epoch_sql('time_in')}),
+                    status=?, price=?, payment_method=?, image_out_path=?
+                WHERE id=? AND status=?
+            """, (SessionStatus.PAID, fee, payment_method, image_out_path, session_id, SessionStatus.PARKING))
+            if cursor.rowcount == 0:
+                closed['already_closed'] = True
+                print(f"[DB-EXIT] ⚠️ Session #{session_id} đã đóng từ trước, bỏ qua")
+                return False
+            daily_rollup.add_session(cursor, session_id)
+            
+            # Giải phóng slot
+            if slot_id:
+                # Nếu có slot_id, dùng nó trực tiếp
+                cursor.execute("UPDATE parking_slots SET status=0 WHERE slot_id=?", (slot_id,))
+                print(f"[DB-EXIT] Session #{session_id} closed, slot {slot_id} freed")
+            else:
+                # Nếu slot_id NULL (migration data), tìm slot đang occupied cho vehicle_type này
+                cursor.execute("""
+                    SELECT slot_id FROM parking_slots 
+                    WHERE vehicle_type=? AND status=1 
+                    LIMIT 1
+                """, (vehicle_type,))
+                found_slot = cursor.fetchone()
+                if found_slot:
+                    slot_to_free = found_slot[0]
+                    closed['slot'] = slot_to_free
+                    cursor.execute("UPDATE parking_slots SET status=0 WHERE slot_id=?", (slot_to_free,))
+                    print(f"[DB-EXIT] Session #{session_id} closed (legacy), slot {slot_to_free} freed")
+                else:
+                    print(f"[DB-EXIT] Session #{session_id} closed (legacy), but couldn't find occupied slot to free")
+            return True
         
         try:
-            return _execute_with_retry(do_update)
+            epoch = self.stats_counter.begin()
+            registry_epoch = self.session_registry.begin()
+            updated = self._run_write(do_update)
+            if updated:
+                self.session_registry.remove(registry_epoch, session_id)
+                if closed['slot']:
+                    self.slot_allocator.set_status(closed['slot'], 0)
+                slots = {closed['slot']: 0} if closed['slot'] else None
+                self.stats_counter.apply(epoch, exited=closed['vehicle_type'], slots=slots)
+            elif closed.get('already_closed'):
+                # Registry còn giữ session này (cổng ra vừa tìm thấy) -> bỏ để lần quét sau không tính phí lại
+                self.session_registry.remove(registry_epoch, session_id)
+            return updated
         except Exception as e:
             print(f"[DB-ERROR] record_exit: {e}")
             return False
 
     # --- 5. THỐNG KÊ DASHBOARD ---
     def get_available_slots_for_guests(self, vehicle_type):
-        """Tính số chỗ trống dành cho khách vãng lai (READ - auto-close)"""
+        """Tính số chỗ trống dành cho khách vãng lai (READ - stats snapshot)"""
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                
-                # Tổng slot non-reserved (dành cho guests)
-                cursor.execute("""
-                    SELECT COUNT(*) FROM parking_slots 
-                    WHERE vehicle_type=? AND is_reserved=0
-                """, (vehicle_type,))
-                total_guest_slots = cursor.fetchone()[0]
-                
-                # Số occupied GUEST slots
-                cursor.execute("""
-                    SELECT COUNT(*) FROM parking_slots 
-                    WHERE vehicle_type=? AND is_reserved=0 AND status=1
-                """, (vehicle_type,))
-                guest_slots_occupied = cursor.fetchone()[0]
-            
+            self._refresh_stats_counter()
             # Available = non-reserved slots - occupied non-reserved slots
-            available = max(0, total_guest_slots - guest_slots_occupied)
-            return available, total_guest_slots
+            return self.stats_counter.guest_slots(VehicleType.coerce(vehicle_type))
         except Exception as e:
             print(f"[DB-ERROR] get_available_slots_for_guests: {e}")
             return 0, 0
     
+    def _refresh_stats_counter(self):
+        """Load lại snapshot thống kê nếu đã cũ (sang ngày mới / quá resync_interval / invalidate)"""
+        if self.stats_counter.needs_reload():
+            with self.connect() as conn:
+                self.stats_counter.load(conn)
+    
     def get_parking_statistics(self):
-        """Lấy các thống kê cho dashboard (READ - auto-close)"""
+        """Lấy các thống kê cho dashboard (READ - stats snapshot)
+        
+        Đọc từ core/stats_counter.py: snapshot được tính bằng 1 câu truy vấn gộp
+        và cập nhật delta sau mỗi lệnh ghi nên mỗi lần refresh không phải query DB.
+        """
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                
-                # Helper: lấy COUNT an toàn
-                def safe_count(query):
-                    cursor.execute(query)
-                    result = cursor.fetchone()
-                    return result[0] if result else 0
-                
-                # Số xe máy đang gửi
-                motor_parking = safe_count("SELECT COUNT(*) FROM parking_sessions WHERE status='PARKING' AND vehicle_type='Xe máy'")
-                
-                # Số ô tô đang gửi
-                car_parking = safe_count("SELECT COUNT(*) FROM parking_sessions WHERE status='PARKING' AND vehicle_type='Ô tô'")
-                
-                # Tổng xe đã vào hôm nay
-                total_in_today = safe_count("SELECT COUNT(*) FROM parking_sessions WHERE date(time_in) = date('now', '+7 hours')")
-                
-                # Tổng xe đã ra hôm nay
-                total_out_today = safe_count("SELECT COUNT(*) FROM parking_sessions WHERE date(time_out) = date('now', '+7 hours') AND status='PAID'")
-                
-                # Tổng số chỗ ô tô
-                car_total = safe_count("SELECT COUNT(*) FROM parking_slots WHERE vehicle_type='Ô tô'")
-                
-                # Tổng số chỗ GUEST ô tô
-                car_guest_total = safe_count("SELECT COUNT(*) FROM parking_slots WHERE vehicle_type='Ô tô' AND is_reserved=0")
-                
-                # Tổng số chỗ MONTHLY ô tô
-                car_monthly_total = safe_count("SELECT COUNT(*) FROM parking_slots WHERE vehicle_type='Ô tô' AND is_reserved=1")
-                
-                # Tổng số chỗ xe máy
-                motor_total = safe_count("SELECT COUNT(*) FROM parking_slots WHERE vehicle_type='Xe máy'")
-                
-                # Tổng số chỗ GUEST xe máy
-                motor_guest_total = safe_count("SELECT COUNT(*) FROM parking_slots WHERE vehicle_type='Xe máy' AND is_reserved=0")
-                
-                # Tổng số chỗ MONTHLY xe máy
-                motor_monthly_total = safe_count("SELECT COUNT(*) FROM parking_slots WHERE vehicle_type='Xe máy' AND is_reserved=1")
-                
-                # Đếm số occupied MONTHLY slots (từ parking_slots nơi status=1 và is_reserved=1)
-                car_monthly_occupied = safe_count("""
-                    SELECT COUNT(*) FROM parking_slots 
-                    WHERE vehicle_type='Ô tô' AND is_reserved=1 AND status=1
-                """)
-                
-                motor_monthly_occupied = safe_count("""
-                    SELECT COUNT(*) FROM parking_slots 
-                    WHERE vehicle_type='Xe máy' AND is_reserved=1 AND status=1
-                """)
-                
-                # Đếm số occupied GUEST slots (từ parking_slots nơi status=1 và is_reserved=0)
-                car_guest_occupied = safe_count("""
-                    SELECT COUNT(*) FROM parking_slots 
-                    WHERE vehicle_type='Ô tô' AND is_reserved=0 AND status=1
-                """)
-                
-                motor_guest_occupied = safe_count("""
-                    SELECT COUNT(*) FROM parking_slots 
-                    WHERE vehicle_type='Xe máy' AND is_reserved=0 AND status=1
-                """)
-                
-                # Tính toán chỗ trống
-                car_guest_available = max(0, car_guest_total - car_guest_occupied)
-                motor_guest_available = max(0, motor_guest_total - motor_guest_occupied)
-                car_monthly_available = max(0, car_monthly_total - car_monthly_occupied)
-                motor_monthly_available = max(0, motor_monthly_total - motor_monthly_occupied)
-                car_available = car_total - car_parking
-                motor_available = motor_total - motor_parking
-            
-            return {
-                'motor_parking': motor_parking,
-                'car_parking': car_parking,
-                'total_in_today': total_in_today,
-                'total_out_today': total_out_today,
-                'car_available': car_available,
-                'car_total': car_total,
-                'car_guest_available': car_guest_available,
-                'car_guest_total': car_guest_total,
-                'car_monthly_available': car_monthly_available,
-                'car_monthly_total': car_monthly_total,
-                'motor_available': motor_available,
-                'motor_total': motor_total,
-                'motor_guest_available': motor_guest_available,
-                'motor_guest_total': motor_guest_total,
-                'motor_monthly_available': motor_monthly_available,
-                'motor_monthly_total': motor_monthly_total,
-            }
+            self._refresh_stats_counter()
+            return self.stats_counter.snapshot()
         except Exception as e:
             print(f"[DB-ERROR] get_parking_statistics: {e}")
             return {
@@ -713,71 +1078,238 @@ class DBManager:
             }
     
     # --- 7. LỊCH SỬ GIAO DỊCH ---
-    def get_parking_history(self, plate=None, date_from=None, date_to=None, time_from=None, time_to=None, status=None):
+    # {{table}} được format() khi truy vấn; vehicle_type / ticket_type / status đọc ra label
+    _HISTORY_COLUMNS = f"""
+        SELECT ps.id, ps.card_id, ps.plate_in, ps.time_in, ps.time_out, 
+               ps.slot_id, {VehicleType.sql_label('ps.vehicle_type')}, {TicketType.sql_label('ps.ticket_type')}, 
+               CASE WHEN ps.ticket_type = {TicketType.MONTHLY.value} THEN COALESCE(mt.owner_name, '') ELSE '' END as owner_name,
+               ps.price, ps.payment_method, {SessionStatus.sql_label('ps.status')}, 
+               ps.image_in_path, ps.image_out_path,
+               COALESCE(ps.duration_sec / 3600, 0) as duration_hours,
+               COALESCE(ps.duration_sec / 60 % 60, 0) as duration_minutes
+        FROM {{table}} ps
+        LEFT JOIN monthly_tickets mt ON ps.card_id = mt.card_id AND ps.ticket_type = {TicketType.MONTHLY.value}
+    """
+
+    def _history_tables(self):
+        """Bảng session cho lịch sử: file chính + file archive (nếu đã tạo - core/archiver.py)"""
+        if DBManager._archive_ready:
+            return ('main.parking_sessions', 'archive.parking_sessions')
+        return ('main.parking_sessions',)
+
+    def _history_filters(self, plate=None, date_from=None, date_to=None, time_from=None, time_to=None, status=None,
+                         table='main.parking_sessions'):
+        """WHERE cho lịch sử giao dịch - so sánh số nguyên trên ps.time_in_ts (chỉ đổi tham số
+        sang epoch, không bọc hàm quanh cột) để dùng được idx_sessions_time_in_ts;
+        biển số lọc qua sessions_plate_fts (trigram) thay cho LIKE '%...%' (archive dùng LIKE)
+        
+        Returns:
+            tuple: (where_sql, params)
+        """
+        where = "WHERE 1=1"
+        params = []
+        
+        if plate and plate.strip():
+            fts = self._fts_match('sessions_plate_fts', plate.strip()) if table == 'main.parking_sessions' else None
+            if fts:
+                where += f" AND ps.id IN ({fts[0]})"
+                params.append(fts[1])
+            else:
+                where += " AND ps.plate_in LIKE ?"
+                params.append(f"%{plate.strip()}%")
+        
+        if date_from:
+            where += f" AND ps.time_in_ts >= {vn_epoch_sql('?')}"
+            params.append(f"{date_from} {time_from}" if time_from else date_from)
+        
+        if date_to:
+            if time_to:
+                where += f" AND ps.time_in_ts <= {vn_epoch_sql('?')}"
+                params.append(f"{date_to} {time_to}")
+            else:
+                where += " AND ps.time_in_ts < " + vn_epoch_sql("date(?, '+1 day')")
+                params.append(date_to)
+        
+        if status:
+            where += " AND ps.status = ?"
+            params.append(SessionStatus.coerce(status))
+        
+        return where, params
+
+    def _query_history(self, filters, limit, before_id=None):
+        """`limit` dòng lịch sử mới nhất (id < before_id) từ file chính + archive
+        
+        Mỗi bảng là 1 truy vấn `ORDER BY id DESC LIMIT` riêng (dùng được index),
+        sau đó gộp theo id giảm dần
+        """
+        rows = []
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            for table in self._history_tables():
+                where, params = self._history_filters(*filters, table=table)
+                if before_id is not None:
+                    where += " AND ps.id < ?"
+                    params.append(before_id)
+                cursor.execute(f"{self._HISTORY_COLUMNS.format(table=table)} {where} ORDER BY ps.id DESC LIMIT ?",
+                               params + [limit])
+                rows.extend(cursor.fetchall())
+        if len(self._history_tables()) > 1:
+            rows.sort(key=lambda row: row[0], reverse=True)
+        return rows[:limit]
+
+    def get_parking_history(self, plate=None, date_from=None, date_to=None, time_from=None, time_to=None, status=None,
+                            limit=1000):
+        """
+        Lấy lịch sử giao dịch với các bộ lọc (READ - pooled connection)
+        
+        Chỉ trả về `limit` bản ghi mới nhất - để duyệt toàn bộ lịch sử dùng get_parking_history_page()
+        """
+        try:
+            return self._query_history((plate, date_from, date_to, time_from, time_to, status), limit)
+        except Exception as e:
+            print(f"[DB-ERROR] get_parking_history: {e}")
+            return []
+
+    def search_sessions_by_plate(self, query, limit=50):
+        """Các lượt gửi xe mới nhất có biển số chứa `query` (READ - pooled connection)"""
+        return self.get_parking_history(plate=query, limit=limit)
+
+    def get_parking_history_page(self, plate=None, date_from=None, date_to=None, time_from=None, time_to=None,
+                                 status=None, before_id=None, page_size=10):
+        """
+        Lấy 1 trang lịch sử giao dịch theo keyset (READ - pooled connection)
+        
+        Trang đầu: before_id=None. Trang kế tiếp: before_id = next_before_id của trang trước.
+        Mỗi trang chỉ là 1 truy vấn `id < ? ORDER BY id DESC LIMIT ?` (mỗi file DB) nên chi phí
+        không phụ thuộc trang đang xem nằm sâu tới đâu.
+        
+        Returns:
+            tuple: (rows, next_before_id) - next_before_id=None nghĩa là hết dữ liệu
+        """
+        try:
+            # Lấy dư 1 dòng để biết còn trang sau hay không
+            rows = self._query_history((plate, date_from, date_to, time_from, time_to, status),
+                                       page_size + 1, before_id)
+            if len(rows) > page_size:
+                rows = rows[:page_size]
+                return rows, rows[-1][0]
+            return rows, None
+        except Exception as e:
+            print(f"[DB-ERROR] get_parking_history_page: {e}")
+            return [], None
+
+    def count_parking_history(self, plate=None, date_from=None, date_to=None, time_from=None, time_to=None,
+                              status=None, cap=10000):
         """
-        Lấy lịch sử giao dịch với các bộ lọc (READ - auto-close)
+        Đếm số bản ghi lịch sử khớp bộ lọc, dừng ở `cap` để không quét hết bảng (READ - pooled connection)
+        
+        cap=None: đếm chính xác (dùng cho xuất file - core/exporter.py)
+        
+        Returns:
+            tuple: (count, is_exact) - is_exact=False nghĩa là có ít nhất `cap` bản ghi
         """
         try:
+            count = 0
             with self.connect() as conn:
                 cursor = conn.cursor()
-                
-                query = """
-                    SELECT ps.id, ps.card_id, ps.plate_in, ps.time_in, ps.time_out, 
-                           ps.slot_id, ps.vehicle_type, ps.ticket_type, 
-                           CASE WHEN ps.ticket_type = 'MONTHLY' THEN COALESCE(mt.owner_name, '') ELSE '' END as owner_name,
-                           ps.price, ps.payment_method, ps.status, 
-                           ps.image_in_path, ps.image_out_path,
-                           CASE WHEN ps.time_out IS NOT NULL THEN CAST((julianday(ps.time_out) - julianday(ps.time_in)) * 24 AS INTEGER) ELSE 0 END as duration_hours,
-                           CASE WHEN ps.time_out IS NOT NULL THEN CAST(CAST((julianday(ps.time_out) - julianday(ps.time_in)) * 24 * 60 AS INTEGER) % 60 AS INTEGER) ELSE 0 END as duration_minutes
-                    FROM parking_sessions ps
-                    LEFT JOIN monthly_tickets mt ON ps.card_id = mt.card_id AND ps.ticket_type = 'MONTHLY'
-                    WHERE 1=1
-                """
-                params = []
-                
-                if plate and plate.strip():
-                    query += " AND ps.plate_in LIKE ?"
-                    params.append(f"%{plate.strip()}%")
-                
-                if date_from:
-                    if time_from:
-                        query += " AND datetime(ps.time_in) >= datetime(?)"
-                        params.append(f"{date_from} {time_from}")
-                    else:
-                        query += " AND date(ps.time_in) >= date(?)"
-                        params.append(date_from)
-                
-                if date_to:
-                    if time_to:
-                        query += " AND datetime(ps.time_in) <= datetime(?)"
-                        params.append(f"{date_to} {time_to}")
+                for table in self._history_tables():
+                    if cap is not None and count >= cap:
+                        break
+                    where, params = self._history_filters(plate, date_from, date_to, time_from, time_to, status,
+                                                          table=table)
+                    if cap is None:
+                        cursor.execute(f"SELECT COUNT(*) FROM {table} ps {where}", params)
                     else:
-                        query += " AND date(ps.time_in) <= date(?)"
-                        params.append(date_to)
-                
-                if status:
-                    query += " AND ps.status = ?"
-                    params.append(status)
-                
-                query += " ORDER BY ps.id DESC LIMIT 1000"
-                
-                cursor.execute(query, params)
-                rows = cursor.fetchall()
-            
-            return rows
+                        cursor.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} ps {where} LIMIT ?)",
+                                       params + [cap - count])
+                    count += cursor.fetchone()[0]
+            return count, cap is None or count < cap
         except Exception as e:
-            print(f"[DB-ERROR] get_parking_history: {e}")
-            return []
+            print(f"[DB-ERROR] count_parking_history: {e}")
+            return 0, True
+
+    def iter_parking_history(self, plate=None, date_from=None, date_to=None, time_from=None, time_to=None,
+                             status=None, chunk_size=2000):
+        """
+        Duyệt toàn bộ lịch sử khớp bộ lọc, mới nhất trước, từng list `chunk_size` dòng (READ - generator)
+        
+        Mỗi chunk là 1 truy vấn keyset riêng (như get_parking_history_page) nên không giữ lock đọc
+        giữa các chunk và bộ nhớ không phụ thuộc số dòng. Exception được ném cho caller.
+        """
+        filters = (plate, date_from, date_to, time_from, time_to, status)
+        before_id = None
+        while True:
+            rows = self._query_history(filters, chunk_size, before_id)
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            before_id = rows[-1][0]
+
+    def export_parking_history(self, path, fmt=None, chunk_size=2000, progress=None, cancel_event=None, **filters):
+        """Xuất lịch sử khớp bộ lọc ra CSV / XLSX theo luồng - xem core/exporter.py"""
+        return exporter.export_history(self, path, filters, fmt=fmt, chunk_size=chunk_size,
+                                       progress=progress, cancel_event=cancel_event)
+
+    # --- 7b. ARCHIVE (HOT/COLD) + BẢO TRÌ ---
+    def archive_old_sessions(self, older_than_days=None, batch_size=None):
+        """Chuyển session đã thanh toán, ra bãi quá N ngày sang file archive (WRITE - nhiều transaction ngắn)
+        
+        Mỗi batch là 1 lệnh ghi riêng -> lượt xe vào/ra vẫn chen vào giữa các batch
+        
+        Returns:
+            int: Tổng số session đã chuyển, -1 nếu lỗi
+        """
+        days = self.archive_after_days if older_than_days is None else older_than_days
+        batch_size = batch_size or int(DB_CONFIG.get("archive_batch_size", 5000))
+        if not self.archive_path or days <= 0:
+            return 0
+        self._ensure_pragma()
+        if not DBManager._archive_ready:
+            print("[DB-ARCHIVE] ⚠️ Archive chưa sẵn sàng, bỏ qua")
+            return -1
+        
+        cutoff_ts = int(time.time()) - days * 86400
+        total = 0
+        try:
+            while True:
+                moved = self._run_write(lambda conn: archiver.archive_batch(conn, cutoff_ts, batch_size))
+                total += moved
+                if moved < batch_size:
+                    break
+        except Exception as e:
+            print(f"[DB-ERROR] archive_old_sessions: {e}")
+            return -1
+        finally:
+            if total:
+                self.stats_counter.invalidate()
+        if total:
+            print(f"[DB-ARCHIVE] ✅ Đã chuyển {total} session (> {days} ngày) sang {self.archive_path}")
+        return total
+
+    def run_maintenance(self):
+        """Archive session cũ + ANALYZE + incremental vacuum file chính (chạy định kỳ trên worker)
+        
+        Returns:
+            dict: {'archived': n, 'freelist_before': n, 'freelist_after': n, ...}
+        """
+        result = {'archived': self.archive_old_sessions()}
+        try:
+            result.update(self._run_write(archiver.maintain))
+        except Exception as e:
+            print(f"[DB-ERROR] run_maintenance: {e}")
+        print(f"[DB-MAINT] {result}")
+        return result
 
     def get_last_entry_session(self):
-        """Lấy phiên vào cuối cùng (READ - auto-close)"""
+        """Lấy phiên vào cuối cùng (READ - pooled connection)"""
         try:
             with self.connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT id, plate_in, time_in, vehicle_type, slot_id 
+                cursor.execute(f"""
+                    SELECT id, plate_in, time_in, {VehicleType.sql_label('vehicle_type')}, slot_id 
                     FROM parking_sessions 
-                    ORDER BY time_in DESC LIMIT 1
+                    ORDER BY time_in_ts DESC LIMIT 1
                 """)
                 row = cursor.fetchone()
             return row
@@ -786,15 +1318,15 @@ class DBManager:
             return None
 
     def get_last_exit_session(self):
-        """Lấy phiên ra cuối cùng (READ - auto-close)"""
+        """Lấy phiên ra cuối cùng (READ - pooled connection)"""
         try:
             with self.connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT id, plate_in, time_out, price, payment_method, slot_id, vehicle_type
+                cursor.execute(f"""
+                    SELECT id, plate_in, time_out, price, payment_method, slot_id, {VehicleType.sql_label('vehicle_type')}
                     FROM parking_sessions 
-                    WHERE status='PAID' 
-                    ORDER BY time_out DESC LIMIT 1
+                    WHERE status={SessionStatus.PAID.value} 
+                    ORDER BY time_out_ts DESC LIMIT 1
                 """)
                 row = cursor.fetchone()
             return row
@@ -811,23 +1343,38 @@ class DBManager:
         conn.close()
         return row
 
-    def get_revenue_by_date_range(self, date_from, date_to):
-        """Lấy doanh thu trong khoảng ngày (READ - auto-close)"""
+    def get_revenue_by_date_range(self, date_from, date_to, group_by='day', snapshot=False):
+        """Lấy doanh thu trong khoảng ngày từ bảng daily_rollup (READ - pooled connection)
+        
+        Args:
+            group_by: 'day' -> key 'YYYY-MM-DD', 'month' -> key 'YYYY-MM'
+            snapshot: True = đọc từ snapshot nếu snapshot được tạo sau khi ngày date_to đã hết
+                      (số liệu đã chốt), ngược lại đọc file đang chạy - xem connect_report()
+        
+        Returns:
+            list: [(key, count, revenue, motor_count, car_count)] mới nhất trước
+        """
+        key = "substr(day, 1, 7)" if group_by == 'month' else "day"
         try:
-            with self.connect() as conn:
+            if snapshot:
+                # 0h (giờ VN) ngày sau date_to
+                day_end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+                min_created = (day_end - datetime(1970, 1, 1)).total_seconds() - VN_OFFSET_SEC
+                connect = self.connect_report(min_created=min_created)
+            else:
+                connect = self.connect()
+            with connect as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT DATE(time_out) as date, 
-                           COUNT(*) as count, 
-                           SUM(price) as revenue,
-                           SUM(CASE WHEN vehicle_type='Xe máy' THEN 1 ELSE 0 END) as motor_count,
-                           SUM(CASE WHEN vehicle_type='Ô tô' THEN 1 ELSE 0 END) as car_count
-                    FROM parking_sessions 
-                    WHERE time_out IS NOT NULL 
-                    AND DATE(time_out) BETWEEN ? AND ?
-                    AND status IN ('PAID', 'COMPLETED')
-                    GROUP BY DATE(time_out)
-                    ORDER BY date DESC
+                cursor.execute(f"""
+                    SELECT {key} as period, 
+                           SUM(exits) as count, 
+                           SUM(revenue) as revenue,
+                           SUM(CASE WHEN vehicle_type={VehicleType.MOTOR.value} THEN exits ELSE 0 END) as motor_count,
+                           SUM(CASE WHEN vehicle_type={VehicleType.CAR.value} THEN exits ELSE 0 END) as car_count
+                    FROM daily_rollup 
+                    WHERE day >= ? AND day <= ?
+                    GROUP BY period
+                    ORDER BY period DESC
                 """, (date_from, date_to))
                 rows = cursor.fetchall()
             return rows if rows else []
@@ -835,8 +1382,27 @@ class DBManager:
             print(f"[DB-ERROR] get_revenue_by_date_range: {e}")
             return []
 
+    def rebuild_daily_rollup(self, date_from=None, date_to=None):
+        """Tính lại daily_rollup từ parking_sessions (WRITE - 1 transaction)
+        
+        Dùng sau khi dữ liệu session bị sửa/xóa ngoài record_exit (script dọn dẹp, import...).
+        
+        Returns:
+            int: Số dòng rollup được ghi, -1 nếu lỗi
+        """
+        def do_rebuild(conn):
+            return daily_rollup.rebuild(conn.cursor(), date_from, date_to)
+        
+        try:
+            rows = self._run_write(do_rebuild)
+            print(f"[DB-ROLLUP] ✅ Rebuilt daily_rollup ({date_from or '...'} -> {date_to or '...'}): {rows} dòng")
+            return rows
+        except Exception as e:
+            print(f"[DB-ERROR] rebuild_daily_rollup: {e}")
+            return -1
+
     def get_all_users(self):
-        """Lấy danh sách tất cả người dùng (READ - auto-close)"""
+        """Lấy danh sách tất cả người dùng (READ - pooled connection)"""
         try:
             with self.connect() as conn:
                 cursor = conn.cursor()
@@ -848,7 +1414,7 @@ class DBManager:
             return []
     
     def get_user_by_username(self, username):
-        """Lấy thông tin user theo username (READ - auto-close)"""
+        """Lấy thông tin user theo username (READ - pooled connection)"""
         try:
             with self.connect() as conn:
                 cursor = conn.cursor()
@@ -860,25 +1426,21 @@ class DBManager:
             return None
 
     def add_user(self, username, password, full_name, role):
-        """Thêm người dùng mới (WRITE - thread-safe with lock)
+        """Thêm người dùng mới (WRITE - serialized writer)
         
         Note: password should be plain text OR already hashed
         This method assumes password is plain text and will hash it.
         """
-        def do_insert():
-            with _db_write_lock:
-                with self.connect() as conn:
-                    cursor = conn.cursor()
-                    # Do NOT hash again - password is already hashed by caller
-                    cursor.execute("""
-                        INSERT INTO users (username, password, full_name, role, is_active)
-                        VALUES (?, ?, ?, ?, 1)
-                    """, (username, password, full_name, role))
-                    conn.commit()
+        def do_insert(conn):
+            # Do NOT hash again - password is already hashed by caller
+            conn.execute("""
+                INSERT INTO users (username, password, full_name, role, is_active)
+                VALUES (?, ?, ?, ?, 1)
+            """, (username, password, full_name, role))
             return True, "Thêm thành công!"
         
         try:
-            return _execute_with_retry(do_insert)
+            return self._run_write(do_insert)
         except sqlite3.IntegrityError as e:
             print(f"[DB-ERROR] IntegrityError: {e}")
             return False, "Username đã tồn tại hoặc dữ liệu trùng lặp!"
@@ -887,26 +1449,25 @@ class DBManager:
             return False, f"Lỗi: {str(e)}"
 
     def delete_user(self, user_id):
-        """Xóa người dùng (WRITE - thread-safe with lock)"""
+        """Xóa người dùng (WRITE - serialized writer)"""
+        def do_delete(conn):
+            conn.execute("DELETE FROM users WHERE id=?", (user_id,))
+        
         try:
-            with _db_write_lock:
-                with self.connect() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM users WHERE id=?", (user_id,))
-                    conn.commit()
+            self._run_write(do_delete)
+            self.read_cache.invalidate('user_permissions')
             return True
         except Exception as e:
             print(f"[DB-ERROR] delete_user: {e}")
             return False
 
     def update_user_role(self, user_id, role):
-        """Cập nhật vai trò người dùng (WRITE - thread-safe with lock)"""
+        """Cập nhật vai trò người dùng (WRITE - serialized writer)"""
+        def do_update(conn):
+            conn.execute("UPDATE users SET role=? WHERE id=?", (role, user_id))
+        
         try:
-            with _db_write_lock:
-                with self.connect() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("UPDATE users SET role=? WHERE id=?", (role, user_id))
-                    conn.commit()
+            self._run_write(do_update)
             return True
         except Exception as e:
             print(f"[DB-ERROR] update_user_role: {e}")
@@ -927,14 +1488,15 @@ class DBManager:
     
     def add_user_permission(self, user_id, permission_code):
         """Thêm quyền cho nhân viên (WRITE - single INSERT statement)"""
+        def do_insert(conn):
+            conn.execute("""
+                INSERT INTO user_permissions (user_id, permission_code)
+                VALUES (?, ?)
+            """, (user_id, permission_code))
+        
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO user_permissions (user_id, permission_code)
-                    VALUES (?, ?)
-                """, (user_id, permission_code))
-                conn.commit()
+            self._run_write(do_insert)
+            self.read_cache.invalidate('user_permissions')
             return True
         except Exception as e:
             print(f"[DB-ERROR] add_user_permission: {e}")
@@ -942,22 +1504,23 @@ class DBManager:
     
     def remove_user_permission(self, user_id, permission_code):
         """Xóa quyền của nhân viên (WRITE - single DELETE statement)"""
+        def do_delete(conn):
+            conn.execute("""
+                DELETE FROM user_permissions 
+                WHERE user_id=? AND permission_code=?
+            """, (user_id, permission_code))
+        
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    DELETE FROM user_permissions 
-                    WHERE user_id=? AND permission_code=?
-                """, (user_id, permission_code))
-                conn.commit()
+            self._run_write(do_delete)
+            self.read_cache.invalidate('user_permissions')
             return True
         except Exception as e:
             print(f"[DB-ERROR] remove_user_permission: {e}")
             return False
     
-    def get_user_permissions(self, user_id):
-        """Lấy danh sách quyền của nhân viên (READ - auto-close)"""
-        try:
+    def _cached_permissions(self, user_id):
+        """Tuple mã quyền của nhân viên (read cache) - exception được ném lại cho caller"""
+        def load():
             with self.connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
@@ -965,45 +1528,51 @@ class DBManager:
                     WHERE user_id=?
                 """, (user_id,))
                 rows = cursor.fetchall()
-            return [row[0] for row in rows]
+            return tuple(row[0] for row in rows)
+        
+        return self.read_cache.get_or_load('user_permissions', user_id, load)
+    
+    def get_user_permissions(self, user_id):
+        """Lấy danh sách quyền của nhân viên (READ - read cache / pooled connection)"""
+        try:
+            return list(self._cached_permissions(user_id))
         except Exception as e:
             print(f"[DB-ERROR] get_user_permissions: {e}")
             return []
     
     def has_permission(self, user_id, permission_code):
-        """Kiểm tra nhân viên có quyền hay không (READ - auto-close)"""
+        """Kiểm tra nhân viên có quyền hay không (READ - read cache / pooled connection)"""
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT 1 FROM user_permissions 
-                    WHERE user_id=? AND permission_code=?
-                """, (user_id, permission_code))
-                result = cursor.fetchone() is not None
-            return result
+            return permission_code in self._cached_permissions(user_id)
         except Exception as e:
             print(f"[DB-ERROR] has_permission: {e}")
             return False
     
     def set_user_permissions(self, user_id, permission_list):
-        """Cập nhật toàn bộ quyền của nhân viên (WRITE - thread-safe, auto-close)"""
-        with _db_write_lock:
-            try:
-                with self.connect() as conn:
-                    cursor = conn.cursor()
-                    
-                    # Xóa tất cả quyền cũ
-                    cursor.execute("DELETE FROM user_permissions WHERE user_id=?", (user_id,))
-                    
-                    # Thêm quyền mới
-                    for perm in permission_list:
-                        cursor.execute("""
-                            INSERT INTO user_permissions (user_id, permission_code)
-                            VALUES (?, ?)
-                        """, (user_id, perm))
-                    
-                    conn.commit()
-                return True
-            except Exception as e:
-                print(f"[DB-ERROR] set_user_permissions: {e}")
-                return False
\ No newline at end of file
+        """Cập nhật toàn bộ quyền của nhân viên (WRITE - 1 transaction)"""
+        def do_replace(conn):
+            # Xóa tất cả quyền cũ
+            conn.execute("DELETE FROM user_permissions WHERE user_id=?", (user_id,))
+            
+            # Thêm quyền mới
+            conn.executemany("""
+                INSERT INTO user_permissions (user_id, permission_code)
+                VALUES (?, ?)
+            """, [(user_id, perm) for perm in permission_list])
+        
+        try:
+            self._run_write(do_replace)
+            self.read_cache.invalidate('user_permissions')
+            return True
+        except Exception as e:
+            print(f"[DB-ERROR] set_user_permissions: {e}")
+            return False
+
+
+# Đo latency mọi method public của DBManager (trừ các method quản lý / thống kê)
+db_instrumentation.instrument_methods(
+    DBManager,
+    lambda db: getattr(db, 'instrumentation', None),
+    exclude=('connect', 'connect_report', 'iter_parking_history', 'get_pool_stats', 'get_query_stats', 'dump_query_stats', 'reset_query_stats',
+             'close_pool', 'hash_password'),
+)
@@ -0,0 +1,424 @@
+"""
+Schema Migrations - Cập nhật schema database theo phiên bản
+Mỗi migration là 1 bước "up" idempotent, được ghi lại trong bảng schema_version
+
+Thêm migration mới: viết hàm _mXXX(cursor) và thêm vào MIGRATIONS theo thứ tự version.
+"""
+
+import re
+import sqlite3
+
+from core import daily_rollup
+from core import enums
+from core.vn_time import vn_epoch_sql
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def _table_exists(cursor, table):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    return cursor.fetchone() is not None
+
+
+# ============================================================================
+# MIGRATIONS
+# ============================================================================
+
+def _m001_legacy_columns(cursor):
+    """Gom các migration ad-hoc cũ (database.migrate_db, migrate_add_status.py)"""
+    if _table_exists(cursor, 'parking_sessions') and not _column_exists(cursor, 'parking_sessions', 'slot_id'):
+        cursor.execute("ALTER TABLE parking_sessions ADD COLUMN slot_id TEXT")
+    if _table_exists(cursor, 'monthly_tickets') and not _column_exists(cursor, 'monthly_tickets', 'status'):
+        cursor.execute("ALTER TABLE monthly_tickets ADD COLUMN status TEXT DEFAULT 'ACTIVE'")
+
+
+def _m002_access_path_indexes(cursor):
+    """Index cho các truy vấn ở cổng vào/ra, dashboard, lịch sử và doanh thu"""
+    statements = [
+        # Partial (chỉ xe đang gửi -> index rất nhỏ dù bảng có hàng triệu phiên):
+        # cổng ra tra theo biển số / thẻ, record_entry kiểm tra trùng thẻ
+        "CREATE INDEX IF NOT EXISTS idx_sessions_open_plate ON parking_sessions(plate_in) "
+        "WHERE status='PARKING'",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_open_card ON parking_sessions(card_id, time_in) "
+        "WHERE status='PARKING'",
+        # Covering: đếm xe đang gửi theo loại xe (get_parking_statistics)
+        "CREATE INDEX IF NOT EXISTS idx_sessions_status_vtype ON parking_sessions(status, vehicle_type)",
+        # Lọc lịch sử / phiên vào gần nhất theo thời gian vào
+        "CREATE INDEX IF NOT EXISTS idx_sessions_time_in ON parking_sessions(time_in)",
+        # Covering: doanh thu theo ngày + phiên ra gần nhất
+        "CREATE INDEX IF NOT EXISTS idx_sessions_status_time_out "
+        "ON parking_sessions(status, time_out, vehicle_type, price)",
+        # Covering: tìm ô trống / đếm ô theo loại xe, loại vé (slot_id kèm theo để khỏi đọc bảng)
+        "CREATE INDEX IF NOT EXISTS idx_slots_lookup "
+        "ON parking_slots(vehicle_type, is_reserved, status, slot_id)",
+        # Vé tháng: tra theo biển số, đếm theo loại xe
+        "CREATE INDEX IF NOT EXISTS idx_monthly_plate ON monthly_tickets(plate_number)",
+        "CREATE INDEX IF NOT EXISTS idx_monthly_type_status ON monthly_tickets(vehicle_type, status)",
+    ]
+    for sql in statements:
+        cursor.execute(sql)
+    cursor.execute("ANALYZE")
+
+
+def _m003_epoch_timestamps(cursor):
+    """Cột epoch time_in_ts/time_out_ts + duration_sec (tính lúc xe ra), backfill dữ liệu cũ
+
+    Index theo thời gian chuyển từ cột text sang cột epoch. Trigger giữ các cột epoch
+    đúng khi script cũ chỉ ghi time_in/time_out dạng text.
+    """
+    for column in ('time_in_ts', 'time_out_ts', 'duration_sec'):
+        if not _column_exists(cursor, 'parking_sessions', column):
+            cursor.execute(f"ALTER TABLE parking_sessions ADD COLUMN {column} INTEGER")
+
+    recompute = f"""
+        time_in_ts = {vn_epoch_sql('time_in')},
+        time_out_ts = {vn_epoch_sql('time_out')},
+        duration_sec = {vn_epoch_sql('time_out')} - {vn_epoch_sql('time_in')}
+    """
+    cursor.execute(f"UPDATE parking_sessions SET {recompute}")
+
+    cursor.execute("DROP INDEX IF EXISTS idx_sessions_time_in")
+    cursor.execute("DROP INDEX IF EXISTS idx_sessions_status_time_out")
+    # Lọc lịch sử / phiên vào gần nhất
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_time_in_ts ON parking_sessions(time_in_ts)")
+    # Covering: doanh thu theo ngày + phiên ra gần nhất
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_status_time_out_ts "
+                   "ON parking_sessions(status, time_out_ts, vehicle_type, price)")
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_ts_insert
+        AFTER INSERT ON parking_sessions
+        WHEN NEW.time_in_ts IS NULL AND NEW.time_in IS NOT NULL
+        BEGIN
+            UPDATE parking_sessions SET {recompute} WHERE id = NEW.id;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_ts_update
+        AFTER UPDATE OF time_in, time_out ON parking_sessions
+        WHEN (NEW.time_in IS NOT OLD.time_in AND NEW.time_in_ts IS OLD.time_in_ts)
+          OR (NEW.time_out IS NOT OLD.time_out AND NEW.time_out_ts IS OLD.time_out_ts)
+        BEGIN
+            UPDATE parking_sessions SET {recompute} WHERE id = NEW.id;
+        END
+    """)
+    cursor.execute("ANALYZE parking_sessions")
+
+
+def _m004_daily_rollup(cursor):
+    """Bảng daily_rollup (doanh thu / lượt xe theo ngày) + tính từ dữ liệu cũ"""
+    cursor.execute(daily_rollup.CREATE_TABLE_SQL)
+    daily_rollup.rebuild(cursor)
+
+
+def _fts5_trigram_available(cursor):
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x, tokenize='trigram')")
+        cursor.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _create_fts_index(cursor, fts_table, source_table, columns):
+    """FTS5 trigram (external content) cho source_table + trigger đồng bộ insert/update/delete"""
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table}
+        USING fts5({cols}, content='{source_table}', content_rowid='id', tokenize='trigram')
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_ai AFTER INSERT ON {source_table} BEGIN
+            INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_vals});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_ad AFTER DELETE ON {source_table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_au AFTER UPDATE OF {cols} ON {source_table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+            INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_vals});
+        END
+    """)
+    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def _m005_trigram_search(cursor):
+    """Index tìm kiếm chuỗi con (FTS5 trigram): biển số lịch sử, vé tháng (biển số / chủ xe / mã thẻ)
+
+    SQLite không có FTS5 -> bỏ qua, DBManager tự dùng LIKE như trước.
+    """
+    if not _fts5_trigram_available(cursor):
+        print("[DB-MIGRATE] ⚠️ SQLite không hỗ trợ FTS5 trigram, tìm kiếm dùng LIKE")
+        return
+    _create_fts_index(cursor, 'sessions_plate_fts', 'parking_sessions', ['plate_in'])
+    _create_fts_index(cursor, 'monthly_tickets_fts', 'monthly_tickets', ['plate_number', 'owner_name', 'card_id'])
+
+
+def _m006_unique_open_card(cursor):
+    """Mỗi thẻ tối đa 1 session PARKING: idx_sessions_open_card thành UNIQUE(card_id)
+
+    record_entry không còn SELECT kiểm tra trùng thẻ trước khi ghi - INSERT vi phạm index bị
+    từ chối (IntegrityError). Dữ liệu cũ có thẻ nhiều session đang mở: giữ session mới nhất,
+    các session cũ hơn chuyển sang 'CANCELLED' (không tính doanh thu / xe đang gửi) và ô đỗ
+    của chúng được trả về trống (trừ ô vẫn còn session PARKING khác).
+    """
+    duplicates = cursor.execute("""
+        SELECT id, slot_id FROM parking_sessions
+        WHERE status='PARKING' AND card_id IS NOT NULL
+          AND id < (SELECT MAX(p2.id) FROM parking_sessions p2
+                    WHERE p2.card_id = parking_sessions.card_id AND p2.status='PARKING')
+    """).fetchall()
+    if duplicates:
+        cursor.executemany("UPDATE parking_sessions SET status='CANCELLED' WHERE id=?",
+                           [(session_id,) for session_id, _ in duplicates])
+        freed = 0
+        for slot_id in {slot_id for _, slot_id in duplicates if slot_id}:
+            cursor.execute("""
+                UPDATE parking_slots SET status=0
+                WHERE slot_id=? AND status=1
+                  AND NOT EXISTS (SELECT 1 FROM parking_sessions WHERE slot_id=? AND status='PARKING')
+            """, (slot_id, slot_id))
+            freed += cursor.rowcount
+        print(f"[DB-MIGRATE] ⚠️ {len(duplicates)} session PARKING trùng thẻ -> CANCELLED, "
+              f"giải phóng {freed} ô đỗ")
+    cursor.execute("DROP INDEX IF EXISTS idx_sessions_open_card")
+    cursor.execute("CREATE UNIQUE INDEX idx_sessions_open_card ON parking_sessions(card_id) "
+                   "WHERE status='PARKING'")
+
+
+def _coded_column_sql(sql, column, enum):
+    """Khai báo cột `column TEXT [DEFAULT '...']` trong CREATE TABLE -> INTEGER [DEFAULT mã số]"""
+    def repl(match):
+        default = match.group(3)
+        ddl = f"{match.group(1)}INTEGER{match.group(2) or ''}"
+        if default is not None:
+            ddl += f" DEFAULT {enum.coerce(default).value}"
+        return ddl
+    return re.sub(rf"(\b{column}\s+)TEXT\b(\s+NOT\s+NULL)?(?:\s+DEFAULT\s+'([^']*)')?", repl, sql,
+                  count=1, flags=re.IGNORECASE)
+
+
+def _coded_literal_sql(sql, column, enum):
+    """Điều kiện `column='LABEL'` trong index / trigger -> `column=mã số`"""
+    return re.sub(rf"\b{column}\s*=\s*'([^']*)'", lambda m: f"{column}={enum.coerce(m.group(1)).value}", sql)
+
+
+def convert_enum_columns(cursor, table, schema='main'):
+    """Dựng lại `schema.table` với các cột enums.CODED_COLUMNS[table] kiểu INTEGER (copy + đổi mã)
+
+    SQLite không đổi được kiểu cột -> tạo bảng mới, INSERT ... SELECT với CASE đổi text sang mã số,
+    DROP bảng cũ, RENAME, tạo lại index / trigger (literal 'PARKING' trong partial index -> mã số).
+    Cột đã là INTEGER thì bỏ qua. Giá trị không nhận ra thành NULL (có cảnh báo).
+
+    Returns:
+        bool: True nếu đã dựng lại bảng
+    """
+    coded = enums.CODED_COLUMNS[table]
+    info = cursor.execute(f"PRAGMA {schema}.table_info({table})").fetchall()
+    if not info or all(row[2].upper() == 'INTEGER' for row in info if row[1] in coded):
+        return False
+
+    master = f"{schema}.sqlite_master"
+    sql = cursor.execute(f"SELECT sql FROM {master} WHERE type='table' AND name=?", (table,)).fetchone()[0]
+    dependents = [row[0] for row in cursor.execute(
+        f"SELECT sql FROM {master} WHERE tbl_name=? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,))]
+    sequence = None
+    if cursor.execute(f"SELECT 1 FROM {master} WHERE name='sqlite_sequence'").fetchone():
+        row = cursor.execute(f"SELECT seq FROM {schema}.sqlite_sequence WHERE name=?", (table,)).fetchone()
+        sequence = row[0] if row else None
+
+    for column, enum in coded.items():
+        unknown = cursor.execute(
+            f"SELECT COUNT(*), GROUP_CONCAT(DISTINCT {column}) FROM {schema}.{table} "
+            f"WHERE {column} IS NOT NULL AND ({enum.sql_code(column)}) IS NULL"
+        ).fetchone()
+        if unknown[0]:
+            print(f"[DB-MIGRATE] ⚠️ {table}.{column}: {unknown[0]} dòng giá trị lạ ({unknown[1]}) -> NULL")
+        sql = _coded_column_sql(sql, column, enum)
+
+    new_table = f"{table}__coded"
+    sql = re.sub(rf'^\s*CREATE TABLE\s+"?{table}"?', f"CREATE TABLE {schema}.{new_table}", sql,
+                 count=1, flags=re.IGNORECASE)
+    cursor.execute(f"DROP TABLE IF EXISTS {schema}.{new_table}")  # Còn sót từ lần chạy dở
+    cursor.execute(sql)
+    columns = [row[1] for row in info]
+    select = ", ".join(f"{coded[c].sql_code(c)}" if c in coded else c for c in columns)
+    cursor.execute(f"INSERT INTO {schema}.{new_table} ({', '.join(columns)}) SELECT {select} FROM {schema}.{table}")
+    cursor.execute(f"DROP TABLE {schema}.{table}")
+    cursor.execute(f"ALTER TABLE {schema}.{new_table} RENAME TO {table}")
+    if sequence is not None:
+        # Giữ seq AUTOINCREMENT cũ (id đã cấp rồi xóa không được dùng lại)
+        cursor.execute(f"UPDATE {schema}.sqlite_sequence SET seq=MAX(seq, ?) WHERE name=?", (sequence, table))
+
+    for ddl in dependents:
+        for column, enum in coded.items():
+            ddl = _coded_literal_sql(ddl, column, enum)
+        if schema != 'main':
+            ddl = re.sub(r"^(\s*CREATE\s+(?:UNIQUE\s+)?(?:INDEX|TRIGGER)\s+)", rf"\g<1>{schema}.", ddl,
+                         count=1, flags=re.IGNORECASE)
+        cursor.execute(ddl)
+    return True
+
+
+def _create_coded_triggers(cursor, table):
+    """Trigger đổi text -> mã số khi script cũ còn ghi label ('Xe máy', 'PARKING'...) vào bảng"""
+    coded = enums.CODED_COLUMNS[table]
+    is_text = " OR ".join(f"typeof(NEW.{column}) = 'text'" for column in coded)
+    convert = ", ".join(f"{column} = {enum.sql_code(column)}" for column, enum in coded.items())
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_coded_insert
+        AFTER INSERT ON {table}
+        WHEN {is_text}
+        BEGIN
+            UPDATE {table} SET {convert} WHERE rowid = NEW.rowid;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_coded_update
+        AFTER UPDATE OF {', '.join(coded)} ON {table}
+        WHEN {is_text}
+        BEGIN
+            UPDATE {table} SET {convert} WHERE rowid = NEW.rowid;
+        END
+    """)
+
+
+def _m007_integer_enums(cursor):
+    """vehicle_type / ticket_type / status lưu mã số nguyên (core/enums.py) + bảng tra cứu
+
+    parking_sessions, parking_slots, monthly_tickets được dựng lại với cột INTEGER; daily_rollup
+    đổi khóa sang mã số. Script cũ còn ghi text thì trigger tự đổi sang mã số (đọc text sẽ
+    không còn khớp - dùng bảng tra cứu: JOIN vehicle_types ON code = vehicle_type).
+    """
+    for enum, lookup in enums.LOOKUP_TABLES:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {lookup} (
+                code INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                label TEXT NOT NULL
+            )
+        """)
+        cursor.executemany(f"INSERT OR REPLACE INTO {lookup} (code, name, label) VALUES (?, ?, ?)",
+                           [(member.value, member.name, member.label) for member in enum])
+
+    for table in ('parking_sessions', 'parking_slots', 'monthly_tickets'):
+        if _table_exists(cursor, table):
+            convert_enum_columns(cursor, table)
+            _create_coded_triggers(cursor, table)
+
+    # daily_rollup: bảng mới với khóa mã số. Đã có archive.parking_sessions (chưa đổi mã, không
+    # tính lại được) thì gộp các dòng cũ theo mã số, ngược lại tính lại từ parking_sessions
+    old = _table_exists(cursor, 'daily_rollup')
+    if old:
+        cursor.execute("ALTER TABLE daily_rollup RENAME TO daily_rollup__text")
+    cursor.execute(daily_rollup.CREATE_TABLE_SQL)
+    archived = cursor.execute("SELECT 1 FROM pragma_database_list WHERE name='archive'").fetchone() and \
+        cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE type='table' AND name='parking_sessions'").fetchone()
+    if old and archived:
+        vehicle = enums.VehicleType.sql_code('vehicle_type')
+        ticket = enums.TicketType.sql_code('ticket_type')
+        cursor.execute(f"""
+            INSERT INTO daily_rollup (day, vehicle_type, ticket_type, payment_method, exits, revenue, dwell_sec)
+            SELECT day, COALESCE({vehicle}, 0), COALESCE({ticket}, 0), payment_method,
+                   SUM(exits), SUM(revenue), SUM(dwell_sec)
+            FROM daily_rollup__text
+            GROUP BY 1, 2, 3, 4
+        """)
+    else:
+        daily_rollup.rebuild(cursor)
+    cursor.execute("DROP TABLE IF EXISTS daily_rollup__text")
+    cursor.execute("ANALYZE")
+
+
+# (version, mô tả, hàm up)
+MIGRATIONS = [
+    (1, "Legacy columns: parking_sessions.slot_id, monthly_tickets.status", _m001_legacy_columns),
+    (2, "Indexes cho parking_sessions, parking_slots, monthly_tickets", _m002_access_path_indexes),
+    (3, "Epoch time_in_ts/time_out_ts + duration_sec cho parking_sessions", _m003_epoch_timestamps),
+    (4, "Bảng daily_rollup (doanh thu / lượt xe theo ngày)", _m004_daily_rollup),
+    (5, "FTS5 trigram: tìm biển số / chủ xe / mã thẻ", _m005_trigram_search),
+    (6, "Unique index: mỗi thẻ tối đa 1 session PARKING", _m006_unique_open_card),
+    (7, "Mã số nguyên cho vehicle_type / ticket_type / status + bảng tra cứu", _m007_integer_enums),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def _ensure_version_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+
+def get_schema_version(conn):
+    """Phiên bản schema hiện tại (0 nếu chưa chạy migration nào)"""
+    _ensure_version_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn, target_version=None, verbose=True):
+    """
+    Chạy các migration còn thiếu theo thứ tự, mỗi bước trong 1 transaction riêng.
+
+    Args:
+        conn: sqlite3 connection
+        target_version: Dừng ở version này (None = mới nhất)
+
+    Returns:
+        list: Các version vừa được áp dụng
+    """
+    current = get_schema_version(conn)
+    applied = []
+
+    for version, description, up in MIGRATIONS:
+        if version <= current:
+            continue
+        if target_version is not None and version > target_version:
+            break
+        if verbose:
+            print(f"[DB-MIGRATE] Áp dụng v{version}: {description}")
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            up(cursor)
+            cursor.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                           (version, description))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[DB-MIGRATE] ❌ Lỗi migration v{version}: {e}")
+            raise
+        applied.append(version)
+
+    if verbose and applied:
+        print(f"[DB-MIGRATE] ✅ Schema version: {applied[-1]}")
+    return applied
+
+
+def migrate_database(db_path, target_version=None, verbose=True):
+    """Mở db_path và chạy run_migrations (dùng cho script / CLI)"""
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    try:
+        return run_migrations(conn, target_version=target_version, verbose=verbose)
+    finally:
+        conn.close()
@@ -0,0 +1,265 @@
+"""
+Connection Pool cho SQLite
+Tái sử dụng connection thay vì mở/đóng sqlite3.connect() ở mỗi lần gọi DBManager
+
+- Reader: mỗi thread giữ 1 connection riêng (thread-local), tối đa `max_readers` connection.
+  Khi vượt quá giới hạn sẽ mở connection tạm (overflow) và đóng ngay sau khi dùng.
+- Writer: 1 connection duy nhất dùng chung, được bảo vệ bởi write lock.
+- Health check: connection quá `health_check_interval` giây chưa kiểm tra sẽ được ping
+  bằng `SELECT 1` trước khi dùng lại, hỏng thì mở connection mới.
+- attachments: {alias: path} được ATTACH trên mọi connection (vd: file archive - core/archiver.py).
+- factory: class connection truyền cho sqlite3.connect (vd: InstrumentedConnection - core/db_instrumentation.py);
+  on_lock_wait(seconds) được gọi mỗi khi phải chờ write lock.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+# PRAGMA áp dụng cho TỪNG connection (không lưu trong file DB)
+DEFAULT_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=10000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class ConnectionPool:
+    """Pool connection SQLite: thread-local readers + 1 writer dùng chung"""
+
+    def __init__(self, db_path, max_readers=8, timeout=120.0, health_check_interval=30.0,
+                 write_lock=None, pragmas=DEFAULT_CONNECTION_PRAGMAS, attachments=None,
+                 factory=None, on_lock_wait=None):
+        self.db_path = db_path
+        self.max_readers = max_readers
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.pragmas = tuple(pragmas)
+        self.attachments = dict(attachments or {})
+        self.factory = factory or sqlite3.Connection
+        self.on_lock_wait = on_lock_wait
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._readers = {}  # {connection: owner_thread}
+        self._write_lock = write_lock if write_lock is not None else threading.RLock()
+        self._writer = None
+        self._writer_checked_at = 0.0
+        self._closed = False
+
+        self._stats = {
+            'reader_hits': 0,        # Dùng lại connection của thread
+            'reader_misses': 0,      # Phải mở connection mới cho thread
+            'reader_overflow': 0,    # Vượt max_readers -> connection tạm
+            'writer_hits': 0,
+            'writer_misses': 0,
+            'health_failures': 0,    # Connection hỏng bị loại bỏ
+            'reaped': 0,             # Connection của thread đã kết thúc bị đóng
+            'write_lock_waits': 0,   # Số lần phải chờ write lock (thread khác đang ghi)
+        }
+
+    # ------------------------------------------------------------------
+    # Tạo / kiểm tra connection
+    # ------------------------------------------------------------------
+    def _create_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                               factory=self.factory)
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        for alias, path in self.attachments.items():
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _release(conn):
+        """Trả connection về trạng thái sạch (rollback phần chưa commit)"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    # ------------------------------------------------------------------
+    # Readers (thread-local)
+    # ------------------------------------------------------------------
+    def _reap_dead_readers(self):
+        """Đóng connection của các thread đã kết thúc (gọi khi đang giữ self._lock)"""
+        dead = [conn for conn, owner in self._readers.items() if not owner.is_alive()]
+        for conn in dead:
+            del self._readers[conn]
+            self._close_quietly(conn)
+            self._stats['reaped'] += 1
+
+    def _acquire_reader(self):
+        """Trả về (connection, pooled). pooled=False nghĩa là connection tạm phải đóng sau khi dùng."""
+        entry = getattr(self._local, 'reader', None)
+        if entry is not None:
+            conn, checked_at = entry
+            now = time.monotonic()
+            if now - checked_at < self.health_check_interval or self._is_healthy(conn):
+                entry[1] = now
+                self._count('reader_hits')
+                return conn, True
+            # Connection hỏng -> bỏ đi, mở lại bên dưới
+            self._count('health_failures')
+            self._discard_local_reader()
+
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool đã đóng")
+            if len(self._readers) >= self.max_readers:
+                self._reap_dead_readers()
+            self._stats['reader_misses'] += 1
+            if len(self._readers) >= self.max_readers:
+                self._stats['reader_overflow'] += 1
+                overflow = True
+            else:
+                overflow = False
+                conn = self._create_connection()
+                self._readers[conn] = threading.current_thread()
+
+        if overflow:
+            return self._create_connection(), False
+
+        self._local.reader = [conn, time.monotonic()]
+        return conn, True
+
+    def _discard_local_reader(self):
+        entry = getattr(self._local, 'reader', None)
+        if entry is None:
+            return
+        conn = entry[0]
+        self._local.reader = None
+        with self._lock:
+            self._readers.pop(conn, None)
+        self._close_quietly(conn)
+
+    @contextmanager
+    def reader(self):
+        """Mượn connection đọc của thread hiện tại"""
+        conn, pooled = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if pooled:
+                self._release(conn)
+            else:
+                self._close_quietly(conn)
+
+    # ------------------------------------------------------------------
+    # Writer (dùng chung, tuần tự hóa bởi write lock)
+    # ------------------------------------------------------------------
+    def _acquire_writer(self):
+        """Gọi khi đang giữ write lock"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool đã đóng")
+        now = time.monotonic()
+        if self._writer is not None:
+            if now - self._writer_checked_at < self.health_check_interval or self._is_healthy(self._writer):
+                self._writer_checked_at = now
+                self._count('writer_hits')
+                return self._writer
+            self._count('health_failures')
+            self._close_quietly(self._writer)
+            self._writer = None
+
+        self._writer = self._create_connection()
+        self._writer_checked_at = now
+        self._count('writer_misses')
+        return self._writer
+
+    def _lock_writer(self):
+        """Lấy write lock, đo thời gian chờ nếu thread khác đang giữ"""
+        if self._write_lock.acquire(blocking=False):
+            return
+        start = time.perf_counter()
+        self._write_lock.acquire()
+        self._count('write_lock_waits')
+        if self.on_lock_wait is not None:
+            self.on_lock_wait(time.perf_counter() - start)
+
+    @contextmanager
+    def writer(self):
+        """Mượn connection ghi (giữ write lock trong suốt context)"""
+        self._lock_writer()
+        try:
+            conn = self._acquire_writer()
+            try:
+                yield conn
+            finally:
+                self._release(conn)
+        finally:
+            self._write_lock.release()
+
+    # ------------------------------------------------------------------
+    # Quản lý & metrics
+    # ------------------------------------------------------------------
+    def get_stats(self):
+        """Snapshot metrics của pool (hit/miss, overflow, health check)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open_readers'] = len(self._readers)
+        stats['max_readers'] = self.max_readers
+        stats['writer_open'] = self._writer is not None
+        reader_total = stats['reader_hits'] + stats['reader_misses']
+        stats['reader_hit_rate'] = stats['reader_hits'] / reader_total if reader_total else 0.0
+        return stats
+
+    def close_all(self):
+        """Đóng toàn bộ connection (gọi khi tắt ứng dụng)"""
+        with self._lock:
+            self._closed = True
+            readers = list(self._readers)
+            self._readers.clear()
+        for conn in readers:
+            self._close_quietly(conn)
+        with self._write_lock:
+            if self._writer is not None:
+                self._close_quietly(self._writer)
+                self._writer = None
+
+
+# ===== POOL DÙNG CHUNG THEO DB PATH =====
+# Nhiều DBManager() (main, login_dialog, user_management...) dùng chung 1 pool cho cùng 1 file
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, **kwargs):
+    """Lấy (hoặc tạo) pool dùng chung cho db_path"""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_path, **kwargs)
+            _pools[db_path] = pool
+        return pool
+
+
+def close_all_pools():
+    """Đóng tất cả pool đang mở"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
@@ -0,0 +1,150 @@
+"""
+Writer Thread cho SQLite (chế độ WAL)
+Tất cả lệnh ghi được đưa vào 1 hàng đợi và thực thi tuần tự bởi 1 thread duy nhất
+
+- submit(func) trả về concurrent.futures.Future; func(conn) chạy trên writer connection
+  và KHÔNG được tự gọi conn.commit()
+- Group commit: các job đang chờ trong hàng đợi được gom thành 1 transaction
+  (tối đa `max_batch` job), mỗi job nằm trong SAVEPOINT riêng nên job lỗi
+  chỉ rollback phần của nó, các job khác vẫn được commit
+- Với WAL, reader không bao giờ chặn writer nên không cần retry/backoff khi ghi
+"""
+
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+
+_STOP = object()
+
+
+class DBWriter:
+    """Thread ghi duy nhất cho 1 file database"""
+
+    def __init__(self, pool, max_batch=32):
+        self.pool = pool
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._running = True
+        self._stats = {'jobs': 0, 'batches': 0, 'failed_jobs': 0, 'max_batch_seen': 0}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="DBWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, func):
+        """Đưa job ghi vào hàng đợi, trả về Future chứa giá trị func(conn) trả về"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Không thể submit job từ chính writer thread (deadlock)")
+        future = Future()
+        if not self._running:
+            future.set_exception(sqlite3.ProgrammingError("DB writer đã dừng"))
+            return future
+        self._queue.put((func, future))
+        return future
+
+    def queue_depth(self):
+        """Số job đang chờ ghi"""
+        return self._queue.qsize()
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self.queue_depth()
+        return stats
+
+    def stop(self, timeout=5.0):
+        """Dừng writer sau khi ghi hết các job đã nhận"""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # ------------------------------------------------------------------
+    def _collect_batch(self, first):
+        """Gom các job đang chờ sẵn (không block) vào cùng 1 transaction"""
+        batch = [first]
+        stop = False
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch, stop = self._collect_batch(item)
+            self._execute_batch(batch)
+            if stop:
+                break
+
+    def _execute_batch(self, batch):
+        done = []  # [(future, result)] chờ commit
+        failed = 0
+        try:
+            with self.pool.writer() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for func, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT db_writer_job")
+                    try:
+                        result = func(conn)
+                    except BaseException as e:
+                        conn.execute("ROLLBACK TO db_writer_job")
+                        conn.execute("RELEASE db_writer_job")
+                        future.set_exception(e)
+                        failed += 1
+                        continue
+                    conn.execute("RELEASE db_writer_job")
+                    done.append((future, result))
+                conn.commit()
+        except BaseException as e:
+            # Commit (hoặc BEGIN) thất bại -> toàn bộ job chưa trả kết quả đều lỗi
+            print(f"[DB-WRITER] ❌ Group commit thất bại: {e}")
+            for func, future in batch:
+                if not future.done():
+                    if future.running() or future.set_running_or_notify_cancel():
+                        future.set_exception(e)
+            return
+
+        for future, result in done:
+            future.set_result(result)
+
+        with self._stats_lock:
+            self._stats['jobs'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['failed_jobs'] += failed
+            self._stats['max_batch_seen'] = max(self._stats['max_batch_seen'], len(batch))
+
+
+# ===== WRITER DÙNG CHUNG THEO DB PATH =====
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(pool, max_batch=32):
+    """Lấy (hoặc khởi động) writer thread dùng chung cho pool.db_path"""
+    with _writers_lock:
+        writer = _writers.get(pool.db_path)
+        if writer is None or not writer._running:
+            writer = DBWriter(pool, max_batch=max_batch)
+            _writers[pool.db_path] = writer
+        return writer
+
+
+def stop_writer(db_path):
+    """Dừng writer thread của db_path (nếu có)"""
+    with _writers_lock:
+        writer = _writers.pop(db_path, None)
+    if writer is not None:
+        writer.stop()
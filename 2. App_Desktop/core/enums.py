@@ -0,0 +1,120 @@
+"""
+Mã số nguyên cho các cột phân loại (migration v7 - core/db_migrations.py)
+vehicle_type / ticket_type / status lưu INTEGER thay cho text tiếng Việt ('Xe máy', 'PARKING'...):
+dòng và index nhỏ hơn, so sánh số nguyên, không còn lỗi gõ sai literal ('Ô tó')
+
+- Mỗi enum có bảng tra cứu (code, name, label) trong DB cho truy vấn tay / script ngoài
+- label = giá trị text cũ: DBManager vẫn nhận / trả label cho UI, mã số chỉ dùng bên trong
+- coerce(): đổi label / alias / mã số / member sang member; sql_label() / sql_code(): biểu thức CASE
+"""
+
+from enum import IntEnum
+
+
+class CodedEnum(IntEnum):
+    """IntEnum kèm label (text hiển thị, cũng là giá trị text cũ trong DB) và alias viết sai đã gặp"""
+
+    def __new__(cls, code, label, *aliases):
+        member = int.__new__(cls, code)
+        member._value_ = code
+        member.label = label
+        member.aliases = aliases
+        return member
+
+    @classmethod
+    def coerce(cls, value):
+        """Member từ mã số / label / alias, None nếu value rỗng
+
+        Raises:
+            ValueError: value không thuộc enum
+        """
+        if value is None or value == '':
+            return None
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, int):
+            return cls(value)
+        text = str(value).strip()
+        for member in cls:
+            if text == member.label or text in member.aliases or text == member.name:
+                return member
+        if text.isdigit():
+            return cls(int(text))
+        raise ValueError(f"{cls.__name__}: giá trị không hợp lệ {value!r}")
+
+    @classmethod
+    def label_of(cls, value):
+        """Label của mã số / member (None giữ nguyên None)"""
+        member = cls.coerce(value)
+        return member.label if member is not None else None
+
+    @classmethod
+    def labels(cls):
+        return tuple(member.label for member in cls)
+
+    @classmethod
+    def sql_label(cls, column):
+        """Biểu thức SQL đổi cột mã số sang label (đọc ra cho UI / file xuất)"""
+        cases = " ".join(f"WHEN {member.value} THEN '{member.label}'" for member in cls)
+        return f"CASE {column} {cases} END"
+
+    @classmethod
+    def sql_code(cls, column):
+        """Biểu thức SQL đổi cột text cũ (label / alias / name) sang mã số, mã số giữ nguyên
+
+        Giá trị không nhận ra -> NULL
+        """
+        cases = " ".join(
+            f"WHEN '{text}' THEN {member.value}"
+            for member in cls
+            for text in dict.fromkeys((member.label, member.name) + member.aliases)
+        )
+        return f"CASE {column} {cases} ELSE CASE WHEN typeof({column}) = 'integer' THEN {column} END END"
+
+    @classmethod
+    def sql_in(cls, *members):
+        """'(2, 3)' cho điều kiện IN viết literal"""
+        return "(" + ", ".join(str(member.value) for member in members) + ")"
+
+
+class VehicleType(CodedEnum):
+    MOTOR = 1, 'Xe máy'
+    CAR = 2, 'Ô tô', 'Ô tó'   # 'Ô tó': dữ liệu cũ bị gõ sai
+
+
+class TicketType(CodedEnum):
+    GUEST = 1, 'GUEST'
+    MONTHLY = 2, 'MONTHLY'
+
+
+class SessionStatus(CodedEnum):
+    PARKING = 1, 'PARKING'        # Đang gửi
+    PAID = 2, 'PAID'              # Đã ra, đã thanh toán
+    COMPLETED = 3, 'COMPLETED'
+    CANCELLED = 4, 'CANCELLED'    # Session trùng thẻ bị hủy (migration v6)
+
+
+class TicketStatus(CodedEnum):
+    ACTIVE = 1, 'ACTIVE'
+    EXPIRED = 2, 'EXPIRED'
+    DELETED = 3, 'DELETED'
+
+
+# Session được tính là đã thanh toán (doanh thu, daily_rollup, archive)
+REVENUE_STATUSES = (SessionStatus.PAID, SessionStatus.COMPLETED)
+
+# (enum, bảng tra cứu trong DB)
+LOOKUP_TABLES = (
+    (VehicleType, 'vehicle_types'),
+    (TicketType, 'ticket_types'),
+    (SessionStatus, 'session_statuses'),
+    (TicketStatus, 'ticket_statuses'),
+)
+
+# Cột mã hóa theo bảng: {bảng: {cột: enum}}
+CODED_COLUMNS = {
+    'parking_sessions': {'vehicle_type': VehicleType, 'ticket_type': TicketType, 'status': SessionStatus},
+    'parking_slots': {'vehicle_type': VehicleType},
+    'monthly_tickets': {'vehicle_type': VehicleType, 'status': TicketStatus},
+    'daily_rollup': {'vehicle_type': VehicleType, 'ticket_type': TicketType},
+}
@@ -0,0 +1,135 @@
+"""
+Xuất lịch sử gửi xe ra CSV / XLSX theo luồng (bộ nhớ không phụ thuộc khoảng ngày)
+
+- Đọc qua DBManager.iter_parking_history(): từng chunk `chunk_size` dòng theo keyset (id < ?)
+  trên file chính + archive, mỗi chunk là 1 lần đọc ngắn -> không giữ lock đọc suốt lúc xuất
+  (DELETE mode: lock đọc dài sẽ chặn COMMIT ở cổng vào/ra)
+- Ghi ngay từng chunk ra file: CSV (utf-8-sig để Excel đọc đúng tiếng Việt) hoặc XLSX bằng
+  openpyxl write_only (tùy chọn - pip install openpyxl)
+- Chạy trên worker (core/async_db.py): progress(done, total) gọi sau mỗi chunk, cancel_event.set()
+  để dừng -> file dở dang bị xóa
+"""
+
+import csv
+import os
+import threading
+import time
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+# (tiêu đề cột, hàm lấy giá trị từ 1 dòng _HISTORY_COLUMNS của DBManager)
+# Dòng lịch sử: 0:id, 1:card_id, 2:plate_in, 3:time_in, 4:time_out, 5:slot_id, 6:vehicle_type,
+# 7:ticket_type, 8:owner_name, 9:price, 10:payment_method, 11:status, 12:image_in_path,
+# 13:image_out_path, 14:duration_hours, 15:duration_minutes
+HISTORY_COLUMNS = (
+    ("ID", lambda r: r[0]),
+    ("Mã thẻ", lambda r: r[1] or ""),
+    ("Biển số", lambda r: r[2] or ""),
+    ("Loại xe", lambda r: r[6] or ""),
+    ("Ô đỗ", lambda r: r[5] or ""),
+    ("Giờ vào", lambda r: r[3] or ""),
+    ("Giờ ra", lambda r: r[4] or ""),
+    ("Thời gian đỗ (phút)", lambda r: (r[14] or 0) * 60 + (r[15] or 0) if r[4] else ""),
+    ("Loại vé", lambda r: r[7] or ""),
+    ("Chủ xe", lambda r: r[8] or ""),
+    ("Phí (đ)", lambda r: r[9] if r[9] is not None else ""),
+    ("Thanh toán", lambda r: r[10] or ""),
+    ("Trạng thái", lambda r: r[11] or ""),
+)
+
+FORMATS = ('csv', 'xlsx')
+
+
+class ExportCancelled(Exception):
+    """Người dùng hủy xuất file (cancel_event)"""
+
+
+class CsvWriter:
+    def __init__(self, path):
+        # utf-8-sig: BOM để Excel nhận đúng encoding tiếng Việt
+        self._file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self._writer = csv.writer(self._file)
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxWriter:
+    def __init__(self, path, sheet_title="Lịch sử"):
+        if openpyxl is None:
+            raise RuntimeError("Xuất XLSX cần openpyxl (pip install openpyxl) - hãy chọn CSV")
+        self.path = path
+        # write_only: dòng được ghi thẳng ra file tạm, không giữ cả sheet trong bộ nhớ
+        self._workbook = openpyxl.Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet(sheet_title)
+
+    def write_rows(self, rows):
+        for row in rows:
+            self._sheet.append(row)
+
+    def close(self):
+        self._workbook.save(self.path)
+
+
+def detect_format(path, fmt=None):
+    """'csv' / 'xlsx' theo tham số hoặc đuôi file"""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.')).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt!r} (chỉ {', '.join(FORMATS)})")
+    return fmt
+
+
+def open_writer(path, fmt=None):
+    return XlsxWriter(path) if detect_format(path, fmt) == 'xlsx' else CsvWriter(path)
+
+
+def export_history(db, path, filters=None, fmt=None, chunk_size=2000, progress=None, cancel_event=None):
+    """Xuất lịch sử khớp `filters` (tham số của get_parking_history) ra `path`
+
+    Args:
+        db: DBManager
+        filters: dict plate / date_from / date_to / time_from / time_to / status
+        progress: progress(done, total) sau mỗi chunk (gọi trên thread đang xuất)
+        cancel_event: threading.Event - set() để hủy
+
+    Returns:
+        dict: {'path', 'rows', 'elapsed_sec'}
+
+    Raises:
+        ExportCancelled: đã hủy (file dở dang bị xóa)
+    """
+    filters = dict(filters or {})
+    cancel_event = cancel_event or threading.Event()
+    t0 = time.perf_counter()
+    total, _ = db.count_parking_history(**filters, cap=None)
+    writer = open_writer(path, fmt)
+    done = 0
+    try:
+        writer.write_rows([[title for title, _ in HISTORY_COLUMNS]])
+        if progress is not None:
+            progress(0, total)
+        for chunk in db.iter_parking_history(**filters, chunk_size=chunk_size):
+            if cancel_event.is_set():
+                raise ExportCancelled(path)
+            writer.write_rows([[get(row) for _, get in HISTORY_COLUMNS] for row in chunk])
+            done += len(chunk)
+            if progress is not None:
+                progress(done, max(total, done))
+        writer.close()
+    except BaseException:
+        try:
+            writer.close()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    elapsed = time.perf_counter() - t0
+    print(f"[EXPORT] ✅ {done:,} dòng -> {path} ({elapsed:.1f}s)")
+    return {'path': path, 'rows': done, 'elapsed_sec': round(elapsed, 2)}
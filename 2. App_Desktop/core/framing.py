@@ -0,0 +1,127 @@
+"""
+Tách dòng (message text kết thúc bằng \\n) từ luồng TCP không copy lại buffer
+
+Thay cho vòng lặp cũ ở NetworkServer: `buffer += data.decode()` rồi `buffer.split('\\n', 1)`
+- mỗi dòng copy lại toàn bộ phần còn lại (burst N dòng -> O(N²)), buffer không giới hạn
+- LineFramer: 1 bytearray cấp sẵn, recv_into() ghi thẳng vào chỗ trống qua memoryview,
+  tìm '\\n' cuối bằng bytearray.rfind(start, end) từ vị trí đã quét, chỉ decode phần đã đủ dòng
+- Dòng dài hơn max_frame (node lỗi / gửi rác) -> FrameTooLong, caller đóng kết nối
+  (dòng dở dang đo theo byte, dòng đã đủ đo theo ký tự sau decode - protocol chỉ có ASCII)
+- Chỉ dời phần dòng dở dang (< max_frame byte) về đầu buffer khi hết chỗ ghi
+"""
+
+from core.protocol_codec import ProtocolError
+
+
+class FrameTooLong(ProtocolError):
+    """Dòng vượt max_frame byte mà chưa gặp '\\n'"""
+
+
+class LineFramer:
+    """Buffer nhận cố định + tách dòng theo delimiter"""
+
+    def __init__(self, max_frame=1024, recv_size=1024, delimiter=b'\n'):
+        self.max_frame = max_frame
+        self.recv_size = recv_size
+        self.delimiter = delimiter
+        self._text_delimiter = delimiter.decode('ascii')
+        # Đủ cho 1 dòng dở dang dài nhất + 1 lần recv
+        self._buffer = bytearray(max_frame + recv_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0   # Đầu phần chưa xử lý
+        self._scan = 0    # Đã tìm delimiter tới đây (không quét lại)
+        self._end = 0     # Cuối dữ liệu đã nhận
+        self._returned = 0  # Đầu đoạn lines() trả về lần gần nhất (cho take(after))
+
+    def _make_room(self):
+        """Dời dòng dở dang về đầu buffer nếu phía sau không đủ recv_size byte
+
+        Raises:
+            FrameTooLong: phần chưa có delimiter đã vượt max_frame
+        """
+        if len(self._buffer) - self._end >= self.recv_size:
+            return
+        pending = self._end - self._start
+        if pending > self.max_frame:
+            self.reset()
+            raise FrameTooLong(f"dòng dài hơn {self.max_frame} byte ({pending} byte chưa có delimiter)")
+        if pending:
+            self._buffer[:pending] = self._view[self._start:self._end].tobytes()
+        self._scan -= self._start
+        self._start, self._end = 0, pending
+
+    def recv_into(self, sock):
+        """sock.recv_into() thẳng vào buffer, trả về số byte (0 = đóng kết nối)
+
+        Gọi lines() sau mỗi lần nhận để buffer luôn còn chỗ cho lần sau
+        """
+        self._make_room()
+        n = sock.recv_into(self._view[self._end:self._end + self.recv_size])
+        self._end += n
+        return n
+
+    def feed(self, data):
+        """Thêm data đã nhận sẵn (asyncio reader.read(recv_size)) - chép 1 lần vào buffer"""
+        n = len(data)
+        if n > self.recv_size:
+            raise ValueError(f"feed() nhận tối đa {self.recv_size} byte / lần")
+        end = self._end
+        if len(self._buffer) - end < self.recv_size:
+            self._make_room()
+            end = self._end
+        # Ghi qua memoryview: đúng n byte, không bao giờ nới rộng buffer
+        self._view[end:end + n] = data
+        self._end = end + n
+
+    def lines(self, encoding='utf-8'):
+        """Các dòng đã đủ (list str, chưa strip), theo thứ tự nhận
+
+        1 lần rfind + 1 lần decode thẳng từ memoryview + split cho cả đoạn đã đủ dòng,
+        không tìm / cắt từng dòng trong Python
+
+        Raises:
+            FrameTooLong: dòng vượt max_frame (dòng dở dang đứng sau các dòng đủ: báo ở lần
+                nhận sau, buffer vẫn không vượt max_frame + recv_size)
+        """
+        start, end = self._start, self._end
+        last = self._buffer.rfind(self.delimiter, self._scan, end)
+        if last < 0:
+            pending = end - start
+            if pending > self.max_frame:
+                self.reset()
+                raise FrameTooLong(f"dòng dài hơn {self.max_frame} byte ({pending} byte chưa có delimiter)")
+            if pending:
+                self._scan = end
+            else:
+                self._start = self._scan = self._end = 0
+            return []
+        lines = str(self._view[start:last], encoding, 'ignore').split(self._text_delimiter)
+        # Đoạn ngắn hơn max_frame thì không dòng nào vượt được, khỏi đo
+        if last - start > self.max_frame and max(map(len, lines)) > self.max_frame:
+            self.reset()
+            raise FrameTooLong(f"dòng dài hơn {self.max_frame} ký tự")
+        self._returned = start
+        self._start = self._scan = last + len(self.delimiter)
+        return lines
+
+    def take(self, after=None):
+        """Lấy (và xóa) toàn bộ byte chưa xử lý - khi chuyển sang giao thức khác giữa luồng
+
+        after=k: tính từ sau dòng thứ k (1-based) của lần lines() vừa rồi - các dòng sau đó
+        trả lại dưới dạng byte gốc, chưa decode
+        """
+        start = self._start
+        if after is not None:
+            start = self._returned
+            for _ in range(after):
+                start = self._buffer.find(self.delimiter, start, self._end) + len(self.delimiter)
+        data = self._view[start:self._end].tobytes()
+        self.reset()
+        return data
+
+    def reset(self):
+        self._start = self._scan = self._end = 0
+
+    def pending(self):
+        """Số byte đang chờ đủ dòng"""
+        return self._end - self._start
@@ -0,0 +1,189 @@
+"""
+Nhập / xuất vé tháng hàng loạt (CSV) - đăng ký cả nghìn vé cho khách doanh nghiệp 1 lần
+thay cho từng vé qua form (mỗi vé 1 lần lấy write lock + 1 transaction)
+
+- read_csv(): đọc file CSV, header theo tên cột DB (plate_number, card_id...) hoặc tiêu đề
+  tiếng Việt của export (Biển số, Mã thẻ...)
+- import_tickets(conn, rows): kiểm tra TẤT CẢ dòng trước, rồi ghi bằng executemany trong
+  transaction của caller (vé + reserve ô + avatar). Có dòng lỗi thì mặc định không ghi gì
+  (skip_invalid=True: chỉ ghi dòng hợp lệ). Trả về báo cáo {'imported', 'errors', 'warnings'...}
+- iter_export_rows(conn): đọc vé tháng theo từng chunk (keyset id > ?) cho xuất file
+- DBManager.import_monthly_tickets() / export_monthly_tickets() và script import_monthly.py
+  gọi các hàm này
+"""
+
+import csv
+import os
+from datetime import date
+
+from core.enums import TicketStatus, VehicleType
+from core.vn_time import vietnam_today
+
+
+VEHICLE_TYPES = VehicleType.labels()
+
+# (cột DB, tiêu đề khi xuất file)
+COLUMNS = (
+    ('plate_number', "Biển số"),
+    ('owner_name', "Chủ xe"),
+    ('card_id', "Mã thẻ"),
+    ('vehicle_type', "Loại xe"),
+    ('reg_date', "Ngày đăng ký"),
+    ('exp_date', "Ngày hết hạn"),
+    ('assigned_slot', "Ô đỗ"),
+    ('avatar_path', "Ảnh"),
+    ('status', "Trạng thái"),
+)
+_HEADER_ALIASES = {title.lower(): column for column, title in COLUMNS}
+_HEADER_ALIASES.update({column: column for column, _ in COLUMNS})
+REQUIRED = ('plate_number', 'owner_name', 'card_id', 'vehicle_type', 'exp_date')
+
+
+def _normalize_header(name):
+    name = (name or "").strip()
+    return _HEADER_ALIASES.get(name.lower())
+
+
+def read_csv(path):
+    """[(số dòng trong file, {cột DB: giá trị})] - cột không nhận ra bị bỏ qua"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return []
+        columns = [_normalize_header(name) for name in header]
+        missing = [c for c in REQUIRED if c not in columns]
+        if missing:
+            raise ValueError(f"File thiếu cột: {', '.join(missing)}")
+        rows = []
+        for values in reader:
+            if not any(v.strip() for v in values):
+                continue
+            record = {col: value.strip() for col, value in zip(columns, values) if col}
+            rows.append((reader.line_num, record))
+        return rows
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def validate(rows, existing_cards, slots, today=None):
+    """Kiểm tra các dòng import
+
+    Args:
+        rows: [(line, record)] từ read_csv()
+        existing_cards: set card_id đã có trong monthly_tickets
+        slots: {slot_id: mã số vehicle_type} của parking_slots
+
+    Returns:
+        tuple: (valid, errors, warnings) - valid là list tuple theo thứ tự cột INSERT,
+               errors / warnings là list (line, card_id, message)
+    """
+    today = today or vietnam_today()
+    valid, errors, warnings = [], [], []
+    seen_cards = {}
+    for line, record in rows:
+        card = record.get('card_id', '')
+        problems = [f"thiếu {column}" for column in REQUIRED if not record.get(column)]
+
+        vehicle_type = None
+        try:
+            vehicle_type = VehicleType.coerce(record.get('vehicle_type'))
+        except ValueError:
+            problems.append(f"loại xe '{record['vehicle_type']}' không hợp lệ (chỉ {' / '.join(VEHICLE_TYPES)})")
+
+        reg_date = _parse_date(record.get('reg_date') or today)
+        exp_date = _parse_date(record.get('exp_date'))
+        if reg_date is None:
+            problems.append(f"ngày đăng ký '{record.get('reg_date')}' không đúng dạng YYYY-MM-DD")
+        if record.get('exp_date') and exp_date is None:
+            problems.append(f"ngày hết hạn '{record.get('exp_date')}' không đúng dạng YYYY-MM-DD")
+        if reg_date and exp_date and exp_date < reg_date:
+            problems.append("ngày hết hạn trước ngày đăng ký")
+
+        if card:
+            if card in existing_cards:
+                problems.append("thẻ đã có vé tháng")
+            elif card in seen_cards:
+                problems.append(f"trùng thẻ với dòng {seen_cards[card]}")
+            else:
+                seen_cards[card] = line
+
+        slot = record.get('assigned_slot') or None
+        if slot:
+            if slot not in slots:
+                problems.append(f"ô đỗ '{slot}' không tồn tại")
+            elif vehicle_type is not None and slots[slot] != vehicle_type:
+                problems.append(f"ô đỗ '{slot}' dành cho {VehicleType.label_of(slots[slot])}")
+
+        avatar = record.get('avatar_path') or ""
+        if avatar and not os.path.exists(avatar):
+            warnings.append((line, card, f"không tìm thấy ảnh '{avatar}' (vẫn lưu đường dẫn)"))
+
+        if exp_date and exp_date < today and not problems:
+            warnings.append((line, card, f"vé đã hết hạn ({exp_date})"))
+
+        if problems:
+            errors.append((line, card, "; ".join(problems)))
+        else:
+            valid.append((record['plate_number'], record['owner_name'], card, vehicle_type,
+                          reg_date, exp_date, slot, avatar))
+    return valid, errors, warnings
+
+
+def import_tickets(conn, rows, skip_invalid=False, dry_run=False, today=None):
+    """Kiểm tra + ghi vé tháng trong transaction hiện tại của conn (caller commit / rollback)
+
+    Returns:
+        dict: {'total', 'imported', 'reserved_slots', 'errors', 'warnings', 'dry_run'}
+    """
+    cursor = conn.cursor()
+    existing_cards = {row[0] for row in cursor.execute("SELECT card_id FROM monthly_tickets")}
+    slots = dict(cursor.execute("SELECT slot_id, vehicle_type FROM parking_slots"))
+    valid, errors, warnings = validate(rows, existing_cards, slots, today)
+    report = {'total': len(rows), 'imported': 0, 'reserved_slots': 0,
+              'errors': errors, 'warnings': warnings, 'dry_run': dry_run}
+    if dry_run or not valid or (errors and not skip_invalid):
+        return report
+
+    cursor.executemany("""
+        INSERT INTO monthly_tickets
+        (plate_number, owner_name, card_id, vehicle_type, reg_date, exp_date, assigned_slot, avatar_path, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [row + (TicketStatus.ACTIVE,) for row in valid])
+    reserved = sorted({row[6] for row in valid if row[6]})
+    cursor.executemany("UPDATE parking_slots SET is_reserved=1 WHERE slot_id=? AND is_reserved=0",
+                       [(slot,) for slot in reserved])
+    report['imported'] = len(valid)
+    report['reserved_slots'] = len(reserved)
+    return report
+
+
+def iter_export_rows(conn, chunk_size=2000):
+    """Vé tháng theo thứ tự id, từng list `chunk_size` dòng (mỗi chunk 1 truy vấn keyset)"""
+    decode = {'vehicle_type': VehicleType, 'status': TicketStatus}
+    columns = ", ".join(decode[column].sql_label(column) if column in decode else column for column, _ in COLUMNS)
+    last_id = 0
+    while True:
+        rows = conn.execute(f"SELECT id, {columns} FROM monthly_tickets WHERE id > ? ORDER BY id LIMIT ?",
+                            (last_id, chunk_size)).fetchall()
+        if rows:
+            yield [row[1:] for row in rows]
+            last_id = rows[-1][0]
+        if len(rows) < chunk_size:
+            return
+
+
+def write_report(path, report):
+    """Ghi báo cáo kiểm tra (dòng, thẻ, mức độ, nội dung) ra CSV"""
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Dòng", "Mã thẻ", "Mức độ", "Nội dung"])
+        for line, card, message in report['errors']:
+            writer.writerow([line, card, "LỖI", message])
+        for line, card, message in report['warnings']:
+            writer.writerow([line, card, "CẢNH BÁO", message])
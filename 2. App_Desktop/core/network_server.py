@@ -13,13 +13,128 @@ Format lệnh gửi xuống ESP:
 - OPEN_1  (Mở barie làn 1)
 - OPEN_2  (Mở barie làn 2)
 - MSG:<Line1>|<Line2>  (Hiển thị message trên LCD)
+
+Gửi lệnh: mỗi client có hàng đợi gửi riêng (giới hạn send_queue_size) + thread gửi riêng,
+send_command() chỉ xếp lệnh vào hàng đợi rồi trả về ngay -> 1 node Wi-Fi bị treo không làm
+chậm OPEN_1 của cổng khác. Gửi quá send_timeout giây -> đóng kết nối (ESP32 tự kết nối lại).
+Hàng đợi đầy: slow_client_policy "close" (đóng kết nối) hoặc "drop" (bỏ lệnh mới).
+
+Định tuyến: ClientRoutes index client theo vai trò (HELLO / CARD), zone_id (HELLO:ZONE_n) và
+làn (CARD / CHECKOUT / CLOSED của làn đó) -> open_barrier(lane) chỉ gửi tới ESP32 của làn,
+is_connected() không phải quét hết client.
+
+Giao thức nhị phân (tùy chọn): node gửi "PROTO:BIN:1" -> từ đó dùng frame độ dài + byte loại
+(core/protocol_codec.py). Text và nhị phân cùng đi vào các handler _on_card / _on_parking_data...
+
+Nhận text: core/framing.py LineFramer (recv_into vào buffer cấp sẵn, dòng > max_line_bytes
+-> đóng kết nối) thay cho cộng dồn str + split.
+
+Kết nối chết: ESP32 mất điện / mất WiFi không gửi FIN, recv chờ mãi và giữ chỗ (max_clients).
+- TCP keepalive trên mọi socket nhận được (enable_keepalive): node chết bị phát hiện sau
+  ~keepalive_idle + 15 giây, kể cả ESP32 chính (không gửi gì khi rảnh)
+- Node cảm biến (HEARTBEAT 30s) im lặng quá idle_timeout giây -> đóng kết nối
 """
 
+import asyncio
+import queue
+import select
 import socket
 import threading
 from PySide6.QtCore import QObject, Signal
 import time
 
+from core import protocol_codec
+from core.framing import LineFramer
+from core.scan_dedup import ScanDeduplicator
+
+
+def enable_keepalive(sock, idle=30, interval=5, count=3):
+    """Bật TCP keepalive: peer chết bị phát hiện sau ~idle + interval * count giây
+
+    ESP32 (lwIP) tự trả lời gói keepalive, không cần sửa firmware. Tùy chọn nào HĐH không
+    hỗ trợ thì giữ mặc định của HĐH.
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    options = [(name, value) for name, value in
+               (('TCP_KEEPIDLE', idle), ('TCP_KEEPINTVL', interval), ('TCP_KEEPCNT', count))
+               if hasattr(socket, name)]
+    if options:
+        for name, value in options:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+            except OSError:
+                pass
+    elif hasattr(sock, 'ioctl') and hasattr(socket, 'SIO_KEEPALIVE_VALS'):
+        # Windows cũ: (bật, idle ms, interval ms)
+        sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, idle * 1000, interval * 1000))
+
+
+class ClientOutbox:
+    """Hàng đợi gửi của 1 client + số liệu (độ sâu, đỉnh, đã gửi, bị bỏ)"""
+
+    def __init__(self, q):
+        self.queue = q          # queue.Queue (engine threaded) / asyncio.Queue (engine asyncio)
+        self.sent = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def depth(self):
+        return self.queue.qsize()
+
+
+class ClientRoutes:
+    """Index client theo vai trò / zone_id / làn (caller giữ clients_lock khi gọi)"""
+
+    def __init__(self):
+        self.by_role = {}   # {'main' / 'sensor' / 'unknown': set(client)}
+        self.by_zone = {}   # {zone_id: set(client)}
+        self.by_lane = {}   # {lane: set(client)}
+
+    @staticmethod
+    def _link(index, key, client):
+        index.setdefault(key, set()).add(client)
+
+    @staticmethod
+    def _unlink(index, key, client):
+        clients = index.get(key)
+        if clients is not None:
+            clients.discard(client)
+            if not clients:
+                del index[key]
+
+    def add(self, client, info):
+        self._link(self.by_role, info['type'], client)
+
+    def set_role(self, client, info, role, zone_id=None):
+        self._unlink(self.by_role, info['type'], client)
+        info['type'] = role
+        self._link(self.by_role, role, client)
+        if zone_id is not None and zone_id != info['zone_id']:
+            self._unlink(self.by_zone, info['zone_id'], client)
+            info['zone_id'] = zone_id
+            self._link(self.by_zone, zone_id, client)
+
+    def add_lane(self, client, info, lane):
+        if lane not in info['lanes']:
+            info['lanes'].add(lane)
+            self._link(self.by_lane, lane, client)
+
+    def drop_lanes(self, client, info):
+        for lane in info['lanes']:
+            self._unlink(self.by_lane, lane, client)
+        info['lanes'].clear()
+
+    def remove(self, client, info):
+        self._unlink(self.by_role, info['type'], client)
+        self._unlink(self.by_zone, info['zone_id'], client)
+        for lane in info['lanes']:
+            self._unlink(self.by_lane, lane, client)
+
+    def clear(self):
+        self.by_role.clear()
+        self.by_zone.clear()
+        self.by_lane.clear()
+
 
 class NetworkServer(QObject):
     """TCP Server hỗ trợ nhiều ESP32 kết nối đồng thời"""
@@ -31,12 +146,41 @@ class NetworkServer(QObject):
     esp_disconnected = Signal()
     sensor_data_received = Signal(int, str, int, int)  # (zone_id, status_binary, occupied, available)
     
-    def __init__(self, host='0.0.0.0', port=8888):
+    def __init__(self, host='0.0.0.0', port=8888, scan_dedup_window=5.0, scan_dedup_max_entries=1024,
+                 send_queue_size=64, send_timeout=5.0, slow_client_policy='close', binary_protocol=True,
+                 max_line_bytes=1024, idle_timeout=90.0, keepalive_idle=30):
         super().__init__()
         self.host = host
         self.port = port
+        # Cho phép node chuyển sang frame nhị phân ("PROTO:BIN:1")
+        self.binary_protocol = binary_protocol
+        # Dòng text dài hơn N byte chưa có '\n' -> node lỗi, đóng kết nối (core/framing.py)
+        self.max_line_bytes = max_line_bytes
+        # Node cảm biến im lặng quá N giây -> đóng (0 = tắt); keepalive cho mọi kết nối
+        self.idle_timeout = idle_timeout
+        self.keepalive_idle = keepalive_idle
+        # Chu kỳ thức dậy của recv để kiểm tra running / idle_timeout
+        self._recv_poll = min(60.0, idle_timeout) if idle_timeout > 0 else 60.0
+        # Bảng dispatch frame nhị phân: byte loại -> handler (tham số từ protocol_codec.decode_payload)
+        self._frame_handlers = {
+            protocol_codec.HELLO_MAIN: self._on_hello_main,
+            protocol_codec.HELLO_SENSOR: self._on_hello_sensor,
+            protocol_codec.CARD: self._on_card,
+            protocol_codec.CHECKOUT: self._on_checkout,
+            protocol_codec.CLOSED: self._on_closed,
+            protocol_codec.PARKING_DATA: self._on_parking_data,
+            protocol_codec.HEARTBEAT: self._on_heartbeat,
+        }
+        # Hàng đợi gửi theo client (xem docstring module)
+        self.send_queue_size = send_queue_size
+        self.send_timeout = send_timeout
+        self.slow_client_policy = slow_client_policy
+        self.send_stats = {'dropped': 0, 'closed_slow': 0}
+        # Quét trùng (thẻ còn trên đầu đọc) bị bỏ ngay tại đây, không kích hoạt camera / LPR
+        self.scan_dedup = ScanDeduplicator(window=scan_dedup_window, max_entries=scan_dedup_max_entries)
         self.server_socket = None
-        self.clients = {}  # {socket: {'address': addr, 'type': 'main'/'sensor', 'zone_id': 1}}
+        self.clients = {}  # {socket: {'address', 'type', 'zone_id', 'lanes', 'outbox', 'rx', 'decoder'}}
+        self.routes = ClientRoutes()  # Index của self.clients, cùng clients_lock
         self.clients_lock = threading.Lock()
         self.running = False
         self.server_thread = None
@@ -64,6 +208,7 @@ class NetworkServer(QObject):
                 except:
                     pass
             self.clients.clear()
+            self.routes.clear()
         
         if self.server_socket:
             try:
@@ -90,21 +235,26 @@ class NetworkServer(QObject):
                     # Chấp nhận kết nối từ ESP32
                     client, address = self.server_socket.accept()
                     print(f"[NET] 🔗 ESP32 đã kết nối từ {address}")
+                    self._enable_keepalive(client)
                     
                     # Lưu client vào dictionary
+                    outbox = ClientOutbox(queue.Queue(maxsize=self.send_queue_size))
                     with self.clients_lock:
-                        self.clients[client] = {
-                            'address': address,
-                            'type': 'unknown',  # Sẽ được set sau khi nhận HELLO
-                            'zone_id': None
-                        }
+                        info = self._register_client(client, address, outbox)
+                    
+                    # Thread gửi riêng: lệnh tới client chậm không chặn các client khác
+                    threading.Thread(
+                        target=self._drain_outbox,
+                        args=(client, address, outbox),
+                        daemon=True
+                    ).start()
                     
                     self.esp_connected.emit(str(address[0]))
                     
                     # Tạo thread riêng cho mỗi client
                     client_thread = threading.Thread(
                         target=self._handle_client, 
-                        args=(client, address),
+                        args=(client, address, info),
                         daemon=True
                     )
                     client_thread.start()
@@ -122,34 +272,24 @@ class NetworkServer(QObject):
             if self.server_socket:
                 self.server_socket.close()
     
-    def _handle_client(self, client_socket, address):
+    def _handle_client(self, client_socket, address, info):
         """Xử lý messages từ một ESP32 client (chạy trong thread riêng)"""
-        buffer = ""
-        
         try:
-            client_socket.settimeout(60.0)  # Timeout 60s cho recv
+            client_socket.settimeout(self._recv_poll)
             
             while self.running:
                 try:
                     # Nhận dữ liệu
-                    data = client_socket.recv(1024)
-                    if not data:
+                    if not self._receive(client_socket, info):
                         break
-                    
-                    # Decode và thêm vào buffer
-                    buffer += data.decode('utf-8', errors='ignore')
-                    
-                    # Xử lý từng dòng (message kết thúc bằng \n)
-                    while '\n' in buffer:
-                        line, buffer = buffer.split('\n', 1)
-                        message = line.strip()
-                        
-                        if message:
-                            print(f"[NET] 📩 Nhận từ {address[0]}: {message}")
-                            self._process_message(message, client_socket)
                 
                 except socket.timeout:
+                    if self._idle_expired(info):
+                        break
                     continue
+                except protocol_codec.ProtocolError as e:
+                    print(f"[NET] ⚠️ Frame lỗi từ {address}: {e}, đóng kết nối")
+                    break
                 except Exception as e:
                     print(f"[NET] Lỗi nhận dữ liệu từ {address}: {e}")
                     break
@@ -157,9 +297,13 @@ class NetworkServer(QObject):
         finally:
             # Xóa client khỏi dictionary
             with self.clients_lock:
-                if client_socket in self.clients:
-                    client_info = self.clients.pop(client_socket)
-                    print(f"[NET] ❌ ESP32 ngắt kết nối: {address} (Type: {client_info['type']})")
+                client_info = self._unregister_client(client_socket)
+            if client_info is not None:
+                print(f"[NET] ❌ ESP32 ngắt kết nối: {address} (Type: {client_info['type']})")
+                try:
+                    client_info['outbox'].queue.put_nowait(None)  # Dừng thread gửi
+                except queue.Full:
+                    pass  # Thread gửi sẽ gặp lỗi socket đã đóng và tự dừng
             
             # Đóng socket
             try:
@@ -169,62 +313,167 @@ class NetworkServer(QObject):
             
             self.esp_disconnected.emit()
     
-    def _process_message(self, message, client_socket):
-        """Xử lý message từ ESP32"""
-        parts = message.split(':')
+    def _register_client(self, client, address, outbox):
+        """Thêm client vào self.clients + routes (caller giữ clients_lock)"""
+        info = {
+            'address': address,
+            'type': 'unknown',  # Sẽ được set sau khi nhận HELLO
+            'zone_id': None,
+            'lanes': set(),     # Làn đã gửi CARD / CHECKOUT / CLOSED qua client này
+            'outbox': outbox,
+            'rx': LineFramer(max_frame=self.max_line_bytes),  # Dữ liệu text chưa đủ dòng
+            'decoder': None,    # protocol_codec.FrameDecoder sau khi thỏa thuận nhị phân
+            'last_seen': time.monotonic(),  # Lần nhận dữ liệu gần nhất (idle_timeout)
+        }
+        self.clients[client] = info
+        self.routes.add(client, info)
+        return info
+    
+    def _unregister_client(self, client):
+        """Xóa client khỏi self.clients + routes (caller giữ clients_lock), trả về info hoặc None"""
+        info = self.clients.pop(client, None)
+        if info is not None:
+            self.routes.remove(client, info)
+        return info
+    
+    def _route(self, client_socket, role=None, zone_id=None, lane=None):
+        """Cập nhật vai trò / zone / làn của client từ message vừa nhận"""
+        with self.clients_lock:
+            info = self.clients.get(client_socket)
+            if info is None:
+                return
+            if role is not None:
+                if role == 'main' and info['type'] != 'main':
+                    self._take_over_lanes(client_socket, info)
+                self.routes.set_role(client_socket, info, role, zone_id)
+            if lane is not None:
+                self.routes.add_lane(client_socket, info, lane)
+    
+    def _take_over_lanes(self, client_socket, info):
+        """ESP32 Main kết nối lại cùng IP: bỏ làn của socket cũ (có thể đã chết, chưa bị đóng)"""
+        ip = info['address'][0]
+        for other in self.routes.by_role.get('main', ()):
+            other_info = self.clients[other]
+            if other is not client_socket and other_info['address'][0] == ip and other_info['lanes']:
+                print(f"[NET] 🔁 ESP32 Main {ip} kết nối lại, bỏ làn {sorted(other_info['lanes'])} "
+                      f"của kết nối cũ {other_info['address']}")
+                self.routes.drop_lanes(other, other_info)
+    
+    def _enable_keepalive(self, sock):
+        try:
+            enable_keepalive(sock, idle=self.keepalive_idle)
+        except OSError as e:
+            print(f"[NET] ⚠️ Không bật được TCP keepalive: {e}")
+    
+    def _idle_expired(self, info):
+        """Node cảm biến không gửi gì (kể cả HEARTBEAT) quá idle_timeout giây"""
+        if self.idle_timeout <= 0 or info['type'] != 'sensor':
+            return False
+        idle = time.monotonic() - info['last_seen']
+        if idle < self.idle_timeout:
+            return False
+        print(f"[NET] ⏱️ Node cảm biến {info['address']} im lặng {idle:.0f}s, đóng kết nối")
+        return True
+    
+    def _receive(self, client_socket, info):
+        """Engine threaded: recv 1 lần rồi xử lý, False = client đã đóng kết nối
         
-        if len(parts) == 0:
+        Raises:
+            protocol_codec.ProtocolError: dòng quá dài / frame sai (caller đóng kết nối)
+        """
+        if info['decoder'] is None:
+            if not info['rx'].recv_into(client_socket):
+                return False
+            info['last_seen'] = time.monotonic()
+            self._process_lines(client_socket, info)
+        else:
+            data = client_socket.recv(info['rx'].recv_size)
+            if not data:
+                return False
+            info['last_seen'] = time.monotonic()
+            self._process_frames(client_socket, info, data)
+        return True
+    
+    def _feed(self, client_socket, info, data):
+        """Engine asyncio: xử lý data đã nhận (tối đa LineFramer.recv_size byte)"""
+        info['last_seen'] = time.monotonic()
+        if info['decoder'] is None:
+            info['rx'].feed(data)
+            self._process_lines(client_socket, info)
+        else:
+            self._process_frames(client_socket, info, data)
+    
+    def _process_lines(self, client_socket, info):
+        """Xử lý từng dòng text đã đủ (message kết thúc bằng \n)"""
+        framer = info['rx']
+        for index, line in enumerate(framer.lines(), 1):
+            message = line.strip()
+            if message:
+                print(f"[NET] 📩 Nhận từ {info['address'][0]}: {message}")
+                self._process_message(message, client_socket)
+            if info['decoder'] is not None:
+                # Vừa chuyển sang nhị phân: phần còn lại (kể cả các "dòng" sau) là frame
+                rest = framer.take(after=index)
+                if rest:
+                    self._process_frames(client_socket, info, rest)
+                return
+    
+    def _process_frames(self, client_socket, info, data):
+        """Tách frame nhị phân + dispatch theo byte loại"""
+        for msg_type, payload in info['decoder'].feed(data):
+            handler = self._frame_handlers.get(msg_type)
+            try:
+                if handler is None:
+                    raise protocol_codec.ProtocolError(f"loại message không biết: 0x{msg_type:02x}")
+                args = protocol_codec.decode_payload(msg_type, payload)
+            except protocol_codec.ProtocolError as e:
+                print(f"[NET] ⚠️ Bỏ frame từ {info['address'][0]}: {e}")
+                continue
+            handler(client_socket, *args)
+    
+    def _negotiate(self, client_socket, version):
+        """PROTO:BIN:<version> - trả lời bằng text rồi chuyển client sang frame nhị phân"""
+        with self.clients_lock:
+            info = self.clients.get(client_socket)
+        if info is None:
             return
-        
+        if not self.binary_protocol or version != "1":
+            self._send_to_client(client_socket, protocol_codec.NEGOTIATE_REFUSED)
+            return
+        self._send_to_client(client_socket, protocol_codec.NEGOTIATE)
+        info['decoder'] = protocol_codec.FrameDecoder()
+        print(f"[NET] 🔀 {info['address'][0]} chuyển sang giao thức nhị phân")
+    
+    def _process_message(self, message, client_socket):
+        """Xử lý message text từ ESP32"""
+        parts = message.split(':')
         command = parts[0]
         
         # CARD:<UID>:<LANE>
         if command == "CARD" and len(parts) >= 3:
             try:
-                card_uid = parts[1]
-                lane = int(parts[2])
-                print(f"[NET] 🎫 Quét thẻ: {card_uid} tại làn {lane}")
-                self.card_scanned.emit(card_uid, lane)
-                
-                # Đánh dấu client này là ESP32 Main
-                with self.clients_lock:
-                    if client_socket in self.clients:
-                        self.clients[client_socket]['type'] = 'main'
-                        
+                self._on_card(client_socket, parts[1], int(parts[2]))
             except ValueError:
                 print(f"[NET] ⚠️ Lỗi format CARD: {message}")
         
         # CHECKOUT:<LANE>
         elif command == "CHECKOUT" and len(parts) >= 2:
             try:
-                lane = int(parts[1])
-                print(f"[NET] 🚗 Checkout không thẻ tại làn {lane}")
-                self.card_scanned.emit("", lane)
+                self._on_checkout(client_socket, int(parts[1]))
             except ValueError:
                 print(f"[NET] ⚠️ Lane number không hợp lệ: {parts[1]}")
         
         # CLOSED:<LANE>
         elif command == "CLOSED" and len(parts) >= 2:
             try:
-                lane = int(parts[1])
-                print(f"[NET] 🚧 Barie làn {lane} đã đóng")
-                # Emit signal
-                self.barrier_closed.emit(lane)
+                self._on_closed(client_socket, int(parts[1]))
             except ValueError:
                 pass
         
         elif message == "HELLO_FROM_ESP32":
-            print(f"[NET] 👋 ESP32 Main chào hỏi - Kết nối thành công!")
-            
-            # Đánh dấu client này là ESP32 Main
-            with self.clients_lock:
-                if client_socket in self.clients:
-                    self.clients[client_socket]['type'] = 'main'
-            
-            # Gửi lại tin xác nhận
-            self._send_to_client(client_socket, "ACK")
+            self._on_hello_main(client_socket)
         
-        elif parts[0] == "HELLO" and len(parts) >= 3:
+        elif command == "HELLO" and len(parts) >= 3:
             # Format: HELLO:ZONE_1:SLOTS_10
             # Handshake từ Node cảm biến
             zone_info = parts[1]  # ZONE_1
@@ -235,69 +484,198 @@ class NetworkServer(QObject):
                 zone_id = int(zone_info.split('_')[1])
             except:
                 zone_id = 1
-            
-            print(f"[NET] 🤝 ESP32 Node2 (Sensor) kết nối: {zone_info}, {slots_info}")
-            
-            # Đánh dấu client này là sensor node
-            with self.clients_lock:
-                if client_socket in self.clients:
-                    self.clients[client_socket]['type'] = 'sensor'
-                    self.clients[client_socket]['zone_id'] = zone_id
-            
-            self._send_to_client(client_socket, "OK")
+            try:
+                slots = int(slots_info.split('_')[1])
+            except:
+                slots = 0
+            self._on_hello_sensor(client_socket, zone_id, slots)
         
-        elif parts[0] == "PARKING_DATA" and len(parts) >= 5:
+        elif command == "PARKING_DATA" and len(parts) >= 5:
             # Format: PARKING_DATA:1:1010001101:5:5
             # zone_id, status_binary, occupied, available
             try:
-                zone_id = int(parts[1])
-                status_binary = parts[2]
-                occupied = int(parts[3])
-                available = int(parts[4])
-                
-                print(f"[NET] 📊 Sensor Data: Zone={zone_id}, "
-                      f"Binary={status_binary}, Occ={occupied}, Avail={available}")
-                
-                # Emit signal để xử lý
-                self.sensor_data_received.emit(zone_id, status_binary, occupied, available)
-                
+                self._on_parking_data(client_socket, int(parts[1]), parts[2], int(parts[3]), int(parts[4]))
             except (ValueError, IndexError) as e:
                 print(f"[NET] ⚠️ Invalid PARKING_DATA format: {message}")
         
-        elif parts[0] == "HEARTBEAT":
+        elif command == "HEARTBEAT":
             # Format: HEARTBEAT:ZONE_1:192.168.1.3:RSSI_-42
-            # print(f"[NET] 💓 Heartbeat từ {parts[2]}, RSSI: {parts[3]}")
-            pass  # Không log heartbeat nữa để giảm spam
+            self._on_heartbeat(client_socket)
+        
+        elif command == "PROTO" and len(parts) >= 3 and parts[1] == "BIN":
+            self._negotiate(client_socket, parts[2])
         
         else:
             print(f"[NET] ⚠️ Lệnh không xác định: {message}")
     
+    # --- Handler message (chung cho text và nhị phân) ---
+    def _on_card(self, client_socket, card_uid, lane):
+        # Đánh dấu client này là ESP32 Main của làn `lane`
+        self._route(client_socket, role='main', lane=lane)
+        
+        if not self.scan_dedup.check(card_uid, lane):
+            print(f"[NET] ⏱️ Quét trùng: {card_uid} tại làn {lane}, bỏ qua")
+            return
+        print(f"[NET] 🎫 Quét thẻ: {card_uid} tại làn {lane}")
+        self.card_scanned.emit(card_uid, lane)
+    
+    def _on_checkout(self, client_socket, lane):
+        self._route(client_socket, lane=lane)
+        if not self.scan_dedup.check("", lane):
+            print(f"[NET] ⏱️ Checkout trùng tại làn {lane}, bỏ qua")
+            return
+        print(f"[NET] 🚗 Checkout không thẻ tại làn {lane}")
+        self.card_scanned.emit("", lane)
+    
+    def _on_closed(self, client_socket, lane):
+        self._route(client_socket, lane=lane)
+        print(f"[NET] 🚧 Barie làn {lane} đã đóng")
+        self.barrier_closed.emit(lane)
+    
+    def _on_hello_main(self, client_socket):
+        print(f"[NET] 👋 ESP32 Main chào hỏi - Kết nối thành công!")
+        
+        # Đánh dấu client này là ESP32 Main
+        self._route(client_socket, role='main')
+        
+        # Gửi lại tin xác nhận
+        self._send_to_client(client_socket, "ACK")
+    
+    def _on_hello_sensor(self, client_socket, zone_id, slots):
+        print(f"[NET] 🤝 ESP32 Node2 (Sensor) kết nối: ZONE_{zone_id}, SLOTS_{slots}")
+        
+        # Đánh dấu client này là sensor node
+        self._route(client_socket, role='sensor', zone_id=zone_id)
+        
+        self._send_to_client(client_socket, "OK")
+    
+    def _on_parking_data(self, client_socket, zone_id, status_binary, occupied, available):
+        print(f"[NET] 📊 Sensor Data: Zone={zone_id}, "
+              f"Binary={status_binary}, Occ={occupied}, Avail={available}")
+        
+        # Emit signal để xử lý
+        self.sensor_data_received.emit(zone_id, status_binary, occupied, available)
+    
+    def _on_heartbeat(self, client_socket, *info):
+        pass  # Không log heartbeat nữa để giảm spam
+    
     def _send_to_client(self, client_socket, command):
-        """Gửi lệnh đến một client cụ thể"""
+        """Xếp lệnh vào hàng đợi gửi của một client (không chặn)"""
+        return self._enqueue(client_socket, self._encode_command(client_socket, command))
+    
+    def _encode_command(self, client_socket, command):
+        """Dòng text, hoặc frame nhị phân nếu client đã thỏa thuận PROTO:BIN"""
+        with self.clients_lock:
+            info = self.clients.get(client_socket)
+        if info is not None and info['decoder'] is not None:
+            return protocol_codec.encode_command(command)
+        return (command + '\n').encode('utf-8')
+    
+    def _enqueue(self, client, data):
+        """Đưa data vào outbox của client, hàng đợi đầy -> áp dụng slow_client_policy"""
+        with self.clients_lock:
+            info = self.clients.get(client)
+        if info is None:
+            return False
+        outbox = info['outbox']
         try:
-            message = command + '\n'
-            client_socket.send(message.encode('utf-8'))
-            return True
-        except Exception as e:
-            print(f"[NET] ❌ Lỗi gửi đến client: {e}")
+            outbox.queue.put_nowait(data)
+        except (queue.Full, asyncio.QueueFull):
+            outbox.dropped += 1
+            with self.clients_lock:
+                self.send_stats['dropped'] += 1
+            if self.slow_client_policy == 'close':
+                print(f"[NET] ⚠️ Hàng đợi gửi tới {info['address']} đầy ({outbox.depth()}), đóng kết nối")
+                self._close_slow_client(client)
+            else:
+                print(f"[NET] ⚠️ Hàng đợi gửi tới {info['address']} đầy, bỏ lệnh")
             return False
+        outbox.high_water = max(outbox.high_water, outbox.depth())
+        return True
+    
+    def _close_slow_client(self, client_socket):
+        """Đóng kết nối client gửi không kịp (thread nhận sẽ dọn dẹp)"""
+        with self.clients_lock:
+            self.send_stats['closed_slow'] += 1
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            client_socket.close()
+        except OSError:
+            pass
+    
+    def _drain_outbox(self, client_socket, address, outbox):
+        """Thread gửi của 1 client: lấy lệnh từ hàng đợi, gửi với timeout send_timeout"""
+        while True:
+            data = outbox.queue.get()
+            if data is None:
+                return
+            try:
+                self._send_all(client_socket, data)
+                outbox.sent += 1
+            except (OSError, ValueError) as e:
+                with self.clients_lock:
+                    connected = client_socket in self.clients
+                if connected and self.running:
+                    print(f"[NET] ❌ Lỗi gửi đến {address}: {e}, đóng kết nối")
+                    self._close_slow_client(client_socket)
+                return
+    
+    def _send_all(self, client_socket, data):
+        """socket.sendall có hạn chót: chờ socket ghi được bằng select, tối đa send_timeout giây"""
+        deadline = time.monotonic() + self.send_timeout
+        view = memoryview(data)
+        while view:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([], [client_socket], [], remaining)[1]:
+                raise socket.timeout(f"gửi quá {self.send_timeout}s")
+            view = view[client_socket.send(view):]
+    
+    def get_send_stats(self):
+        """Số liệu hàng đợi gửi: tổng bị bỏ / đóng vì chậm + từng client (độ sâu, đỉnh, đã gửi, bị bỏ)"""
+        with self.clients_lock:
+            stats = dict(self.send_stats)
+            stats['clients'] = [
+                {'address': info['address'][0], 'type': info['type'], 'depth': info['outbox'].depth(),
+                 'high_water': info['outbox'].high_water, 'sent': info['outbox'].sent,
+                 'dropped': info['outbox'].dropped}
+                for info in self.clients.values()
+            ]
+        return stats
     
-    def send_command(self, command, target='main'):
+    def send_command(self, command, target='main', zone_id=None, lane=None):
         """
-        Gửi lệnh xuống ESP32
+        Gửi lệnh xuống ESP32 (xếp vào hàng đợi gửi của từng client, không chờ gửi xong)
         
         Args:
             command: Lệnh cần gửi
             target: 'main' (ESP32 chính), 'sensor' (Node cảm biến), 'all' (tất cả)
+            zone_id: Chỉ gửi tới node cảm biến của zone này
+            lane: Chỉ gửi tới ESP32 của làn này (kèm client target chưa báo làn nào);
+                  chưa client nào báo làn đó -> gửi theo target
         """
         sent_count = 0
         
+        # Chỉ giữ lock lúc chọn client, không giữ lúc gửi
         with self.clients_lock:
-            for client_socket, info in self.clients.items():
-                if target == 'all' or info['type'] == target:
-                    if self._send_to_client(client_socket, command):
-                        sent_count += 1
-                        print(f"[NET] 📤 Đã gửi: {command} → {info['type']} ({info['address'][0]})")
+            if lane is not None and lane in self.routes.by_lane:
+                chosen = set(self.routes.by_lane[lane])
+                # ESP32 vừa kết nối lại chưa báo làn: gửi kèm, tránh chỉ gửi vào socket cũ đã chết
+                chosen.update(client for client in self.routes.by_role.get(target, ())
+                              if not self.clients[client]['lanes'])
+            elif zone_id is not None:
+                chosen = self.routes.by_zone.get(zone_id, ())
+            elif target == 'all':
+                chosen = self.clients
+            else:
+                chosen = self.routes.by_role.get(target, ())
+            targets = [(client, self.clients[client]) for client in chosen]
+        for client_socket, info in targets:
+            if self._send_to_client(client_socket, command):
+                sent_count += 1
+                print(f"[NET] 📤 Đã gửi: {command} → {info['type']} ({info['address'][0]})")
         
         if sent_count == 0:
             print(f"[NET] ⚠️ Không có client {target} để gửi")
@@ -306,8 +684,8 @@ class NetworkServer(QObject):
         return True
     
     def open_barrier(self, lane_number):
-        """Mở barie (lane: 1 hoặc 2) - chỉ gửi đến ESP32 Main"""
-        return self.send_command(f"OPEN_{lane_number}", target='main')
+        """Mở barie (lane: 1 hoặc 2) - chỉ gửi đến ESP32 Main của làn đó"""
+        return self.send_command(f"OPEN_{lane_number}", target='main', lane=lane_number)
     
     def send_lcd_message(self, line1, line2):
         """Gửi message hiển thị lên LCD ESP32 - chỉ gửi đến ESP32 Main"""
@@ -316,10 +694,7 @@ class NetworkServer(QObject):
     def is_connected(self, client_type='main'):
         """Kiểm tra ESP có kết nối không"""
         with self.clients_lock:
-            for info in self.clients.values():
-                if info['type'] == client_type:
-                    return True
-        return False
+            return bool(self.routes.by_role.get(client_type))
     
     def get_connected_clients(self):
         """Lấy danh sách các client đang kết nối"""
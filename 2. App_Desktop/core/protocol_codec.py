@@ -0,0 +1,264 @@
+"""
+Codec giao thức nhị phân ESP32 <-> server (chạy song song với giao thức text)
+
+Thỏa thuận: sau khi kết nối, ESP32 gửi dòng text "PROTO:BIN:1". Server hỗ trợ thì trả
+"PROTO:BIN:1" (vẫn là text) và từ byte tiếp theo cả 2 chiều dùng frame nhị phân; server tắt
+binary_protocol thì trả "PROTO:TEXT" và tiếp tục text. ESP32 phải chờ câu trả lời trước khi
+gửi frame đầu tiên. Node không gửi PROTO giữ nguyên giao thức text cũ.
+
+Frame:  [độ dài: u16 big-endian][loại: u8][payload]   (độ dài = 1 + len(payload), tối đa MAX_FRAME)
+
+ESP32 -> server                           server -> ESP32
+  0x01 HELLO_MAIN    (trống)                0x81 ACK    (trống)
+  0x02 HELLO_SENSOR  zone u16, slots u16    0x82 OK     (trống)
+  0x03 CARD          lane u8, uid ASCII     0x83 OPEN   lane u8
+  0x04 CHECKOUT      lane u8                0x84 MSG    UTF-8 "dòng 1|dòng 2"
+  0x05 CLOSED        lane u8                0x85 SLOTS  car u16, motor u16
+  0x06 PARKING_DATA  zone u16, slots u16,   0x86 TEXT   UTF-8 lệnh text khác (REJECT_1...)
+                     bitmask ceil(slots/8) byte
+  0x07 HEARTBEAT     zone u16, rssi i8
+
+Bitmask: ô thứ i (0-based, ký tự thứ i của status_binary text) = bit (i % 8) của byte i // 8
+(LSB trước). occupied / available tính từ bitmask thay vì gửi kèm.
+"""
+
+import struct
+
+
+class ProtocolError(ValueError):
+    """Frame / payload nhị phân không hợp lệ"""
+
+
+NEGOTIATE = "PROTO:BIN:1"
+NEGOTIATE_REFUSED = "PROTO:TEXT"
+
+HEADER = struct.Struct(">H")
+MAX_FRAME = 4096
+
+# ESP32 -> server
+HELLO_MAIN = 0x01
+HELLO_SENSOR = 0x02
+CARD = 0x03
+CHECKOUT = 0x04
+CLOSED = 0x05
+PARKING_DATA = 0x06
+HEARTBEAT = 0x07
+
+# server -> ESP32
+ACK = 0x81
+OK = 0x82
+OPEN = 0x83
+MSG = 0x84
+SLOTS = 0x85
+TEXT = 0x86
+
+_U8 = struct.Struct(">B")
+_ZONE_SLOTS = struct.Struct(">HH")
+_HEARTBEAT = struct.Struct(">Hb")
+_SLOTS = struct.Struct(">HH")
+
+
+# ===== FRAME =====
+def encode_frame(msg_type, payload=b""):
+    length = 1 + len(payload)
+    if length > MAX_FRAME:
+        raise ProtocolError(f"frame {length} byte > {MAX_FRAME}")
+    return HEADER.pack(length) + bytes((msg_type,)) + payload
+
+
+class FrameDecoder:
+    """Tách frame từ luồng byte (dữ liệu đến theo từng đoạn bất kỳ)"""
+
+    def __init__(self, max_frame=MAX_FRAME):
+        self.max_frame = max_frame
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """Thêm data, trả về [(loại, payload bytes)] của các frame đã đủ
+
+        Raises:
+            ProtocolError: độ dài frame = 0 hoặc > max_frame (luồng lệch, nên đóng kết nối)
+        """
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        start = 0
+        end = len(buffer)
+        while end - start >= HEADER.size:
+            (length,) = HEADER.unpack_from(buffer, start)
+            if length == 0 or length > self.max_frame:
+                del buffer[:]
+                raise ProtocolError(f"độ dài frame không hợp lệ: {length}")
+            if end - start - HEADER.size < length:
+                break
+            body = start + HEADER.size
+            frames.append((buffer[body], bytes(buffer[body + 1:body + length])))
+            start = body + length
+        del buffer[:start]
+        return frames
+
+    def pending(self):
+        """Số byte đang chờ đủ frame"""
+        return len(self._buffer)
+
+
+# ===== BITMASK Ô ĐỖ =====
+def pack_status(status_binary):
+    """'1010...' -> bitmask bytes"""
+    mask = bytearray((len(status_binary) + 7) // 8)
+    for i, char in enumerate(status_binary):
+        if char == '1':
+            mask[i >> 3] |= 1 << (i & 7)
+    return bytes(mask)
+
+
+def unpack_status(mask, slots):
+    """bitmask bytes -> '1010...' (slots ký tự)"""
+    return "".join('1' if mask[i >> 3] >> (i & 7) & 1 else '0' for i in range(slots))
+
+
+# ===== PAYLOAD ESP32 -> SERVER =====
+def _empty(payload):
+    if payload:
+        raise ProtocolError("payload phải rỗng")
+    return ()
+
+
+def _lane(payload):
+    if len(payload) != 1:
+        raise ProtocolError("payload làn phải 1 byte")
+    return (payload[0],)
+
+
+def _card(payload):
+    if len(payload) < 2:
+        raise ProtocolError("CARD thiếu UID")
+    try:
+        uid = payload[1:].decode('ascii')
+    except UnicodeDecodeError:
+        raise ProtocolError("UID không phải ASCII") from None
+    if not uid.isalnum():
+        raise ProtocolError("UID chỉ gồm chữ / số")
+    return uid, payload[0]
+
+
+def _hello_sensor(payload):
+    if len(payload) != _ZONE_SLOTS.size:
+        raise ProtocolError("HELLO_SENSOR phải 4 byte")
+    return _ZONE_SLOTS.unpack(payload)
+
+
+def _parking_data(payload):
+    if len(payload) < _ZONE_SLOTS.size:
+        raise ProtocolError("PARKING_DATA thiếu zone / slots")
+    zone_id, slots = _ZONE_SLOTS.unpack_from(payload)
+    mask = payload[_ZONE_SLOTS.size:]
+    if len(mask) != (slots + 7) // 8:
+        raise ProtocolError(f"bitmask {len(mask)} byte không khớp {slots} ô")
+    status_binary = unpack_status(mask, slots)
+    occupied = status_binary.count('1')
+    return zone_id, status_binary, occupied, slots - occupied
+
+
+def _heartbeat(payload):
+    if len(payload) != _HEARTBEAT.size:
+        raise ProtocolError("HEARTBEAT phải 3 byte")
+    return _HEARTBEAT.unpack(payload)
+
+
+# Bảng dispatch theo byte loại: payload -> tuple tham số cho handler của NetworkServer
+DECODERS = {
+    HELLO_MAIN: _empty,            # ()
+    HELLO_SENSOR: _hello_sensor,   # (zone_id, slots)
+    CARD: _card,                   # (uid, lane)
+    CHECKOUT: _lane,               # (lane,)
+    CLOSED: _lane,                 # (lane,)
+    PARKING_DATA: _parking_data,   # (zone_id, status_binary, occupied, available)
+    HEARTBEAT: _heartbeat,         # (zone_id, rssi)
+}
+
+
+def decode_payload(msg_type, payload):
+    """Tham số của message ESP32 -> server
+
+    Raises:
+        ProtocolError: loại không biết hoặc payload sai
+    """
+    decoder = DECODERS.get(msg_type)
+    if decoder is None:
+        raise ProtocolError(f"loại message không biết: 0x{msg_type:02x}")
+    return decoder(payload)
+
+
+# ===== ENCODE (ESP32 -> server: dùng cho test / giả lập node) =====
+def encode_hello_main():
+    return encode_frame(HELLO_MAIN)
+
+
+def encode_hello_sensor(zone_id, slots):
+    return encode_frame(HELLO_SENSOR, _ZONE_SLOTS.pack(zone_id, slots))
+
+
+def encode_card(uid, lane):
+    return encode_frame(CARD, _U8.pack(lane) + uid.encode('ascii'))
+
+
+def encode_checkout(lane):
+    return encode_frame(CHECKOUT, _U8.pack(lane))
+
+
+def encode_closed(lane):
+    return encode_frame(CLOSED, _U8.pack(lane))
+
+
+def encode_parking_data(zone_id, status_binary):
+    return encode_frame(PARKING_DATA, _ZONE_SLOTS.pack(zone_id, len(status_binary)) + pack_status(status_binary))
+
+
+def encode_heartbeat(zone_id, rssi):
+    return encode_frame(HEARTBEAT, _HEARTBEAT.pack(zone_id, rssi))
+
+
+# ===== LỆNH SERVER -> ESP32 =====
+def _number(text, limit):
+    """'12' -> 12 nếu là số viết chuẩn (không có 0 đứng đầu) và < limit, ngược lại None"""
+    if text.isdigit() and str(int(text)) == text and int(text) < limit:
+        return int(text)
+    return None
+
+
+def encode_command(command):
+    """Lệnh text của NetworkServer (ACK, OPEN_1, MSG:a|b, SLOTS:c:m...) -> frame nhị phân"""
+    if command == "ACK":
+        return encode_frame(ACK)
+    if command == "OK":
+        return encode_frame(OK)
+    if command.startswith("OPEN_") and _number(command[5:], 256) is not None:
+        return encode_frame(OPEN, _U8.pack(int(command[5:])))
+    if command.startswith("MSG:"):
+        return encode_frame(MSG, command[4:].encode('utf-8'))
+    if command.startswith("SLOTS:"):
+        parts = command.split(':')
+        if len(parts) == 3 and all(_number(p, 65536) is not None for p in parts[1:]):
+            return encode_frame(SLOTS, _SLOTS.pack(int(parts[1]), int(parts[2])))
+    return encode_frame(TEXT, command.encode('utf-8'))
+
+
+def decode_command(msg_type, payload):
+    """Frame server -> ESP32 -> lệnh text tương ứng (ngược của encode_command)"""
+    if msg_type == ACK:
+        return "ACK"
+    if msg_type == OK:
+        return "OK"
+    if msg_type == OPEN and len(payload) == 1:
+        return f"OPEN_{payload[0]}"
+    if msg_type == SLOTS and len(payload) == _SLOTS.size:
+        return "SLOTS:{}:{}".format(*_SLOTS.unpack(payload))
+    try:
+        if msg_type == MSG:
+            return "MSG:" + payload.decode('utf-8')
+        if msg_type == TEXT:
+            return payload.decode('utf-8')
+    except UnicodeDecodeError:
+        raise ProtocolError("payload không phải UTF-8") from None
+    raise ProtocolError(f"lệnh không hợp lệ: 0x{msg_type:02x}")
@@ -0,0 +1,86 @@
+"""
+Lọc quét thẻ trùng ngay tại NetworkServer (trước khi emit card_scanned)
+ESP32 gửi lại CARD:<UID>:<LANE> liên tục khi thẻ còn đặt trên đầu đọc; mỗi lần lọt qua
+sẽ kích hoạt chụp ảnh + nhận diện biển số ở MainWindow.
+
+- Khóa (làn, thẻ): cùng thẻ quét ở làn khác (vào rồi ra) không bị chặn
+- Cửa sổ trượt `window` giây: lần quét trùng cũng làm mới mốc thời gian, thẻ để yên trên
+  đầu đọc bị chặn tới khi nhấc ra đủ `window` giây
+- Bộ nhớ giới hạn: khóa được gom theo bucket thời gian (`bucket_seconds`), bucket quá hạn
+  bị xóa nguyên khối; vượt `max_entries` khóa thì bỏ bucket cũ nhất
+- Chỉ chặn quét lặp trong thời gian ngắn; "1 thẻ chỉ có 1 xe trong bãi" do DB đảm bảo
+  (unique index idx_sessions_open_card - core/db_migrations.py v6)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ScanDeduplicator:
+    """Cửa sổ quét gần đây theo (làn, thẻ), thread-safe"""
+
+    def __init__(self, window=5.0, max_entries=1024, bucket_seconds=1.0, clock=time.monotonic):
+        self.window = window
+        self.max_entries = max_entries
+        self.bucket_seconds = bucket_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_seen = {}           # {(lane, card): (timestamp, bucket)}
+        self._buckets = OrderedDict()  # {bucket: set((lane, card))} - bucket tăng dần
+        self._stats = {'accepted': 0, 'suppressed': 0, 'evicted': 0}
+
+    def _bucket(self, now):
+        return int(now // self.bucket_seconds)
+
+    def _drop_bucket(self, bucket, keys):
+        for key in keys:
+            seen = self._last_seen.get(key)
+            if seen is not None and seen[1] == bucket:
+                del self._last_seen[key]
+
+    def _expire(self, now):
+        # Bucket mà mọi khóa trong đó đã quá window
+        oldest_live = self._bucket(now - self.window)
+        while self._buckets:
+            bucket = next(iter(self._buckets))
+            if bucket >= oldest_live:
+                break
+            self._drop_bucket(bucket, self._buckets.pop(bucket))
+
+    def check(self, card_uid, lane):
+        """True = lần quét mới (xử lý tiếp), False = trùng trong cửa sổ (bỏ qua)"""
+        key = (lane, card_uid)
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            seen = self._last_seen.get(key)
+            duplicate = seen is not None and now - seen[0] < self.window
+
+            bucket = self._bucket(now)
+            self._last_seen[key] = (now, bucket)
+            self._buckets.setdefault(bucket, set()).add(key)
+            self._buckets.move_to_end(bucket)
+
+            while len(self._last_seen) > self.max_entries and len(self._buckets) > 1:
+                oldest, keys = self._buckets.popitem(last=False)
+                before = len(self._last_seen)
+                self._drop_bucket(oldest, keys)
+                self._stats['evicted'] += before - len(self._last_seen)
+
+            self._stats['suppressed' if duplicate else 'accepted'] += 1
+            return not duplicate
+
+    def forget(self, card_uid=None, lane=None):
+        """Cho phép quét lại ngay (vd: giao dịch xong / bị lỗi) - None = mọi thẻ / mọi làn"""
+        with self._lock:
+            for key in [k for k in self._last_seen
+                        if (card_uid is None or k[1] == card_uid) and (lane is None or k[0] == lane)]:
+                del self._last_seen[key]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tracked'] = len(self._last_seen)
+            stats['buckets'] = len(self._buckets)
+        return stats
@@ -8,6 +8,8 @@ import time
 import sys
 import io
 
+from core.enums import VehicleType
+
 # Fix Unicode encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -39,7 +41,7 @@ class SensorDataManager(QObject):
         
         # Cấu hình (có thể thay đổi)
         self.total_sensor_slots = 10
-        self.vehicle_type = "Xe máy"  # Mặc định zone này cho xe máy
+        self.vehicle_type = VehicleType.MOTOR  # Mặc định zone này cho xe máy
         
         # Tracking slots
         self.sensor_slot_states = [False] * 10  # False=trống, True=có xe
@@ -48,9 +50,9 @@ class SensorDataManager(QObject):
         self.last_notified_data = None
         
     def set_vehicle_type(self, vehicle_type):
-        """Cấu hình loại xe cho zone cảm biến này"""
-        self.vehicle_type = vehicle_type
-        print(f"[SENSOR] Zone cảm biến cấu hình cho: {vehicle_type}")
+        """Cấu hình loại xe cho zone cảm biến này (VehicleType, mã số hoặc label)"""
+        self.vehicle_type = VehicleType.coerce(vehicle_type)
+        print(f"[SENSOR] Zone cảm biến cấu hình cho: {self.vehicle_type.label}")
         
     def update_from_node(self, zone_id, status_binary, occupied, available):
         """
@@ -247,7 +249,7 @@ class SensorDataManager(QObject):
         """Lấy số chỗ trống từ database (fallback)"""
         try:
             stats = self.db.get_parking_statistics()
-            if self.vehicle_type == "Xe máy":
+            if self.vehicle_type == VehicleType.MOTOR:
                 return stats['motor_available']
             else:
                 return stats['car_available']
@@ -298,7 +300,7 @@ class SensorDataManager(QObject):
         print("SENSOR DATA MANAGER - DEBUG INFO")
         print("="*60)
         print(f"Zone ID: {self.sensor_data['zone_id']}")
-        print(f"Vehicle Type: {self.vehicle_type}")
+        print(f"Vehicle Type: {self.vehicle_type.label}")
         print(f"Total Slots: {self.total_sensor_slots}")
         print(f"Status Binary: {self.sensor_data['status_binary']}")
         print(f"Occupied: {self.sensor_data['occupied_count']}")
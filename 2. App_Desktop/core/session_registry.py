@@ -0,0 +1,191 @@
+"""
+Registry session đang gửi (status=PARKING) trong bộ nhớ - tra cứu ở cổng ra O(1)
+Thay cho SELECT parking_sessions theo biển số / thẻ ở calculate_fee_and_display và
+handle_confirm_exit (mỗi lượt xe ra tra 2 lần)
+
+- load(conn): nạp toàn bộ session PARKING (partial index idx_sessions_open_plate - vài trăm dòng)
+- Index theo biển số đã chuẩn hóa (bỏ dấu cách / '-' / '.', chữ hoa) và theo card_id
+- Sau mỗi lệnh ghi ĐÃ COMMIT, DBManager gọi add() (xe vào) / remove() (xe ra)
+- Tự load lại sau `resync_interval` giây hoặc khi invalidate(); mỗi lần load so với bản
+  trong bộ nhớ và đếm số session lệch (drift - script ngoài sửa DB)
+
+Epoch như core/stats_counter.py: load lại xen giữa begin() và add()/remove() -> bỏ delta,
+đánh dấu cần load lại. load() tăng epoch TRƯỚC khi truy vấn; add() / remove() / invalidate()
+xen giữa truy vấn và lúc cài (`_changes` đổi) -> cài nhưng giữ trạng thái cần load lại
+(xe vừa ra không được "sống lại" từ kết quả truy vấn cũ).
+"""
+
+import re
+import sqlite3
+import threading
+import time
+
+
+_PLATE_JUNK = re.compile(r'[^0-9A-Z]')
+
+
+def normalize_plate(plate):
+    """'51a-999.99' / '51A 99999' -> '51A99999'"""
+    return _PLATE_JUNK.sub('', (plate or '').upper())
+
+
+def normalize_card(card_id):
+    return (card_id or '').strip()
+
+
+class SessionRegistry:
+    """Session đang gửi theo id, biển số chuẩn hóa và card_id"""
+
+    def __init__(self, resync_interval=60.0):
+        self.resync_interval = resync_interval
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._changes = 0     # Số lần add() / remove() / invalidate() - load() so trước / sau truy vấn
+        self._valid = False
+        self._loaded_at = 0.0
+        self._sessions = {}   # {session_id: row (sqlite3.Row - cùng cột với get_parking_session)}
+        self._by_plate = {}   # {biển số chuẩn hóa: set(session_id)}
+        self._by_card = {}    # {card_id chuẩn hóa: set(session_id)}
+        self._stats = {'reloads': 0, 'hits': 0, 'misses': 0, 'added': 0, 'removed': 0,
+                       'dropped_deltas': 0, 'drift': 0, 'raced_loads': 0}
+
+    # ------------------------------------------------------------------
+    # Load / resync
+    # ------------------------------------------------------------------
+    def needs_reload(self):
+        with self._lock:
+            return not self._valid or time.monotonic() - self._loaded_at >= self.resync_interval
+
+    def load(self, conn, sql, params=()):
+        """Nạp lại từ DB: `sql` trả về các session PARKING (cột 'id', 'plate_in', 'card_id')"""
+        with self._lock:
+            # Lệnh ghi đã begin() trước thời điểm này -> delta bị bỏ (không biết truy vấn thấy chưa)
+            self._epoch += 1
+            changes = self._changes
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        rows = cursor.execute(sql, params).fetchall()
+        with self._lock:
+            # Delta áp vào bản cũ trong lúc truy vấn sẽ bị ghi đè -> chưa tin được bản này
+            consistent = self._changes == changes
+            # Chỉ so khi bản cũ đang được tin (đã invalidate / load xen delta thì lệch là bình thường)
+            if self._stats['reloads'] and self._valid and consistent:
+                drift = len(self._sessions.keys() ^ {row['id'] for row in rows})
+                if drift:
+                    self._stats['drift'] += drift
+                    print(f"[SESSIONS] ⚠️ Registry lệch DB {drift} session, đã load lại")
+            self._sessions, self._by_plate, self._by_card = {}, {}, {}
+            for row in rows:
+                self._add(row)
+            self._loaded_at = time.monotonic()
+            self._valid = consistent
+            self._epoch += 1
+            self._stats['reloads'] += 1
+            if not consistent:
+                self._stats['raced_loads'] += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._changes += 1
+            self._valid = False
+
+    # ------------------------------------------------------------------
+    # Delta sau khi commit
+    # ------------------------------------------------------------------
+    def begin(self):
+        """Gọi TRƯỚC khi ghi, truyền epoch trả về cho add() / remove()"""
+        with self._lock:
+            return self._epoch
+
+    def _accept(self, epoch):
+        if not self._valid:
+            return False
+        if epoch != self._epoch:
+            self._valid = False
+            self._stats['dropped_deltas'] += 1
+            return False
+        return True
+
+    def _add(self, row):
+        session_id = row['id']
+        self._sessions[session_id] = row
+        self._by_plate.setdefault(normalize_plate(row['plate_in']), set()).add(session_id)
+        if row['card_id']:
+            self._by_card.setdefault(normalize_card(row['card_id']), set()).add(session_id)
+
+    def _discard(self, index, key, session_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(session_id)
+            if not ids:
+                del index[key]
+
+    def add(self, epoch, row):
+        """Session vừa được ghi (record_entry đã commit)"""
+        with self._lock:
+            self._changes += 1
+            if self._accept(epoch):
+                self._add(row)
+                self._stats['added'] += 1
+
+    def remove(self, epoch, session_id):
+        """Session vừa rời trạng thái PARKING (record_exit đã commit)"""
+        with self._lock:
+            self._changes += 1
+            if not self._accept(epoch):
+                return
+            row = self._sessions.pop(session_id, None)
+            if row is None:
+                return
+            self._discard(self._by_plate, normalize_plate(row['plate_in']), session_id)
+            if row['card_id']:
+                self._discard(self._by_card, normalize_card(row['card_id']), session_id)
+            self._stats['removed'] += 1
+
+    # ------------------------------------------------------------------
+    # Tra cứu
+    # ------------------------------------------------------------------
+    def find(self, plate=None, card_id=None):
+        """Session PARKING mới nhất (id lớn nhất) theo biển số hoặc thẻ
+
+        Returns:
+            tuple: (found, row) - found=False nghĩa là registry chưa load, caller đọc DB
+        """
+        with self._lock:
+            if not self._valid:
+                return False, None
+            if plate:
+                ids = self._by_plate.get(normalize_plate(plate))
+            elif card_id:
+                ids = self._by_card.get(normalize_card(card_id))
+            else:
+                ids = None
+            row = self._sessions[max(ids)] if ids else None
+            self._stats['hits' if row is not None else 'misses'] += 1
+            return True, row
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open'] = len(self._sessions)
+            stats['valid'] = self._valid
+        return stats
+
+
+# ===== REGISTRY DÙNG CHUNG THEO DB PATH =====
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_session_registry(db_path, resync_interval=60.0):
+    """Lấy (hoặc tạo) registry dùng chung cho db_path"""
+    with _registries_lock:
+        registry = _registries.get(db_path)
+        if registry is None:
+            registry = SessionRegistry(resync_interval=resync_interval)
+            _registries[db_path] = registry
+        return registry
@@ -0,0 +1,180 @@
+"""
+Slot Allocator - cấp ô đỗ trong bộ nhớ
+Thay cho 3 câu truy vấn của find_available_slot ở mỗi lượt xe vào
+
+- Free list theo (vehicle_type, is_reserved), nạp từ parking_slots ở lần dùng đầu tiên
+  (vehicle_type là mã số - core/enums.py VehicleType)
+- reserve(): lấy 1 ô trống O(1) và giữ ô đó (pending) cho tới khi commit()/release()
+  -> 2 làn vào chạy song song không bao giờ nhận cùng 1 ô
+- DBManager ghi status=1 có điều kiện (WHERE status=0) trong cùng transaction với
+  INSERT parking_sessions; nếu DB báo ô đã có xe (cảm biến, script ngoài) thì
+  allocator đánh dấu ô đó occupied và lấy ô khác
+- Ô được trả lại (xe ra, cảm biến báo trống) nối vào cuối free list (xoay vòng)
+- Tự load lại từ DB sau `resync_interval` giây hoặc khi invalidate()
+  (thêm/xóa vé tháng làm đổi is_reserved)
+- load() truy vấn ngoài lock: commit() / conflict() / set_status() / invalidate() xen giữa
+  truy vấn và lúc cài free list (`_changes` đổi) -> free list mới có thể đã cũ, cài nhưng
+  giữ trạng thái cần load lại
+"""
+
+import threading
+import time
+
+from core.enums import VehicleType
+
+
+class SlotAllocator:
+    """Free list ô đỗ theo loại xe và loại vé (vãng lai / vé tháng)"""
+
+    def __init__(self, resync_interval=60.0):
+        self.resync_interval = resync_interval
+        self._lock = threading.Lock()
+        self._valid = False
+        self._changes = 0    # Số lần đổi trạng thái ô - load() so trước / sau truy vấn
+        self._loaded_at = 0.0
+        self._slots = {}     # {slot_id: (vehicle_type, is_reserved)}
+        self._free = {}      # {(vehicle_type, is_reserved): {slot_id: None}} - dict giữ thứ tự
+        self._pending = set()  # Ô đã reserve() nhưng chưa commit()/release()
+        self._stats = {'reloads': 0, 'allocations': 0, 'conflicts': 0, 'exhausted': 0, 'raced_loads': 0}
+
+    # ------------------------------------------------------------------
+    # Load / resync
+    # ------------------------------------------------------------------
+    def needs_reload(self):
+        with self._lock:
+            return not self._valid or time.monotonic() - self._loaded_at >= self.resync_interval
+
+    def load(self, conn):
+        """Nạp lại free list từ parking_slots (thứ tự rowid như LIMIT 1 trước đây)"""
+        with self._lock:
+            changes = self._changes
+        rows = conn.execute(
+            "SELECT slot_id, vehicle_type, is_reserved, status FROM parking_slots ORDER BY rowid"
+        ).fetchall()
+        with self._lock:
+            # Ô vừa đổi trạng thái sau truy vấn sẽ bị ghi đè bằng trạng thái cũ -> chưa tin được
+            consistent = self._changes == changes
+            self._slots = {}
+            self._free = {}
+            for slot_id, vtype, reserved, status in rows:
+                key = (vtype, 1 if reserved else 0)
+                self._slots[slot_id] = key
+                free = self._free.setdefault(key, {})
+                if status != 1 and slot_id not in self._pending:
+                    free[slot_id] = None
+            self._loaded_at = time.monotonic()
+            self._valid = consistent
+            self._stats['reloads'] += 1
+            if not consistent:
+                self._stats['raced_loads'] += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._changes += 1
+            self._valid = False
+
+    # ------------------------------------------------------------------
+    # Cấp phát
+    # ------------------------------------------------------------------
+    def peek(self, vehicle_type, is_monthly=False):
+        """Ô trống đầu tiên (không giữ chỗ) - dùng cho find_available_slot"""
+        with self._lock:
+            free = self._free.get((vehicle_type, 1 if is_monthly else 0))
+            return next(iter(free), None) if free else None
+
+    def reserve(self, vehicle_type, is_monthly=False):
+        """Lấy và giữ 1 ô trống, None nếu hết chỗ"""
+        with self._lock:
+            free = self._free.get((vehicle_type, 1 if is_monthly else 0))
+            if not free:
+                self._stats['exhausted'] += 1
+                return None
+            slot_id = next(iter(free))
+            del free[slot_id]
+            self._pending.add(slot_id)
+            return slot_id
+
+    def claim(self, slot_id):
+        """Giữ đúng ô slot_id nếu đang trống (ô riêng của vé tháng)"""
+        with self._lock:
+            key = self._slots.get(slot_id)
+            free = self._free.get(key) if key else None
+            if not free or slot_id not in free:
+                return False
+            del free[slot_id]
+            self._pending.add(slot_id)
+            return True
+
+    def commit(self, slot_id):
+        """Ô đã được ghi status=1 trong DB"""
+        with self._lock:
+            self._changes += 1
+            self._pending.discard(slot_id)
+            self._stats['allocations'] += 1
+
+    def release(self, slot_id):
+        """Trả lại ô đã reserve() nhưng không dùng (ghi DB thất bại)"""
+        with self._lock:
+            if slot_id in self._pending:
+                self._pending.discard(slot_id)
+                self._add_free(slot_id)
+
+    def conflict(self, slot_id):
+        """DB báo ô đã có xe dù allocator tưởng còn trống -> bỏ khỏi free list"""
+        with self._lock:
+            self._changes += 1
+            self._pending.discard(slot_id)
+            self._stats['conflicts'] += 1
+
+    # ------------------------------------------------------------------
+    # Đồng bộ với các lệnh ghi khác (cảm biến, xe ra, record_entry chỉ định ô)
+    # ------------------------------------------------------------------
+    def _add_free(self, slot_id):
+        key = self._slots.get(slot_id)
+        if key is None:
+            self._valid = False
+            return
+        self._free.setdefault(key, {})[slot_id] = None
+
+    def set_status(self, slot_id, status):
+        """Gọi sau khi commit UPDATE parking_slots SET status=? (0 = trống, 1 = có xe)"""
+        with self._lock:
+            self._changes += 1
+            if slot_id in self._pending:
+                return
+            if status == 1:
+                key = self._slots.get(slot_id)
+                if key is not None:
+                    self._free.get(key, {}).pop(slot_id, None)
+            else:
+                self._add_free(slot_id)
+
+    def counts(self, vehicle_type, is_monthly=False):
+        """(số ô trống, tổng số ô) theo loại xe + loại vé"""
+        key = (vehicle_type, 1 if is_monthly else 0)
+        with self._lock:
+            total = sum(1 for k in self._slots.values() if k == key)
+            return len(self._free.get(key, ())), total
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+            stats['free'] = {f"{VehicleType.label_of(k[0])}/{'monthly' if k[1] else 'guest'}": len(v)
+                             for k, v in self._free.items()}
+        return stats
+
+
+# ===== ALLOCATOR DÙNG CHUNG THEO DB PATH =====
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def get_slot_allocator(db_path, resync_interval=60.0):
+    """Lấy (hoặc tạo) allocator dùng chung cho db_path"""
+    with _allocators_lock:
+        allocator = _allocators.get(db_path)
+        if allocator is None:
+            allocator = SlotAllocator(resync_interval=resync_interval)
+            _allocators[db_path] = allocator
+        return allocator
@@ -0,0 +1,290 @@
+"""
+Snapshot Service - bản sao point-in-time của database bằng sqlite3 online backup API
+Thay cho việc copy tay parking_system.db (copy file khi app đang ghi có thể ra file hỏng)
+và cho báo cáo nặng đọc từ bản sao thay vì file đang chạy
+
+- Backup theo từng bước `pages_per_step` trang, ngủ `step_sleep` giây giữa các bước
+  -> lock đọc trên file nguồn chỉ giữ trong 1 bước, lệnh ghi ở cổng vào/ra chen vào được
+- WAL: connection nguồn giữ 1 read transaction suốt quá trình backup -> bản sao nhất quán,
+  writer không bị chặn (WAL cho phép ghi song song với reader)
+- DELETE: không giữ read transaction (sẽ chặn COMMIT của writer); có lệnh ghi xen giữa thì
+  backup tự chạy lại từ đầu - quá `max_restarts` lần thì chép nốt trong 1 bước duy nhất
+- Mỗi snapshot là 1 thư mục <snapshot_dir>/<YYYYmmdd_HHMMSS>/ chứa file chính + file archive
+  (core/archiver.py); ghi vào thư mục .tmp, quick_check rồi mới rename -> không bao giờ thấy
+  snapshot dở dang. Chỉ giữ `retention` snapshot mới nhất
+- File chính được chụp trước archive: session bị archive_batch() chuyển đúng lúc đang backup
+  có thể nằm ở cả 2 file của snapshot, không bao giờ mất khỏi cả 2
+- connect_latest(): connection read-only tới snapshot mới nhất (archive được ATTACH như pool)
+"""
+
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+
+SNAPSHOT_NAME_FORMAT = "%Y%m%d_%H%M%S"
+_SNAPSHOT_DIR_RE = re.compile(r"^\d{8}_\d{6}$")
+TMP_SUFFIX = ".tmp"
+STARTUP_DELAY = 10  # Giây chờ sau khi start() trước snapshot đầu tiên (để app khởi động xong)
+
+
+class BackupRestarted(Exception):
+    """File nguồn bị ghi trong lúc backup quá max_restarts lần (DELETE mode)"""
+
+
+def default_snapshot_dir(db_path):
+    """parking_system.db -> snapshots/ cạnh file DB chính"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "snapshots")
+
+
+def _ro_uri(path):
+    return "file:" + os.path.abspath(path).replace("?", "%3f").replace("#", "%23") + "?mode=ro"
+
+
+class SnapshotService:
+    """Tạo snapshot định kỳ trên thread nền + mở connection đọc snapshot mới nhất"""
+
+    def __init__(self, db_path, snapshot_dir=None, interval=1800, retention=48, pages_per_step=256,
+                 step_sleep=0.01, max_restarts=3, attachments=None, timeout=30.0, verify=True,
+                 factory=None):
+        self.db_path = db_path
+        self.snapshot_dir = snapshot_dir or default_snapshot_dir(db_path)
+        self.interval = interval
+        self.retention = max(1, int(retention))
+        self.pages_per_step = max(1, int(pages_per_step))
+        self.step_sleep = step_sleep
+        self.max_restarts = max_restarts
+        self.attachments = dict(attachments or {})  # {alias: path} - vd {'archive': ..._archive.db}
+        self.timeout = timeout
+        self.verify = verify
+        self.factory = factory or sqlite3.Connection
+        self._snapshot_lock = threading.Lock()  # 1 backup tại 1 thời điểm
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'snapshots': 0, 'failures': 0, 'restarts': 0, 'fallback_single_step': 0,
+                       'last_duration_ms': 0.0, 'last_size_bytes': 0, 'last_error': None,
+                       'reads_snapshot': 0, 'reads_live': 0}
+
+    # ------------------------------------------------------------------
+    # Danh sách snapshot
+    # ------------------------------------------------------------------
+    def _file_name(self, alias):
+        path = self.db_path if alias == 'main' else self.attachments[alias]
+        return os.path.basename(path)
+
+    def list_snapshots(self):
+        """[{'name', 'path', 'created'}] các snapshot hoàn chỉnh, cũ nhất trước"""
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.snapshot_dir)):
+            path = os.path.join(self.snapshot_dir, name)
+            if not _SNAPSHOT_DIR_RE.match(name) or not os.path.isdir(path):
+                continue
+            result.append({
+                'name': name,
+                'path': path,
+                'created': time.mktime(time.strptime(name, SNAPSHOT_NAME_FORMAT)),
+            })
+        return result
+
+    def latest(self):
+        """Snapshot mới nhất (dict như list_snapshots) hoặc None"""
+        snapshots = self.list_snapshots()
+        return snapshots[-1] if snapshots else None
+
+    # ------------------------------------------------------------------
+    # Backup
+    # ------------------------------------------------------------------
+    def _backup_schema(self, src, target_path, name):
+        """Backup 1 schema (main / archive) của src sang target_path theo từng bước"""
+        dst = sqlite3.connect(target_path)
+        try:
+            state = {'last_remaining': None, 'restarts': 0}
+
+            def progress(status, remaining, total):
+                # Bước thành công mà remaining không giảm = sqlite đã chạy lại backup từ đầu
+                # (nguồn bị ghi từ connection khác); status BUSY = bước chưa chạy, bỏ qua
+                if status != sqlite3.SQLITE_OK:
+                    return
+                if state['last_remaining'] is not None and remaining >= state['last_remaining']:
+                    state['restarts'] += 1
+                    if state['restarts'] > self.max_restarts:
+                        raise BackupRestarted(name)
+                state['last_remaining'] = remaining
+                if remaining and self.step_sleep:
+                    time.sleep(self.step_sleep)  # Nhả lock đọc cho lệnh ghi chen vào
+
+            try:
+                src.backup(dst, pages=self.pages_per_step, progress=progress, name=name)
+            except BackupRestarted:
+                # Ghi quá dày: chép nốt trong 1 bước (giữ lock đọc trong thời gian copy toàn bộ file)
+                self._count('fallback_single_step')
+                src.backup(dst, pages=-1, name=name)
+            self._count('restarts', state['restarts'])
+            # Bản sao của file WAL vẫn mang cờ WAL -> chuyển về DELETE cho snapshot là 1 file độc lập
+            dst.execute("PRAGMA journal_mode=DELETE")
+
+            if self.verify:
+                result = dst.execute("PRAGMA quick_check").fetchone()[0]
+                if result != 'ok':
+                    raise sqlite3.DatabaseError(f"quick_check {name}: {result}")
+        finally:
+            dst.close()
+
+    def take_snapshot(self):
+        """Tạo 1 snapshot ngay (blocking), trả về dict snapshot mới, dọn snapshot quá retention"""
+        with self._snapshot_lock:
+            t0 = time.perf_counter()
+            name = time.strftime(SNAPSHOT_NAME_FORMAT)
+            final_path = os.path.join(self.snapshot_dir, name)
+            if os.path.exists(final_path):
+                return self.latest()  # Vừa tạo trong cùng giây
+            tmp_path = final_path + TMP_SUFFIX
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+
+            src = sqlite3.connect(self.db_path, timeout=self.timeout)
+            try:
+                src.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+                schemas = ['main']
+                for alias, path in self.attachments.items():
+                    # Chỉ backup archive đã có file (ATTACH file chưa có sẽ tạo file rỗng)
+                    if path and os.path.exists(path):
+                        src.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+                        schemas.append(alias)
+
+                # Read transaction trên các schema WAL -> mọi bước backup thấy cùng 1 thời điểm.
+                # Schema DELETE (vd: archive) không giữ lock đọc: sẽ chặn lệnh ghi vào file đó
+                wal_schemas = [schema for schema in schemas
+                               if src.execute(f"PRAGMA {schema}.journal_mode").fetchone()[0].lower() == 'wal']
+                if wal_schemas:
+                    src.execute("BEGIN")
+                    for schema in wal_schemas:
+                        src.execute(f"SELECT count(*) FROM {schema}.sqlite_master").fetchone()
+
+                for schema in schemas:
+                    self._backup_schema(src, os.path.join(tmp_path, self._file_name(schema)), schema)
+            except Exception as e:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                self._count('failures')
+                with self._stats_lock:
+                    self._stats['last_error'] = str(e)
+                raise
+            finally:
+                if src.in_transaction:
+                    src.rollback()
+                src.close()
+
+            os.replace(tmp_path, final_path)
+            size = sum(os.path.getsize(os.path.join(final_path, f)) for f in os.listdir(final_path))
+            duration_ms = (time.perf_counter() - t0) * 1000.0
+            with self._stats_lock:
+                self._stats['snapshots'] += 1
+                self._stats['last_duration_ms'] = round(duration_ms, 1)
+                self._stats['last_size_bytes'] = size
+                self._stats['last_error'] = None
+            print(f"[DB-SNAPSHOT] ✅ {final_path} ({size / 1048576:.1f} MB, {duration_ms:.0f} ms)")
+
+            self._apply_retention()
+            return self.latest()
+
+    def _apply_retention(self):
+        """Xóa snapshot cũ vượt retention + thư mục .tmp sót lại (app bị tắt giữa chừng)"""
+        for snapshot in self.list_snapshots()[:-self.retention]:
+            shutil.rmtree(snapshot['path'], ignore_errors=True)
+        # Gọi trong _snapshot_lock -> không có backup nào đang ghi vào thư mục .tmp
+        for name in os.listdir(self.snapshot_dir):
+            if name.endswith(TMP_SUFFIX):
+                shutil.rmtree(os.path.join(self.snapshot_dir, name), ignore_errors=True)
+
+    # ------------------------------------------------------------------
+    # Đọc snapshot
+    # ------------------------------------------------------------------
+    def connect_latest(self, max_age=None, min_created=None):
+        """Connection read-only tới snapshot mới nhất, None nếu không có snapshot phù hợp
+
+        Args:
+            max_age: Bỏ qua snapshot cũ hơn N giây
+            min_created: Bỏ qua snapshot tạo trước epoch này (vd: báo cáo đến hết ngày X cần
+                         snapshot tạo sau 0h ngày X+1)
+        """
+        snapshot = self.latest()
+        if snapshot is None \
+                or (max_age is not None and time.time() - snapshot['created'] > max_age) \
+                or (min_created is not None and snapshot['created'] < min_created):
+            return None
+        conn = sqlite3.connect(_ro_uri(os.path.join(snapshot['path'], self._file_name('main'))),
+                               uri=True, check_same_thread=False, factory=self.factory)
+        for alias in self.attachments:
+            path = os.path.join(snapshot['path'], self._file_name(alias))
+            if os.path.exists(path):
+                conn.execute(f"ATTACH DATABASE ? AS {alias}", (_ro_uri(path),))
+        return conn
+
+    def record_read(self, from_snapshot):
+        self._count('reads_snapshot' if from_snapshot else 'reads_live')
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        latest = self.latest()
+        stats['latest'] = latest['name'] if latest else None
+        stats['latest_age_sec'] = round(time.time() - latest['created']) if latest else None
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+    # ------------------------------------------------------------------
+    # Thread nền
+    # ------------------------------------------------------------------
+    def start(self):
+        """Chạy snapshot định kỳ mỗi `interval` giây (interval <= 0 = tắt)"""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="DBSnapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Dừng thread nền (backup đang chạy dở vẫn chạy xong - tối đa timeout giây chờ)"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _next_delay(self):
+        latest = self.latest()
+        if latest is None:
+            return STARTUP_DELAY
+        return max(latest['created'] + self.interval - time.time(), STARTUP_DELAY)
+
+    def _run(self):
+        delay = self._next_delay()  # Snapshot cũ vẫn còn hạn -> chờ tới hạn (khởi động lại app)
+        while not self._stop_event.wait(delay):
+            try:
+                self.take_snapshot()
+            except Exception as e:
+                print(f"[DB-SNAPSHOT] ❌ Lỗi tạo snapshot: {e}")
+            delay = self.interval
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_snapshot_service(db_path, **kwargs):
+    """Lấy (hoặc tạo) snapshot service dùng chung cho db_path (chưa start thread)"""
+    with _services_lock:
+        service = _services.get(db_path)
+        if service is None:
+            service = SnapshotService(db_path, **kwargs)
+            _services[db_path] = service
+        return service
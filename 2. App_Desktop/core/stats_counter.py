@@ -0,0 +1,237 @@
+"""
+Bộ đếm thống kê dashboard (in-process)
+Thay cho ~16 câu COUNT(*) của get_parking_statistics mỗi lần refresh
+
+- load(conn): tính toàn bộ snapshot bằng 1 câu truy vấn gộp (UNION ALL + GROUP BY)
+- Sau mỗi lệnh ghi ĐÃ COMMIT (record_entry / record_exit / update_slot_status),
+  DBManager áp delta vào snapshot -> dashboard chỉ đọc dict trong bộ nhớ
+- Tự resync từ DB khi: sang ngày mới (giờ Việt Nam), quá `resync_interval` giây,
+  hoặc bị invalidate() (thay đổi hiếm như thêm/xóa vé tháng, script ngoài sửa DB)
+
+Epoch: begin() trả về epoch hiện tại trước khi ghi. Nếu snapshot được load lại
+trong lúc đang ghi thì không biết lần load đó đã thấy lệnh ghi hay chưa -> bỏ delta
+và đánh dấu cần load lại, tránh đếm trùng. load() tăng epoch TRƯỚC khi truy vấn và tăng
+lần nữa khi cài snapshot; có delta / invalidate() nào xen giữa (`_changes` đổi) thì snapshot
+vẫn được cài nhưng giữ trạng thái cần load lại.
+"""
+
+import threading
+import time
+
+from core.enums import SessionStatus, VehicleType
+from core.vn_time import vietnam_today, vn_epoch_sql
+
+
+# Key theo mã số vehicle_type (core/enums.py) - caller truyền mã số / member, không truyền label
+MOTOR = VehicleType.MOTOR
+CAR = VehicleType.CAR
+
+# 1 lần quét: xe đang gửi theo loại, xe vào/ra hôm nay, slot theo (loại xe, reserved)
+_DAY_START = vn_epoch_sql(':day')
+_DAY_END = vn_epoch_sql("date(:day, '+1 day')")
+_SNAPSHOT_SQL = f"""
+    SELECT 'open', vehicle_type, NULL, COUNT(*), NULL
+    FROM parking_sessions WHERE status={SessionStatus.PARKING.value} GROUP BY vehicle_type
+    UNION ALL
+    SELECT 'in', NULL, NULL, COUNT(*), NULL
+    FROM parking_sessions WHERE time_in_ts >= {_DAY_START} AND time_in_ts < {_DAY_END}
+    UNION ALL
+    SELECT 'out', NULL, NULL, COUNT(*), NULL
+    FROM parking_sessions WHERE status={SessionStatus.PAID.value} AND time_out_ts >= {_DAY_START} AND time_out_ts < {_DAY_END}
+    UNION ALL
+    SELECT 'slot', vehicle_type, is_reserved, slot_id, status
+    FROM parking_slots
+"""
+
+
+class ParkingStatsCounter:
+    """Snapshot thống kê bãi xe, cập nhật tăng dần sau mỗi lệnh ghi"""
+
+    def __init__(self, resync_interval=60.0):
+        self.resync_interval = resync_interval
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._changes = 0        # Số lần apply() / invalidate() - load() so trước / sau truy vấn
+        self._valid = False
+        self._loaded_at = 0.0
+        self._day = None
+
+        self._open = {}          # {vehicle_type: số xe đang gửi}
+        self._in_today = 0
+        self._out_today = 0
+        self._slots = {}         # {slot_id: [vehicle_type, is_reserved, status]}
+        self._slot_counts = {}   # {(vehicle_type, is_reserved): [total, occupied]}
+
+        self._stats = {'reloads': 0, 'deltas': 0, 'dropped_deltas': 0, 'raced_loads': 0}
+
+    # ------------------------------------------------------------------
+    # Load / resync
+    # ------------------------------------------------------------------
+    def needs_reload(self):
+        with self._lock:
+            return (not self._valid
+                    or self._day != vietnam_today()
+                    or time.monotonic() - self._loaded_at >= self.resync_interval)
+
+    def load(self, conn):
+        """Tính lại toàn bộ snapshot từ DB (1 câu truy vấn)"""
+        with self._lock:
+            # Lệnh ghi đã begin() trước thời điểm này -> delta bị bỏ (không biết truy vấn thấy chưa)
+            self._epoch += 1
+            changes = self._changes
+        day = vietnam_today()
+        rows = conn.execute(_SNAPSHOT_SQL, {'day': day}).fetchall()
+
+        open_counts, slots, slot_counts = {}, {}, {}
+        in_today = out_today = 0
+        for kind, vtype, reserved, value, status in rows:
+            if kind == 'open':
+                open_counts[vtype] = value
+            elif kind == 'in':
+                in_today = value
+            elif kind == 'out':
+                out_today = value
+            else:
+                reserved = 1 if reserved else 0
+                occupied = 1 if status == 1 else 0
+                slots[value] = [vtype, reserved, occupied]
+                counts = slot_counts.setdefault((vtype, reserved), [0, 0])
+                counts[0] += 1
+                counts[1] += occupied
+
+        with self._lock:
+            # Delta áp vào snapshot cũ trong lúc truy vấn sẽ bị ghi đè -> chưa tin được snapshot này
+            consistent = self._changes == changes
+            self._open = open_counts
+            self._in_today = in_today
+            self._out_today = out_today
+            self._slots = slots
+            self._slot_counts = slot_counts
+            self._day = day
+            self._loaded_at = time.monotonic()
+            self._valid = consistent
+            self._epoch += 1
+            self._stats['reloads'] += 1
+            if not consistent:
+                self._stats['raced_loads'] += 1
+
+    def invalidate(self):
+        """Buộc load lại ở lần đọc tiếp theo"""
+        with self._lock:
+            self._changes += 1
+            self._valid = False
+
+    # ------------------------------------------------------------------
+    # Delta sau khi commit
+    # ------------------------------------------------------------------
+    def begin(self):
+        """Gọi TRƯỚC khi ghi, truyền epoch trả về cho apply()"""
+        with self._lock:
+            return self._epoch
+
+    def _set_slot_status(self, slot_id, status):
+        slot = self._slots.get(slot_id)
+        if slot is None:
+            # Slot chưa có trong snapshot (vừa được thêm?) -> load lại cho chắc
+            self._valid = False
+            return
+        occupied = 1 if status == 1 else 0
+        if slot[2] != occupied:
+            self._slot_counts[(slot[0], slot[1])][1] += occupied - slot[2]
+            slot[2] = occupied
+
+    def apply(self, epoch, entered=None, exited=None, slots=None):
+        """Áp delta của 1 lệnh ghi đã commit
+
+        Args:
+            epoch: Giá trị begin() trả về trước khi ghi
+            entered: vehicle_type của xe vừa vào (record_entry)
+            exited: vehicle_type của xe vừa ra (record_exit)
+            slots: {slot_id: status mới}
+        """
+        with self._lock:
+            self._changes += 1
+            if not self._valid:
+                return
+            if epoch != self._epoch or self._day != vietnam_today():
+                self._valid = False
+                self._stats['dropped_deltas'] += 1
+                return
+            if entered is not None:
+                self._open[entered] = self._open.get(entered, 0) + 1
+                self._in_today += 1
+            if exited is not None:
+                self._open[exited] = max(0, self._open.get(exited, 0) - 1)
+                self._out_today += 1
+            for slot_id, status in (slots or {}).items():
+                self._set_slot_status(slot_id, status)
+            self._stats['deltas'] += 1
+
+    # ------------------------------------------------------------------
+    # Đọc
+    # ------------------------------------------------------------------
+    def guest_slots(self, vehicle_type):
+        """(chỗ trống, tổng) của slot vãng lai theo loại xe"""
+        with self._lock:
+            total, occupied = self._slot_counts.get((vehicle_type, 0), (0, 0))
+        return max(0, total - occupied), total
+
+    def snapshot(self):
+        """Dict thống kê cho dashboard (cùng key với get_parking_statistics trước đây)"""
+        with self._lock:
+            counts = {key: tuple(value) for key, value in self._slot_counts.items()}
+            motor_parking = self._open.get(MOTOR, 0)
+            car_parking = self._open.get(CAR, 0)
+            total_in_today = self._in_today
+            total_out_today = self._out_today
+
+        def slot(vtype, reserved):
+            return counts.get((vtype, reserved), (0, 0))
+
+        car_guest_total, car_guest_occupied = slot(CAR, 0)
+        car_monthly_total, car_monthly_occupied = slot(CAR, 1)
+        motor_guest_total, motor_guest_occupied = slot(MOTOR, 0)
+        motor_monthly_total, motor_monthly_occupied = slot(MOTOR, 1)
+        car_total = car_guest_total + car_monthly_total
+        motor_total = motor_guest_total + motor_monthly_total
+
+        return {
+            'motor_parking': motor_parking,
+            'car_parking': car_parking,
+            'total_in_today': total_in_today,
+            'total_out_today': total_out_today,
+            'car_available': car_total - car_parking,
+            'car_total': car_total,
+            'car_guest_available': max(0, car_guest_total - car_guest_occupied),
+            'car_guest_total': car_guest_total,
+            'car_monthly_available': max(0, car_monthly_total - car_monthly_occupied),
+            'car_monthly_total': car_monthly_total,
+            'motor_available': motor_total - motor_parking,
+            'motor_total': motor_total,
+            'motor_guest_available': max(0, motor_guest_total - motor_guest_occupied),
+            'motor_guest_total': motor_guest_total,
+            'motor_monthly_available': max(0, motor_monthly_total - motor_monthly_occupied),
+            'motor_monthly_total': motor_monthly_total,
+        }
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['valid'] = self._valid
+            stats['day'] = self._day
+        return stats
+
+
+# ===== BỘ ĐẾM DÙNG CHUNG THEO DB PATH =====
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_stats_counter(db_path, resync_interval=60.0):
+    """Lấy (hoặc tạo) bộ đếm dùng chung cho db_path"""
+    with _counters_lock:
+        counter = _counters.get(db_path)
+        if counter is None:
+            counter = ParkingStatsCounter(resync_interval=resync_interval)
+            _counters[db_path] = counter
+        return counter
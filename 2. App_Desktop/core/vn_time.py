@@ -0,0 +1,29 @@
+"""
+Giờ Việt Nam (UTC+7) <-> epoch
+time_in/time_out lưu dạng text giờ VN ('YYYY-MM-DD HH:MM:SS', từ datetime('now', '+7 hours'));
+time_in_ts/time_out_ts lưu epoch (giây, UTC) để lọc/sắp xếp bằng so sánh số nguyên
+"""
+
+from datetime import datetime, timedelta, timezone
+
+
+VN_OFFSET_SEC = 7 * 3600
+
+
+def vn_epoch_sql(expr):
+    """Biểu thức SQL đổi text giờ VN (hoặc tham số ?) sang epoch
+
+    Chỉ bọc hàm quanh THAM SỐ, không bọc cột -> điều kiện vẫn dùng được index:
+        f"time_in_ts >= {vn_epoch_sql('?')}"
+    """
+    return f"(CAST(strftime('%s', {expr}) AS INTEGER) - {VN_OFFSET_SEC})"
+
+
+def vn_date_sql(ts_expr):
+    """Biểu thức SQL đổi cột epoch sang ngày giờ VN ('YYYY-MM-DD')"""
+    return f"date({ts_expr} + {VN_OFFSET_SEC}, 'unixepoch')"
+
+
+def vietnam_today():
+    """Ngày hiện tại theo giờ Việt Nam - khớp với date('now', '+7 hours') trong SQL"""
+    return (datetime.now(timezone.utc) + timedelta(hours=7)).strftime('%Y-%m-%d')
@@ -1,6 +1,7 @@
 import sqlite3
 import hashlib
 import os
+from core.db_migrations import migrate_database
 
 # Database file name
 DB_NAME = "parking_system.db"
@@ -160,44 +161,21 @@ def init_db():
         print("[DB-ERROR] Loi: Khong tao duoc file database.")
 
 def migrate_db():
-    """Update schema of existing database"""
+    """Update schema of existing database (versioned migrations - core/db_migrations.py)"""
     print(f"--- Checking and updating Database: {DB_NAME} ---")
     if not os.path.exists(DB_NAME):
         print("[DB-ERROR] Database khong ton tai, hay chay init_db() truoc")
         return
     
-    conn = None
     try:
-        conn = sqlite3.connect(DB_NAME, timeout=30.0, check_same_thread=False)
-        cursor = conn.cursor()
-        
-        # Check if slot_id column exists in parking_sessions
-        cursor.execute("PRAGMA table_info(parking_sessions)")
-        columns = [row[1] for row in cursor.fetchall()]
-        
-        if 'slot_id' not in columns:
-            print("[DB] Cot slot_id chua ton tai, dang them...")
-            cursor.execute("ALTER TABLE parking_sessions ADD COLUMN slot_id TEXT")
-            print("[DB] Da them cot slot_id")
+        applied = migrate_database(DB_NAME)
+        if applied:
+            print(f"[DB] Da ap dung migration: {applied}")
         else:
-            print("[DB] Cot slot_id da ton tai")
-        
-        conn.commit()
+            print("[DB] Schema da o phien ban moi nhat")
         print("[DB] Cap nhat Database hoan tat")
-        
     except Exception as e:
         print(f"[DB-ERROR] Loi cap nhat Database: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-    finally:
-        if conn:
-            try:
-                conn.close()
-            except:
-                pass
 
 if __name__ == "__main__":
     init_db()
@@ -12,6 +12,10 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from core.db_manager import DBManager
+from core.enums import SessionStatus, VehicleType
+
+MOTOR = VehicleType.MOTOR.value
+PARKING = SessionStatus.PARKING.value
 
 def print_section(title):
     print(f"\n{'='*70}")
@@ -28,13 +32,13 @@ def main():
     cursor = conn.cursor()
     
     # Đếm slots xe máy
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT COUNT(*) as total, 
                SUM(CASE WHEN status=0 THEN 1 ELSE 0 END) as available,
                SUM(CASE WHEN status=1 THEN 1 ELSE 0 END) as occupied,
                SUM(CASE WHEN is_reserved=1 THEN 1 ELSE 0 END) as monthly
         FROM parking_slots 
-        WHERE vehicle_type='Xe máy'
+        WHERE vehicle_type={MOTOR}
     """)
     
     result = cursor.fetchone()
@@ -45,10 +49,10 @@ def main():
     
     # Chi tiết từng slot
     print("\n  Chi tiết từng slot XE MÁY:")
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT slot_id, is_reserved, status 
         FROM parking_slots 
-        WHERE vehicle_type='Xe máy'
+        WHERE vehicle_type={MOTOR}
         ORDER BY slot_id
     """)
     
@@ -61,9 +65,9 @@ def main():
     print_section("2. PARKING SESSIONS - Dữ liệu xe hiện tại")
     
     # Xe đang gửi (status='PARKING')
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT COUNT(*) FROM parking_sessions 
-        WHERE vehicle_type='Xe máy' AND status='PARKING'
+        WHERE vehicle_type={MOTOR} AND status={PARKING}
     """)
     motor_parking = cursor.fetchone()[0]
     
@@ -71,10 +75,10 @@ def main():
     
     if motor_parking > 0:
         print("\n  Chi tiết xe đang gửi:")
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT id, plate_in, time_in, slot_id 
             FROM parking_sessions 
-            WHERE vehicle_type='Xe máy' AND status='PARKING'
+            WHERE vehicle_type={MOTOR} AND status={PARKING}
             ORDER BY time_in DESC
         """)
         
@@ -84,15 +88,15 @@ def main():
     # 3. So sánh logic
     print_section("3. SO SÁNH & PHÂN TÍCH")
     
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT COUNT(*) FROM parking_slots 
-        WHERE vehicle_type='Xe máy' AND is_reserved=0 AND status=1
+        WHERE vehicle_type={MOTOR} AND is_reserved=0 AND status=1
     """)
     guest_occupied_from_slots = cursor.fetchone()[0]
     
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT COUNT(*) FROM parking_sessions 
-        WHERE vehicle_type='Xe máy' AND status='PARKING'
+        WHERE vehicle_type={MOTOR} AND status={PARKING}
     """)
     guest_occupied_from_sessions = cursor.fetchone()[0]
     
@@ -108,14 +112,14 @@ def main():
     # 4. Tìm slots bị "bẩn" (có status=1 nhưng không có session PARKING)
     print_section("4. TÌM SLOTS 'BẨN' (status=1 nhưng không có session)")
     
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT ps.slot_id 
         FROM parking_slots ps
-        WHERE ps.vehicle_type='Xe máy' AND ps.status=1 AND ps.is_reserved=0
+        WHERE ps.vehicle_type={MOTOR} AND ps.status=1 AND ps.is_reserved=0
         AND NOT EXISTS (
             SELECT 1 FROM parking_sessions psess 
-            WHERE psess.vehicle_type='Xe máy' 
-            AND psess.status='PARKING' 
+            WHERE psess.vehicle_type={MOTOR} 
+            AND psess.status={PARKING} 
             AND psess.slot_id = ps.slot_id
         )
     """)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Sinh database giả lập cỡ lớn cho benchmark / thử tải
+- Ô đỗ ô tô / xe máy (một phần dành riêng cho vé tháng)
+- Vé tháng: chủ xe, biển số, thẻ, ô riêng, ~20% đã hết hạn
+- Phiên gửi xe trải đều `days` ngày tới hiện tại theo lưu lượng thực tế:
+  ngày thường đông hơn cuối tuần, cao điểm 7-9h và 17-19h, khách quen quay lại nhiều lần,
+  vé tháng đỗ cả ngày, thẻ khách vãng lai được dùng lại
+- Xe đang gửi (PARKING) chiếm ô tương ứng trong parking_slots
+- Sau khi sinh dữ liệu chạy run_migrations() (epoch, daily_rollup, FTS...) như DB thật
+
+Usage:
+    python generate_dataset.py --out bench.db                        # 1.000.000 sessions, 2 năm
+    python generate_dataset.py --out big.db --sessions 5000000 --days 1095 --motor-slots 1500
+"""
+import argparse
+import datetime
+import hashlib
+import os
+import random
+import sqlite3
+import sys
+import time
+
+app_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, app_dir)
+
+from core.db_migrations import run_migrations
+from core.vn_time import VN_OFFSET_SEC
+
+BASE_SCHEMA = os.path.join(app_dir, "..", "5. Database", "schema.sql")
+
+MOTOR = "Xe máy"
+CAR = "Ô tô"
+
+# Tỉ lệ lượt vào theo giờ trong ngày (0h..23h): cao điểm sáng 7-9h, chiều 17-19h
+HOURLY_PROFILE = (1, 1, 1, 1, 1, 2, 5, 12, 14, 8, 6, 6, 7, 6, 5, 5, 7, 11, 12, 8, 5, 4, 3, 2)
+# Hệ số theo thứ trong tuần (Thứ 2 .. Chủ nhật)
+WEEKDAY_FACTOR = (1.0, 1.0, 1.0, 1.0, 1.05, 0.8, 0.6)
+
+DEFAULT_SETTINGS = (
+    ('parking_name', 'Bai xe Thong minh J97'),
+    ('price_xe_máy_block1', '5000'), ('price_xe_máy_block2', '3000'), ('price_xe_máy_monthly', '150000'),
+    ('price_ô_tô_block1', '25000'), ('price_ô_tô_block2', '10000'), ('price_ô_tô_monthly', '1200000'),
+    ('camera_entry_url', '0'),
+    ('camera_exit_url', '1'),
+)
+
+LAST_NAMES = ("Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ")
+MIDDLE_NAMES = ("Văn", "Thị", "Minh", "Đức", "Thanh", "Ngọc", "Quốc", "Hữu", "Thu", "Gia")
+FIRST_NAMES = ("An", "Bình", "Cường", "Dũng", "Hà", "Hải", "Hạnh", "Hùng", "Khoa", "Lan", "Linh",
+               "Long", "Mai", "Nam", "Phong", "Phúc", "Quân", "Tâm", "Thảo", "Trang", "Tuấn", "Vy")
+
+
+def _hash_password(password):
+    return hashlib.md5(password.encode()).hexdigest()
+
+
+def _vn_now():
+    """Giờ Việt Nam hiện tại (naive datetime, cùng quy ước với time_in/time_out trong DB)"""
+    now = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=VN_OFFSET_SEC)
+    return now.replace(tzinfo=None, microsecond=0)
+
+
+def _fee(vehicle_type, minutes):
+    """Cùng cách tính với calculate_parking_fee() (main.py) theo bảng giá mặc định"""
+    block1, block2 = (5000, 3000) if vehicle_type == MOTOR else (25000, 10000)
+    if minutes <= 120:
+        return block1
+    extra = minutes - 120
+    return block1 + (int(extra // 60) + (1 if extra % 60 else 0)) * block2
+
+
+class DatasetGenerator:
+    """Sinh dữ liệu có tính lặp lại (cùng seed -> cùng database)"""
+
+    def __init__(self, sessions=1_000_000, days=730, car_slots=100, motor_slots=300,
+                 monthly_tickets=400, open_sessions=None, monthly_share=0.25, seed=42):
+        self.rnd = random.Random(seed)
+        self.n_sessions = sessions
+        self.days = days
+        self.car_slots = car_slots
+        self.motor_slots = motor_slots
+        self.n_monthly = monthly_tickets
+        self.monthly_share = monthly_share if monthly_tickets else 0.0
+        # Mặc định ~40% số ô đang có xe
+        self.n_open = open_sessions if open_sessions is not None else int((car_slots + motor_slots) * 0.4)
+        self.now = _vn_now()
+
+    # ------------------------------------------------------------------
+    # Dữ liệu tham chiếu
+    # ------------------------------------------------------------------
+    def plate(self, vehicle_type):
+        rnd = self.rnd
+        if vehicle_type == MOTOR:
+            return f"{rnd.randint(11, 99)}-{rnd.choice('ABCDEFGHKLMNPSTUVXYZ')}{rnd.randint(1, 9)} " \
+                   f"{rnd.randint(100, 999)}.{rnd.randint(10, 99)}"
+        return f"{rnd.randint(11, 99)}{rnd.choice('ABCDEFGHKLMN')}-{rnd.randint(100, 999)}.{rnd.randint(10, 99)}"
+
+    def card(self):
+        return f"{self.rnd.randint(0, 0xFFFFFFFF):08X}"
+
+    def slots(self):
+        """[(slot_id, vehicle_type, is_reserved, status)] - ~20% ô mỗi loại dành cho vé tháng"""
+        rows = [(f"A{i}", CAR, 1 if i <= self.car_slots // 5 else 0, 0) for i in range(1, self.car_slots + 1)]
+        rows += [(f"M{i}", MOTOR, 1 if i <= self.motor_slots // 5 else 0, 0) for i in range(1, self.motor_slots + 1)]
+        return rows
+
+    def monthly(self, slots):
+        """[(plate, owner, card, assigned_slot, vehicle_type, reg_date, exp_date, status)]"""
+        rnd = self.rnd
+        reserved = {CAR: [s[0] for s in slots if s[1] == CAR and s[2]],
+                    MOTOR: [s[0] for s in slots if s[1] == MOTOR and s[2]]}
+        today = self.now.date()
+        rows, cards = [], set()
+        for i in range(self.n_monthly):
+            vehicle_type = MOTOR if rnd.random() < 0.7 else CAR
+            card = self.card()
+            while card in cards:
+                card = self.card()
+            cards.add(card)
+            pool = reserved[vehicle_type]
+            slot = pool[i % len(pool)] if pool else None
+            reg = today - datetime.timedelta(days=rnd.randint(0, self.days))
+            if rnd.random() < 0.8:
+                exp = today + datetime.timedelta(days=rnd.randint(1, 180))
+            else:
+                exp = today - datetime.timedelta(days=rnd.randint(1, 90))
+            owner = f"{rnd.choice(LAST_NAMES)} {rnd.choice(MIDDLE_NAMES)} {rnd.choice(FIRST_NAMES)}"
+            rows.append((self.plate(vehicle_type), owner, card, slot, vehicle_type,
+                         reg.isoformat(), exp.isoformat(), 'ACTIVE'))
+        return rows
+
+    # ------------------------------------------------------------------
+    # Phiên gửi xe
+    # ------------------------------------------------------------------
+    def _daily_counts(self):
+        """Số lượt vào mỗi ngày: hệ số thứ trong tuần x dao động ngẫu nhiên x tăng trưởng nhẹ"""
+        first_day = self.now.date() - datetime.timedelta(days=self.days - 1)
+        weights = []
+        for i in range(self.days):
+            day = first_day + datetime.timedelta(days=i)
+            growth = 0.8 + 0.4 * i / max(self.days - 1, 1)
+            weights.append(WEEKDAY_FACTOR[day.weekday()] * growth * self.rnd.uniform(0.85, 1.15))
+        # Hôm nay mới qua một phần (theo HOURLY_PROFILE)
+        elapsed_hours = self.now.hour + 1
+        weights[-1] *= sum(HOURLY_PROFILE[:elapsed_hours]) / sum(HOURLY_PROFILE)
+        total = sum(weights)
+        counts = [int(self.n_sessions * w / total) for w in weights]
+        # Phần dư do làm tròn chia đều cho các ngày đã trọn
+        for i in range(self.n_sessions - sum(counts)):
+            counts[i % max(self.days - 1, 1)] += 1
+        return first_day, counts
+
+    def sessions(self, monthly_rows):
+        """Sinh (card_id, plate_in, time_in, time_out, price, vehicle_type, ticket_type, status,
+        payment_method, slot_id) theo thứ tự thời gian vào; n_open phiên cuối là xe đang gửi"""
+        rnd = self.rnd
+        hours = list(range(24))
+        # Khách vãng lai: khách quen (pool nhỏ) quay lại nhiều lần, thẻ vãng lai dùng lại
+        guest_plates = {MOTOR: [self.plate(MOTOR) for _ in range(max(self.n_sessions // 40, 50))],
+                        CAR: [self.plate(CAR) for _ in range(max(self.n_sessions // 120, 20))]}
+        guest_cards = [self.card() for _ in range(max((self.car_slots + self.motor_slots) * 2, 50))]
+        free_slots = {CAR: [f"A{i}" for i in range(1, self.car_slots + 1)],
+                      MOTOR: [f"M{i}" for i in range(1, self.motor_slots + 1)]}
+        open_from = self.n_sessions - self.n_open
+        open_cards = set()  # Mỗi thẻ tối đa 1 xe đang gửi (unique index idx_sessions_open_card)
+
+        first_day, counts = self._daily_counts()
+        index = 0
+        for day_offset, count in enumerate(counts):
+            day = datetime.datetime.combine(first_day + datetime.timedelta(days=day_offset), datetime.time())
+            # Hôm nay: chỉ các giờ đã qua (dồn đủ số lượt vào phần đã qua của ngày)
+            elapsed_hours = min(int((self.now - day).total_seconds() // 3600), 23)
+            entries = sorted(
+                min(day + datetime.timedelta(hours=h, seconds=rnd.randrange(3600)), self.now)
+                for h in rnd.choices(hours[:elapsed_hours + 1], weights=HOURLY_PROFILE[:elapsed_hours + 1], k=count)
+            )
+            for time_in in entries:
+                is_monthly = rnd.random() < self.monthly_share
+                if is_monthly:
+                    plate, _, card, slot, vehicle_type, _, _, _ = rnd.choice(monthly_rows)
+                    ticket_type = 'MONTHLY'
+                    minutes = rnd.randint(6 * 60, 11 * 60)  # Đi làm cả ngày
+                else:
+                    vehicle_type = MOTOR if rnd.random() < 0.75 else CAR
+                    pool = guest_plates[vehicle_type]
+                    plate = rnd.choice(pool) if rnd.random() < 0.6 else self.plate(vehicle_type)
+                    card = rnd.choice(guest_cards)
+                    slot = rnd.choice(free_slots[vehicle_type])
+                    ticket_type = 'GUEST'
+                    minutes = min(int(rnd.lognormvariate(4.3, 0.9)) + 5, 36 * 60)
+
+                if index >= open_from and free_slots[vehicle_type] and card not in open_cards:
+                    # Xe đang gửi: giữ riêng 1 ô (ô riêng của vé tháng nếu có)
+                    open_cards.add(card)
+                    if not (is_monthly and slot in free_slots[vehicle_type]):
+                        slot = free_slots[vehicle_type][-1]
+                    free_slots[vehicle_type].remove(slot)
+                    yield (card, plate, time_in.strftime("%Y-%m-%d %H:%M:%S"), None, 0,
+                           vehicle_type, ticket_type, 'PARKING', None, slot)
+                else:
+                    time_out = min(time_in + datetime.timedelta(minutes=minutes), self.now)
+                    price = 0 if is_monthly else round(_fee(vehicle_type, minutes) / 1000) * 1000
+                    yield (card, plate, time_in.strftime("%Y-%m-%d %H:%M:%S"),
+                           time_out.strftime("%Y-%m-%d %H:%M:%S"), price, vehicle_type, ticket_type,
+                           'PAID', 'MONTHLY' if is_monthly else rnd.choice(("CASH", "CASH", "BANKING")), slot)
+                index += 1
+
+
+def build_database(path, sessions=1_000_000, days=730, car_slots=100, motor_slots=300,
+                   monthly_tickets=400, open_sessions=None, seed=42, migrate=True, verbose=True):
+    """Tạo database tại `path` (ghi đè nếu đã có)
+
+    Args:
+        migrate: False = chỉ schema gốc (5. Database/schema.sql), chưa chạy migration nào
+
+    Returns:
+        dict: thông số của dataset (dùng làm metadata cho benchmark)
+    """
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    gen = DatasetGenerator(sessions, days, car_slots, motor_slots, monthly_tickets, open_sessions, seed=seed)
+
+    t0 = time.perf_counter()
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        with open(BASE_SCHEMA, "r", encoding="utf-8") as f:
+            conn.executescript(f.read())
+
+        conn.executemany("INSERT INTO users (username, password, full_name, role) VALUES (?, ?, ?, ?)", [
+            ("admin", _hash_password("admin123"), "Quan Tri Vien", "ADMIN"),
+            ("staff", _hash_password("123456"), "Nhan Vien Thu Ngan", "STAFF"),
+        ])
+        conn.executemany("INSERT INTO settings (key_name, key_value) VALUES (?, ?)", DEFAULT_SETTINGS)
+        conn.executemany("INSERT INTO settings (key_name, key_value) VALUES (?, ?)", [
+            ('total_slots_car', str(car_slots)), ('total_slots_motor', str(motor_slots)),
+        ])
+
+        slots = gen.slots()
+        conn.executemany("INSERT INTO parking_slots (slot_id, vehicle_type, is_reserved, status) "
+                         "VALUES (?, ?, ?, ?)", slots)
+        monthly = gen.monthly(slots)
+        conn.executemany("""
+            INSERT INTO monthly_tickets
+            (plate_number, owner_name, card_id, assigned_slot, vehicle_type, reg_date, exp_date, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, monthly)
+
+        if verbose:
+            print(f"🔧 Sinh {sessions:,} sessions / {days} ngày -> {path}")
+        conn.executemany("""
+            INSERT INTO parking_sessions
+            (card_id, plate_in, time_in, time_out, price, vehicle_type, ticket_type, status, payment_method, slot_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, gen.sessions(monthly))
+        conn.execute("""
+            UPDATE parking_slots SET status=1
+            WHERE slot_id IN (SELECT slot_id FROM parking_sessions WHERE status='PARKING')
+        """)
+        conn.commit()
+        if verbose:
+            print(f"   Dữ liệu xong sau {time.perf_counter() - t0:.1f}s")
+
+        if migrate:
+            run_migrations(conn, verbose=verbose)
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+
+    if verbose:
+        print(f"✅ {path}: {os.path.getsize(path) / 1024 / 1024:.1f} MB sau {time.perf_counter() - t0:.1f}s")
+    return {
+        'sessions': sessions, 'days': days, 'car_slots': car_slots, 'motor_slots': motor_slots,
+        'monthly_tickets': monthly_tickets, 'open_sessions': gen.n_open, 'seed': seed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sinh database giả lập cỡ lớn")
+    parser.add_argument("--out", required=True, help="File database sẽ tạo (ghi đè)")
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=730, help="Số ngày dữ liệu tính tới hôm nay")
+    parser.add_argument("--car-slots", type=int, default=100)
+    parser.add_argument("--motor-slots", type=int, default=300)
+    parser.add_argument("--monthly", type=int, default=400, help="Số vé tháng")
+    parser.add_argument("--open", type=int, default=None, help="Số xe đang gửi (mặc định 40%% số ô)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-migrate", action="store_true", help="Chỉ schema gốc, không chạy migration")
+    args = parser.parse_args()
+    build_database(args.out, args.sessions, args.days, args.car_slots, args.motor_slots, args.monthly,
+                   args.open, args.seed, migrate=not args.no_migrate)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Script nhập / xuất vé tháng hàng loạt (core/monthly_bulk.py)
+Nhập: kiểm tra toàn bộ file trước, rồi ghi tất cả vé + reserve ô trong 1 transaction;
+có dòng lỗi thì không ghi gì (trừ khi --skip-invalid). Báo cáo lỗi / cảnh báo ghi ra CSV.
+Chạy được khi app đang mở (app tự nạp lại vé tháng sau cache_ttl / stats_resync_interval giây)
+
+File CSV (UTF-8), header theo tên cột hoặc tiêu đề tiếng Việt của file xuất:
+    plate_number,owner_name,card_id,vehicle_type,reg_date,exp_date,assigned_slot,avatar_path
+    30A-123.45,Công ty ABC,A1B2C3D4,Ô tô,2025-01-01,2025-12-31,A1,
+
+Usage:
+    python import_monthly.py import tickets.csv                   # Báo cáo: tickets_report.csv
+    python import_monthly.py import tickets.csv --dry-run         # Chỉ kiểm tra
+    python import_monthly.py import tickets.csv --skip-invalid --report loi.csv
+    python import_monthly.py export ve_thang.csv                  # Hoặc .xlsx (cần openpyxl)
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import exporter, monthly_bulk
+from core.db_migrations import run_migrations
+
+# Đường dẫn database
+DB_PATH = os.path.join(os.path.dirname(__file__), "parking_system.db")
+
+
+def import_file(csv_path, db_path=DB_PATH, report_path=None, skip_invalid=False, dry_run=False):
+    report_path = report_path or f"{os.path.splitext(csv_path)[0]}_report.csv"
+    rows = monthly_bulk.read_csv(csv_path)
+    print(f"🔄 Nhập {len(rows):,} vé tháng từ {csv_path}{' (chỉ kiểm tra)' if dry_run else ''}...")
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    try:
+        run_migrations(conn)
+        t0 = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        report = monthly_bulk.import_tickets(conn, rows, skip_invalid=skip_invalid, dry_run=dry_run)
+        conn.commit()
+        elapsed = time.perf_counter() - t0
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Lỗi nhập vé tháng: {e}")
+        raise
+    finally:
+        conn.close()
+
+    monthly_bulk.write_report(report_path, report)
+    print(f"   Lỗi: {len(report['errors'])}, cảnh báo: {len(report['warnings'])} -> {report_path}")
+    if report['imported']:
+        print(f"✅ Đã nhập {report['imported']:,} vé, reserve {report['reserved_slots']} ô ({elapsed:.2f}s)")
+    elif report['errors'] and not dry_run:
+        print("❌ Không nhập vé nào - sửa các dòng lỗi hoặc chạy lại với --skip-invalid")
+    return report
+
+
+def export_file(out_path, db_path=DB_PATH, chunk_size=2000):
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    writer = exporter.open_writer(out_path)
+    count = 0
+    try:
+        writer.write_rows([[title for _, title in monthly_bulk.COLUMNS]])
+        for chunk in monthly_bulk.iter_export_rows(conn, chunk_size):
+            writer.write_rows(chunk)
+            count += len(chunk)
+    finally:
+        writer.close()
+        conn.close()
+    print(f"✅ Đã xuất {count:,} vé tháng -> {out_path}")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nhập / xuất vé tháng hàng loạt")
+    parser.add_argument("--db", default=DB_PATH, help="Đường dẫn file database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_import = sub.add_parser("import", help="Nhập vé tháng từ CSV")
+    p_import.add_argument("csv", help="File CSV vé tháng")
+    p_import.add_argument("--report", help="File báo cáo lỗi (mặc định: <csv>_report.csv)")
+    p_import.add_argument("--skip-invalid", action="store_true", help="Vẫn nhập các dòng hợp lệ khi có dòng lỗi")
+    p_import.add_argument("--dry-run", action="store_true", help="Chỉ kiểm tra, không ghi")
+    p_export = sub.add_parser("export", help="Xuất toàn bộ vé tháng ra CSV / XLSX")
+    p_export.add_argument("out", help="File xuất (.csv hoặc .xlsx)")
+    args = parser.parse_args()
+    if args.command == "import":
+        result = import_file(args.csv, args.db, args.report, args.skip_invalid, args.dry_run)
+        sys.exit(1 if result['errors'] and not (args.skip_invalid or args.dry_run) else 0)
+    else:
+        export_file(args.out, args.db)
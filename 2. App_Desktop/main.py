@@ -2,26 +2,31 @@
 # -*- coding: utf-8 -*-
 import sys
 import os
+import threading
 import time
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QPushButton, QLabel, 
                                QStackedWidget, QTableWidget, QTableWidgetItem, QLineEdit, 
                                QComboBox, QDateEdit, QFileDialog, QMessageBox, QGraphicsView, QGraphicsScene,
                                QProgressBar, QDialog, QVBoxLayout, QHBoxLayout, QTimeEdit, QSpinBox, QCheckBox, QFrame,
-                               QHeaderView, QScrollArea)
+                               QHeaderView, QScrollArea, QProgressDialog)
 from PySide6.QtUiTools import QUiLoader
 from PySide6.QtCore import QFile, QDate, QTime, Qt, QRectF, QTimer
-from PySide6.QtGui import QPixmap, QImage, QColor, QBrush, QPen, QFont
+from PySide6.QtGui import QPixmap, QImage, QColor, QBrush, QPen, QFont, QShortcut, QKeySequence
 import PIL.Image
 
 # --- CẤU HÌNH IMPORT THEO CẤU TRÚC MỚI ---
 # Thêm thư mục hiện tại (2. App_Desktop) vào sys.path để import các file ngang cấp
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from config import UI_PATH, PAGES_PATH, CAMERA_ENTRY_ID, CAMERA_EXIT_ID, ENABLE_AI_DETECTION
+from config import UI_PATH, PAGES_PATH, CAMERA_ENTRY_ID, CAMERA_EXIT_ID, ENABLE_AI_DETECTION, DB_CONFIG, SERVER_CONFIG
 from database import init_db, migrate_db # Import functions to initialize and update DB
 from core.db_manager import DBManager
+from core.async_db import AsyncDBManager
+from core import exporter
+from core.enums import VehicleType, TicketType, SessionStatus
 from core.camera_thread import CameraThread
 from core.network_server import NetworkServer
+from core.async_network_server import AsyncNetworkServer
 from core.sensor_manager import SensorDataManager
 from login_dialog import LoginDialog
 
@@ -31,10 +36,21 @@ CAR_SLOTS = 5    # Số slot ô tô
 
 # --- TÍNH PHÍ (Hàm độc lập) ---
 # Tái định nghĩa hàm tính phí vì nó sử dụng DBManager (cần giữ logic này trong main)
-def calculate_parking_fee(db: DBManager, vehicle_type: str, time_in_str: str, time_out_seconds: float):
+def session_time_in_epoch(session):
+    """Epoch giờ vào của session (cột time_in_ts); session cũ chưa có thì parse text time_in"""
+    try:
+        if session['time_in_ts'] is not None:
+            return session['time_in_ts']
+    except (IndexError, KeyError, TypeError):
+        pass
+    return time.mktime(time.strptime(session[4], "%Y-%m-%d %H:%M:%S"))
+
+def calculate_parking_fee(db: DBManager, vehicle_type: str, time_in, time_out_seconds: float):
     # Tính phí dựa trên bảng giá từ settings
+    # time_in: epoch (time_in_ts) hoặc text 'YYYY-MM-DD HH:MM:SS' (dữ liệu cũ)
     try:
-        time_in = time.mktime(time.strptime(time_in_str, "%Y-%m-%d %H:%M:%S"))
+        if isinstance(time_in, str):
+            time_in = time.mktime(time.strptime(time_in, "%Y-%m-%d %H:%M:%S"))
         parking_duration_minutes = (time_out_seconds - time_in) / 60
         
         if parking_duration_minutes < 0: return 0
@@ -117,7 +133,7 @@ class PaymentDialog(QDialog):
         layout.addWidget(lbl_title)
         
         # Thông tin
-        icon = "🏍️" if self.vehicle_type == "Xe máy" else "🚗"
+        icon = "🏍️" if self.vehicle_type == VehicleType.MOTOR.label else "🚗"
         lbl_plate = QLabel(f"Biển số: {self.plate}")
         lbl_plate.setAlignment(Qt.AlignCenter)
         lbl_plate.setStyleSheet("font-size: 14px;")
@@ -226,13 +242,16 @@ class MainWindow(QMainWindow):
         super().__init__()
         # Khởi tạo DB Manager
         self.db = DBManager()
+        # Lệnh DB của luồng xe vào/ra + dashboard chạy trên worker, không chặn GUI thread
+        self.async_db = AsyncDBManager(self.db, max_workers=DB_CONFIG.get("async_workers", 4), parent=self)
+        self._dashboard_refresh_pending = False
+        self._dashboard_refresh_again = False
         self.camera_entry_thread = None
         self.camera_exit_thread = None
         
         # Khởi tạo Sensor Data Manager
         self.sensor_manager = SensorDataManager(self.db)
-        self.sensor_manager.set_vehicle_type("Tổng hợp")  # 10 slots cho cả xe máy & ô tô
-        self.sensor_manager.set_vehicle_type("Xe máy")  # Mặc định zone cảm biến cho xe máy
+        self.sensor_manager.set_vehicle_type(VehicleType.MOTOR)  # Mặc định zone cảm biến cho xe máy
         self.sensor_manager.slots_changed.connect(self.on_sensor_slots_changed, Qt.QueuedConnection)
         print("[INIT] ✅ Sensor Manager initialized")
         
@@ -242,8 +261,54 @@ class MainWindow(QMainWindow):
         self.dashboard_refresh_timer.start(2000)  # 2000ms = 2 giây
         print("[INIT] ✅ Auto-refresh timer started (2s interval)")
         
+        # Bảo trì DB định kỳ trên worker: archive session cũ + ANALYZE + incremental vacuum
+        self.db_maintenance_timer = QTimer(self)
+        self.db_maintenance_timer.timeout.connect(lambda: self.async_db.call('run_maintenance'))
+        self.db_maintenance_timer.start(int(DB_CONFIG.get("maintenance_interval", 3600)) * 1000)
+        
+        # Nạp session đang gửi vào registry trước lượt xe ra đầu tiên (core/session_registry.py)
+        self.async_db.call('load_session_registry')
+        
+        # Snapshot DB định kỳ trên thread nền (online backup API, không chặn lệnh ghi ở cổng)
+        self.db.snapshots.start()
+        
+        # Ctrl+Shift+D: ghi thống kê truy vấn DB (latency, slow query) ra reports/db_stats_*.json
+        self.db_stats_shortcut = QShortcut(QKeySequence("Ctrl+Shift+D"), self)
+        self.db_stats_shortcut.activated.connect(
+            lambda: self.async_db.call('dump_query_stats')
+        )
+        
+        # Debounce ô tìm kiếm vé tháng: chỉ truy vấn khi ngừng gõ 250ms
+        self._monthly_search_text = ""
+        self.monthly_search_timer = QTimer(self)
+        self.monthly_search_timer.setSingleShot(True)
+        self.monthly_search_timer.setInterval(250)
+        self.monthly_search_timer.timeout.connect(
+            lambda: self.load_monthly_tickets(self._monthly_search_text)
+        )
+        
         # Khởi tạo Network Server (kết nối với ESP32)
-        self.network_server = NetworkServer(host='0.0.0.0', port=8888)
+        # SERVER_CONFIG["engine"] = "asyncio": 1 event loop thread cho mọi ESP32 thay cho 1 thread / client
+        server_options = dict(
+            host='0.0.0.0', port=8888,
+            scan_dedup_window=SERVER_CONFIG.get("scan_dedup_window", 5.0),
+            scan_dedup_max_entries=SERVER_CONFIG.get("scan_dedup_max_entries", 1024),
+            send_queue_size=SERVER_CONFIG.get("send_queue_size", 64),
+            send_timeout=SERVER_CONFIG.get("send_timeout", 5.0),
+            slow_client_policy=SERVER_CONFIG.get("slow_client_policy", "close"),
+            binary_protocol=SERVER_CONFIG.get("binary_protocol", True),
+            max_line_bytes=SERVER_CONFIG.get("max_line_bytes", 1024),
+            idle_timeout=SERVER_CONFIG.get("idle_timeout", 90),
+            keepalive_idle=SERVER_CONFIG.get("keepalive_idle", 30),
+        )
+        if SERVER_CONFIG.get("engine", "threaded") == "asyncio":
+            self.network_server = AsyncNetworkServer(
+                backlog=SERVER_CONFIG.get("backlog", 128),
+                max_clients=SERVER_CONFIG.get("max_clients", 100),
+                **server_options,
+            )
+        else:
+            self.network_server = NetworkServer(**server_options)
         # Sử dụng Qt.QueuedConnection cho cross-thread signal
         self.network_server.card_scanned.connect(self.on_esp_card_scanned, Qt.QueuedConnection)
         self.network_server.barrier_closed.connect(self.on_barrier_closed, Qt.QueuedConnection)
@@ -257,7 +322,7 @@ class MainWindow(QMainWindow):
         self.current_entry_plate = "..."
         self.current_entry_card = "" 
         self.current_exit_plate = "..."
-        self.current_entry_vehicle_type = "Ô tô"  # Mặc định
+        self.current_entry_vehicle_type = VehicleType.CAR.label  # Mặc định
         self.parking_map_scene = None  # Khởi tạo sớm để tránh lỗi
         
         # Tracking để tránh update UI không cần thiết
@@ -532,13 +597,13 @@ class MainWindow(QMainWindow):
         
         return super().eventFilter(obj, event)
 
-    def draw_parking_map(self):
+    def draw_parking_map(self, slots=None):
         if not hasattr(self, 'parking_map_scene') or not self.parking_map_scene: 
             return
+        if slots is None:
+            slots = self.db.get_all_parking_slots()
         self.parking_map_scene.clear()
         
-        slots = self.db.get_all_parking_slots()
-        
         slot_width = 120
         slot_height = 50
         spacing = 10
@@ -594,7 +659,7 @@ class MainWindow(QMainWindow):
             last_entry = self.db.get_last_entry_session()
             if last_entry:
                 session_id, plate_in, time_in, vehicle_type, slot_id = last_entry
-                vehicle_icon = "🏍️" if vehicle_type == "Xe máy" else "🚗"
+                vehicle_icon = "🏍️" if vehicle_type == VehicleType.MOTOR.label else "🚗"
                 
                 if self.lbl_entry_plate:
                     self.lbl_entry_plate.setText(f"{vehicle_icon} {plate_in} ({vehicle_type})")
@@ -615,7 +680,7 @@ class MainWindow(QMainWindow):
             last_exit = self.db.get_last_exit_session()
             if last_exit:
                 session_id, plate_in, time_out, price, payment_method, slot_id, vehicle_type = last_exit
-                vehicle_icon = "🏍️" if vehicle_type == "Xe máy" else "🚗"
+                vehicle_icon = "🏍️" if vehicle_type == VehicleType.MOTOR.label else "🚗"
                 
                 if self.lbl_exit_plate:
                     self.lbl_exit_plate.setText(f"{vehicle_icon} {plate_in} ({vehicle_type})")
@@ -690,7 +755,7 @@ class MainWindow(QMainWindow):
         if plate_text and plate_text != "..." and not plate_text.startswith("LỖI"):
             # Phân loại xe tự động
             vehicle_type = self.classify_vehicle_type(plate_text)
-            vehicle_icon = "🏍️" if vehicle_type == "Xe máy" else "🚗"
+            vehicle_icon = "🏍️" if vehicle_type == VehicleType.MOTOR.label else "🚗"
             
             if self.lbl_entry_plate:
                 # Cập nhật thông tin biển số vào + loại xe
@@ -725,7 +790,7 @@ class MainWindow(QMainWindow):
         if plate_text and plate_text != "..." and not plate_text.startswith("LỖI"):
             # Phân loại xe tự động
             vehicle_type = self.classify_vehicle_type(plate_text)
-            vehicle_icon = "🏍️" if vehicle_type == "Xe máy" else "🚗"
+            vehicle_icon = "🏍️" if vehicle_type == VehicleType.MOTOR.label else "🚗"
             
             if self.lbl_exit_plate:
                 self.lbl_exit_plate.setText(f"{vehicle_icon} {plate_text} ({vehicle_type})")
@@ -855,17 +920,8 @@ class MainWindow(QMainWindow):
             print(f"[ESP-EXIT] txt_exit_rfid exists: {self.txt_exit_rfid is not None if hasattr(self, 'txt_exit_rfid') else False}")
             
             if self.txt_exit_rfid:
-                # DEBOUNCE: Kiểm tra thời gian quét gần nhất (time-based)
-                current_time = time.time()
-                if hasattr(self, '_last_exit_scan_time'):
-                    time_diff = current_time - self._last_exit_scan_time
-                    if time_diff < 5.0:  # 5 giây debounce
-                        print(f"[ESP-EXIT] ⏱️ Debounce: {time_diff:.1f}s < 5s, bỏ qua")
-                        return
-                
-                self._last_exit_scan_time = current_time
-                print(f"[ESP-EXIT] ✅ Đã cập nhật _last_exit_scan_time")
-                
+                # Quét trùng (cùng thẻ / cùng làn trong SERVER_CONFIG["scan_dedup_window"] giây)
+                # đã bị NetworkServer bỏ trước khi tới đây
                 if card_uid:
                     # Có thẻ RFID (vé tháng hoặc vé lượt)
                     print(f"[ESP-EXIT] 🎫 Quét thẻ cổng ra: {card_uid}")
@@ -970,12 +1026,13 @@ class MainWindow(QMainWindow):
         # KHÔNG gọi update_dashboard_with_sensor_data() ở đây để tránh trùng lặp
         # Vì on_sensor_data_received() đã gọi rồi
     
-    def update_dashboard_with_sensor_data(self):
+    def update_dashboard_with_sensor_data(self, stats=None):
         """Cập nhật dashboard với dữ liệu từ cảm biến (bãi tổng hợp: 5 xe máy + 5 ô tô)"""
         try:
             print(f"\n[DASHBOARD-UPDATE-CALLED] ⚡ Dashboard update triggered!")
-            # Lấy stats từ DB
-            stats = self.db.get_parking_statistics()
+            # Lấy stats từ DB (nếu caller chưa lấy sẵn)
+            if stats is None:
+                stats = self.db.get_parking_statistics()
             
             # Lấy số xe GUEST đang parking từ DB (chỉ GUEST, không MONTHLY)
             motor_db_guest_parking = stats['motor_guest_total'] - stats['motor_guest_available']
@@ -1200,13 +1257,18 @@ class MainWindow(QMainWindow):
         vehicle_type = self.classify_vehicle_type(plate_text)
         print(f"[CLASSIFY] Biển số: {plate_text} → Loại xe: {vehicle_type}")
         
-        # Xử lý logic vé tháng/vãng lai
-        rfid = self.current_entry_card
-        ticket_info = self.db.get_monthly_ticket_info(rfid)
-        
-        # Lưu image path để truyền vào record_entry()
+        # Lưu image path để truyền vào allocate_and_record_entry()
         self._current_entry_image_path = image_in_path
         
+        # Xử lý logic vé tháng/vãng lai (tra vé tháng trên worker, tiếp tục ở _on_entry_ticket_info)
+        rfid = self.current_entry_card
+        self.async_db.call(
+            'get_monthly_ticket_info', rfid,
+            callback=lambda ticket_info: self._on_entry_ticket_info(rfid, vehicle_type, ticket_info),
+            errback=lambda e: self.display_entry_lane_error(f"Lỗi tra cứu vé: {e}", auto_clear_seconds=5))
+    
+    def _on_entry_ticket_info(self, rfid, vehicle_type, ticket_info):
+        """Tiếp tục on_entry_capture_complete sau khi tra vé tháng xong (GUI thread)"""
         if ticket_info:
             plate_db = ticket_info['plate_number']
             slot_db = ticket_info['assigned_slot']
@@ -1312,27 +1374,34 @@ class MainWindow(QMainWindow):
     def auto_process_monthly_entry(self, card_id, plate, ticket_info):
         """Tự động xử lý xe vé tháng vào bãi"""
         vehicle_type = ticket_info['vehicle_type']
-        assigned_slot = ticket_info['assigned_slot']
-        
-        # Kiểm tra slot có bị chiếm không
-        slot_status = self.db.get_all_parking_slots()
-        is_reserved_slot_occupied = any(s[0] == assigned_slot and s[3] == 1 for s in slot_status if assigned_slot)
         
-        if assigned_slot and not is_reserved_slot_occupied:
-            # Slot riêng còn trống
-            pass
-        else:
-            # Slot riêng bị chiếm hoặc không có, tìm slot khác
-            assigned_slot = self.db.find_available_slot(vehicle_type, is_monthly=False)
-            if not assigned_slot:
-                error_msg = "Bãi đỗ xe đã đầy!"
-                self.display_entry_lane_error(error_msg, auto_clear_seconds=5)
-                QMessageBox.warning(self, "Lỗi", error_msg)
-                return
-        
-        # Ghi nhận xe vào
+        # Cấp ô + ghi nhận xe vào trong 1 transaction:
+        # ưu tiên slot riêng nếu còn trống, bị chiếm hoặc không có thì lấy ô vãng lai
         image_path = getattr(self, '_current_entry_image_path', None)
-        success = self.db.record_entry(card_id, plate, vehicle_type, assigned_slot, 'MONTHLY', image_path)
+        self.async_db.call(
+            'allocate_and_record_entry', card_id, plate, vehicle_type, TicketType.MONTHLY.label, image_path,
+            preferred_slot=ticket_info['assigned_slot'],
+            callback=lambda result: self._on_monthly_entry_recorded(card_id, plate, ticket_info, result),
+            errback=lambda e: self._on_entry_record_failed(e))
+    
+    def _on_entry_record_failed(self, error):
+        """Lệnh ghi xe vào ném exception (GUI thread)"""
+        print(f"[ENTRY ERROR] {error}")
+        if hasattr(self, 'network_server'):
+            self.network_server.scan_dedup.forget(lane=1)  # Cho quét lại ngay
+        error_msg = "Không thể ghi nhận xe vào."
+        self.display_entry_lane_error(error_msg, auto_clear_seconds=5)
+        QMessageBox.critical(self, "Lỗi", error_msg)
+    
+    def _on_monthly_entry_recorded(self, card_id, plate, ticket_info, result):
+        """Tiếp tục auto_process_monthly_entry sau khi ghi DB xong (GUI thread)"""
+        vehicle_type = ticket_info['vehicle_type']
+        assigned_slot, success = result
+        if not assigned_slot:
+            error_msg = "Bãi đỗ xe đã đầy!"
+            self.display_entry_lane_error(error_msg, auto_clear_seconds=5)
+            QMessageBox.warning(self, "Lỗi", error_msg)
+            return
         
         if success:
             # Set debounce flag để tránh xử lý lại cùng thẻ
@@ -1364,8 +1433,7 @@ class MainWindow(QMainWindow):
             QTimer.singleShot(3000, self.send_idle_lcd_message)
             
             # Cập nhật UI
-            self.draw_parking_map()
-            self.update_dashboard_stats()
+            self.refresh_dashboard_async()
 
             #Cập nhật lịch sử ra vào
             self.refresh_history_if_visible()
@@ -1380,26 +1448,43 @@ class MainWindow(QMainWindow):
         # Phân loại xe tự động
         vehicle_type = self.classify_vehicle_type(plate)
         print(f"[CLASSIFY] Biển số: {plate} → Loại xe: {vehicle_type}")
-        ticket_type = 'GUEST'
+        ticket_type = TicketType.GUEST.label
         
         print(f"[ENTRY] Tìm slot cho {vehicle_type}...")
         
-        # Tìm slot trống
-        assigned_slot = self.db.find_available_slot(vehicle_type, is_monthly=False)
+        # Cấp slot trống + ghi nhận xe vào trong 1 transaction (worker thread)
+        image_path = getattr(self, '_current_entry_image_path', None)
+        
+        def record():
+            assigned_slot, success = self.db.allocate_and_record_entry(
+                card_id, plate, vehicle_type, ticket_type, image_path)
+            if assigned_slot:
+                return assigned_slot, success, None, None
+            # Hết chỗ: lấy luôn số chỗ trống vãng lai (bỏ qua reserved) để báo lỗi
+            return (assigned_slot, success,
+                    self.db.get_available_slots_for_guests(vehicle_type), self.db.get_parking_statistics())
+        
+        self.async_db.submit(
+            record,
+            callback=lambda result: self._on_guest_entry_recorded(card_id, plate, vehicle_type, result),
+            errback=lambda e: self._on_entry_record_failed(e))
+    
+    def _on_guest_entry_recorded(self, card_id, plate, vehicle_type, result):
+        """Tiếp tục auto_process_guest_entry sau khi ghi DB xong (GUI thread)"""
+        assigned_slot, success, guest_slots, stats = result
         
         if not assigned_slot:
             # Kiểm tra thông tin chi tiết - dùng guest-available slots (bỏ qua reserved)
             # Ưu tiên dùng sensor data nếu có sẵn (accurate real-time data)
-            available, total = self.db.get_available_slots_for_guests(vehicle_type)
+            available, total = guest_slots
             
             # Nếu sensor có data fresh, dùng sensor available count thay vì DB
             if self.sensor_manager.is_data_fresh():
-                stats = self.db.get_parking_statistics()
-                if vehicle_type == 'Ô tó':
+                if vehicle_type == VehicleType.CAR.label:
                     available = stats['car_guest_available']
                     total = stats['car_guest_total']
                     print(f"[ENTRY-SENSOR] Using sensor data: Car GUEST available={available}/{total}")
-                elif vehicle_type == 'Xe máy':
+                elif vehicle_type == VehicleType.MOTOR.label:
                     available = stats['motor_guest_available']
                     total = stats['motor_guest_total']
                     print(f"[ENTRY-SENSOR] Using sensor data: Motor GUEST available={available}/{total}")
@@ -1420,10 +1505,6 @@ class MainWindow(QMainWindow):
             QTimer.singleShot(10000, self.reset_entry_ui)
             return
         
-        # Ghi nhận xe vào
-        image_path = getattr(self, '_current_entry_image_path', None)
-        success = self.db.record_entry(card_id, plate, vehicle_type, assigned_slot, ticket_type, image_path)
-        
         if success:
             # Set debounce flag để tránh xử lý lại cùng thẻ
             self._last_processed_card = card_id
@@ -1450,8 +1531,7 @@ class MainWindow(QMainWindow):
 
             
             # Cập nhật UI
-            self.draw_parking_map()
-            self.update_dashboard_stats()
+            self.refresh_dashboard_async()
             
             # Gửi số ô trống lên LCD sau 3 giây (để người dùng thấy thông tin xe)
             from PySide6.QtCore import QTimer
@@ -1545,7 +1625,7 @@ class MainWindow(QMainWindow):
         import re
         
         if not plate_text:
-            return "Ô tô"  # Default
+            return VehicleType.CAR.label  # Default
         
         # Normalize: uppercase, loại bỏ dấu chấm và khoảng trắng thừa
         plate = plate_text.upper().strip()
@@ -1558,23 +1638,23 @@ class MainWindow(QMainWindow):
         # Pattern 2: XX Y... (có khoảng trắng)
         if re.match(r'^\d{2}[\s\-][A-Z]', plate):
             print(f"[CLASSIFY-DEBUG] Result: Xe máy (có dấu ngăn cách)")
-            return "Xe máy"
+            return VehicleType.MOTOR.label
         
         # Kiểm tra pattern ô tô: Số và chữ dính liền (không có dấu ngăn cách)
         # Pattern: XXY... (51F, 29A, etc.)
         if re.match(r'^\d{2}[A-Z]', plate):
             print(f"[CLASSIFY-DEBUG] Result: Ô tô (không có dấu ngăn cách)")
-            return "Ô tô"
+            return VehicleType.CAR.label
         
         # Fallback: Nếu không match pattern nào, dùng logic độ dài
         # Xe máy thường ngắn hơn ô tô
         clean_plate = re.sub(r'[^A-Z0-9]', '', plate)
         if len(clean_plate) <= 7:
             print(f"[CLASSIFY-DEBUG] Result: Xe máy (fallback: length {len(clean_plate)} <= 7)")
-            return "Xe máy"
+            return VehicleType.MOTOR.label
         else:
             print(f"[CLASSIFY-DEBUG] Result: Ô tô (fallback: length {len(clean_plate)} > 7)")
-            return "Ô tô"
+            return VehicleType.CAR.label
     
     def handle_confirm_entry(self):
         plate = self.current_entry_plate
@@ -1586,34 +1666,37 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Thiếu thông tin", "Vui lòng đợi nhận diện biển số và nhập Mã RFID.")
             return
             
-        ticket_info = self.db.get_monthly_ticket_info(card_id)
+        classified_type = self.current_entry_vehicle_type
         
-        if ticket_info:
-            ticket_type = 'MONTHLY'
-            vehicle_type = ticket_info['vehicle_type']
-            assigned_slot = ticket_info['assigned_slot'] 
-            
-            slot_status = self.db.get_all_parking_slots() # Cần lấy thông tin chi tiết
-            is_reserved_slot_occupied = any(s[0] == assigned_slot and s[3] == 1 for s in slot_status if assigned_slot)
-            
-            if assigned_slot and not is_reserved_slot_occupied:
-                pass 
+        def record():
+            ticket_info = self.db.get_monthly_ticket_info(card_id)
+            if ticket_info:
+                ticket_type = TicketType.MONTHLY.label
+                vehicle_type = ticket_info['vehicle_type']
+                # Slot riêng nếu còn trống, không thì ô vãng lai
+                preferred_slot = ticket_info['assigned_slot']
             else:
-                assigned_slot = self.db.find_available_slot(vehicle_type, is_monthly=False) 
-        else:
-            ticket_type = 'GUEST'
-            # Sử dụng vehicle_type đã phân loại từ camera
-            vehicle_type = self.current_entry_vehicle_type
-            print(f"[DEBUG] Using classified vehicle type: {vehicle_type} for plate: {plate}")
-            assigned_slot = self.db.find_available_slot(vehicle_type, is_monthly=False)
-
+                ticket_type = TicketType.GUEST.label
+                # Sử dụng vehicle_type đã phân loại từ camera
+                vehicle_type = classified_type
+                print(f"[DEBUG] Using classified vehicle type: {vehicle_type} for plate: {plate}")
+                preferred_slot = None
+            assigned_slot, success = self.db.allocate_and_record_entry(
+                card_id, plate, vehicle_type, ticket_type, preferred_slot=preferred_slot)
+            return ticket_type, vehicle_type, assigned_slot, success
+        
+        self.async_db.submit(
+            record,
+            callback=lambda result: self._on_confirm_entry_recorded(plate, *result),
+            errback=lambda e: self._on_entry_record_failed(e))
+    
+    def _on_confirm_entry_recorded(self, plate, ticket_type, vehicle_type, assigned_slot, success):
+        """Tiếp tục handle_confirm_entry sau khi ghi DB xong (GUI thread)"""
         if not assigned_slot:
             error_msg = f"Bãi đỗ xe đã đầy cho loại xe {vehicle_type}! Không thể cho xe vào."
             self.display_entry_lane_error(error_msg, auto_clear_seconds=5)
             QMessageBox.critical(self, "Lỗi", error_msg)
             return
-
-        success = self.db.record_entry(card_id, plate, vehicle_type, assigned_slot, ticket_type)
         
         if success:
             # Gửi thông tin lên LCD ESP32
@@ -1627,7 +1710,7 @@ class MainWindow(QMainWindow):
             self.handle_open_barrier_in()
             
             # 📋 Cập nhật thông tin chi tiết xe đã vào trên UI
-            vehicle_icon = "🏍️" if vehicle_type == "Xe máy" else "🚗"
+            vehicle_icon = "🏍️" if vehicle_type == VehicleType.MOTOR.label else "🚗"
             if self.lbl_entry_plate:
                 self.lbl_entry_plate.setText(f"{vehicle_icon} {plate} ({vehicle_type})")
                 self.lbl_entry_plate.setStyleSheet("color: #22c55e; font-weight: bold;")
@@ -1636,53 +1719,72 @@ class MainWindow(QMainWindow):
                 self.lbl_entry_slot.setText(f"Ô đỗ: {assigned_slot}")
             
             if self.lbl_entry_guidance:
-                ticket_type_text = "VÉ THÁNG" if ticket_type == "MONTHLY" else "VÉ LƯỢT"
+                ticket_type_text = "VÉ THÁNG" if ticket_type == TicketType.MONTHLY.label else "VÉ LƯỢT"
                 self.lbl_entry_guidance.setText(f"✅ {ticket_type_text} - Vào tại: {assigned_slot} - 🚧 Barie đã mở")
             
             QMessageBox.information(self, "Xe Vào Thành Công", f"Xe {plate} ({ticket_type}) đã đỗ tại {assigned_slot}.\n🚧 Barie đã mở!")
             self.txt_entry_rfid.clear()
             self.current_entry_plate = "..."
-            self.draw_parking_map()
-            self.update_dashboard_stats()  # Cập nhật thống kê 
+            self.refresh_dashboard_async()  # Cập nhật sơ đồ + thống kê
         else:
             error_msg = "Không thể ghi nhận xe vào."
             self.display_entry_lane_error(error_msg, auto_clear_seconds=5)
             QMessageBox.critical(self, "Lỗi Database", error_msg)
             
-    def calculate_fee_and_display(self, exit_plate):
-        session = self.db.get_parking_session(plate=exit_plate, status='PARKING')
+    def calculate_fee_and_display(self, exit_plate, on_done=None):
+        """Tra session + tính phí trên worker thread, hiển thị kết quả khi xong
+        
+        on_done(fee, session_id, slot_id, ticket_type, vehicle_type) được gọi trên GUI thread
+        (session_id=None nếu xe không có trong bãi)
+        """
+        def load():
+            session = self.db.get_parking_session(plate=exit_plate, status=SessionStatus.PARKING)
+            if not session:
+                return None, 0, time.time()
+            # Tính phí và thời gian đỗ
+            current_time_seconds = time.time()
+            fee = calculate_parking_fee(self.db, session[9], session_time_in_epoch(session), current_time_seconds)
+            return session, fee, current_time_seconds
+        
+        def done(result):
+            fee, session_id, slot_id, ticket_type, vehicle_type = self._display_exit_fee(exit_plate, *result)
+            if on_done:
+                on_done(fee, session_id, slot_id, ticket_type, vehicle_type)
+        
+        self.async_db.submit(
+            load, callback=done,
+            errback=lambda e: self.display_exit_lane_error(f"Lỗi tính phí: {e}", auto_clear_seconds=5))
+    
+    def _display_exit_fee(self, exit_plate, session, fee, current_time_seconds):
+        """Hiển thị phí xe ra (GUI thread) - phần còn lại của calculate_fee_and_display"""
         if not session:
             self.lbl_exit_fee.setText("Xe không có trong bãi")
-            return 0, None, None, None
+            return 0, None, None, None, None
 
-        time_in_str = session[4] # time_in ở index 4
         vehicle_type = session[9] # vehicle_type ở index 9
         ticket_type = session[10] # ticket_type ở index 10
         slot_id = session[13] if len(session) > 13 else None # slot_id ở index 13 (mới thêm)
         
         # Hiển thị thông tin chỗ đỗ (có loại vé)
         if slot_id and self.lbl_exit_slot:
-            ticket_type_text = "VÉ THÁNG" if ticket_type == 'MONTHLY' else "KHÁCH VÃNG LAI"
+            ticket_type_text = "VÉ THÁNG" if ticket_type == TicketType.MONTHLY.label else "KHÁCH VÃNG LAI"
             self.lbl_exit_slot.setText(f"Ô đỗ: {slot_id} ({ticket_type_text})")
             print(f"[DASHBOARD] ✅ Exit slot updated: {slot_id} ({ticket_type_text})")
         elif self.lbl_exit_slot:
             print(f"[DASHBOARD] ⚠️ slot_id is None!")
         
         # Kiểm tra vé tháng - MIỄN PHÍ
-        if ticket_type == 'MONTHLY':
+        if ticket_type == TicketType.MONTHLY.label:
             self.lbl_exit_fee.setText("✅ VÉ THÁNG - MIỄN PHÍ")
             # Gửi info lên LCD
             self.send_vehicle_info_to_lcd(exit_plate, vehicle_type, slot_id, "VE THANG")
             # Tự động xử lý xe ra cho vé tháng
             self.auto_process_monthly_exit(exit_plate, session[0])
-            return 0, session[0], slot_id, 'MONTHLY'
+            return 0, session[0], slot_id, TicketType.MONTHLY.label, vehicle_type
         
-        # Tính phí và thời gian đỗ
-        current_time_seconds = time.time()
-        fee = calculate_parking_fee(self.db, vehicle_type, time_in_str, current_time_seconds)
+        time_in = session_time_in_epoch(session)
         
         # Tính thời gian đỗ (phải dùng cách tính giống hệt như calculate_parking_fee)
-        time_in = time.mktime(time.strptime(time_in_str, "%Y-%m-%d %H:%M:%S"))
         parking_duration_minutes = (current_time_seconds - time_in) / 60
         
         # Chuyển đổi phút thành giờ:phút
@@ -1703,20 +1805,24 @@ class MainWindow(QMainWindow):
         # Gửi số ô trống lên LCD sau 3 giây
         QTimer.singleShot(3000, self.send_idle_lcd_message)
         
-        return fee, session[0], slot_id, ticket_type # fee, id, slot_id, ticket_type
+        return fee, session[0], slot_id, ticket_type, vehicle_type # fee, id, slot_id, ticket_type, vehicle_type
     
     def auto_process_monthly_exit(self, plate, session_id):
         image_path = getattr(self, '_current_exit_image_path', None)
-        success = self.db.record_exit(session_id, plate, 0, 'MONTHLY', image_path)
-
+        self.async_db.call(
+            'record_exit', session_id, plate, 0, 'MONTHLY', image_path,
+            callback=self._on_monthly_exit_recorded,
+            errback=lambda e: self._on_monthly_exit_recorded(False))
+    
+    def _on_monthly_exit_recorded(self, success):
+        """Tiếp tục auto_process_monthly_exit sau khi ghi DB xong (GUI thread)"""
         if success:
             self.handle_open_barrier_out()
         # ✅ RESET debounce cho thẻ
             self._last_processed_card = ""
 
             # 📺 Không auto-reset - giữ thông tin để xem được
-            self.draw_parking_map()
-            self.update_dashboard_stats()
+            self.refresh_dashboard_async()
             self.refresh_history_if_visible()
             
             # Gửi số ô trống lên LCD sau khi xe vé tháng ra (delay 3s để người dùng thấy thông tin xe)
@@ -1746,8 +1852,11 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Thiếu thông tin", error_msg)
             return
             
-        fee, session_id, slot_id, ticket_type = self.calculate_fee_and_display(exit_plate)
-
+        self.calculate_fee_and_display(
+            exit_plate, on_done=lambda *result: self._continue_confirm_exit(exit_plate, *result))
+    
+    def _continue_confirm_exit(self, exit_plate, fee, session_id, slot_id, ticket_type, vehicle_type):
+        """Tiếp tục handle_confirm_exit sau khi tra session + tính phí xong (GUI thread)"""
         if session_id is None:
             error_msg = f"Không tìm thấy xe {exit_plate} đang đỗ."
             self.display_exit_lane_error(error_msg, auto_clear_seconds=5)
@@ -1755,13 +1864,9 @@ class MainWindow(QMainWindow):
             return
         
         # Vé tháng đã được xử lý tự động trong calculate_fee_and_display
-        if ticket_type == 'MONTHLY':
+        if ticket_type == TicketType.MONTHLY.label:
             return
         
-        # Lấy loại xe từ session
-        session = self.db.get_parking_session(plate=exit_plate, status='PARKING')
-        vehicle_type = session[9] if session else "Ô tô"  # index 9 là vehicle_type
-
         # Hiển thị dialog thanh toán cho khách vãng lai
         payment_dialog = PaymentDialog(exit_plate, vehicle_type, fee, self)
         if payment_dialog.exec() != QDialog.Accepted or not payment_dialog.payment_confirmed:
@@ -1771,8 +1876,13 @@ class MainWindow(QMainWindow):
         # Thanh toán thành công -> Ghi nhận xe ra
         payment_method = payment_dialog.payment_method
         image_path = getattr(self, '_current_exit_image_path', None)
-        success = self.db.record_exit(session_id, exit_plate, fee, payment_method, image_path)
-        
+        self.async_db.call(
+            'record_exit', session_id, exit_plate, fee, payment_method, image_path,
+            callback=lambda success: self._on_guest_exit_recorded(exit_plate, vehicle_type, fee, payment_method, success),
+            errback=lambda e: self._on_guest_exit_recorded(exit_plate, vehicle_type, fee, payment_method, False))
+    
+    def _on_guest_exit_recorded(self, exit_plate, vehicle_type, fee, payment_method, success):
+        """Tiếp tục handle_confirm_exit sau khi ghi xe ra xong (GUI thread)"""
         if success:
             # Tự động mở barie
             self.handle_open_barrier_out()
@@ -1789,7 +1899,7 @@ class MainWindow(QMainWindow):
             QTimer.singleShot(2000, self.send_idle_lcd_message)
             
             # �📋 Cập nhật thông tin chi tiết xe đã ra trên UI
-            vehicle_icon = "🏍️" if vehicle_type == "Xe máy" else "🚗"
+            vehicle_icon = "🏍️" if vehicle_type == VehicleType.MOTOR.label else "🚗"
             if self.lbl_exit_plate:
                 self.lbl_exit_plate.setText(f"{vehicle_icon} {exit_plate} ({vehicle_type})")
                 self.lbl_exit_plate.setStyleSheet("color: #22c55e; font-weight: bold;")
@@ -1821,13 +1931,13 @@ class MainWindow(QMainWindow):
             if self.txt_exit_rfid:
                 self.txt_exit_rfid.clear()
                 self.txt_exit_rfid.setFocus()
-            self._last_exit_scan_time = 0  # Reset debounce time
+            if hasattr(self, 'network_server'):
+                self.network_server.scan_dedup.forget(lane=2)  # Reset debounce làn ra
             
             # Reset entry UI để thẻ này có thể dùng lại cho xe khác
             self.reset_entry_ui()
             
-            self.draw_parking_map()
-            self.update_dashboard_stats()  # Cập nhật thống kê
+            self.refresh_dashboard_async()  # Cập nhật sơ đồ + thống kê
         else:
             error_msg = "Lỗi ghi nhận xe ra vào Database."
             self.display_exit_lane_error(error_msg, auto_clear_seconds=5)
@@ -1837,7 +1947,8 @@ class MainWindow(QMainWindow):
             # ✅ RESET RFID field để cho phép quét lại
             if self.txt_exit_rfid:
                 self.txt_exit_rfid.clear()
-            self._last_exit_scan_time = 0  # Reset debounce time
+            if hasattr(self, 'network_server'):
+                self.network_server.scan_dedup.forget(lane=2)  # Reset debounce làn ra
             
     # --- LOGIC TRANG VÉ THÁNG (MONTHLY) ---
     
@@ -1992,7 +2103,7 @@ class MainWindow(QMainWindow):
         owner = page.findChild(QLineEdit, "newOwner").text().strip()
         card = page.findChild(QLineEdit, "newCardNumber").text().strip()
         v_type_cb = page.findChild(QComboBox, "newType")
-        v_type = v_type_cb.currentText() if v_type_cb else "Ô tô"
+        v_type = v_type_cb.currentText() if v_type_cb else VehicleType.CAR.label
         reg_date = page.findChild(QDateEdit, "newRegDate").date().toString("yyyy-MM-dd")
         exp_date = page.findChild(QDateEdit, "newExpDate").date().toString("yyyy-MM-dd")
         
@@ -2002,7 +2113,7 @@ class MainWindow(QMainWindow):
             return
         
         # Tính phí vé tháng
-        monthly_fee = 500000 if v_type == "Ô tô" else 200000  # Giá cố định
+        monthly_fee = 500000 if v_type == VehicleType.CAR.label else 200000  # Giá cố định
         
         # Hiển thị dialog thanh toán
         print(f"[DEBUG] Creating payment dialog for {plate}, {v_type}, {monthly_fee}")
@@ -2037,7 +2148,7 @@ class MainWindow(QMainWindow):
         try:
             from PySide6.QtCore import QMetaObject, Qt
             
-            monthly_fee = 500000 if v_type == "Ô tô" else 200000
+            monthly_fee = 500000 if v_type == VehicleType.CAR.label else 200000
             print(f"\n[REGISTRATION] ========== STARTING REGISTRATION ==========")
             print(f"[REGISTRATION] Plate: {plate}, Owner: {owner}, Card: {card}, Type: {v_type}")
             print(f"[REGISTRATION] RegDate: {reg_date}, ExpDate: {exp_date}")
@@ -2269,8 +2380,9 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "Hủy", "Đã hủy quét thẻ")
     
     def handle_monthly_search(self, text):
-        """Xử lý tìm kiếm vé tháng"""
-        self.load_monthly_tickets(text.strip())
+        """Xử lý tìm kiếm vé tháng (debounce - xem monthly_search_timer)"""
+        self._monthly_search_text = text.strip()
+        self.monthly_search_timer.start()
     
     def delete_monthly_ticket(self, card_id):
         """Xóa vé tháng (soft delete)"""
@@ -2401,7 +2513,7 @@ class MainWindow(QMainWindow):
             new_exp_str = new_exp_date.strftime("%Y-%m-%d")
             
             # Tính phí gia hạn dựa trên loại xe
-            monthly_fee = 500000 if vehicle_type == "Ô tô" else 200000
+            monthly_fee = 500000 if vehicle_type == VehicleType.CAR.label else 200000
             total_fee = monthly_fee * months
             
             # Hiển thị dialog thanh toán
@@ -2459,7 +2571,7 @@ class MainWindow(QMainWindow):
             months_approx = max(1, round(days_diff / 30))  # Tối thiểu 1 tháng
             
             # Tính phí
-            monthly_fee = 500000 if vehicle_type == "Ô tô" else 200000
+            monthly_fee = 500000 if vehicle_type == VehicleType.CAR.label else 200000
             total_fee = monthly_fee * months_approx
             
             # Hiển thị dialog thanh toán
@@ -2487,9 +2599,10 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "Lỗi", f"Lỗi khi gia hạn: {str(e)}")
 
     # --- CÁC HÀM KHÁC ---
-    def update_dashboard_stats(self):
-        """Cập nhật thống kê dashboard từ database"""
-        stats = self.db.get_parking_statistics()
+    def update_dashboard_stats(self, stats=None):
+        """Cập nhật thống kê dashboard từ database (stats lấy sẵn trên worker nếu có)"""
+        if stats is None:
+            stats = self.db.get_parking_statistics()
         
         # Cập nhật số liệu thống kê
         if self.lbl_stat1_value:
@@ -2502,7 +2615,36 @@ class MainWindow(QMainWindow):
             self.lbl_stat4_value.setText(str(stats['total_out_today']))
         
         # Cập nhật chỗ trống dùng sensor + DB logic (smart parking)
-        self.update_dashboard_with_sensor_data()
+        self.update_dashboard_with_sensor_data(stats)
+
+    def refresh_dashboard_async(self):
+        """Lấy thống kê + danh sách slot trên worker rồi vẽ lại dashboard (GUI thread)
+        
+        Chỉ 1 lần refresh chạy tại 1 thời điểm; gọi thêm trong lúc đang chạy thì
+        refresh lại 1 lần nữa ngay sau đó (để thấy lệnh ghi vừa commit)
+        """
+        if self._dashboard_refresh_pending:
+            self._dashboard_refresh_again = True
+            return
+        self._dashboard_refresh_pending = True
+        self._dashboard_refresh_again = False
+        
+        def load():
+            return self.db.get_parking_statistics(), self.db.get_all_parking_slots()
+        
+        def done(result):
+            self._dashboard_refresh_pending = False
+            stats, slots = result
+            self.update_dashboard_stats(stats)
+            self.draw_parking_map(slots)
+            if self._dashboard_refresh_again:
+                self.refresh_dashboard_async()
+        
+        def failed(e):
+            self._dashboard_refresh_pending = False
+            print(f"[AUTO-REFRESH] Error: {e}")
+        
+        self.async_db.submit(load, callback=done, errback=failed)
 
     def auto_refresh_dashboard(self):
         """Tự động refresh dashboard nếu đang ở trang dashboard"""
@@ -2510,8 +2652,7 @@ class MainWindow(QMainWindow):
             # Chỉ refresh khi đang ở trang dashboard
             current_page = self.stacked_widget.currentWidget()
             if current_page == self.loaded_pages.get("dashboard"):
-                self.update_dashboard_stats()
-                self.draw_parking_map()
+                self.refresh_dashboard_async()
                 # print("[AUTO-REFRESH] Dashboard updated")
         except Exception as e:
             print(f"[AUTO-REFRESH] Error: {e}")
@@ -2531,6 +2672,11 @@ class MainWindow(QMainWindow):
             btn_apply.clicked.connect(self.load_history)
             print("[HISTORY] Button 'Áp dụng' đã kết nối")
         
+        # Nút xuất lịch sử (theo bộ lọc hiện tại) ra CSV / XLSX
+        btn_export = widget.findChild(QPushButton, "btnExportHistory")
+        if btn_export:
+            btn_export.clicked.connect(self.export_history)
+        
         # Khởi tạo giá trị mặc định
         date_from = widget.findChild(QDateEdit, "historyDateFrom")
         date_to = widget.findChild(QDateEdit, "historyDateTo")
@@ -2750,17 +2896,19 @@ class MainWindow(QMainWindow):
         date_from_str = date_from.date().toString("yyyy-MM-dd") if date_from else None
         date_to_str = date_to.date().toString("yyyy-MM-dd") if date_to else None
         
-        # Lấy dữ liệu từ database (Lấy cả xe đang đỗ và xe đã ra)
+        # Lưu bộ lọc - dữ liệu được lấy từng trang khi cần (keyset pagination)
         print(f"[HISTORY] Filters: plate='{plate_filter}', date={date_from_str} to {date_to_str}")
-        history = self.db.get_parking_history(
-            plate=plate_filter if plate_filter else None,
-            date_from=date_from_str,
-            date_to=date_to_str,
-            status=None  # Không filter theo status - hiển thị tất cả (PARKING + PAID)
-        )
+        self._history_filters = {
+            'plate': plate_filter if plate_filter else None,
+            'date_from': date_from_str,
+            'date_to': date_to_str,
+            'status': None,  # Không filter theo status - hiển thị tất cả (PARKING + PAID)
+        }
+        self._history_total, self._history_total_exact = self.db.count_parking_history(**self._history_filters)
         
-        # Lưu dữ liệu toàn bộ và reset trang
-        self._history_all_data = history
+        # Reset trang: _history_cursors[i] = before_id của trang i (trang đầu: None)
+        self._history_cursors = [None]
+        self._history_next_before = None
         self._history_current_page = 0
         self._history_rows_per_page = 10
         
@@ -2797,7 +2945,7 @@ class MainWindow(QMainWindow):
         # Hiển thị trang đầu tiên
         self._display_history_page()
         
-        print(f"[HISTORY] ✅ Tìm thấy {len(history)} bản ghi")
+        print(f"[HISTORY] ✅ Tìm thấy {self._history_total}{'' if self._history_total_exact else '+'} bản ghi")
     
     def _display_history_page(self):
         """Hiển thị trang hiện tại của lịch sử"""
@@ -2809,15 +2957,23 @@ class MainWindow(QMainWindow):
         if not table:
             return
         
-        # Kiểm tra dữ liệu
-        if not hasattr(self, '_history_all_data') or not self._history_all_data:
+        # Kiểm tra bộ lọc (load_history() chưa chạy)
+        if not hasattr(self, '_history_filters'):
             table.setRowCount(0)
             return
         
-        # Tính toán vị trí dữ liệu cho trang hiện tại
+        # Lấy đúng 1 trang từ DB (keyset: id < before_id)
         start_idx = self._history_current_page * self._history_rows_per_page
         end_idx = start_idx + self._history_rows_per_page
-        page_data = self._history_all_data[start_idx:end_idx]
+        page_data, self._history_next_before = self.db.get_parking_history_page(
+            **self._history_filters,
+            before_id=self._history_cursors[self._history_current_page],
+            page_size=self._history_rows_per_page,
+        )
+        if not page_data:
+            table.setRowCount(0)
+            self._update_pagination_info()
+            return
         
         # Chỉ cần set số dòng, headers đã được thiết lập trong load_history()
         table.setRowCount(len(page_data))
@@ -2839,10 +2995,10 @@ class MainWindow(QMainWindow):
             status = row_data[11]  # status column (chỉnh từ 12 → 11)
             time_out = row_data[4]  # time_out column (chỉnh từ 5 → 4)
             
-            if status == "PAID" and time_out:
+            if status == SessionStatus.PAID.label and time_out:
                 status_display = "🚪 Đã ra"
                 status_color = "#22c55e"  # Green
-            elif status == "PARKING":
+            elif status == SessionStatus.PARKING.label:
                 status_display = "🅿️ Đang đỗ"
                 status_color = "#3b82f6"  # Blue
             else:
@@ -3034,25 +3190,29 @@ class MainWindow(QMainWindow):
         if not page:
             return
         
-        if not hasattr(self, '_history_all_data'):
+        if not hasattr(self, '_history_filters'):
             return
         
-        total_records = len(self._history_all_data)
-        total_pages = (total_records + self._history_rows_per_page - 1) // self._history_rows_per_page
+        # Tổng số bản ghi là ước lượng (count_parking_history dừng ở 10.000)
+        total_records = self._history_total
+        total_text = f"{total_records:,}" if self._history_total_exact else f"hơn {total_records:,}"
+        total_pages = max(1, (total_records + self._history_rows_per_page - 1) // self._history_rows_per_page)
+        pages_text = str(total_pages) if self._history_total_exact else f"{total_pages}+"
         
         # Cập nhật label thông tin trang
         pagination_label = page.findChild(QLabel, "paginationLabel")
         if pagination_label:
             start_idx = self._history_current_page * self._history_rows_per_page + 1
-            end_idx = min((self._history_current_page + 1) * self._history_rows_per_page, total_records)
-            pagination_label.setText(f"Hiển thị {start_idx}-{end_idx} của {total_records} kết quả (Trang {self._history_current_page + 1}/{total_pages})")
+            table = page.findChild(QTableWidget, "historyTable")
+            end_idx = start_idx + (table.rowCount() if table else 0) - 1
+            pagination_label.setText(f"Hiển thị {start_idx}-{end_idx} của {total_text} kết quả (Trang {self._history_current_page + 1}/{pages_text})")
         
         # Vô hiệu hóa nút prev/next
         btn_prev = page.findChild(QPushButton, "btnPrevPage")
         btn_next = page.findChild(QPushButton, "btnNextPage")
         
         prev_enabled = self._history_current_page > 0
-        next_enabled = self._history_current_page < total_pages - 1
+        next_enabled = self._history_next_before is not None
         
         if btn_prev:
             btn_prev.setEnabled(prev_enabled)
@@ -3066,7 +3226,7 @@ class MainWindow(QMainWindow):
         else:
             print("[HISTORY] ❌ Cannot find btnNextPage in _update_pagination_info()")
         
-        print(f"[HISTORY] Current: {self._history_current_page + 1}/{total_pages}, Records: {total_records}")
+        print(f"[HISTORY] Current: {self._history_current_page + 1}/{pages_text}, Records: {total_text}")
     
     def _history_prev_page(self):
         """Chuyển sang trang trước"""
@@ -3081,17 +3241,78 @@ class MainWindow(QMainWindow):
     def _history_next_page(self):
         """Chuyển sang trang sau"""
         print(f"[HISTORY-BTN] Next button clicked! Current page: {self._history_current_page}")
-        if not hasattr(self, '_history_all_data'):
+        if not hasattr(self, '_history_filters'):
             print("[HISTORY-BTN] ❌ No history data")
             return
-        total_pages = (len(self._history_all_data) + self._history_rows_per_page - 1) // self._history_rows_per_page
-        if self._history_current_page < total_pages - 1:
+        if self._history_next_before is not None:
+            # Ghi nhớ keyset của trang sau để nút "Trang trước" quay lại được
+            del self._history_cursors[self._history_current_page + 1:]
+            self._history_cursors.append(self._history_next_before)
             self._history_current_page += 1
             self._display_history_page()
             print(f"[HISTORY-PAGE] ✅ Chuyển sang trang {self._history_current_page + 1}")
         else:
-            print(f"[HISTORY-PAGE] ⚠️ Đã ở trang cuối cùng ({total_pages}), không thể tiếp tục")
+            print(f"[HISTORY-PAGE] ⚠️ Đã ở trang cuối cùng ({self._history_current_page + 1}), không thể tiếp tục")
     
+    def export_history(self):
+        """Xuất toàn bộ lịch sử khớp bộ lọc ra CSV / XLSX trên worker (progress + hủy)"""
+        if getattr(self, '_export_job', None) is not None:
+            QMessageBox.information(self, "Xuất file", "Đang xuất file, vui lòng chờ...")
+            return
+        if not hasattr(self, '_history_filters'):
+            self.load_history()
+        
+        default_ext = "xlsx" if exporter.openpyxl is not None else "csv"
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports",
+                                    time.strftime(f"lich_su_%Y%m%d_%H%M%S.{default_ext}"))
+        os.makedirs(os.path.dirname(default_path), exist_ok=True)
+        file_filter = "Excel (*.xlsx);;CSV (*.csv)" if default_ext == "xlsx" else "CSV (*.csv);;Excel (*.xlsx)"
+        path, selected = QFileDialog.getSaveFileName(self, "Xuất lịch sử", default_path, file_filter)
+        if not path:
+            return
+        if os.path.splitext(path)[1].lower() not in ('.csv', '.xlsx'):
+            path += ".xlsx" if "xlsx" in selected else ".csv"
+        
+        # Worker chỉ ghi vào job; QTimer trên GUI thread đọc job để cập nhật dialog
+        job = {'done': 0, 'total': 0, 'cancel': threading.Event()}
+        dialog = QProgressDialog("Đang xuất lịch sử...", "Hủy", 0, 100, self)
+        dialog.setWindowTitle("Xuất lịch sử")
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(0)
+        dialog.canceled.connect(job['cancel'].set)
+        timer = QTimer(self)
+        
+        def on_progress(done, total):
+            job['done'], job['total'] = done, total
+        
+        def update_dialog():
+            if job['total']:
+                dialog.setValue(min(99, job['done'] * 100 // job['total']))
+                dialog.setLabelText(f"Đang xuất lịch sử... {job['done']:,}/{job['total']:,} dòng")
+        
+        def finish():
+            timer.stop()
+            dialog.reset()
+            self._export_job = None
+        
+        def on_done(result):
+            finish()
+            QMessageBox.information(self, "Xuất file",
+                                    f"Đã xuất {result['rows']:,} dòng ({result['elapsed_sec']}s):\n{result['path']}")
+        
+        def on_failed(exc):
+            finish()
+            if isinstance(exc, exporter.ExportCancelled):
+                print("[EXPORT] Đã hủy xuất file")
+                return
+            QMessageBox.warning(self, "Lỗi xuất file", str(exc))
+        
+        timer.timeout.connect(update_dialog)
+        timer.start(200)
+        self._export_job = job
+        self.async_db.call('export_parking_history', path, progress=on_progress, cancel_event=job['cancel'],
+                           callback=on_done, errback=on_failed, **self._history_filters)
+
     def refresh_history_if_visible(self):
         page = self.loaded_pages.get("history")
         if not page:
@@ -3116,6 +3337,14 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'network_server'):
             self.network_server.stop()
         
+        # Hủy xuất file đang chạy (nếu có) để worker dừng sớm
+        if getattr(self, '_export_job', None) is not None:
+            self._export_job['cancel'].set()
+        
+        # Chờ các lệnh DB đang chạy trên worker rồi đóng connection pool
+        self.async_db.shutdown(wait=True)
+        self.db.close_pool()
+        
         event.accept()
         print("[APP] Đã đóng hoàn tất!")
 
@@ -3203,35 +3432,30 @@ class MainWindow(QMainWindow):
             days_diff = (date_to_obj - date_from_obj).days
             is_month = days_diff > 60
             
-            group_format = "%Y-%m" if is_month else "%Y-%m-%d"
             title_suffix = "tháng" if is_month else "ngày"
 
-            rows = self.db.get_revenue_by_date_range(date_from, date_to)
+            # Đọc từ bảng daily_rollup, đã group theo ngày/tháng trong SQL
+            # (từ snapshot nếu khoảng ngày đã chốt trước thời điểm snapshot mới nhất)
+            rows = self.db.get_revenue_by_date_range(date_from, date_to,
+                                                     group_by='month' if is_month else 'day',
+                                                     snapshot=True)
 
             total_revenue = 0
             total_visits = 0
             motor_count = 0
             car_count = 0
 
-            # Group data theo ngày hoặc tháng
+            # Data theo ngày hoặc tháng
             grouped_data = {}
             
             for row in rows:
-                # row: (date, count, revenue, motor_count, car_count)
+                # row: (ngày/tháng, count, revenue, motor_count, car_count)
                 total_revenue += row[2] or 0
                 total_visits += row[1]
                 motor_count += row[3] or 0
                 car_count += row[4] or 0
 
-                # Group key
-                date_obj = datetime.strptime(row[0], "%Y-%m-%d")
-                key = date_obj.strftime(group_format)
-                
-                if key not in grouped_data:
-                    grouped_data[key] = {"count": 0, "revenue": 0}
-                
-                grouped_data[key]["count"] += row[1]
-                grouped_data[key]["revenue"] += row[2] or 0
+                grouped_data[row[0]] = {"count": row[1], "revenue": row[2] or 0}
 
             # Sắp xếp theo key (tự động theo ngày hoặc tháng)
             labels = sorted(grouped_data.keys())
@@ -3287,7 +3511,7 @@ class MainWindow(QMainWindow):
                 fig, ax = plt.subplots(figsize=(4, 4), dpi=90)
                 ax.pie(
                     [motor_count, car_count],
-                    labels=["Xe máy", "Ô tô"],
+                    labels=[VehicleType.MOTOR.label, VehicleType.CAR.label],
                     autopct="%1.1f%%",
                     startangle=90
                 )
@@ -1,5 +1,6 @@
 """
 Migration script: Thêm cột status vào bảng monthly_tickets
+(Đã được gộp vào core/db_migrations.py - v1, DBManager tự chạy khi khởi động)
 """
 import sqlite3
 import os
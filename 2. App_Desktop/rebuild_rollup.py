@@ -0,0 +1,57 @@
+"""
+Script tính lại bảng daily_rollup (doanh thu / lượt xe theo ngày) từ parking_sessions
+Dùng sau khi sửa/xóa session bằng script ngoài (cleanup_db.py, import dữ liệu cũ...)
+Nếu có file archive (parking_system_archive.db - core/archiver.py) thì tính cả session đã archive
+
+Usage:
+    python rebuild_rollup.py                          # Toàn bộ lịch sử
+    python rebuild_rollup.py --from 2024-01-01 --to 2024-12-31
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import archiver, daily_rollup
+from core.db_migrations import run_migrations
+
+# Đường dẫn database
+DB_PATH = os.path.join(os.path.dirname(__file__), "parking_system.db")
+
+
+def rebuild(db_path=DB_PATH, date_from=None, date_to=None, archive_path=None):
+    print(f"🔄 Tính lại daily_rollup ({date_from or '...'} -> {date_to or '...'})...")
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    try:
+        archive_path = archive_path or archiver.default_archive_path(db_path)
+        if os.path.exists(archive_path):
+            archiver.attach_archive(conn, archive_path)
+            print(f"   + archive: {archive_path}")
+        run_migrations(conn)
+        if archiver.is_attached(conn):
+            archiver.ensure_archive_schema(conn)  # Archive cùng mã số enum với file chính
+            conn.commit()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        rows = daily_rollup.rebuild(cursor, date_from, date_to)
+        conn.commit()
+        print(f"✅ Đã ghi {rows} dòng rollup")
+        return rows
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Lỗi rebuild: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tính lại bảng daily_rollup")
+    parser.add_argument("--db", default=DB_PATH, help="Đường dẫn file database")
+    parser.add_argument("--from", dest="date_from", help="Từ ngày (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="Đến ngày (YYYY-MM-DD)")
+    parser.add_argument("--archive", help="File archive (mặc định: <db>_archive.db nếu có)")
+    args = parser.parse_args()
+    rebuild(args.db, args.date_from, args.date_to, args.archive)
@@ -14,6 +14,33 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_NAME = "parking_system.db"
 DATABASE_PATH = os.path.join(BASE_DIR, DB_NAME)
 
+# Connection pool & tuning cho DBManager (core/db_pool.py)
+DB_CONFIG = {
+    "pool_size": 8,                 # Số connection đọc tối đa (mỗi thread giữ 1 connection)
+    "busy_timeout": 120,            # Thời gian chờ khi database bị khóa (giây)
+    "health_check_interval": 30,    # Ping connection (SELECT 1) nếu quá N giây chưa kiểm tra
+    "journal_mode": "DELETE",       # "WAL" = bật WAL + writer thread duy nhất (core/db_writer.py)
+    "writer_batch_size": 32,        # WAL: số lệnh ghi tối đa gom vào 1 lần commit (group commit)
+    "stats_resync_interval": 60,    # Thống kê dashboard: load lại từ DB sau N giây (core/stats_counter.py)
+    "session_registry_resync": 60,  # Session đang gửi (tra cứu cổng ra): đối chiếu lại với DB sau N giây (core/session_registry.py)
+    "cache_max_entries": 1024,      # Read cache (settings, vé tháng, quyền): số entry tối đa (core/cache.py)
+    "cache_ttl": 30,                # Read cache: entry hết hạn sau N giây (DB bị sửa từ bên ngoài)
+    "async_workers": 4,             # Số worker chạy lệnh DB cho MainWindow (core/async_db.py)
+    "archive_after_days": 0,        # Session đã thanh toán quá N ngày -> file archive (0 = tắt, vd 180; core/archiver.py)
+    "archive_path": None,           # None = parking_system_archive.db cạnh file DB chính
+    "archive_batch_size": 5000,     # Số session chuyển trong 1 transaction
+    "maintenance_interval": 3600,   # Chạy archive + ANALYZE + incremental vacuum mỗi N giây
+    "instrumentation": True,        # Đo latency theo method / câu SQL (core/db_instrumentation.py)
+    "slow_query_ms": 100,           # Câu SQL chậm hơn N ms -> slow log kèm EXPLAIN QUERY PLAN
+    "slow_query_log_size": 200,     # Số slow query gần nhất được giữ lại
+    "snapshot_interval": 0,         # Snapshot DB (online backup API) mỗi N giây (0 = tắt, vd 1800; core/snapshot_service.py)
+    "snapshot_retention": 12,       # Số snapshot mới nhất được giữ lại (mỗi bản = 1 bản copy DB + archive)
+    "snapshot_dir": None,           # None = thư mục snapshots/ cạnh file DB chính
+    "snapshot_pages_per_step": 256, # Số trang copy mỗi bước backup (nhả lock đọc giữa các bước)
+    "snapshot_step_sleep": 0.01,    # Nghỉ N giây giữa các bước cho lệnh ghi chen vào
+    "snapshot_max_age": 3600,       # Báo cáo chỉ đọc snapshot tạo trong vòng N giây, cũ hơn -> đọc DB
+}
+
 # ============================================================================
 # 2. SERVER & IOT CONFIGURATION (TCP Socket)
 # ============================================================================
@@ -23,7 +50,18 @@ SERVER_CONFIG = {
     "host": "0.0.0.0",              # Lắng nghe trên tất cả interface
     "port": 8888,                   # TCP Port
     "timeout": 30,                  # Timeout connection (giây)
-    "max_clients": 10,              # Tối đa 10 client kết nối
+    "max_clients": 10,              # Tối đa 10 client kết nối (engine "asyncio"; engine "threaded" không giới hạn)
+    "engine": "threaded",           # "asyncio" = 1 event loop cho mọi ESP32 (core/async_network_server.py)
+    "backlog": 128,                 # Hàng đợi accept của socket lắng nghe (engine "asyncio")
+    "send_queue_size": 64,          # Số lệnh chờ gửi tối đa / client (core/network_server.py)
+    "send_timeout": 5.0,            # Gửi 1 lệnh quá N giây -> đóng kết nối client (ESP32 tự kết nối lại)
+    "slow_client_policy": "close",  # Hàng đợi gửi đầy: "close" = đóng kết nối, "drop" = bỏ lệnh mới
+    "binary_protocol": True,        # Cho node chuyển sang frame nhị phân khi gửi "PROTO:BIN:1" (core/protocol_codec.py)
+    "idle_timeout": 90,             # Node cảm biến (HEARTBEAT 30s) im lặng quá N giây -> đóng kết nối (0 = tắt)
+    "keepalive_idle": 30,           # TCP keepalive: kết nối im lặng N giây bắt đầu dò, node chết bị đóng sau ~N+15s
+    "max_line_bytes": 1024,         # Dòng text dài hơn N byte chưa có xuống dòng -> đóng kết nối (core/framing.py)
+    "scan_dedup_window": 5.0,       # Quét lại cùng thẻ / cùng làn trong N giây -> bỏ qua (core/scan_dedup.py)
+    "scan_dedup_max_entries": 1024, # Số (làn, thẻ) tối đa được ghi nhớ
 }
 
 # ESP32 thông tin (để user config)
@@ -17,7 +17,7 @@ print("TEST 1: Checking database records")
 print("="*80)
 
 db = DBManager()
-history = db.get_parking_history(
+total_records, is_exact = db.count_parking_history(
     plate=None,
     date_from=None,
     date_to=None,
@@ -26,33 +26,44 @@ history = db.get_parking_history(
     status=None
 )
 
-print(f"✅ Total records in database: {len(history)}")
+print(f"✅ Total records in database: {total_records}{'' if is_exact else '+'}")
 
-# Test 2: Simulate pagination
+# Test 2: Keyset pagination - mỗi trang là 1 truy vấn id < before_id
 print("\n" + "="*80)
-print("TEST 2: Simulating pagination (10 records per page)")
+print("TEST 2: Keyset pagination (10 records per page)")
 print("="*80)
 
 rows_per_page = 10
-total_records = len(history)
-total_pages = (total_records + rows_per_page - 1) // rows_per_page
+cursors = [None]
+seen_ids = []
+page_num = 0
 
-print(f"Total records: {total_records}")
-print(f"Rows per page: {rows_per_page}")
-print(f"Total pages: {total_pages}")
-
-for page_num in range(total_pages):
-    start_idx = page_num * rows_per_page
-    end_idx = start_idx + rows_per_page
-    page_data = history[start_idx:end_idx]
+while True:
+    page_data, next_before = db.get_parking_history_page(before_id=cursors[page_num], page_size=rows_per_page)
+    seen_ids.extend(row[0] for row in page_data)
     
     prev_enabled = page_num > 0
-    next_enabled = page_num < total_pages - 1
+    next_enabled = next_before is not None
     
-    print(f"\nPage {page_num + 1}/{total_pages}:")
-    print(f"  Records: {len(page_data)} (indices {start_idx}-{end_idx-1})")
+    print(f"\nPage {page_num + 1}:")
+    print(f"  Records: {len(page_data)} (id {page_data[0][0] if page_data else '-'} -> {page_data[-1][0] if page_data else '-'})")
     print(f"  Prev button: {'ENABLED' if prev_enabled else 'DISABLED'}")
     print(f"  Next button: {'ENABLED' if next_enabled else 'DISABLED'}")
+    
+    if not next_enabled or page_num >= 99:
+        break
+    cursors.append(next_before)
+    page_num += 1
+
+# Test 3: Không trùng / không sót bản ghi giữa các trang
+print("\n" + "="*80)
+print("TEST 3: Checking page boundaries")
+print("="*80)
+assert seen_ids == sorted(seen_ids, reverse=True), "Pages must be ordered by id DESC"
+assert len(seen_ids) == len(set(seen_ids)), "Duplicate records across pages"
+if is_exact and page_num < 99:
+    assert len(seen_ids) == total_records, f"Walked {len(seen_ids)} records, expected {total_records}"
+print(f"✅ {len(seen_ids)} records across {page_num + 1} pages, no duplicates")
 
 print("\n" + "="*80)
 print("TEST COMPLETE")
@@ -0,0 +1,157 @@
+"""
+Fuzz test codec giao thức nhị phân ESP32 (core/protocol_codec.py)
+
+Chạy: python test_protocol_codec.py [số vòng]   (hoặc pytest test_protocol_codec.py)
+- Encode -> decode giữ nguyên tham số cho mọi loại message
+- Frame cắt thành đoạn ngẫu nhiên vẫn tách đúng
+- Byte ngẫu nhiên / frame bị sửa: chỉ được ném ProtocolError, không lỗi nào khác
+"""
+
+import os
+import random
+import string
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import protocol_codec as codec
+
+ROUNDS = 2000
+SEED = int(os.environ.get("FUZZ_SEED", "20241018"))
+
+
+def _random_message(rng):
+    """(frame, loại, tham số mong đợi sau decode_payload)"""
+    kind = rng.choice(list(codec.DECODERS))
+    if kind == codec.HELLO_MAIN:
+        return codec.encode_hello_main(), kind, ()
+    if kind == codec.HELLO_SENSOR:
+        zone, slots = rng.randrange(65536), rng.randrange(65536)
+        return codec.encode_hello_sensor(zone, slots), kind, (zone, slots)
+    if kind == codec.CARD:
+        uid = "".join(rng.choice("0123456789ABCDEF") for _ in range(rng.randint(1, 20)))
+        lane = rng.randrange(256)
+        return codec.encode_card(uid, lane), kind, (uid, lane)
+    if kind in (codec.CHECKOUT, codec.CLOSED):
+        lane = rng.randrange(256)
+        encode = codec.encode_checkout if kind == codec.CHECKOUT else codec.encode_closed
+        return encode(lane), kind, (lane,)
+    if kind == codec.PARKING_DATA:
+        zone = rng.randrange(65536)
+        status = "".join(rng.choice("01") for _ in range(rng.randint(0, 200)))
+        occupied = status.count('1')
+        return codec.encode_parking_data(zone, status), kind, (zone, status, occupied, len(status) - occupied)
+    zone, rssi = rng.randrange(65536), rng.randint(-128, 127)
+    return codec.encode_heartbeat(zone, rssi), kind, (zone, rssi)
+
+
+def _split(rng, data):
+    """Cắt data thành các đoạn ngẫu nhiên (như recv())"""
+    chunks, i = [], 0
+    while i < len(data):
+        n = rng.randint(1, 64)
+        chunks.append(data[i:i + n])
+        i += n
+    return chunks
+
+
+def test_roundtrip_chunked(rounds=ROUNDS):
+    rng = random.Random(SEED)
+    messages = [_random_message(rng) for _ in range(rounds)]
+    stream = b"".join(frame for frame, _, _ in messages)
+    decoder = codec.FrameDecoder()
+    frames = []
+    for chunk in _split(rng, stream):
+        frames.extend(decoder.feed(chunk))
+    assert decoder.pending() == 0
+    assert len(frames) == len(messages)
+    for (msg_type, payload), (_, kind, expected) in zip(frames, messages):
+        assert msg_type == kind
+        assert codec.decode_payload(msg_type, payload) == expected
+
+
+def test_status_bitmask(rounds=ROUNDS):
+    rng = random.Random(SEED + 1)
+    for _ in range(rounds):
+        status = "".join(rng.choice("01") for _ in range(rng.randint(0, 100)))
+        assert codec.unpack_status(codec.pack_status(status), len(status)) == status
+
+
+def test_commands_roundtrip(rounds=ROUNDS):
+    rng = random.Random(SEED + 2)
+    fixed = ["ACK", "OK", "OPEN_1", "OPEN_2", "MSG:BAI DAY!|Xe máy: 0/10", "SLOTS:3:12", "REJECT_1",
+             "OPEN_999", "OPEN_01", "SLOTS:1:70000", "SLOTS:a:b", "SLOTS:01:2"]
+    text = string.ascii_letters + string.digits + ":|_ -!đá"
+    commands = fixed + ["".join(rng.choice(text) for _ in range(rng.randint(1, 40))) for _ in range(rounds)]
+    decoder = codec.FrameDecoder()
+    frames = decoder.feed(b"".join(codec.encode_command(c) for c in commands))
+    assert [codec.decode_command(t, p) for t, p in frames] == commands
+
+
+def test_random_bytes_only_protocol_error(rounds=ROUNDS):
+    """Luồng rác: decoder / decode_payload chỉ được ném ProtocolError"""
+    rng = random.Random(SEED + 3)
+    for _ in range(rounds):
+        decoder = codec.FrameDecoder(max_frame=rng.choice((16, 256, codec.MAX_FRAME)))
+        data = bytes(rng.randrange(256) for _ in range(rng.randint(0, 300)))
+        try:
+            for chunk in _split(rng, data):
+                for msg_type, payload in decoder.feed(chunk):
+                    try:
+                        codec.decode_payload(msg_type, payload)
+                    except codec.ProtocolError:
+                        pass
+        except codec.ProtocolError:
+            pass
+
+
+def test_mutated_frames(rounds=ROUNDS):
+    """Frame hợp lệ bị đổi / cắt / thêm byte trong payload"""
+    rng = random.Random(SEED + 4)
+    for _ in range(rounds):
+        frame, kind, _ = _random_message(rng)
+        payload = bytearray(frame[3:])
+        op = rng.choice(("flip", "truncate", "extend", "type"))
+        if op == "flip" and payload:
+            payload[rng.randrange(len(payload))] = rng.randrange(256)
+        elif op == "truncate" and payload:
+            del payload[rng.randrange(len(payload)):]
+        elif op == "extend":
+            payload += bytes(rng.randrange(256) for _ in range(rng.randint(1, 4)))
+        else:
+            kind = rng.randrange(256)
+        try:
+            codec.decode_payload(kind, bytes(payload))
+        except codec.ProtocolError:
+            pass
+
+
+def test_bad_length_rejected():
+    for header in (b"\x00\x00", b"\xff\xff"):
+        decoder = codec.FrameDecoder()
+        try:
+            decoder.feed(header + b"\x01")
+        except codec.ProtocolError:
+            assert decoder.pending() == 0
+        else:
+            raise AssertionError(f"độ dài {header!r} phải bị từ chối")
+
+
+def test_binary_smaller_than_text():
+    status = "1010001101" * 10
+    text = f"PARKING_DATA:1:{status}:{status.count('1')}:{status.count('0')}\n".encode()
+    assert len(codec.encode_parking_data(1, status)) < len(text) // 3
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else ROUNDS
+    tests = [(name, func) for name, func in sorted(globals().items()) if name.startswith("test_")]
+    print("=" * 60)
+    print(f"FUZZ TEST PROTOCOL CODEC (seed={SEED}, {rounds} vòng)")
+    print("=" * 60)
+    for name, func in tests:
+        if "rounds" in func.__code__.co_varnames[:func.__code__.co_argcount]:
+            func(rounds)
+        else:
+            func()
+        print(f"✅ {name}")
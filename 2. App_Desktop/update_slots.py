@@ -1,5 +1,7 @@
 import sqlite3
 
+from core.enums import VehicleType
+
 # Kết nối database
 conn = sqlite3.connect('parking_system.db')
 cursor = conn.cursor()
@@ -35,20 +37,20 @@ print("-"*60)
 
 for row in rows:
     slot_id = row[0]
-    vehicle_type = row[1]
+    vehicle_type = VehicleType.label_of(row[1])
     reserved_text = "Vé tháng" if row[2] == 1 else "Vãng lai"
     status_text = "Có xe" if row[3] == 1 else "Trống"
     print(f"{slot_id:<6} | {vehicle_type:<10} | {reserved_text:<10} | {status_text:<10}")
 
 print("="*60)
 print("\nTÓM TẮT:")
-cursor.execute('SELECT COUNT(*) FROM parking_slots WHERE vehicle_type="Ô tô" AND is_reserved=1')
+cursor.execute(f'SELECT COUNT(*) FROM parking_slots WHERE vehicle_type={VehicleType.CAR.value} AND is_reserved=1')
 car_monthly = cursor.fetchone()[0]
-cursor.execute('SELECT COUNT(*) FROM parking_slots WHERE vehicle_type="Ô tô" AND is_reserved=0')
+cursor.execute(f'SELECT COUNT(*) FROM parking_slots WHERE vehicle_type={VehicleType.CAR.value} AND is_reserved=0')
 car_guest = cursor.fetchone()[0]
-cursor.execute('SELECT COUNT(*) FROM parking_slots WHERE vehicle_type="Xe máy" AND is_reserved=1')
+cursor.execute(f'SELECT COUNT(*) FROM parking_slots WHERE vehicle_type={VehicleType.MOTOR.value} AND is_reserved=1')
 motor_monthly = cursor.fetchone()[0]
-cursor.execute('SELECT COUNT(*) FROM parking_slots WHERE vehicle_type="Xe máy" AND is_reserved=0')
+cursor.execute(f'SELECT COUNT(*) FROM parking_slots WHERE vehicle_type={VehicleType.MOTOR.value} AND is_reserved=0')
 motor_guest = cursor.fetchone()[0]
 
 print(f"Ô tô: {car_monthly} vé tháng + {car_guest} vãng lai")
@@ -0,0 +1,68 @@
+-- ============================================================================
+-- SMART PARKING SYSTEM - BASE SCHEMA
+-- Bảng gốc (giống database.init_db). Index và các thay đổi sau đó được áp dụng
+-- bởi versioned migrations trong "2. App_Desktop/core/db_migrations.py"
+-- (bảng schema_version ghi lại các bước đã chạy).
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    full_name TEXT,
+    role TEXT DEFAULT 'STAFF',          -- 'ADMIN' hoặc 'STAFF'
+    phone TEXT,
+    is_active INTEGER DEFAULT 1,        -- 1: Đang làm, 0: Đã nghỉ
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_permissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    permission_code TEXT NOT NULL,      -- 'view_history', 'manage_monthly', ...
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+    UNIQUE(user_id, permission_code)
+);
+
+CREATE TABLE IF NOT EXISTS parking_slots (
+    slot_id TEXT PRIMARY KEY,           -- Tên ô (VD: A1, M2)
+    vehicle_type TEXT,                  -- 'Ô tô' hoặc 'Xe máy'
+    is_reserved INTEGER DEFAULT 0,      -- 1: Dành cho khách tháng, 0: Khách vãng lai
+    status INTEGER DEFAULT 0            -- 0: Trống, 1: Có xe
+);
+
+CREATE TABLE IF NOT EXISTS monthly_tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    plate_number TEXT NOT NULL,
+    owner_name TEXT,
+    card_id TEXT UNIQUE,                -- Mã thẻ RFID
+    assigned_slot TEXT,                 -- Ô đỗ cố định (VD: A1)
+    vehicle_type TEXT,
+    reg_date TEXT,
+    exp_date TEXT,
+    avatar_path TEXT,
+    status TEXT DEFAULT 'ACTIVE',       -- ACTIVE, EXPIRED, DELETED
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS parking_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    card_id TEXT,
+    plate_in TEXT,
+    time_in TIMESTAMP,                  -- Giờ Việt Nam (UTC+7), 'YYYY-MM-DD HH:MM:SS'
+    time_out TIMESTAMP,
+    image_in_path TEXT,
+    image_out_path TEXT,
+    price INTEGER DEFAULT 0,
+    vehicle_type TEXT,                  -- 'Ô tô' hoặc 'Xe máy'
+    ticket_type TEXT,                   -- 'MONTHLY' hoặc 'GUEST'
+    status TEXT DEFAULT 'PARKING',      -- 'PARKING' (Đang gửi) hoặc 'PAID' (Đã ra)
+    payment_method TEXT,                -- 'CASH', 'BANKING', 'MONTHLY'
+    slot_id TEXT
+);
+
+CREATE TABLE IF NOT EXISTS settings (
+    key_name TEXT PRIMARY KEY,
+    key_value TEXT
+);